@@ -0,0 +1,91 @@
+"""Добавление таблицы ingestion_jobs (очередь фоновой ингестии).
+
+Создаёт:
+- Таблицу ingestion_jobs, из которой воркеры забирают задачи через SKIP LOCKED
+- Частичный уникальный индекс: не более одной активной задачи на версию документа
+- Индексы для выборки очереди
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0024_add_ingestion_jobs"
+down_revision = "0023_add_suggested_fix_to_audit_issues"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ingestion_jobs",
+        sa.Column(
+            "id",
+            postgresql.UUID(as_uuid=True),
+            primary_key=True,
+            nullable=False,
+            server_default=sa.text("gen_random_uuid()"),
+        ),
+        sa.Column(
+            "doc_version_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("document_versions.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("status", sa.Text(), nullable=False, server_default=sa.text("'queued'")),
+        sa.Column("force", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default=sa.text("0")),
+        sa.Column("max_attempts", sa.Integer(), nullable=False, server_default=sa.text("3")),
+        sa.Column(
+            "run_after",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.Column("locked_by", sa.Text(), nullable=True),
+        sa.Column("locked_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("result_json", postgresql.JSONB(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+    )
+
+    op.execute(
+        "ALTER TABLE ingestion_jobs ADD CONSTRAINT chk_ingestion_jobs_status "
+        "CHECK (status IN ('queued', 'running', 'succeeded', 'failed'))"
+    )
+
+    op.create_index(
+        "ix_ingestion_jobs_status_run_after",
+        "ingestion_jobs",
+        ["status", "run_after"],
+    )
+    op.create_index(
+        "ix_ingestion_jobs_doc_version_id",
+        "ingestion_jobs",
+        ["doc_version_id"],
+    )
+    op.create_index(
+        "uq_ingestion_jobs_active_doc_version",
+        "ingestion_jobs",
+        ["doc_version_id"],
+        unique=True,
+        postgresql_where=sa.text("status IN ('queued', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("uq_ingestion_jobs_active_doc_version", table_name="ingestion_jobs")
+    op.drop_index("ix_ingestion_jobs_doc_version_id", table_name="ingestion_jobs")
+    op.drop_index("ix_ingestion_jobs_status_run_after", table_name="ingestion_jobs")
+    op.execute("ALTER TABLE ingestion_jobs DROP CONSTRAINT chk_ingestion_jobs_status")
+    op.drop_table("ingestion_jobs")
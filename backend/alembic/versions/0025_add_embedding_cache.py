@@ -0,0 +1,39 @@
+"""Добавление таблицы embedding_cache (content-addressed кэш эмбеддингов).
+
+Создаёт:
+- Таблицу embedding_cache с ключом (provider, model, dims, text_hash)
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0025_add_embedding_cache"
+down_revision = "0024_add_ingestion_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "embedding_cache",
+        sa.Column("provider", sa.Text(), nullable=False),
+        sa.Column("model", sa.Text(), nullable=False),
+        sa.Column("dims", sa.Integer(), nullable=False),
+        sa.Column("text_hash", sa.String(length=64), nullable=False),
+        sa.Column("embedding", postgresql.ARRAY(sa.Float()), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+        sa.PrimaryKeyConstraint("provider", "model", "dims", "text_hash"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("embedding_cache")
@@ -0,0 +1,71 @@
+"""Индексы для векторного поиска chunks (RetrievalService).
+
+Создаёт:
+- HNSW-индекс idx_chunks_embedding_hnsw (vector_cosine_ops), если миграция 0002
+  создала ivfflat-индекс (pgvector < 0.5) — он заменяется на HNSW; замена отмечается
+  комментарием индекса, и downgrade по нему восстанавливает ivfflat-индекс
+- Индекс documents(study_id, doc_type) для фильтров поиска по исследованию и типу документа
+- STORAGE PLAIN для chunks.embedding: vector(1536) (~6 КБ) хранится в строке, а не в TOAST,
+  поэтому точный поиск по chunks исследования не делает отдельных чтений TOAST.
+  Действует для новых строк; существующие переносятся при перезаписи таблицы
+  (VACUUM FULL chunks / pg_repack) — HNSW-индекс при этом перестраивается,
+  нужен достаточный maintenance_work_mem.
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0026_chunks_ann_retrieval"
+down_revision = "0025_add_embedding_cache"
+branch_labels = None
+depends_on = None
+
+
+# Комментарий HNSW-индекса, созданного этой миграцией вместо ivfflat
+REPLACED_IVFFLAT_COMMENT = "replaces idx_chunks_embedding_ivfflat"
+
+
+def upgrade() -> None:
+    connection = op.get_bind()
+    has_ivfflat = connection.execute(
+        sa.text("SELECT to_regclass('idx_chunks_embedding_ivfflat') IS NOT NULL")
+    ).scalar()
+
+    op.execute("DROP INDEX IF EXISTS idx_chunks_embedding_ivfflat")
+    op.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chunks_embedding_hnsw
+        ON chunks USING hnsw (embedding vector_cosine_ops)
+        WITH (m = 16, ef_construction = 64)
+    """)
+    if has_ivfflat:
+        op.execute(f"COMMENT ON INDEX idx_chunks_embedding_hnsw IS '{REPLACED_IVFFLAT_COMMENT}'")
+
+    op.execute("ALTER TABLE chunks ALTER COLUMN embedding SET STORAGE PLAIN")
+
+    op.create_index(
+        "ix_documents_study_doc_type",
+        "documents",
+        ["study_id", "doc_type"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_documents_study_doc_type", table_name="documents", if_exists=True)
+    op.execute("ALTER TABLE chunks ALTER COLUMN embedding SET STORAGE EXTERNAL")
+
+    # HNSW-индекс, созданный ещё в 0002, сохраняется; заменённый ivfflat-индекс восстанавливается
+    connection = op.get_bind()
+    hnsw_comment = connection.execute(
+        sa.text("SELECT obj_description(to_regclass('idx_chunks_embedding_hnsw'), 'pg_class')")
+    ).scalar()
+    if hnsw_comment == REPLACED_IVFFLAT_COMMENT:
+        op.execute("DROP INDEX IF EXISTS idx_chunks_embedding_hnsw")
+        op.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chunks_embedding_ivfflat
+            ON chunks USING ivfflat (embedding vector_cosine_ops)
+            WITH (lists = 100)
+        """)
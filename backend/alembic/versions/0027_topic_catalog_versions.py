@@ -0,0 +1,62 @@
+"""Счётчик изменений справочников топиков (topic_catalog_versions).
+
+Создаёт:
+- Таблицу topic_catalog_versions (scope = имя таблицы, version)
+- Функцию bump_topic_catalog_version() и statement-level триггеры на topics и
+  topic_zone_priors: любой INSERT/UPDATE/DELETE/TRUNCATE увеличивает version.
+  TopicRegistry сравнивает счётчик с закэшированным и перекомпилирует профили топиков
+  и zone priors только после изменений.
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0027_topic_catalog_versions"
+down_revision = "0026_chunks_ann_retrieval"
+branch_labels = None
+depends_on = None
+
+_TABLES = ("topics", "topic_zone_priors")
+
+
+def upgrade() -> None:
+    op.create_table(
+        "topic_catalog_versions",
+        sa.Column("scope", sa.Text(), primary_key=True),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+            server_default=sa.text("now()"),
+        ),
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bump_topic_catalog_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO topic_catalog_versions (scope, version, updated_at)
+            VALUES (TG_TABLE_NAME, 1, now())
+            ON CONFLICT (scope) DO UPDATE
+                SET version = topic_catalog_versions.version + 1, updated_at = now();
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table in _TABLES:
+        op.execute(
+            f"CREATE TRIGGER trg_{table}_catalog_version "
+            f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+            "FOR EACH STATEMENT EXECUTE FUNCTION bump_topic_catalog_version()"
+        )
+
+
+def downgrade() -> None:
+    for table in _TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_catalog_version ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS bump_topic_catalog_version()")
+    op.drop_table("topic_catalog_versions")
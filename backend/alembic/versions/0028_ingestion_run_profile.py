@@ -0,0 +1,28 @@
+"""Профиль ингестии по стадиям (ingestion_runs.profile_json).
+
+Добавляет nullable-колонку profile_json: заполняется только при включённом
+профилировании ингестии (settings.ingestion_profiling_enabled или ingest(profile=True)).
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0028_ingestion_run_profile"
+down_revision = "0027_topic_catalog_versions"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "ingestion_runs",
+        sa.Column("profile_json", postgresql.JSONB(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("ingestion_runs", "profile_json")
@@ -0,0 +1,34 @@
+"""Индексы для keyset-пагинации anchors и facts.
+
+GET /document-versions/{id}/anchors упорядочивает anchors по (ordinal, id),
+GET /studies/{id}/facts — факты по id; страницы выбираются условием "ключ > курсор"
+без сортировки всей выборки.
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0029_keyset_pagination_indexes"
+down_revision = "0028_ingestion_run_profile"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_anchors_doc_version_ordinal_id",
+        "anchors",
+        ["doc_version_id", "ordinal", "id"],
+    )
+    op.create_index(
+        "ix_facts_study_id_id",
+        "facts",
+        ["study_id", "id"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_facts_study_id_id", table_name="facts")
+    op.drop_index("ix_anchors_doc_version_ordinal_id", table_name="anchors")
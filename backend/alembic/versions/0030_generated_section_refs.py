@@ -0,0 +1,113 @@
+"""Обратный индекс ссылок сгенерированных секций для Impact Analysis.
+
+- generated_section_anchor_refs: anchor_id → generated_target_sections.id
+- generated_section_fact_refs: fact_key → generated_target_sections.id
+- GIN-индекс topic_evidence.anchor_ids (поиск затронутых topic_evidence через &&)
+
+Таблицы заполняются из artifacts_json существующих секций (citations,
+claim_items[].anchor_ids, citation_items[].anchor_id, claim_items[].fact_refs);
+новые секции индексирует GenerationService при сохранении.
+"""
+
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0030_generated_section_refs"
+down_revision = "0029_keyset_pagination_indexes"
+branch_labels = None
+depends_on = None
+
+
+def _json_array(expr: str) -> str:
+    """Выражение jsonb-массива (не массив → пустой массив)."""
+    return f"CASE WHEN jsonb_typeof({expr}) = 'array' THEN {expr} ELSE '[]'::jsonb END"
+
+
+def upgrade() -> None:
+    op.create_table(
+        "generated_section_anchor_refs",
+        sa.Column("anchor_id", sa.Text(), nullable=False),
+        sa.Column(
+            "generated_section_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("generated_target_sections.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("anchor_id", "generated_section_id"),
+    )
+    op.create_index(
+        "ix_generated_section_anchor_refs_section",
+        "generated_section_anchor_refs",
+        ["generated_section_id"],
+    )
+
+    op.create_table(
+        "generated_section_fact_refs",
+        sa.Column("fact_key", sa.Text(), nullable=False),
+        sa.Column(
+            "generated_section_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("generated_target_sections.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("fact_key", "generated_section_id"),
+    )
+    op.create_index(
+        "ix_generated_section_fact_refs_section",
+        "generated_section_fact_refs",
+        ["generated_section_id"],
+    )
+
+    op.create_index(
+        "ix_topic_evidence_anchor_ids_gin",
+        "topic_evidence",
+        ["anchor_ids"],
+        postgresql_using="gin",
+    )
+
+    # Заполнение из artifacts_json существующих секций: те же правила, что у index_generated_section_refs
+    # (claim_items/citation_items — только объекты, в индекс попадают только строковые значения)
+    claim_items = "jsonb_array_elements(" + _json_array("s.artifacts_json->'claim_items'") + ")"
+    op.execute(
+        f"""
+        INSERT INTO generated_section_anchor_refs (anchor_id, generated_section_id)
+        SELECT DISTINCT refs.anchor_id, s.id
+        FROM generated_target_sections s
+        CROSS JOIN LATERAL (
+            SELECT c #>> '{{}}' AS anchor_id
+            FROM jsonb_array_elements({_json_array("s.artifacts_json->'citations'")}) c
+            WHERE jsonb_typeof(c) = 'string'
+            UNION
+            SELECT a #>> '{{}}'
+            FROM {claim_items} claim
+            CROSS JOIN LATERAL jsonb_array_elements({_json_array("claim->'anchor_ids'")}) a
+            WHERE jsonb_typeof(claim) = 'object' AND jsonb_typeof(a) = 'string'
+            UNION
+            SELECT ci->>'anchor_id'
+            FROM jsonb_array_elements({_json_array("s.artifacts_json->'citation_items'")}) ci
+            WHERE jsonb_typeof(ci) = 'object' AND jsonb_typeof(ci->'anchor_id') = 'string'
+        ) refs
+        """
+    )
+    op.execute(
+        f"""
+        INSERT INTO generated_section_fact_refs (fact_key, generated_section_id)
+        SELECT DISTINCT f #>> '{{}}', s.id
+        FROM generated_target_sections s
+        CROSS JOIN LATERAL {claim_items} claim
+        CROSS JOIN LATERAL jsonb_array_elements({_json_array("claim->'fact_refs'")}) f
+        WHERE jsonb_typeof(claim) = 'object' AND jsonb_typeof(f) = 'string'
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_topic_evidence_anchor_ids_gin", table_name="topic_evidence")
+    op.drop_index("ix_generated_section_fact_refs_section", table_name="generated_section_fact_refs")
+    op.drop_table("generated_section_fact_refs")
+    op.drop_index("ix_generated_section_anchor_refs_section", table_name="generated_section_anchor_refs")
+    op.drop_table("generated_section_anchor_refs")
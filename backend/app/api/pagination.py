@@ -0,0 +1,124 @@
+"""
+Keyset-пагинация, проекция полей и NDJSON-стриминг для списочных endpoints.
+
+Курсор — непрозрачная base64url-строка с ключом сортировки последней отданной строки
+(например, [ordinal, id] для anchors). Следующая страница выбирается условием
+"ключ > курсор" по индексу, поэтому время ответа не зависит от номера страницы.
+Курсор следующей страницы передаётся в заголовке X-Next-Cursor (тело ответа остаётся
+списком, как у непагинированных endpoints).
+
+NDJSON-режим (format=ndjson) отдаёт по одной JSON-строке на запись через StreamingResponse:
+строки читаются серверным курсором (yield_per) в собственной сессии, так как
+сессия зависимости get_db может быть закрыта до отправки тела ответа.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from collections.abc import AsyncIterator, Callable, Iterable
+from typing import Any
+from uuid import UUID
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.core.errors import ValidationError
+
+# Размер страницы JSON-ответа без limit, и максимальный limit
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+# Сколько строк серверный курсор выбирает за один FETCH в NDJSON-режиме
+STREAM_BATCH_SIZE = 1000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def encode_cursor(*key: Any) -> str:
+    """Курсор из ключа сортировки строки."""
+    raw = json.dumps(jsonable_encoder(list(key)), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: Callable[[Any], Any]) -> tuple[Any, ...]:
+    """
+    Ключ сортировки из курсора; types приводят элементы ключа (например, int, UUID).
+
+    Raises:
+        ValidationError: курсор повреждён или не от этого endpoint
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(cast(value) for cast, value in zip(types, values))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValidationError("Некорректный cursor", details={"cursor": cursor}) from None
+
+
+def parse_fields(fields: str | None, allowed: Iterable[str]) -> list[str]:
+    """
+    Список полей из параметра fields ("a,b,c"); без параметра — все allowed.
+
+    Raises:
+        ValidationError: запрошены неизвестные поля
+    """
+    allowed = list(allowed)
+    if not fields:
+        return allowed
+    requested = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in allowed]
+    if unknown or not requested:
+        raise ValidationError(
+            f"Неизвестные поля: {', '.join(unknown)}" if unknown else "Пустой список полей",
+            details={"allowed": allowed},
+        )
+    return requested
+
+
+def page_limit(limit: int | None, cursor: str | None, response_format: str = "json") -> int | None:
+    """
+    Размер страницы: limit; без limit — DEFAULT_PAGE_SIZE (JSON-ответ всегда постраничный).
+
+    Без пагинации (None) — только NDJSON без limit и cursor: поток всего списка.
+    """
+    if limit is None and (cursor is not None or response_format != "ndjson"):
+        return DEFAULT_PAGE_SIZE
+    return limit
+
+
+def page_response(items: list[dict[str, Any]], next_cursor: str | None) -> JSONResponse:
+    """JSON-список страницы; курсор следующей страницы — в заголовке X-Next-Cursor."""
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return JSONResponse(content=jsonable_encoder(items), headers=headers)
+
+
+def ndjson_response(items: AsyncIterator[dict[str, Any]]) -> StreamingResponse:
+    """Потоковый ответ: одна JSON-строка на запись."""
+
+    async def lines() -> AsyncIterator[bytes]:
+        async for item in items:
+            yield json.dumps(jsonable_encoder(item), ensure_ascii=False).encode("utf-8") + b"\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def uuid_key(value: Any) -> UUID:
+    return value if isinstance(value, UUID) else UUID(str(value))
+
+
+__all__ = [
+    "DEFAULT_PAGE_SIZE",
+    "MAX_PAGE_SIZE",
+    "NDJSON_MEDIA_TYPE",
+    "NEXT_CURSOR_HEADER",
+    "STREAM_BATCH_SIZE",
+    "decode_cursor",
+    "encode_cursor",
+    "ndjson_response",
+    "page_limit",
+    "page_response",
+    "parse_fields",
+    "uuid_key",
+]
@@ -4,22 +4,36 @@ from pathlib import Path
 import re
 import urllib.parse
 from uuid import UUID
-from typing import Any
+from typing import Any, Literal
 
-from fastapi import APIRouter, Depends, File, Query, UploadFile, status
+from fastapi import APIRouter, Depends, File, Query, Response, UploadFile, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import func, select
+from sqlalchemy import Select, select, tuple_
 
 from app.api.deps import get_db
+from app.api.pagination import (
+    MAX_PAGE_SIZE,
+    NDJSON_MEDIA_TYPE,
+    STREAM_BATCH_SIZE,
+    decode_cursor,
+    encode_cursor,
+    ndjson_response,
+    page_limit,
+    page_response,
+    parse_fields,
+    uuid_key,
+)
 from app.core.audit import log_audit
+from app.core.config import settings
 from app.core.logging import logger
 from app.core.errors import ConflictError, NotFoundError, ValidationError
 from app.core.storage import save_upload
-from app.worker.job_runner import run_ingestion_now
+from app.worker.job_runner import enqueue_ingestion, execute_ingestion, get_ingestion_job
 from app.services.anchor_aligner import AnchorAligner
 from app.db.models.studies import Document, DocumentVersion, Study
 from app.db.models.anchors import Anchor
 from app.db.models.anchor_matches import AnchorMatch
+from app.db.models.ingestion_jobs import IngestionJob
 from app.db.models.sections import TargetSectionMap
 from app.db.models.topics import TopicEvidence
 from app.db.enums import AnchorContentType, IngestionStatus, DocumentLanguage
@@ -33,9 +47,11 @@ from app.schemas.documents import (
     DiffResult,
     ChangedAnchor,
     AlignmentDiffItem,
+    IngestionJobOut,
 )
 from app.schemas.anchors import AnchorOut
 from app.db.models.facts import Fact
+from app.db.session import async_session_factory
 
 router = APIRouter()
 
@@ -394,146 +410,6 @@ def _detect_language_from_docx(file_path: Path, max_chars: int = 50_000) -> tupl
     return lang, meta
 
 
-def _ensure_list(value: Any) -> list[Any]:
-    if value is None:
-        return []
-    if isinstance(value, list):
-        return value
-    return [value]
-
-
-async def _build_ingestion_summary(
-    *,
-    db: AsyncSession,
-    version: DocumentVersion,
-    ingestion_result: Any | None,
-    final_status: IngestionStatus,
-    warnings: list[str] | None = None,
-    errors: list[str] | None = None,
-) -> dict[str, Any]:
-    """
-    Формирует ingestion_summary_json со стабильной схемой (MVP шаги 1–6).
-
-    Требуемые ключи (всегда присутствуют):
-    - anchors_created
-    - soa_found
-    - soa_facts_written
-    - chunks_created
-    - mapping_status
-    - warnings
-    - errors
-    """
-    base_summary: dict[str, Any] = version.ingestion_summary_json or {}
-
-    anchors_created = int(getattr(ingestion_result, "anchors_created", 0) or 0) if ingestion_result else 0
-    chunks_created = int(getattr(ingestion_result, "chunks_created", 0) or 0) if ingestion_result else 0
-    soa_found = bool(getattr(ingestion_result, "soa_detected", False)) if ingestion_result else False
-
-    # SoA facts actually written: проверяем по БД и извлекаем количество элементов из value_json
-    soa_facts_counts: dict[str, int] = {"visits": 0, "procedures": 0, "matrix": 0}
-    soa_facts_written_flags: dict[str, bool] = {"visits": False, "procedures": False, "matrix": False}
-    
-    if ingestion_result is not None:
-        # Получаем факты SoA с их value_json
-        facts_res = await db.execute(
-            select(Fact.fact_key, Fact.value_json)
-            .where(
-                Fact.created_from_doc_version_id == version.id,
-                Fact.fact_type == "soa",
-                Fact.fact_key.in_(("visits", "procedures", "matrix")),
-            )
-        )
-        
-        for row in facts_res.all():
-            fact_key = str(row.fact_key)
-            value_json = row.value_json or {}
-            
-            # Извлекаем количество элементов из value_json
-            if fact_key == "visits":
-                visits_list = value_json.get("visits", [])
-                if isinstance(visits_list, list):
-                    soa_facts_counts["visits"] = len(visits_list)
-                    soa_facts_written_flags["visits"] = len(visits_list) > 0
-            elif fact_key == "procedures":
-                procedures_list = value_json.get("procedures", [])
-                if isinstance(procedures_list, list):
-                    soa_facts_counts["procedures"] = len(procedures_list)
-                    soa_facts_written_flags["procedures"] = len(procedures_list) > 0
-            elif fact_key == "matrix":
-                matrix_list = value_json.get("matrix", [])
-                if isinstance(matrix_list, list):
-                    soa_facts_counts["matrix"] = len(matrix_list)
-                    soa_facts_written_flags["matrix"] = len(matrix_list) > 0
-
-    soa_facts_written = {
-        "visits": soa_facts_written_flags["visits"],
-        "procedures": soa_facts_written_flags["procedures"],
-        "matrix": soa_facts_written_flags["matrix"],
-        "counts": soa_facts_counts,
-    }
-
-    # Маппинг секций: минимальная стабильная схема
-    sections_mapped_count = None
-    sections_needs_review_count = None
-    if ingestion_result is not None and getattr(ingestion_result, "docx_summary", None):
-        ds = getattr(ingestion_result, "docx_summary") or {}
-        if "sections_mapped_count" in ds:
-            sections_mapped_count = ds.get("sections_mapped_count")
-        if "sections_needs_review_count" in ds:
-            sections_needs_review_count = ds.get("sections_needs_review_count")
-
-    mapping_status = {
-        "sections_mapped_count": sections_mapped_count,
-        "sections_needs_review_count": sections_needs_review_count,
-        "status": "needs_review" if final_status == IngestionStatus.NEEDS_REVIEW else ("failed" if final_status == IngestionStatus.FAILED else "ready"),
-    }
-
-    stable_summary: dict[str, Any] = {
-        "anchors_created": anchors_created,
-        "soa_found": soa_found,
-        "soa_facts_written": soa_facts_written,
-        "chunks_created": chunks_created,
-        "mapping_status": mapping_status,
-        "warnings": _ensure_list(warnings),
-        "errors": _ensure_list(errors),
-        # Дублируем для обратной совместимости с существующими тестами/клиентами:
-        "soa_detected": bool(getattr(ingestion_result, "soa_detected", False)) if ingestion_result else False,
-        "needs_review": bool(getattr(ingestion_result, "needs_review", False)) if ingestion_result else (final_status == IngestionStatus.NEEDS_REVIEW),
-    }
-
-    # Сохраняем метаданные загруженного файла, если уже были записаны при upload
-    for k in ("filename", "size_bytes"):
-        if k in base_summary and k not in stable_summary:
-            stable_summary[k] = base_summary[k]
-
-    # Сохраняем поля alignment и soa_confidence из base_summary (записываются в корень в ingestion service)
-    for k in ("matched_anchors", "changed_anchors", "soa_confidence"):
-        if k in base_summary:
-            stable_summary[k] = base_summary[k]
-
-    # Прокидываем sha256 из модели в summary для трассировки
-    if version.source_sha256:
-        stable_summary["source_sha256"] = version.source_sha256
-
-    # При желании сохраняем дополнительные поля, но не полагаемся на них как на часть стабильной схемы
-    if ingestion_result is not None:
-        stable_summary["facts_extraction"] = {
-            "facts_count": getattr(ingestion_result, "facts_count", 0),
-            "needs_review": getattr(ingestion_result, "facts_needs_review", []),
-        }
-        if getattr(ingestion_result, "soa_detected", False):
-            stable_summary["soa"] = {
-                "table_index": getattr(ingestion_result, "soa_table_index", None),
-                "section_path": getattr(ingestion_result, "soa_section_path", None),
-                "confidence": getattr(ingestion_result, "soa_confidence", None),
-                "cell_anchors_created": getattr(ingestion_result, "cell_anchors_created", 0),
-            }
-        if getattr(ingestion_result, "docx_summary", None):
-            stable_summary["docx_summary"] = getattr(ingestion_result, "docx_summary")
-
-    return stable_summary
-
-
 def validate_file_extension(filename: str) -> None:
     """Проверяет расширение файла."""
     if not filename:
@@ -787,6 +663,9 @@ async def start_ingestion(
     State machine:
     - uploaded -> processing -> ready/needs_review/failed
     - Можно перезапустить с force=true для failed/needs_review
+
+    При INGESTION_QUEUE_ENABLED=true ингестия ставится в очередь ingestion_jobs и
+    выполняется воркером; ответ содержит job_id для GET /ingestion-jobs/{job_id}.
     """
     # Проверяем существование version и загружаем document для получения workspace_id
     version = await db.get(DocumentVersion, version_id)
@@ -833,7 +712,6 @@ async def start_ingestion(
 
     # Переводим статус: uploaded -> processing
     version.ingestion_status = IngestionStatus.PROCESSING
-    await db.commit()
     
     # Audit: логируем переход в processing
     await log_audit(
@@ -845,126 +723,57 @@ async def start_ingestion(
         before_json=before_state,
         after_json={"ingestion_status": IngestionStatus.PROCESSING.value},
     )
-    await db.commit()
-
-    try:
-        # Выполняем ингестию через JobRunner
-        ingestion_result = await run_ingestion_now(db, version_id)
-        
-        # Определяем финальный статус на основе результата
-        if ingestion_result.needs_review or ingestion_result.warnings:
-            final_status = IngestionStatus.NEEDS_REVIEW
-        else:
-            final_status = IngestionStatus.READY
-        
-        # Формируем стабильный summary
-        all_warnings: list[str] = []
-        if getattr(ingestion_result, "warnings", None):
-            all_warnings.extend(list(getattr(ingestion_result, "warnings") or []))
-        if getattr(ingestion_result, "docx_summary", None) and isinstance(ingestion_result.docx_summary, dict):
-            docx_warnings = ingestion_result.docx_summary.get("warnings") or []
-            all_warnings.extend(list(docx_warnings))
-
-        summary = await _build_ingestion_summary(
-            db=db,
-            version=version,
-            ingestion_result=ingestion_result,
-            final_status=final_status,
-            warnings=all_warnings,
-            errors=[],
-        )
-
-        # Собираем counts_by_type и num_sections из созданных anchors (доп. поля; не часть стабильной схемы)
-        if ingestion_result.anchors_created > 0:
-            counts_result = await db.execute(
-                select(
-                    Anchor.content_type,
-                    func.count(Anchor.id).label("count"),
-                )
-                .where(Anchor.doc_version_id == version_id)
-                .group_by(Anchor.content_type)
-            )
-            summary["counts_by_type"] = {
-                row.content_type.value: row.count
-                for row in counts_result.all()
-            }
-            sections_result = await db.execute(
-                select(Anchor.section_path)
-                .where(Anchor.doc_version_id == version_id)
-                .distinct()
-            )
-            unique_sections = sorted([row.section_path for row in sections_result.all()])
-            summary["num_sections"] = len(unique_sections)
-            summary["sections"] = unique_sections
 
-        version.ingestion_summary_json = summary
-        
-        # Обновляем статус
-        version.ingestion_status = final_status
-        await db.commit()
-        
-        # Audit: логируем завершение ингестии
-        await log_audit(
-            db=db,
-            workspace_id=workspace_id,
-            action="ingest_complete",
-            entity_type="document_version",
-            entity_id=str(version_id),
-            before_json={"ingestion_status": IngestionStatus.PROCESSING.value},
-            after_json={
-                "ingestion_status": final_status.value,
-                "ingestion_summary": version.ingestion_summary_json,
-            },
-        )
+    if settings.ingestion_queue_enabled:
+        # Фоновый режим: статус processing, audit и задача в очереди фиксируются одним commit —
+        # при ошибке постановки в очередь версия не остаётся в processing без задачи
+        job = await enqueue_ingestion(db, version_id, force=force)
         await db.commit()
-        
         return {
-            "status": final_status.value,
+            "status": IngestionStatus.PROCESSING.value,
             "version_id": str(version_id),
-            "anchors_created": ingestion_result.anchors_created,
-            "chunks_created": ingestion_result.chunks_created,
-            "soa_detected": ingestion_result.soa_detected,
-            "warnings": ingestion_result.warnings,
-            "needs_review": ingestion_result.needs_review,
+            "job_id": str(job.id),
+            "job_status": job.status,
         }
-        
-    except Exception as e:
-        # Обработка ошибок: processing -> failed
-        # Делаем rollback перед повторными операциями, если транзакция была откачена
-        try:
-            await db.rollback()
-        except Exception:
-            pass  # Игнорируем ошибки rollback, если транзакция уже закрыта
-        
-        error_message = str(e)
-        version.ingestion_status = IngestionStatus.FAILED
-        version.ingestion_summary_json = await _build_ingestion_summary(
-            db=db,
-            version=version,
-            ingestion_result=None,
-            final_status=IngestionStatus.FAILED,
-            warnings=[],
-            errors=[error_message],
-        )
-        await db.commit()
-        
-        # Audit: логируем ошибку
-        await log_audit(
-            db=db,
-            workspace_id=workspace_id,
-            action="ingest_failed",
-            entity_type="document_version",
-            entity_id=str(version_id),
-            before_json={"ingestion_status": IngestionStatus.PROCESSING.value},
-            after_json={
-                "ingestion_status": IngestionStatus.FAILED.value,
-                "error": error_message,
-            },
-        )
-        await db.commit()
-        
-        # Пробрасываем ошибку дальше
-        raise
+
+    # Выполняем ингестию через JobRunner в текущем запросе
+    await db.commit()
+    return await execute_ingestion(db, version_id, force=force)
+
+
+@router.get(
+    "/ingestion-jobs/{job_id}",
+    response_model=IngestionJobOut,
+)
+async def get_ingestion_job_status(
+    job_id: UUID,
+    db: AsyncSession = Depends(get_db),
+) -> IngestionJobOut:
+    """Статус фоновой задачи ингестии."""
+    job = await get_ingestion_job(db, job_id)
+    if not job:
+        raise NotFoundError("IngestionJob", str(job_id))
+    return IngestionJobOut.model_validate(job)
+
+
+@router.get(
+    "/document-versions/{version_id}/ingestion-jobs",
+    response_model=list[IngestionJobOut],
+)
+async def list_ingestion_jobs(
+    version_id: UUID,
+    db: AsyncSession = Depends(get_db),
+) -> list[IngestionJobOut]:
+    """История задач ингестии версии документа (новые первыми)."""
+    version = await db.get(DocumentVersion, version_id)
+    if not version:
+        raise NotFoundError("DocumentVersion", str(version_id))
+    result = await db.execute(
+        select(IngestionJob)
+        .where(IngestionJob.doc_version_id == version_id)
+        .order_by(IngestionJob.created_at.desc())
+    )
+    return [IngestionJobOut.model_validate(j) for j in result.scalars().all()]
 
 
 @router.get(
@@ -982,32 +791,87 @@ async def get_document_version(
     return DocumentVersionOut.model_validate(version)
 
 
+def _anchors_stmt(
+    version_id: UUID,
+    section_path: str | None,
+    content_type: AnchorContentType | None,
+    fields: list[str],
+    after: tuple[Any, ...] | None,
+    limit: int | None,
+) -> Select:
+    """Выборка только запрошенных колонок anchors в порядке (ordinal, id)."""
+    stmt = select(
+        Anchor.ordinal.label("_ordinal"),
+        Anchor.id.label("_id"),
+        *(getattr(Anchor, name) for name in fields),
+    ).where(Anchor.doc_version_id == version_id)
+    if section_path:
+        stmt = stmt.where(Anchor.section_path == section_path)
+    if content_type:
+        stmt = stmt.where(Anchor.content_type == content_type)
+    if after is not None:
+        stmt = stmt.where(tuple_(Anchor.ordinal, Anchor.id) > tuple_(*after))
+    stmt = stmt.order_by(Anchor.ordinal, Anchor.id)
+    if limit is not None:
+        # Лишняя строка показывает, есть ли следующая страница
+        stmt = stmt.limit(limit + 1)
+    return stmt
+
+
+async def _stream_anchors(stmt: Select, fields: list[str]):
+    """Anchors для NDJSON: серверный курсор в собственной сессии."""
+    async with async_session_factory() as session:
+        result = await session.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for row in result:
+            yield {name: row._mapping[name] for name in fields}
+
+
 @router.get(
     "/document-versions/{version_id}/anchors",
     response_model=list[AnchorOut],
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
 )
 async def list_anchors(
     version_id: UUID,
     section_path: str | None = Query(None),
     content_type: AnchorContentType | None = Query(None),
+    limit: int | None = Query(
+        None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы (keyset-пагинация по ordinal, id)"
+    ),
+    cursor: str | None = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    fields: str | None = Query(None, description="Поля AnchorOut через запятую (по умолчанию — все)"),
+    response_format: Literal["json", "ndjson"] = Query(
+        "json", alias="format", description="ndjson — потоковая выдача по одной записи в строке"
+    ),
     db: AsyncSession = Depends(get_db),
-) -> list[AnchorOut]:
-    """Список якорей версии документа."""
+) -> Response:
+    """
+    Список якорей версии документа.
+
+    JSON-ответ постраничный: limit записей (по умолчанию DEFAULT_PAGE_SIZE) и курсор
+    следующей страницы в заголовке X-Next-Cursor. Весь список без пагинации — только
+    в format=ndjson без limit/cursor. ORM-объекты не создаются: выбираются только
+    запрошенные колонки.
+    """
     # Проверяем существование version
     version = await db.get(DocumentVersion, version_id)
     if not version:
         raise NotFoundError("DocumentVersion", str(version_id))
 
-    # Получаем anchors
-    stmt = select(Anchor).where(Anchor.doc_version_id == version_id)
-    if section_path:
-        stmt = stmt.where(Anchor.section_path == section_path)
-    if content_type:
-        stmt = stmt.where(Anchor.content_type == content_type)
+    selected_fields = parse_fields(fields, AnchorOut.model_fields)
+    after = decode_cursor(cursor, int, uuid_key) if cursor else None
+    limit = page_limit(limit, cursor, response_format)
+    stmt = _anchors_stmt(version_id, section_path, content_type, selected_fields, after, limit)
 
-    result = await db.execute(stmt)
-    anchors = result.scalars().all()
-    return [AnchorOut.model_validate(a) for a in anchors]
+    if response_format == "ndjson":
+        return ndjson_response(_stream_anchors(stmt, selected_fields))
+
+    rows = (await db.execute(stmt)).all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]._ordinal, rows[-1]._id)
+    return page_response([{name: row._mapping[name] for name in selected_fields} for row in rows], next_cursor)
 
 
 @router.get(
@@ -16,12 +16,12 @@ from app.db.enums import DocumentType
 from app.db.models.topics import ClusterAssignment
 from app.db.models.studies import DocumentVersion
 from app.schemas.passport_tuning import (
-    Cluster,
     ClustersResponse,
     ClusterMappingItem,
     MappingMode,
     MappingResponse,
 )
+from app.services.passport_tuning_cache import get_clusters_cache, get_mapping_cache, mapping_item_json
 from app.services.topic_evidence_builder import TopicEvidenceBuilder
 from sqlalchemy import select
 from uuid import UUID
@@ -58,46 +58,17 @@ async def get_clusters(
     page_size: int = Query(100, ge=1, le=1000, description="Размер страницы"),
     search: str | None = Query(None, description="Поиск по top_titles_ru/en"),
 ) -> ClustersResponse:
-    """Возвращает список кластеров из clusters.json."""
+    """Возвращает список кластеров из clusters.json (файл кэшируется до изменения)."""
     clusters_file = get_clusters_file_path()
 
-    if not clusters_file.exists():
-        logger.warning(f"Файл clusters.json не найден: {clusters_file}")
-        return ClustersResponse(items=[], total=0)
-
     try:
-        with open(clusters_file, "r", encoding="utf-8") as f:
-            clusters_data = json.load(f)
-
-        # Преобразуем в список Cluster
-        all_clusters: list[Cluster] = []
-        for item in clusters_data:
-            # Преобразуем cluster_id в строку
-            cluster_id = str(item.get("cluster_id", ""))
-            cluster = Cluster(
-                cluster_id=cluster_id,
-                top_titles_ru=item.get("top_titles_ru", []),
-                top_titles_en=item.get("top_titles_en", []),
-                examples=item.get("examples", []),
-                stats=item.get("stats", {}),
-                candidate_section_1=item.get("candidate_section_1"),
-                candidate_section_2=item.get("candidate_section_2"),
-                candidate_section_3=item.get("candidate_section_3"),
-                default_section=item.get("default_section"),  # Для обратной совместимости
-            )
-            all_clusters.append(cluster)
-
-        # Фильтрация по поисковому запросу
-        if search and search.strip():
-            search_lower = search.lower().strip()
-            filtered_clusters = []
-            for cluster in all_clusters:
-                # Поиск в top_titles_ru и top_titles_en
-                titles_ru = " ".join(cluster.top_titles_ru).lower()
-                titles_en = " ".join(cluster.top_titles_en).lower()
-                if search_lower in titles_ru or search_lower in titles_en:
-                    filtered_clusters.append(cluster)
-            all_clusters = filtered_clusters
+        cluster_index = get_clusters_cache().get(clusters_file)
+        if cluster_index is None:
+            logger.warning(f"Файл clusters.json не найден: {clusters_file}")
+            return ClustersResponse(items=[], total=0)
+
+        # Фильтрация по поисковому запросу (по токенному индексу top_titles_ru/en)
+        all_clusters = cluster_index.search(search)
 
         # Пагинация
         total = len(all_clusters)
@@ -130,36 +101,14 @@ async def get_mapping() -> MappingResponse:
     """
     mapping_file = get_mapping_file_path()
 
-    if not mapping_file.exists():
-        return MappingResponse(mapping={})
-
     try:
-        with open(mapping_file, "r", encoding="utf-8") as f:
-            mapping_data = json.load(f)
+        mapping_items = get_mapping_cache().get(mapping_file)
+        if mapping_items is None:
+            return MappingResponse(mapping={})
 
-        # Валидация и преобразование с обратной совместимостью
-        validated_mapping: dict[str, dict[str, str | None]] = {}
-        for cluster_id, item_data in mapping_data.items():
-            try:
-                # Обратная совместимость: добавляем дефолты для старых записей
-                if "mapping_mode" not in item_data:
-                    item_data["mapping_mode"] = MappingMode.SINGLE.value
-                if "notes" not in item_data:
-                    item_data["notes"] = None
-
-                item = ClusterMappingItem.model_validate(item_data)
-                validated_mapping[str(cluster_id)] = {
-                    "doc_type": item.doc_type.value if item.doc_type else None,
-                    "section_key": item.section_key,
-                    "title_ru": item.title_ru if item.title_ru else None,
-                    "mapping_mode": item.mapping_mode.value,
-                    "notes": item.notes if item.notes else None,
-                }
-            except Exception as e:
-                logger.warning(f"Ошибка валидации маппинга для cluster_id={cluster_id}: {e}")
-                continue
-
-        return MappingResponse(mapping=validated_mapping)
+        return MappingResponse(
+            mapping={cluster_id: mapping_item_json(item) for cluster_id, item in mapping_items.items()}
+        )
 
     except json.JSONDecodeError as e:
         logger.error(f"Ошибка парсинга mapping файла: {e}")
@@ -243,13 +192,7 @@ async def save_mapping(
     # Подготовка данных для сохранения
     save_data: dict[str, dict[str, str | None]] = {}
     for cluster_id, item in validated_mapping.items():
-        save_data[cluster_id] = {
-            "doc_type": item.doc_type.value if item.doc_type else None,
-            "section_key": item.section_key,
-            "title_ru": item.title_ru if item.title_ru else None,
-            "mapping_mode": item.mapping_mode.value,
-            "notes": item.notes if item.notes else None,
-        }
+        save_data[cluster_id] = mapping_item_json(item)
 
     # Атомарная запись с блокировкой
     with _file_lock:
@@ -262,6 +205,8 @@ async def save_mapping(
 
             # Атомарное переименование
             tmp_file.replace(mapping_file)
+            # Кэш получает новое содержимое сразу после записи (файл не перечитывается)
+            get_mapping_cache().put(mapping_file, save_data)
 
             logger.info(f"Mapping сохранен: {mapping_file}, элементов: {len(save_data)}")
 
@@ -314,68 +259,42 @@ async def get_mapping_for_autotune(
     """
     mapping_file = get_mapping_file_path()
 
-    if not mapping_file.exists():
-        return {
-            "included": {},
-            "excluded": {
-                "ambiguous": [],
-                "skip": [],
-                "needs_split": [],
-            },
-        }
-
     try:
-        with open(mapping_file, "r", encoding="utf-8") as f:
-            mapping_data = json.load(f)
+        mapping_items = get_mapping_cache().get(mapping_file)
+        if mapping_items is None:
+            return {
+                "included": {},
+                "excluded": {
+                    "ambiguous": [],
+                    "skip": [],
+                    "needs_split": [],
+                },
+            }
 
         included: dict[str, dict[str, str | None]] = {}
         excluded_ambiguous: list[dict[str, str | None]] = []
         excluded_skip: list[dict[str, str | None]] = []
         excluded_needs_split: list[dict[str, str | None]] = []
 
-        for cluster_id, item_data in mapping_data.items():
-            # Обратная совместимость
-            if "mapping_mode" not in item_data:
-                item_data["mapping_mode"] = MappingMode.SINGLE.value
+        for cluster_id, item in mapping_items.items():
+            mapping_mode = item.mapping_mode
 
-            try:
-                item = ClusterMappingItem.model_validate(item_data)
-                mapping_mode = item.mapping_mode
-
-                cluster_entry = {
-                    "cluster_id": str(cluster_id),
-                    "doc_type": item.doc_type.value if item.doc_type else None,
-                    "section_key": item.section_key,
-                    "title_ru": item.title_ru if item.title_ru else None,
-                    "notes": item.notes if item.notes else None,
-                }
+            cluster_entry = {
+                "cluster_id": cluster_id,
+                "doc_type": item.doc_type.value if item.doc_type else None,
+                "section_key": item.section_key,
+                "title_ru": item.title_ru if item.title_ru else None,
+                "notes": item.notes if item.notes else None,
+            }
 
-                if mapping_mode == MappingMode.AMBIGUOUS:
-                    excluded_ambiguous.append(cluster_entry)
-                elif mapping_mode == MappingMode.SKIP:
-                    excluded_skip.append(cluster_entry)
-                elif mapping_mode == MappingMode.NEEDS_SPLIT:
-                    if include_needs_split:
-                        included[str(cluster_id)] = {
-                            "doc_type": item.doc_type.value if item.doc_type else None,
-                            "section_key": item.section_key,
-                            "title_ru": item.title_ru if item.title_ru else None,
-                            "mapping_mode": item.mapping_mode.value,
-                            "notes": item.notes if item.notes else None,
-                        }
-                    else:
-                        excluded_needs_split.append(cluster_entry)
-                else:  # SINGLE
-                    included[str(cluster_id)] = {
-                        "doc_type": item.doc_type.value if item.doc_type else None,
-                        "section_key": item.section_key,
-                        "title_ru": item.title_ru if item.title_ru else None,
-                        "mapping_mode": item.mapping_mode.value,
-                        "notes": item.notes if item.notes else None,
-                    }
-            except Exception as e:
-                logger.warning(f"Ошибка обработки маппинга для cluster_id={cluster_id}: {e}")
-                continue
+            if mapping_mode == MappingMode.AMBIGUOUS:
+                excluded_ambiguous.append(cluster_entry)
+            elif mapping_mode == MappingMode.SKIP:
+                excluded_skip.append(cluster_entry)
+            elif mapping_mode == MappingMode.NEEDS_SPLIT and not include_needs_split:
+                excluded_needs_split.append(cluster_entry)
+            else:  # SINGLE (и NEEDS_SPLIT при include_needs_split)
+                included[cluster_id] = mapping_item_json(item)
 
         return {
             "included": included,
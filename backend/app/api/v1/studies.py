@@ -1,13 +1,28 @@
 from __future__ import annotations
 
+from collections import defaultdict
+from collections.abc import Sequence
+from typing import Any, Literal
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Depends, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import Select, select
 from sqlalchemy.exc import IntegrityError
 
 from app.api.deps import get_db
+from app.api.pagination import (
+    MAX_PAGE_SIZE,
+    NDJSON_MEDIA_TYPE,
+    STREAM_BATCH_SIZE,
+    decode_cursor,
+    encode_cursor,
+    ndjson_response,
+    page_limit,
+    page_response,
+    parse_fields,
+    uuid_key,
+)
 from app.core.audit import log_audit
 from app.core.errors import NotFoundError, ValidationError
 from app.db.enums import EvidenceRole
@@ -15,9 +30,10 @@ from app.db.models.studies import Document, DocumentVersion, Study
 from app.db.models.facts import Fact, FactEvidence
 from app.db.models.core_facts import StudyCoreFacts
 from app.db.models.auth import Workspace
+from app.db.session import async_session_factory
 from app.schemas.studies import StudyCreate, StudyOut
 from app.schemas.documents import DocumentOut, DocumentVersionOut
-from app.schemas.facts import FactOut, FactEvidenceOut
+from app.schemas.facts import FactOut
 from app.services.core_facts_extractor import CoreFactsExtractor
 
 router = APIRouter()
@@ -157,47 +173,93 @@ async def list_studies(
     return [StudyOut.model_validate(s) for s in studies]
 
 
+def _facts_stmt(study_id: UUID, fields: list[str], after: UUID | None, limit: int | None) -> Select:
+    """Выборка только запрошенных колонок facts в порядке id."""
+    columns = [getattr(Fact, name) for name in fields if name not in ("id", "evidence")]
+    stmt = select(Fact.id, *columns).where(Fact.study_id == study_id)
+    if after is not None:
+        stmt = stmt.where(Fact.id > after)
+    stmt = stmt.order_by(Fact.id)
+    if limit is not None:
+        # Лишняя строка показывает, есть ли следующая страница
+        stmt = stmt.limit(limit + 1)
+    return stmt
+
+
+async def _load_evidence(db: AsyncSession, fact_ids: Sequence[UUID]) -> dict[UUID, list[dict[str, Any]]]:
+    """Evidence для набора фактов одним запросом."""
+    evidence: dict[UUID, list[dict[str, Any]]] = defaultdict(list)
+    if not fact_ids:
+        return evidence
+    result = await db.execute(
+        select(FactEvidence.fact_id, FactEvidence.anchor_id, FactEvidence.evidence_role)
+        .where(FactEvidence.fact_id.in_(fact_ids))
+        .order_by(FactEvidence.fact_id, FactEvidence.created_at, FactEvidence.id)
+    )
+    for fact_id, anchor_id, evidence_role in result.all():
+        # Если у evidence отсутствует роль, проставляем PRIMARY по умолчанию для совместимости.
+        evidence[fact_id].append({"anchor_id": anchor_id, "evidence_role": evidence_role or EvidenceRole.PRIMARY})
+    return evidence
+
+
+async def _fact_items(db: AsyncSession, rows: Sequence[Any], fields: list[str]) -> list[dict[str, Any]]:
+    evidence = await _load_evidence(db, [row.id for row in rows]) if "evidence" in fields else {}
+    return [
+        {name: evidence.get(row.id, []) if name == "evidence" else row._mapping[name] for name in fields}
+        for row in rows
+    ]
+
+
+async def _stream_facts(stmt: Select, fields: list[str]):
+    """Факты для NDJSON: серверный курсор в собственной сессии, evidence — запросом на пачку."""
+    async with async_session_factory() as session:
+        result = await session.stream(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        async for rows in result.partitions():
+            for item in await _fact_items(session, rows, fields):
+                yield item
+
+
 @router.get(
     "/studies/{study_id}/facts",
     response_model=list[FactOut],
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
 )
 async def list_study_facts(
     study_id: UUID,
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы (keyset-пагинация по id)"),
+    cursor: str | None = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
+    fields: str | None = Query(None, description="Поля FactOut через запятую (по умолчанию — все)"),
+    response_format: Literal["json", "ndjson"] = Query(
+        "json", alias="format", description="ndjson — потоковая выдача по одной записи в строке"
+    ),
     db: AsyncSession = Depends(get_db),
-) -> list[FactOut]:
-    """Список фактов исследования."""
+) -> Response:
+    """
+    Список фактов исследования.
+
+    JSON-ответ постраничный: limit записей (по умолчанию DEFAULT_PAGE_SIZE) и курсор
+    следующей страницы в заголовке X-Next-Cursor. Весь список без пагинации — только
+    в format=ndjson без limit/cursor. Evidence загружается одним запросом на страницу.
+    """
     # Проверяем существование study
     study = await db.get(Study, study_id)
     if not study:
         raise NotFoundError("Study", str(study_id))
 
-    # Получаем факты
-    stmt = select(Fact).where(Fact.study_id == study_id)
-    result = await db.execute(stmt)
-    facts = result.scalars().all()
+    selected_fields = parse_fields(fields, FactOut.model_fields)
+    after = decode_cursor(cursor, uuid_key)[0] if cursor else None
+    limit = page_limit(limit, cursor, response_format)
+    stmt = _facts_stmt(study_id, selected_fields, after, limit)
 
-    # Получаем evidence для каждого факта
-    facts_out = []
-    for fact in facts:
-        evidence_stmt = select(FactEvidence).where(FactEvidence.fact_id == fact.id)
-        evidence_result = await db.execute(evidence_stmt)
-        evidence_list = evidence_result.scalars().all()
+    if response_format == "ndjson":
+        return ndjson_response(_stream_facts(stmt, selected_fields))
 
-        fact_out = FactOut.model_validate(fact)
-        # Если у evidence отсутствует роль, проставляем PRIMARY по умолчанию для совместимости.
-        fact_out.evidence = []
-        for e in evidence_list:
-            # Убеждаемся, что evidence_role установлен (дефолт PRIMARY)
-            evidence_role = getattr(e, "evidence_role", None) or EvidenceRole.PRIMARY
-            # Создаём словарь с правильными ключами для Pydantic (используем alias)
-            evidence_data = {
-                "anchor_id": e.anchor_id,
-                "role": evidence_role,  # Используем имя поля из схемы (alias)
-            }
-            fact_out.evidence.append(FactEvidenceOut.model_validate(evidence_data))
-        facts_out.append(fact_out)
-
-    return facts_out
+    rows = (await db.execute(stmt)).all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return page_response(await _fact_items(db, rows, selected_fields), next_cursor)
 
 
 @router.get(
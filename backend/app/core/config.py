@@ -54,6 +54,38 @@ class Settings(BaseSettings):
     # поэтому даём провайдеру больше времени, чем "обычный" чат.
     llm_timeout_sec: int = 60
 
+    # Общий HTTP-транспорт LLM/эмбеддингов (app/services/llm_transport.py).
+    # Размер keep-alive пула соединений на процесс
+    llm_http_max_connections: int = 20
+    llm_http_max_keepalive_connections: int = 10
+    # HTTP/2 (используется, только если установлен пакет h2)
+    llm_http2: bool = True
+    # Максимум одновременных запросов к провайдерам на процесс
+    llm_max_concurrency: int = 8
+    # Общий лимит частоты запросов (token bucket) по провайдерам, запросов/сек; 0 — без лимита.
+    # Состояние bucket-ов хранится в процессе: каждый процесс получает долю
+    # llm_rate_limit_rps / llm_rate_limit_processes
+    llm_rate_limit_rps: dict[str, float] = {
+        "azure_openai": 0.0,
+        "openai_compatible": 0.0,
+        "local": 0.0,
+        "yandexgpt": 0.0,
+    }
+    # Ёмкость bucket-а (допустимый всплеск запросов), тоже делится между процессами
+    llm_rate_limit_burst: int = 5
+    # Число процессов, разделяющих лимит провайдера (процессы API + воркеры ингестии)
+    llm_rate_limit_processes: int = 1
+    # Повторы при HTTP 429 (задержка из Retry-After или экспоненциальная от backoff)
+    llm_rate_limit_max_retries: int = 5
+    llm_rate_limit_backoff_sec: float = 1.0
+    llm_rate_limit_max_backoff_sec: float = 30.0
+
+    # Нормализация значений фактов через LLM (ValueNormalizer, Double Check в FactExtractionService).
+    # Максимум одновременных LLM-запросов нормализации на один документ
+    value_normalization_concurrency: int = 4
+    # Сколько кандидатов упаковывать в один промпт (1 — отдельный запрос на каждый факт)
+    value_normalization_batch_size: int = 1
+
     # MVP: UI/HTTP редактирование section_contracts запрещено по умолчанию.
     # Паспорта должны загружаться сидером из репозитория.
     enable_contract_editing: bool = False
@@ -71,6 +103,70 @@ class Settings(BaseSettings):
     # Если False, маппинг выполняется напрямую по блокам без кластеризации
     topic_mapping_use_clustering: bool = True
 
+    # Массовая запись anchors/chunks/fact_evidence через COPY FROM STDIN (FORMAT BINARY).
+    # Если False, используется executemany через SQLAlchemy Core.
+    bulk_copy_enabled: bool = True
+
+    # Кэш эмбеддингов провайдера (in-process LRU + таблица embedding_cache).
+    # Ключ: (provider, model, dims, sha256(text)).
+    embedding_cache_enabled: bool = True
+    # Размер in-process LRU (количество векторов)
+    embedding_cache_lru_size: int = 4096
+
+    # Векторный поиск chunks (RetrievalService, pgvector HNSW).
+    # hnsw.ef_search: длина списка кандидатов при обходе графа (точность/скорость)
+    retrieval_hnsw_ef_search: int = 100
+    # При фильтрах (zone/language/документы) ef_search >= limit * factor:
+    # фильтры применяются к кандидатам индекса, часть из них отбрасывается
+    retrieval_filtered_ef_factor: int = 20
+    # Если фильтры по документам сужают поиск до стольких chunks или меньше — точный поиск
+    retrieval_exact_search_max_chunks: int = 10000
+    # Во сколько раз больше k кандидатов выбирать для re-ranking (crosswalk / prefer_language)
+    retrieval_candidate_multiplier: int = 4
+    # Вес crosswalk-приора зоны при re-ranking (0 — только косинусное сходство)
+    retrieval_crosswalk_prior_weight: float = 0.2
+    # Штраф к score для chunks не на prefer_language
+    retrieval_prefer_language_penalty: float = 0.05
+
+    # Фоновая очередь ингестии (таблица ingestion_jobs, воркер: python -m app.worker).
+    # Если False, POST .../ingest выполняет ингестию прямо в HTTP-запросе (dev/тесты).
+    ingestion_queue_enabled: bool = False
+    # Количество параллельных задач в одном процессе воркера
+    ingestion_worker_concurrency: int = 2
+    # Максимум попыток на задачу (включая первую)
+    ingestion_job_max_attempts: int = 3
+    # Пауза между опросами очереди, когда задач нет
+    ingestion_job_poll_interval_sec: float = 2.0
+    # Базовая задержка перед повтором (растёт экспоненциально с номером попытки)
+    ingestion_job_retry_backoff_sec: int = 30
+    # Задача в статусе running без продления блокировки дольше этого времени считается брошенной:
+    # возвращается в очередь, а после последней попытки помечается failed
+    ingestion_job_lock_timeout_sec: int = 3600
+    # Как часто выполняющаяся задача продлевает блокировку (locked_at)
+    ingestion_job_heartbeat_interval_sec: int = 60
+    # Размер пула процессов для CPU-bound этапов ингестии (парсинг DOCX, заголовки,
+    # source_zone, SoA; app/services/ingestion/cpu_pool.py). 0 — выполнять в потоке
+    ingestion_cpu_workers: int = 2
+    # Инкрементальная переингестия: новый набор anchors сравнивается с сохранённым
+    # (anchor_id + отпечаток содержимого), записываются только изменения, сдвинутые якоря
+    # обновляются на месте; chunks пересобираются только для затронутых секций. Факты и
+    # маппинг топиков при изменениях пересчитываются по всему документу, без изменений
+    # пропускаются (не при force и только если последний IngestionRun версии завершился
+    # со статусом ok; новая версия-поправка не имеет anchors и ингестируется полностью)
+    ingestion_incremental_enabled: bool = True
+    # Метрики ингестии из БД (chunks, факты, section_maps, топики) и QualityGate считаются
+    # в фоне после commit вызывающего кода, а не на критическом пути ингестии. IngestionRun
+    # дополняется позже (summary_json.metrics_pending до этого); в той же транзакции
+    # результат QualityGate переносится в версию документа (ready -> needs_review)
+    ingestion_metrics_deferred: bool = False
+    # Профилирование ингестии (app/services/ingestion/profiling.py): wall/CPU/БД-время,
+    # число запросов, вызовы LLM и эмбеддингов и пиковый RSS по стадиям в
+    # IngestionRun.profile_json. Включает небольшие накладные расходы на каждый SQL-запрос
+    ingestion_profiling_enabled: bool = False
+    # Каталог для <ingestion_run_id>.collapsed.txt и <ingestion_run_id>.speedscope.json
+    # (flame graph по стадиям); пусто — профиль только в БД
+    ingestion_profile_export_dir: str = ""
+
     @property
     def sync_database_url(self) -> str:
         return (
@@ -0,0 +1,246 @@
+"""
+Массовая запись строк через COPY ... FROM STDIN (FORMAT BINARY).
+
+Используется ингестией (anchors, cell anchors, fact_evidence) и ChunkingService
+(chunks с vector(1536)) вместо ORM add_all + flush, который отправляет отдельный
+INSERT на каждую строку. COPY передаёт все строки одним потоком, поэтому время
+записи растёт с объёмом данных, а не с числом round-trip'ов.
+
+Если драйвер не psycopg 3 (или COPY отключён настройкой), используется
+executemany через SQLAlchemy Core с теми же значениями.
+"""
+
+from __future__ import annotations
+
+import time
+import uuid
+from collections.abc import Iterable, Sequence
+from enum import Enum
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.db.enums import EvidenceRole, SourceZone
+from app.db.models.anchors import Anchor, Chunk
+from app.db.models.facts import FactEvidence
+
+# (колонка, тип PostgreSQL для бинарного COPY).
+# ENUM-колонки передаются как text: бинарное представление enum совпадает с текстом метки.
+ANCHOR_COPY_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("id", "uuid"),
+    ("doc_version_id", "uuid"),
+    ("anchor_id", "text"),
+    ("section_path", "text"),
+    ("content_type", "text"),
+    ("ordinal", "int4"),
+    ("text_raw", "text"),
+    ("text_norm", "text"),
+    ("text_hash", "text"),
+    ("location_json", "jsonb"),
+    ("source_zone", "text"),
+    ("language", "text"),
+)
+
+CHUNK_COPY_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("id", "uuid"),
+    ("doc_version_id", "uuid"),
+    ("chunk_id", "text"),
+    ("section_path", "text"),
+    ("text", "text"),
+    ("anchor_ids", "text[]"),
+    ("embedding", "vector"),
+    ("source_zone", "text"),
+    ("language", "text"),
+    ("metadata_json", "jsonb"),
+)
+
+FACT_EVIDENCE_COPY_COLUMNS: tuple[tuple[str, str], ...] = (
+    ("id", "uuid"),
+    ("fact_id", "uuid"),
+    ("anchor_id", "text"),
+    ("evidence_role", "text"),
+)
+
+EMBEDDING_DIMS = 1536
+
+
+def _enum_value(value: Any) -> Any:
+    """Значение enum как строка (для ENUM-колонок)."""
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def _anchor_row(anchor: Any) -> tuple[Any, ...]:
+    """Строка COPY для AnchorCreate / CellAnchorCreate / Anchor."""
+    return (
+        getattr(anchor, "id", None) or uuid.uuid4(),
+        anchor.doc_version_id,
+        anchor.anchor_id,
+        anchor.section_path,
+        _enum_value(anchor.content_type),
+        anchor.ordinal,
+        anchor.text_raw,
+        anchor.text_norm,
+        anchor.text_hash,
+        anchor.location_json,
+        _enum_value(getattr(anchor, "source_zone", None) or SourceZone.UNKNOWN),
+        _enum_value(anchor.language),
+    )
+
+
+def _chunk_row(chunk: Any) -> tuple[Any, ...]:
+    """Строка COPY для Chunk (embedding валидируется как в Vector1536)."""
+    embedding = chunk.embedding
+    if embedding is None or len(embedding) != EMBEDDING_DIMS:
+        size = None if embedding is None else len(embedding)
+        raise ValueError(f"Vector1536 ожидает длину {EMBEDDING_DIMS}, получено: {size}")
+    return (
+        getattr(chunk, "id", None) or uuid.uuid4(),
+        chunk.doc_version_id,
+        chunk.chunk_id,
+        chunk.section_path,
+        chunk.text,
+        list(chunk.anchor_ids),
+        embedding,
+        _enum_value(chunk.source_zone or SourceZone.UNKNOWN),
+        _enum_value(chunk.language),
+        chunk.metadata_json,
+    )
+
+
+async def _get_psycopg_connection(db: AsyncSession) -> Any | None:
+    """Возвращает psycopg AsyncConnection текущей транзакции сессии (или None)."""
+    if not settings.bulk_copy_enabled:
+        return None
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    driver_conn = raw.driver_connection
+    if driver_conn is None or not hasattr(driver_conn, "cursor") or conn.dialect.driver != "psycopg":
+        return None
+    return driver_conn
+
+
+async def _ensure_vector_type(driver_conn: Any) -> None:
+    """Регистрирует тип vector на соединении (нужен для бинарного дампа embedding)."""
+    if driver_conn.adapters.types.get("vector") is not None:
+        return
+    from pgvector.psycopg import register_vector_async
+
+    await register_vector_async(driver_conn)
+
+
+async def ensure_vector_adapter(db: AsyncSession) -> None:
+    """
+    Регистрирует тип vector на psycopg-соединении текущей транзакции сессии,
+    чтобы float32-массивы можно было передавать параметрами запросов (<=> и т.п.).
+    """
+    conn = await db.connection()
+    if conn.dialect.driver != "psycopg":
+        return
+    raw = await conn.get_raw_connection()
+    driver_conn = raw.driver_connection
+    if driver_conn is not None and hasattr(driver_conn, "adapters"):
+        await _ensure_vector_type(driver_conn)
+
+
+async def copy_rows(
+    db: AsyncSession,
+    table: str,
+    columns: Sequence[tuple[str, str]],
+    rows: Iterable[Sequence[Any]],
+) -> int:
+    """
+    Записывает строки в таблицу через COPY FROM STDIN (FORMAT BINARY).
+
+    Pending-объекты сессии предварительно flush-атся, чтобы COPY видел их
+    (FK/порядок операций сохраняется). Строки пишутся в той же транзакции.
+
+    Args:
+        db: Сессия БД
+        table: Имя таблицы
+        columns: Пары (колонка, тип PostgreSQL)
+        rows: Значения в порядке columns
+
+    Returns:
+        Количество записанных строк
+    """
+    driver_conn = await _get_psycopg_connection(db)
+    if driver_conn is None:
+        raise RuntimeError("COPY недоступен: требуется драйвер psycopg 3")
+    return await _copy_rows(db, driver_conn, table, columns, rows)
+
+
+async def _copy_rows(
+    db: AsyncSession,
+    driver_conn: Any,
+    table: str,
+    columns: Sequence[tuple[str, str]],
+    rows: Iterable[Sequence[Any]],
+) -> int:
+    await db.flush()
+    if any(pg_type == "vector" for _, pg_type in columns):
+        await _ensure_vector_type(driver_conn)
+
+    # COPY идёт мимо событий курсора SQLAlchemy: время передаётся профайлеру ингестии явно
+    from app.services.ingestion.profiling import record_db_time
+
+    column_list = ", ".join(name for name, _ in columns)
+    count = 0
+    started = time.perf_counter()
+    try:
+        async with driver_conn.cursor() as cur:
+            async with cur.copy(f"COPY {table} ({column_list}) FROM STDIN (FORMAT BINARY)") as copy:
+                copy.set_types([pg_type for _, pg_type in columns])
+                for row in rows:
+                    await copy.write_row(row)
+                    count += 1
+    finally:
+        record_db_time((time.perf_counter() - started) * 1000)
+    logger.debug(f"COPY {table}: записано {count} строк")
+    return count
+
+
+async def _bulk_write(
+    db: AsyncSession,
+    model: type,
+    columns: Sequence[tuple[str, str]],
+    rows: list[tuple[Any, ...]],
+) -> int:
+    """COPY, если доступен; иначе executemany через SQLAlchemy Core."""
+    if not rows:
+        return 0
+    driver_conn = await _get_psycopg_connection(db)
+    if driver_conn is not None:
+        return await _copy_rows(db, driver_conn, model.__tablename__, columns, rows)
+
+    names = [name for name, _ in columns]
+    await db.execute(insert(model), [dict(zip(names, row)) for row in rows])
+    return len(rows)
+
+
+async def bulk_insert_anchors(db: AsyncSession, anchors: Iterable[Any]) -> int:
+    """Массовая вставка anchors (AnchorCreate / CellAnchorCreate)."""
+    rows = [_anchor_row(a) for a in anchors]
+    return await _bulk_write(db, Anchor, ANCHOR_COPY_COLUMNS, rows)
+
+
+async def bulk_insert_chunks(db: AsyncSession, chunks: Iterable[Any]) -> int:
+    """Массовая вставка chunks (объекты с полями Chunk, включая embedding)."""
+    rows = [_chunk_row(c) for c in chunks]
+    return await _bulk_write(db, Chunk, CHUNK_COPY_COLUMNS, rows)
+
+
+async def bulk_insert_fact_evidence(
+    db: AsyncSession,
+    fact_id: UUID,
+    anchor_ids: Iterable[str],
+    evidence_role: EvidenceRole = EvidenceRole.PRIMARY,
+) -> int:
+    """Массовая вставка fact_evidence для одного факта."""
+    rows = [(uuid.uuid4(), fact_id, aid, evidence_role.value) for aid in anchor_ids]
+    return await _bulk_write(db, FactEvidence, FACT_EVIDENCE_COPY_COLUMNS, rows)
@@ -9,10 +9,13 @@ from __future__ import annotations
 - anchors: anchors / chunks
 - sections: target_section_contracts / target_section_maps
 - facts: facts / fact_evidence
-- generation: templates / model_configs / generation_runs / generated_target_sections
+- generation: templates / model_configs / generation_runs / generated_target_sections /
+  generated_section_anchor_refs / generated_section_fact_refs
 - conflicts: conflicts / conflict_items
 - change: change_events / impact_items / tasks
 - audit: audit_log
+- embedding_cache: embedding_cache (кэш эмбеддингов провайдеров)
+- ingestion_jobs: ingestion_jobs (очередь фоновой ингестии)
 - zones: zone_sets / zone_crosswalk
 """
 
@@ -24,13 +27,17 @@ from .anchors import Anchor, Chunk  # noqa: F401
 from .anchor_matches import AnchorMatch  # noqa: F401
 from .conflicts import Conflict, ConflictItem  # noqa: F401
 from .core_facts import StudyCoreFacts  # noqa: F401
+from .embedding_cache import EmbeddingCacheEntry  # noqa: F401
 from .facts import Fact, FactEvidence  # noqa: F401
 from .generation import (  # noqa: F401
+    GeneratedSectionAnchorRef,
+    GeneratedSectionFactRef,
     GeneratedTargetSection,
     GenerationRun,
     ModelConfig,
     Template,
 )
+from .ingestion_jobs import IngestionJob  # noqa: F401
 from .ingestion_runs import IngestionRun  # noqa: F401
 from .sections import TargetSectionContract, TargetSectionMap  # noqa: F401
 from .studies import Document, DocumentVersion, Study  # noqa: F401
@@ -38,6 +45,7 @@ from .topics import (  # noqa: F401
     ClusterAssignment,
     HeadingCluster,
     Topic,
+    TopicCatalogVersion,
     TopicEvidence,
     TopicMappingRun,
 )
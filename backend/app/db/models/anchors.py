@@ -4,6 +4,7 @@ import uuid
 from datetime import datetime
 from typing import Any
 
+import numpy as np
 from sqlalchemy import DateTime, ForeignKey, String, Text, TypeDecorator
 from sqlalchemy.dialects.postgresql import ARRAY, ENUM as PG_ENUM, JSONB, UUID as PG_UUID
 from sqlalchemy.orm import Mapped, mapped_column
@@ -21,6 +22,9 @@ class Vector1536(UserDefinedType):
     В миграции создаётся расширение `vector` и используется тот же col spec.
     """
 
+    # Тип без состояния: скомпилированные запросы с vector-параметрами кэшируются
+    cache_ok = True
+
     def get_col_spec(self, **kw: Any) -> str:  # type: ignore[override]
         return "vector(1536)"
 
@@ -36,6 +40,11 @@ class Vector1536(UserDefinedType):
         def process(value):
             if value is None:
                 return None
+            if isinstance(value, np.ndarray):
+                # float32-массивы (hash_embeddings_v1_batch) передаются в pgvector без копирования в list
+                if value.shape != (1536,):
+                    raise ValueError(f"Vector1536 ожидает длину 1536, получено: {value.shape}")
+                return value
             if not isinstance(value, (list, tuple)):
                 raise TypeError(f"Vector1536 ожидает list[float], получено: {type(value)!r}")
             if len(value) != 1536:
@@ -0,0 +1,33 @@
+"""Content-addressed кэш эмбеддингов внешних провайдеров."""
+
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import DateTime, Float, Integer, String, Text
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+
+class EmbeddingCacheEntry(Base):
+    """
+    Эмбеддинг текста, полученный от провайдера.
+
+    Ключ — (provider, model, dims, text_hash), где text_hash = sha256 текста.
+    Размерность зависит от модели (256 / 1536 / 3072), поэтому вектор хранится
+    как float8[], а не как vector(N).
+    """
+
+    __tablename__ = "embedding_cache"
+
+    provider: Mapped[str] = mapped_column(Text, primary_key=True)
+    model: Mapped[str] = mapped_column(Text, primary_key=True)
+    dims: Mapped[int] = mapped_column(Integer, primary_key=True)
+    text_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    embedding: Mapped[list[float]] = mapped_column(ARRAY(Float), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
@@ -4,7 +4,7 @@ import uuid
 from datetime import datetime
 from typing import Any
 
-from sqlalchemy import DateTime, Enum, ForeignKey, Integer, String, Text
+from sqlalchemy import DateTime, Enum, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.dialects.postgresql import JSONB, UUID as PG_UUID
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
@@ -154,3 +154,38 @@ class GeneratedTargetSection(Base):
     )
 
 
+class GeneratedSectionAnchorRef(Base):
+    """
+    Обратный индекс anchor_id → сгенерированная секция, ссылающаяся на якорь.
+
+    Строится из artifacts_json (citations, claim_items[].anchor_ids, citation_items[].anchor_id)
+    при сохранении секции; по нему ImpactService находит затронутые секции одним join.
+    """
+
+    __tablename__ = "generated_section_anchor_refs"
+    __table_args__ = (
+        Index("ix_generated_section_anchor_refs_section", "generated_section_id"),
+    )
+
+    anchor_id: Mapped[str] = mapped_column(Text, primary_key=True)
+    generated_section_id: Mapped[uuid.UUID] = mapped_column(
+        PG_UUID(as_uuid=True),
+        ForeignKey("generated_target_sections.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+
+
+class GeneratedSectionFactRef(Base):
+    """Обратный индекс fact_key → сгенерированная секция (claim_items[].fact_refs)."""
+
+    __tablename__ = "generated_section_fact_refs"
+    __table_args__ = (
+        Index("ix_generated_section_fact_refs_section", "generated_section_id"),
+    )
+
+    fact_key: Mapped[str] = mapped_column(Text, primary_key=True)
+    generated_section_id: Mapped[uuid.UUID] = mapped_column(
+        PG_UUID(as_uuid=True),
+        ForeignKey("generated_target_sections.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
@@ -0,0 +1,84 @@
+"""Модель очереди фоновых задач ингестии (Postgres + SKIP LOCKED)."""
+
+from __future__ import annotations
+
+import uuid
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, String, Text, TypeDecorator, text
+from sqlalchemy.dialects.postgresql import JSONB, UUID as PG_UUID
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+INGESTION_JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+
+class IngestionJobStatusType(TypeDecorator):
+    """TypeDecorator для валидации статуса задачи ингестии."""
+
+    impl = String
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        """Конвертируем значение при сохранении."""
+        if value is None:
+            return None
+        if value not in INGESTION_JOB_STATUSES:
+            raise ValueError(f"Invalid ingestion job status: {value}")
+        return str(value)
+
+    def process_result_value(self, value, dialect):
+        """Конвертируем значение при чтении."""
+        return value
+
+
+class IngestionJob(Base):
+    """
+    Задача ингестии в очереди.
+
+    Воркеры забирают задачи через SELECT ... FOR UPDATE SKIP LOCKED, поэтому
+    несколько процессов могут безопасно обрабатывать одну очередь.
+    """
+
+    __tablename__ = "ingestion_jobs"
+    __table_args__ = (
+        Index("ix_ingestion_jobs_status_run_after", "status", "run_after"),
+        Index("ix_ingestion_jobs_doc_version_id", "doc_version_id"),
+        # Не более одной активной задачи на версию документа
+        Index(
+            "uq_ingestion_jobs_active_doc_version",
+            "doc_version_id",
+            unique=True,
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        PG_UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    doc_version_id: Mapped[uuid.UUID] = mapped_column(
+        PG_UUID(as_uuid=True),
+        ForeignKey("document_versions.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    status: Mapped[str] = mapped_column(
+        IngestionJobStatusType(), nullable=False, default="queued"
+    )
+    force: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=3)
+    run_after: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    locked_by: Mapped[str | None] = mapped_column(Text, nullable=True)
+    locked_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    result_json: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
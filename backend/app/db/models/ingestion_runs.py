@@ -75,6 +75,8 @@ class IngestionRun(Base):
     errors_json: Mapped[list[str]] = mapped_column(
         JSONB, nullable=False, server_default="'[]'::jsonb"
     )
+    # Профиль по стадиям (только при включённом профилировании ингестии)
+    profile_json: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True)
 
     # Relationships
     doc_version: Mapped["DocumentVersion"] = relationship(
@@ -4,7 +4,20 @@ import uuid
 from datetime import datetime
 from typing import Any
 
-from sqlalchemy import ARRAY, Boolean, DateTime, Float, ForeignKey, Integer, String, Text, TypeDecorator
+from sqlalchemy import (
+    ARRAY,
+    DDL,
+    BigInteger,
+    Boolean,
+    DateTime,
+    Float,
+    ForeignKey,
+    Integer,
+    String,
+    Text,
+    TypeDecorator,
+    event,
+)
 from sqlalchemy.dialects.postgresql import ENUM as PG_ENUM, JSONB, UUID as PG_UUID
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql import func
@@ -209,3 +222,46 @@ class TopicEvidence(Base):
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
 
+
+class TopicCatalogVersion(Base):
+    """
+    Счётчик изменений справочников топиков (scope = имя таблицы: topics / topic_zone_priors).
+
+    Увеличивается statement-level триггерами; по нему TopicRegistry понимает,
+    что скомпилированные профили топиков и zone priors устарели.
+    """
+
+    __tablename__ = "topic_catalog_versions"
+
+    scope: Mapped[str] = mapped_column(Text, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+
+
+# Триггеры счётчика изменений (те же, что в миграции 0027) — чтобы они создавались и при create_all
+BUMP_TOPIC_CATALOG_VERSION_FUNCTION = """
+CREATE OR REPLACE FUNCTION bump_topic_catalog_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO topic_catalog_versions (scope, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, now())
+    ON CONFLICT (scope) DO UPDATE
+        SET version = topic_catalog_versions.version + 1, updated_at = now();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def topic_catalog_version_trigger(table_name: str) -> str:
+    return (
+        f"CREATE TRIGGER trg_{table_name}_catalog_version "
+        f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table_name} "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_topic_catalog_version()"
+    )
+
+
+for _table in (Topic.__table__, TopicZonePrior.__table__):
+    event.listen(_table, "after_create", DDL(BUMP_TOPIC_CATALOG_VERSION_FUNCTION))
+    event.listen(_table, "after_create", DDL(topic_catalog_version_trigger(_table.name)))
@@ -1,15 +1,29 @@
 from __future__ import annotations
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1 import router as api_router
 from app.core.config import settings
 from app.core.errors import configure_error_handlers
+from app.services.ingestion.cpu_pool import shutdown_cpu_executor
+from app.services.llm_transport import close_llm_transport
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    yield
+    # Закрываем общий пул соединений к LLM-провайдерам
+    await close_llm_transport()
+    # Останавливаем пул процессов CPU-bound этапов ингестии
+    shutdown_cpu_executor()
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="ClinNexus MVP", version="0.1.0")
+    app = FastAPI(title="ClinNexus MVP", version="0.1.0", lifespan=lifespan)
 
     # CORS для dev
     if settings.app_env == "dev":
@@ -33,6 +33,11 @@ class ChunkOut(BaseModel):
     text: str
     anchor_ids: list[str]
     metadata: dict[str, Any] | None
+    doc_version_id: UUID | None = None
+    source_zone: str | None = None
+    language: str | None = None
+    # Релевантность в RetrievalService (косинусное сходство, с учётом приоров при re-ranking)
+    score: float | None = None
 
     class Config:
         from_attributes = True
@@ -69,6 +69,27 @@ class UploadResult(BaseModel):
     status: str  # ingestion_status
 
 
+class IngestionJobOut(BaseModel):
+    """Статус фоновой задачи ингестии."""
+
+    id: UUID
+    doc_version_id: UUID
+    status: str  # queued|running|succeeded|failed
+    force: bool
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    locked_by: str | None
+    started_at: datetime | None
+    finished_at: datetime | None
+    last_error: str | None
+    result_json: dict[str, Any] | None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
 class ChangedAnchor(BaseModel):
     """Измененный якорь."""
     
@@ -9,9 +9,11 @@ import hashlib
 import json
 import platform
 import sys
+import time
 from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
+from collections.abc import Awaitable, Callable, Sequence
 from typing import Any
 from uuid import UUID, uuid4
 
@@ -42,6 +44,10 @@ from app.services.ingestion import IngestionService
 # Разрешенные расширения файлов
 ALLOWED_EXTENSIONS = {".pdf", ".docx", ".xlsx"}
 
+# Построчный отчёт кампании (прогресс для --resume). Имя отличается от benchmark_summary.csv
+# scripts/batch_upload_ingest.py: у того другой набор колонок
+BENCHMARK_FILENAME = "campaign_benchmark.csv"
+
 
 def find_document_files(path: Path) -> list[Path]:
     """
@@ -292,6 +298,120 @@ async def upload_file_to_campaign(
     return version
 
 
+async def get_processed_sha256_set(db: AsyncSession, workspace_id: UUID | None = None) -> set[str]:
+    """
+    Получает множество SHA256 файлов с завершённой ингестией (ready или needs_review).
+
+    Аналог get_processed_sha256_set из scripts/batch_upload_ingest.py, но одним запросом к БД.
+    Файлы со статусом failed или processing будут обработаны заново.
+
+    Returns:
+        set с SHA256 хешами (в нижнем регистре для сравнения)
+    """
+    query = select(DocumentVersion.source_sha256).where(
+        DocumentVersion.source_sha256.isnot(None),
+        DocumentVersion.ingestion_status.in_([IngestionStatus.READY, IngestionStatus.NEEDS_REVIEW]),
+    )
+    if workspace_id:
+        query = query.join(Document).where(Document.workspace_id == workspace_id)
+    result = await db.execute(query.distinct())
+    return {sha256.lower() for sha256 in result.scalars().all()}
+
+
+def calculate_file_sha256(file_path: Path) -> str:
+    """Вычисляет SHA256 хеш файла."""
+    sha256_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for byte_block in iter(lambda: f.read(65536), b""):
+            sha256_hash.update(byte_block)
+    return sha256_hash.hexdigest()
+
+
+class BenchmarkSummaryWriter:
+    """
+    Построчная запись campaign_benchmark.csv (время обработки каждого документа).
+
+    Строка пишется и сбрасывается на диск сразу после документа, поэтому прерванная
+    кампания сохраняет прогресс, а --resume пропускает уже успешно обработанные версии.
+    """
+
+    FIELDNAMES = [
+        "doc_version_id",
+        "file_name",
+        "doc_type",
+        "status",
+        "needs_review",
+        "anchors_count",
+        "soa_found",
+        "topics_rate",
+        "facts_total",
+        "facts_conflicts",
+        "ingestion_duration_ms",
+        "processing_time_sec",
+        "worker",
+    ]
+
+    def __init__(self, path: Path, resume: bool = False) -> None:
+        self.path = path
+        append = resume and path.exists()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a" if append else "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=self.FIELDNAMES, extrasaction="ignore")
+        if not append:
+            self._writer.writeheader()
+            self._file.flush()
+
+    @staticmethod
+    def completed_ids(path: Path) -> set[str]:
+        """doc_version_id, уже успешно обработанные в предыдущих запусках кампании."""
+        if not path.exists():
+            return set()
+        with open(path, encoding="utf-8", newline="") as f:
+            return {row["doc_version_id"] for row in csv.DictReader(f) if row.get("status") == "ok"}
+
+    def write(self, row: dict[str, Any]) -> None:
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def group_by_study(doc_versions: Sequence[tuple[Any, ...]]) -> list[list[tuple[Any, ...]]]:
+    """
+    Разбивает версии на очереди по исследованиям (study_id — последний элемент кортежа).
+
+    Порядок исследований и порядок версий внутри исследования сохраняются.
+    """
+    queues: dict[Any, list[tuple[Any, ...]]] = {}
+    for item in doc_versions:
+        queues.setdefault(item[-1], []).append(item)
+    return list(queues.values())
+
+
+async def run_study_queues(
+    study_queues: Sequence[Sequence[Any]],
+    concurrency: int,
+    handle: Callable[[int, Any], Awaitable[None]],
+) -> None:
+    """
+    Обрабатывает очереди исследований пулом из concurrency воркеров.
+
+    Воркер забирает очередь исследования целиком и вызывает handle(worker_idx, item)
+    для его версий по порядку: выравнивание якорей и diff используют предыдущую версию
+    исследования, поэтому она должна быть обработана раньше. Параллельно обрабатываются
+    только разные исследования.
+    """
+    pending = iter(study_queues)
+
+    async def worker(worker_idx: int) -> None:
+        for queue in pending:
+            for item in queue:
+                await handle(worker_idx, item)
+
+    await asyncio.gather(*(worker(idx) for idx in range(max(1, min(concurrency, len(study_queues))))))
+
+
 async def run_campaign(
     db: AsyncSession,
     workspace_id: UUID | None = None,
@@ -301,9 +421,16 @@ async def run_campaign(
     dry_run: bool = False,
     concurrency: int = 1,
     output_dir: Path | None = None,
+    resume: bool = False,
 ) -> None:
     """
     Запускает кампанию ингестии для множества документов.
+
+    Версии разбиваются на очереди по исследованиям и обрабатываются пулом из concurrency
+    воркеров (run_study_queues): версии одного исследования — по порядку одним воркером,
+    параллельно — только разные исследования. Каждый документ обрабатывается в своей сессии БД.
+    Время обработки каждого документа пишется в campaign_benchmark.csv (в output_dir, без него —
+    в текущей директории) по мере завершения.
     
     Args:
         db: Сессия базы данных
@@ -312,13 +439,19 @@ async def run_campaign(
         limit: Максимальное количество документов для обработки
         since: Дата начала фильтрации (YYYY-MM-DD)
         dry_run: Режим проверки без реальной ингестии
-        concurrency: Количество параллельных задач (по умолчанию 1)
+        concurrency: Количество параллельных воркеров (по умолчанию 1)
         output_dir: Директория для сохранения отчетов
+        resume: Пропускать версии, уже успешно обработанные по campaign_benchmark.csv
     """
     logger.info("Начало кампании ингестии")
     
-    # Формируем запрос для поиска doc_versions
-    query = select(DocumentVersion).join(Document)
+    # Формируем запрос для поиска doc_versions (doc_type — тем же запросом)
+    # Порядок версий внутри исследования — по времени создания (очереди по исследованиям)
+    query = (
+        select(DocumentVersion.id, Document.doc_type, DocumentVersion.ingestion_summary_json, Document.study_id)
+        .join(Document)
+        .order_by(Document.study_id, DocumentVersion.created_at, DocumentVersion.id)
+    )
     
     # Фильтры
     if workspace_id:
@@ -344,15 +477,26 @@ async def run_campaign(
     
     # Выполняем запрос
     result = await db.execute(query)
-    doc_versions = result.scalars().all()
+    doc_versions = [
+        (dv_id, dv_doc_type.value, (summary or {}).get("filename", ""), study_id)
+        for dv_id, dv_doc_type, summary, study_id in result.all()
+    ]
     
     logger.info(f"Найдено {len(doc_versions)} документов для обработки")
+
+    benchmark_path = (output_dir or Path.cwd()) / BENCHMARK_FILENAME
+    if resume:
+        completed = BenchmarkSummaryWriter.completed_ids(benchmark_path)
+        if completed:
+            doc_versions = [dv for dv in doc_versions if str(dv[0]) not in completed]
+            logger.info(
+                f"--resume: пропущено {len(completed)} уже обработанных версий, осталось {len(doc_versions)}"
+            )
     
     if dry_run:
         logger.info("DRY RUN: документы не будут обработаны")
-        for dv in doc_versions[:10]:  # Показываем первые 10
-            doc = await db.get(Document, dv.document_id)
-            logger.info(f"  - {dv.id} ({doc.doc_type.value if doc else 'unknown'})")
+        for dv_id, dv_doc_type, _, _ in doc_versions[:10]:  # Показываем первые 10
+            logger.info(f"  - {dv_id} ({dv_doc_type})")
         return
     
     # Результаты кампании
@@ -371,24 +515,21 @@ async def run_campaign(
     error_counts: defaultdict[str, int] = defaultdict(int)
     section_failures: defaultdict[str, int] = defaultdict(int)
     
-    # Обрабатываем документы
-    ingestion_service = IngestionService(db)
-    
-    async def process_doc_version(dv: DocumentVersion) -> dict[str, Any]:
-        """Обрабатывает один документ."""
-        nonlocal soa_found_count, unknown_rates, mapping_coverages, topics_rates, warning_counts, error_counts, section_failures
+    async def process_doc_version(
+        db: AsyncSession,
+        ingestion_service: IngestionService,
+        dv_uuid: UUID,
+        doc_type_str: str,
+    ) -> dict[str, Any]:
+        """Обрабатывает один документ в сессии воркера."""
+        nonlocal soa_found_count
         
-        # Сохраняем id до возможной ошибки, чтобы использовать в except блоке
-        dv_id = str(dv.id)
-        
-        doc = await db.get(Document, dv.document_id)
-        doc_type_str = doc.doc_type.value if doc else "unknown"
+        dv_id = str(dv_uuid)
         
         try:
             logger.info(f"Обработка doc_version {dv_id} ({doc_type_str})")
-            # Используем UUID из строки, чтобы избежать проблем с сессией после rollback
-            dv_uuid = UUID(dv_id)
-            result = await ingestion_service.ingest(dv_uuid, force=True)
+            # Метрики читаются сразу после commit — собираем их синхронно
+            result = await ingestion_service.ingest(dv_uuid, force=True, defer_metrics=False)
             await db.commit()
             
             # Получаем последний ingestion_run
@@ -465,6 +606,7 @@ async def run_campaign(
                 "doc_version_id": dv_id,
                 "status": "ok",
                 "needs_review": needs_review,
+                "anchors_count": result.anchors_created,
                 "unknown_rate": unknown_rate,
                 "soa_found": soa_found,
                 "mapping_coverage": mapping_coverage,
@@ -481,6 +623,7 @@ async def run_campaign(
                 "doc_version_id": dv_id,
                 "status": "failed",
                 "needs_review": False,
+                "anchors_count": 0,
                 "unknown_rate": None,
                 "soa_found": False,
                 "mapping_coverage": None,
@@ -492,22 +635,59 @@ async def run_campaign(
                 "error": str(e)[:200],
             }
     
-    # Обрабатываем документы (последовательно для безопасности)
-    for i, dv in enumerate(doc_versions, 1):
-        logger.info(f"Обработка {i}/{total_docs}")
-        result = await process_doc_version(dv)
+    # Очереди по исследованиям обрабатываются пулом воркеров; каждый документ — в своей
+    # сессии (AsyncSession не допускает конкурентного использования)
+    session_factory = async_sessionmaker(db.bind, expire_on_commit=False)
+    study_queues = group_by_study(doc_versions)
+    started_count = 0
+    benchmark = BenchmarkSummaryWriter(benchmark_path, resume=resume)
+    campaign_started_at = datetime.now()
+    wall_start = time.perf_counter()
+
+    async def handle(worker_idx: int, item: tuple[Any, ...]) -> None:
+        nonlocal ok_count, failed_count, needs_review_count, started_count
+        dv_uuid, doc_type_str, file_name, _ = item
+        started_count += 1
+        logger.info(f"[worker {worker_idx}] Обработка {started_count}/{total_docs}")
+        started = time.perf_counter()
+        async with session_factory() as doc_db:
+            result = await process_doc_version(doc_db, IngestionService(doc_db), dv_uuid, doc_type_str)
+        processing_time_sec = round(time.perf_counter() - started, 2)
         campaign_results.append(result)
-        
+        benchmark.write({
+            **result,
+            "file_name": file_name,
+            "doc_type": doc_type_str,
+            "facts_conflicts": result.get("conflicting_count", 0),
+            "ingestion_duration_ms": result.get("duration_ms"),
+            "processing_time_sec": processing_time_sec,
+            "worker": worker_idx,
+        })
+
         if result["status"] == "ok":
             ok_count += 1
             if result.get("needs_review"):
                 needs_review_count += 1
         else:
             failed_count += 1
+
+    logger.info(f"Исследований: {len(study_queues)} (параллельно до {concurrency})")
+    try:
+        await run_study_queues(study_queues, concurrency, handle)
+    finally:
+        benchmark.close()
+    wall_time_sec = time.perf_counter() - wall_start
+    logger.info(
+        f"Обработано {len(campaign_results)} документов за {wall_time_sec:.1f} с "
+        f"(concurrency={concurrency}); время по документам: {benchmark_path}"
+    )
     
     # Формируем сводку
     campaign_summary = {
-        "campaign_started_at": datetime.now().isoformat(),
+        "campaign_started_at": campaign_started_at.isoformat(),
+        "concurrency": concurrency,
+        "wall_time_sec": round(wall_time_sec, 2),
+        "docs_per_minute": round(len(campaign_results) / wall_time_sec * 60, 2) if wall_time_sec > 0 else 0.0,
         "total_docs": total_docs,
         "ok": ok_count,
         "failed": failed_count,
@@ -539,7 +719,9 @@ async def run_campaign(
         details_path = output_dir / "campaign_details.csv"
         with open(details_path, "w", encoding="utf-8", newline="") as f:
             if campaign_results:
-                writer = csv.DictWriter(f, fieldnames=campaign_results[0].keys())
+                # У строк failed есть поле error — заголовок по объединению полей
+                fieldnames = list(dict.fromkeys(key for row in campaign_results for key in row))
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
                 writer.writeheader()
                 writer.writerows(campaign_results)
         logger.info(f"Детали сохранены в {details_path}")
@@ -573,13 +755,22 @@ async def main() -> None:
     parser.add_argument("--limit", type=int, help="Максимальное количество документов")
     parser.add_argument("--since", type=str, help="Дата начала фильтрации (YYYY-MM-DD)")
     parser.add_argument("--dry-run", action="store_true", help="Режим проверки без реальной ингестии")
-    parser.add_argument("--concurrency", type=int, default=1, help="Количество параллельных задач (по умолчанию 1)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Количество параллельных воркеров (по умолчанию 1)")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Продолжить прерванную кампанию: не загружать файлы, уже обработанные по SHA256 (ready/needs_review), "
+        "и пропускать версии, успешно обработанные по campaign_benchmark.csv",
+    )
     parser.add_argument("--output", type=str, help="Путь к директории для сохранения отчетов")
     parser.add_argument("--upload-file", type=str, help="Путь к файлу для загрузки")
     parser.add_argument("--upload-dir", type=str, help="Путь к директории с файлами для загрузки (с подкаталогами)")
     parser.add_argument("--study-code", type=str, help="Код исследования (для создаваемых исследований)")
     
     args = parser.parse_args()
+    if args.concurrency < 1:
+        logger.error(f"--concurrency должен быть >= 1: {args.concurrency}")
+        return
     
     # Парсим workspace_id
     workspace_id = None
@@ -604,8 +795,14 @@ async def main() -> None:
             logger.error(f"Неверный doc_type: {args.doc_type}")
             return
     
-    # Создаём подключение к БД
-    engine = create_async_engine(settings.async_database_url, echo=False)
+    # Создаём подключение к БД. Ингестия одного документа держит одно соединение (плюс
+    # сессию чтения alignment и короткие сессии записи неудачного запуска и отложенных
+    # метрик), пул рассчитан на concurrency воркеров; предел параллелизма — max_connections PostgreSQL
+    engine = create_async_engine(
+        settings.async_database_url,
+        echo=False,
+        pool_size=max(5, args.concurrency * 2),
+    )
     async_session_factory = async_sessionmaker(engine, expire_on_commit=False)
     
     async with async_session_factory() as db:
@@ -637,9 +834,17 @@ async def main() -> None:
                     logger.warning("Не найдено файлов для загрузки")
                 else:
                     logger.info(f"Найдено {len(files_to_upload)} файлов для загрузки")
+
+                    processed_hashes: set[str] = set()
+                    if args.resume:
+                        processed_hashes = await get_processed_sha256_set(db, workspace_id)
+                        logger.info(f"--resume: найдено обработанных файлов (ready/needs_review): {len(processed_hashes)}")
                     
                     # Загружаем файлы
                     for i, file_path in enumerate(files_to_upload, 1):
+                        if processed_hashes and calculate_file_sha256(file_path) in processed_hashes:
+                            logger.info(f"Файл уже обработан, пропускаем: {file_path.name}")
+                            continue
                         try:
                             logger.info(f"Загрузка файла {i}/{len(files_to_upload)}: {file_path.name}")
                             version = await upload_file_to_campaign(
@@ -670,6 +875,7 @@ async def main() -> None:
                 dry_run=args.dry_run,
                 concurrency=args.concurrency,
                 output_dir=output_dir,
+                resume=args.resume,
             )
         finally:
             await engine.dispose()
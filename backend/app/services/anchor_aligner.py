@@ -5,12 +5,14 @@
 
 from __future__ import annotations
 
-import math
+import asyncio
 import re
+import heapq
 from collections import defaultdict
+from collections.abc import Iterable
 from dataclasses import dataclass
 from difflib import SequenceMatcher
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
 from sqlalchemy import select
@@ -21,8 +23,12 @@ from app.db.enums import AnchorContentType, DocumentLanguage
 from app.db.models.anchors import Anchor, Chunk
 from app.db.models.anchor_matches import AnchorMatch
 from app.db.models.studies import DocumentVersion
+from app.services.similarity import cosine_similarity, cosine_similarity_matrix
 from app.services.text_normalization import normalize_for_match
 
+if TYPE_CHECKING:
+    from app.services.ingestion.anchor_snapshot import AnchorSnapshot
+
 
 def _convert_to_json_serializable(obj: Any) -> Any:
     """
@@ -71,6 +77,166 @@ def _convert_to_json_serializable(obj: Any) -> Any:
     return obj
 
 
+# Допуск на погрешность float при отсечении кандидатов (оценки должны оставаться верхними)
+_BOUND_EPS = 1e-9
+
+_FUZZY_STRIP_RE = re.compile(r'[^\w\s]')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _normalize_fuzzy_text(text: str) -> str:
+    """Нормализация для fuzzy: удаление всех спецсимволов и лишних пробелов."""
+    text = _FUZZY_STRIP_RE.sub('', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def _fuzzy_similarity(text_a: str, tokens_a: set[str], text_b: str, tokens_b: set[str]) -> float:
+    """0.6 * SequenceMatcher.ratio + 0.4 * Jaccard по токенам (тексты уже нормализованы)."""
+    # Используем SequenceMatcher для базового fuzzy matching
+    ratio = SequenceMatcher(None, text_a, text_b).ratio()
+    
+    if not tokens_a or not tokens_b:
+        return ratio
+    
+    # Jaccard similarity по токенам
+    intersection = len(tokens_a & tokens_b)
+    union = len(tokens_a | tokens_b)
+    jaccard = intersection / union if union > 0 else 0.0
+    
+    # Комбинируем ratio и jaccard
+    return 0.6 * ratio + 0.4 * jaccard
+
+
+class _AnchorFeatures:
+    """Предвычисленные признаки якоря для матчинга (нормализация выполняется один раз)."""
+
+    __slots__ = ("anchor", "match_text", "fuzzy_text", "tokens", "path_parts")
+
+    def __init__(self, anchor: Anchor) -> None:
+        self.anchor = anchor
+        self.match_text = normalize_for_match(anchor.text_norm)
+        self.fuzzy_text = _normalize_fuzzy_text(self.match_text) if self.match_text else ""
+        self.tokens = set(self.fuzzy_text.split())
+        self.path_parts = anchor.section_path.split("/")
+
+
+def _fuzzy_score_prepared(features_a: _AnchorFeatures, features_b: _AnchorFeatures) -> float:
+    """AnchorAligner._fuzzy_score по предвычисленным признакам."""
+    if not features_a.match_text or not features_b.match_text:
+        return 0.0
+    return _fuzzy_similarity(
+        features_a.fuzzy_text, features_a.tokens, features_b.fuzzy_text, features_b.tokens
+    )
+
+
+def _fuzzy_upper_bound(features_a: _AnchorFeatures, features_b: _AnchorFeatures) -> float:
+    """Верхняя оценка fuzzy score без SequenceMatcher (ratio <= 2 * min(len) / sum(len))."""
+    if not features_a.match_text or not features_b.match_text:
+        return 0.0
+    len_a = len(features_a.fuzzy_text)
+    len_b = len(features_b.fuzzy_text)
+    total = len_a + len_b
+    ratio_bound = 2.0 * min(len_a, len_b) / total if total else 1.0
+    if not features_a.tokens or not features_b.tokens:
+        return ratio_bound
+    intersection = len(features_a.tokens & features_b.tokens)
+    union = len(features_a.tokens) + len(features_b.tokens) - intersection
+    jaccard = intersection / union if union > 0 else 0.0
+    return 0.6 * ratio_bound + 0.4 * jaccard
+
+
+def _fuzzy_quick_bound(features_a: _AnchorFeatures, features_b: _AnchorFeatures) -> float:
+    """Более точная верхняя оценка fuzzy score через SequenceMatcher.quick_ratio."""
+    if not features_a.match_text or not features_b.match_text:
+        return 0.0
+    matcher = SequenceMatcher(None, features_a.fuzzy_text, features_b.fuzzy_text)
+    ratio_bound = matcher.quick_ratio()
+    if not features_a.tokens or not features_b.tokens:
+        return ratio_bound
+    intersection = len(features_a.tokens & features_b.tokens)
+    union = len(features_a.tokens | features_b.tokens)
+    jaccard = intersection / union if union > 0 else 0.0
+    return 0.6 * ratio_bound + 0.4 * jaccard
+
+
+def _path_similarity(path_a_parts: list[str], path_b_parts: list[str]) -> float:
+    """Доля общего префикса section_path."""
+    common_prefix_len = 0
+    for i, (part_a, part_b) in enumerate(zip(path_a_parts, path_b_parts)):
+        if part_a == part_b:
+            common_prefix_len = i + 1
+        else:
+            break
+    if max(len(path_a_parts), len(path_b_parts)) > 0:
+        return common_prefix_len / max(len(path_a_parts), len(path_b_parts))
+    return 0.0
+
+
+def _combine_score(
+    fuzzy_score: float,
+    emb_score: float,
+    zone_score: float,
+    path_score: float,
+) -> tuple[float, str]:
+    """Итоговый score пары (без бонусов) и метод. Монотонно не убывает по fuzzy_score."""
+    # Усиливаем вклад embedding
+    if emb_score > 0:
+        combined = 0.65 * emb_score + 0.25 * fuzzy_score + 0.10 * (0.6 * zone_score + 0.4 * path_score)
+        method = "hybrid"
+    else:
+        combined = 0.60 * fuzzy_score + 0.40 * (0.5 * zone_score + 0.5 * path_score)
+        method = "fuzzy"
+
+    # Штраф за существенное расхождение section_path
+    path_penalty = 0.15 * (1.0 - path_score)
+    return max(0.0, combined - path_penalty), method
+
+
+def _group_score_bound(emb_sim: float | None, zone_score: float, path_score: float) -> float:
+    """Верхняя оценка score (без бонусов) для пары групп при fuzzy = 1.0."""
+    bound, _ = _combine_score(1.0, 0.0, zone_score, path_score)
+    if emb_sim is not None and emb_sim > 0:
+        hybrid, _ = _combine_score(1.0, emb_sim, zone_score, path_score)
+        bound = max(bound, hybrid)
+    return bound
+
+
+class _PairContext:
+    """Общие для пары групп составляющие score (всё, кроме fuzzy)."""
+
+    __slots__ = ("emb_sim", "zone_score", "path_score", "zone_bonus", "lang_bonus")
+
+    def __init__(
+        self,
+        emb_sim: float | None,
+        zone_score: float,
+        path_score: float,
+        zone_bonus: float,
+        lang_bonus: float,
+    ) -> None:
+        self.emb_sim = emb_sim
+        self.zone_score = zone_score
+        self.path_score = path_score
+        self.zone_bonus = zone_bonus
+        self.lang_bonus = lang_bonus
+
+    def with_bonuses(self, score: float) -> float:
+        """Итоговый score с бонусами (порядок сложения как в исходной формуле)."""
+        return float(min(1.0, score + self.zone_bonus + self.lang_bonus))
+
+    def final_score(self, fuzzy_score: float) -> float:
+        """Итоговый score с бонусами при заданном fuzzy (верхняя оценка при оценке fuzzy сверху)."""
+        emb_score = self.emb_sim if self.emb_sim is not None else 0.0
+        combined, _ = _combine_score(fuzzy_score, emb_score, self.zone_score, self.path_score)
+        return self.with_bonuses(float(combined))
+
+
+# Стадии уточнения оценки пары в _greedy_match
+_STAGE_EXACT = 0
+_STAGE_LENGTH_BOUND = 1
+_STAGE_QUICK_BOUND = 2
+
+
 @dataclass
 class AlignmentStats:
     """Статистика выравнивания якорей."""
@@ -83,14 +249,50 @@ class AlignmentStats:
     total_to: int
 
 
+# (anchor_a, anchor_b, score, method, meta_json)
+AnchorMatchTuple = tuple[Anchor, Anchor, float, str, dict[str, Any]]
+
+
+@dataclass
+class AlignmentResult:
+    """Матчи двух версий, вычисленные AnchorAligner.match (записываются AnchorAligner.save)."""
+
+    document_id: UUID
+    from_version_id: UUID
+    to_version_id: UUID
+    matches: list[AnchorMatchTuple]
+    stats: AlignmentStats
+
+
+def anchor_embeddings_from_chunks(chunks: Iterable[Chunk], anchor_ids: set[str]) -> dict[str, list[float]]:
+    """
+    Embeddings anchors по chunks, в которые они входят: {anchor_id: embedding}.
+    Если якорь присутствует в нескольких chunks, берётся первый; chunks без embedding пропускаются.
+    """
+    embeddings: dict[str, list[float]] = {}
+    for chunk in chunks:
+        emb = chunk.embedding
+        if emb is None:
+            continue
+        for anchor_id in chunk.anchor_ids:
+            if anchor_id in anchor_ids and anchor_id not in embeddings:
+                # embedding может быть list[float] или vector
+                if isinstance(emb, list):
+                    embeddings[anchor_id] = emb
+                elif hasattr(emb, '__iter__'):
+                    embeddings[anchor_id] = list(emb)
+    return embeddings
+
+
 class AnchorAligner:
     """Сервис для выравнивания якорей между двумя версиями документа.
     
     Алгоритм:
     1. Фильтрует якоря по content_type (сравнивает только одинаковые типы)
-    2. Генерирует кандидатов с учетом source_zone и language
+    2. Генерирует кандидатов с учетом source_zone и language (индекс точных
+       совпадений + группы по контексту, без перебора всех пар)
     3. Вычисляет score для каждой пары (exact/fuzzy/embedding/hybrid)
-    4. Выполняет жадное 1-to-1 матчинг по убыванию score
+    4. Выполняет жадное 1-to-1 матчинг по убыванию score (ленивое уточнение оценок)
     5. Сохраняет результаты в anchor_matches
     """
     
@@ -104,19 +306,55 @@ class AnchorAligner:
         *,
         scope: str = "body",
         min_score: float = 0.6,
+        anchor_snapshot_b: AnchorSnapshot | None = None,
+        commit: bool = True,
     ) -> AlignmentStats:
         """
-        Выравнивает якоря между двумя версиями документа.
+        Выравнивает якоря между двумя версиями документа и сохраняет матчи.
         
         Args:
             doc_version_a: UUID или DocumentVersion исходной версии
             doc_version_b: UUID или DocumentVersion целевой версии
             scope: Область сравнения ("body", "all") - пока не используется
             min_score: Минимальный score для матчинга (0.0-1.0)
+            anchor_snapshot_b: Снимок anchors целевой версии из текущей ингестии;
+                None — anchors читаются из БД
+            commit: Делать commit; False — только flush, транзакцией управляет вызывающий код (ингестия)
             
         Returns:
             AlignmentStats со статистикой выравнивания
         """
+        result = await self.match(
+            doc_version_a,
+            doc_version_b,
+            scope=scope,
+            min_score=min_score,
+            anchor_snapshot_b=anchor_snapshot_b,
+        )
+        await self.save(result, commit=commit)
+        return result.stats
+
+    async def match(
+        self,
+        doc_version_a: UUID | DocumentVersion,
+        doc_version_b: UUID | DocumentVersion,
+        *,
+        scope: str = "body",
+        min_score: float = 0.6,
+        anchor_snapshot_b: AnchorSnapshot | None = None,
+        embeddings_b: dict[str, list[float]] | None = None,
+    ) -> AlignmentResult:
+        """
+        Вычисляет матчи якорей двух версий без записи в БД (сессия только читает).
+
+        Матчинг (CPU) выполняется в потоке и не блокирует event loop: ингестия
+        вычисляет выравнивание в отдельной сессии чтения параллельно с другими стадиями.
+
+        Args:
+            embeddings_b: Embeddings anchors целевой версии (anchor_id -> вектор);
+                None — по её chunks из БД
+            Остальные — как у align.
+        """
         # Получаем DocumentVersion объекты
         if isinstance(doc_version_a, UUID):
             doc_version_a = await self.db.get(DocumentVersion, doc_version_a)
@@ -136,7 +374,10 @@ class AnchorAligner:
         
         # Получаем все якоря для обеих версий
         anchors_a = await self._get_anchors(doc_version_a.id)
-        anchors_b = await self._get_anchors(doc_version_b.id)
+        if anchor_snapshot_b is not None:
+            anchors_b = list(anchor_snapshot_b)
+        else:
+            anchors_b = await self._get_anchors(doc_version_b.id)
         
         # Логируем количество якорей ДО начала матчинга
         logger.info(
@@ -146,37 +387,11 @@ class AnchorAligner:
         
         # Получаем embeddings через chunks
         embeddings_a = await self._get_anchor_embeddings(doc_version_a.id, anchors_a)
-        embeddings_b = await self._get_anchor_embeddings(doc_version_b.id, anchors_b)
-        
-        # Группируем якоря по content_type
-        anchors_by_type_a = self._group_by_content_type(anchors_a)
-        anchors_by_type_b = self._group_by_content_type(anchors_b)
-        
-        # Выполняем матчинг для каждого типа контента
-        all_matches: list[tuple[Anchor, Anchor, float, str, dict[str, Any]]] = []
+        if embeddings_b is None:
+            embeddings_b = await self._get_anchor_embeddings(doc_version_b.id, anchors_b)
         
-        for content_type in AnchorContentType:
-            if content_type not in anchors_by_type_a or content_type not in anchors_by_type_b:
-                continue
-            
-            type_anchors_a = anchors_by_type_a[content_type]
-            type_anchors_b = anchors_by_type_b[content_type]
-            
-            matches = self._match_anchors(
-                type_anchors_a,
-                type_anchors_b,
-                embeddings_a,
-                embeddings_b,
-                min_score=min_score,
-            )
-            all_matches.extend(matches)
-        
-        # Сохраняем матчи в БД
-        await self._save_matches(
-            doc_version_a.document_id,
-            doc_version_a.id,
-            doc_version_b.id,
-            all_matches,
+        all_matches = await asyncio.to_thread(
+            self._match_all, anchors_a, anchors_b, embeddings_a, embeddings_b, min_score
         )
         
         # Вычисляем статистику
@@ -195,7 +410,51 @@ class AnchorAligner:
             f"changed={stats.changed}, added={stats.added}, removed={stats.removed}"
         )
         
-        return stats
+        return AlignmentResult(
+            document_id=doc_version_a.document_id,
+            from_version_id=doc_version_a.id,
+            to_version_id=doc_version_b.id,
+            matches=all_matches,
+            stats=stats,
+        )
+
+    async def save(self, result: AlignmentResult, commit: bool = True) -> None:
+        """Сохраняет матчи результата match в anchor_matches (commit=False — только flush)."""
+        await self._save_matches(
+            result.document_id,
+            result.from_version_id,
+            result.to_version_id,
+            result.matches,
+            commit=commit,
+        )
+
+    def _match_all(
+        self,
+        anchors_a: list[Anchor],
+        anchors_b: list[Anchor],
+        embeddings_a: dict[str, list[float]],
+        embeddings_b: dict[str, list[float]],
+        min_score: float,
+    ) -> list[AnchorMatchTuple]:
+        """Матчинг по всем типам контента (якоря сравниваются только внутри одного типа)."""
+        # Группируем якоря по content_type
+        anchors_by_type_a = self._group_by_content_type(anchors_a)
+        anchors_by_type_b = self._group_by_content_type(anchors_b)
+        
+        all_matches: list[AnchorMatchTuple] = []
+        for content_type in AnchorContentType:
+            if content_type not in anchors_by_type_a or content_type not in anchors_by_type_b:
+                continue
+            all_matches.extend(
+                self._match_anchors(
+                    anchors_by_type_a[content_type],
+                    anchors_by_type_b[content_type],
+                    embeddings_a,
+                    embeddings_b,
+                    min_score=min_score,
+                )
+            )
+        return all_matches
     
     async def _get_anchors(self, doc_version_id: UUID) -> list[Anchor]:
         """Получает все якоря для версии документа."""
@@ -222,22 +481,7 @@ class AnchorAligner:
             Chunk.anchor_ids.overlap(list(anchor_ids)),  # type: ignore
         )
         result = await self.db.execute(stmt)
-        chunks = result.scalars().all()
-        
-        # Строим маппинг anchor_id -> embedding
-        # Если якорь присутствует в нескольких chunks, берем первый
-        embeddings: dict[str, list[float]] = {}
-        for chunk in chunks:
-            for anchor_id in chunk.anchor_ids:
-                if anchor_id in anchor_ids and anchor_id not in embeddings:
-                    # embedding может быть list[float] или vector
-                    emb = chunk.embedding
-                    if isinstance(emb, list):
-                        embeddings[anchor_id] = emb
-                    elif hasattr(emb, '__iter__'):
-                        embeddings[anchor_id] = list(emb)
-        
-        return embeddings
+        return anchor_embeddings_from_chunks(result.scalars().all(), anchor_ids)
     
     def _group_by_content_type(
         self, anchors: list[Anchor]
@@ -308,60 +552,169 @@ class AnchorAligner:
         if not remaining_a or not remaining_b:
             return matched
 
-        # Генерируем кандидатов с приоритетами
-        candidates: list[tuple[Anchor, Anchor, float]] = []
-        
-        for anchor_a in remaining_a:
-            for anchor_b in remaining_b:
-                # Фильтруем по source_zone и language (приоритет, но не требование)
-                zone_bonus = 0.0
-                lang_bonus = 0.0
-                
-                if anchor_a.source_zone == anchor_b.source_zone:
-                    zone_bonus = 0.05
-                if anchor_a.language == anchor_b.language and anchor_a.language != DocumentLanguage.UNKNOWN:
-                    lang_bonus = 0.05
-                
-                # Вычисляем score
-                score, method, meta = self._compute_score(
-                    anchor_a,
-                    anchor_b,
-                    embeddings_a.get(anchor_a.anchor_id),
-                    embeddings_b.get(anchor_b.anchor_id),
-                )
-                
-                # Добавляем бонусы к финальному score
-                final_score = float(min(1.0, score + zone_bonus + lang_bonus))
-                
+        # Нормализация текста выполняется один раз на якорь
+        features_a = [_AnchorFeatures(a) for a in remaining_a]
+        features_b = [_AnchorFeatures(b) for b in remaining_b]
+
+        # Жадный 1-to-1 матчинг по убыванию score (только по парам-кандидатам)
+        matched.extend(
+            self._greedy_match(
+                features_a,
+                features_b,
+                embeddings_a,
+                embeddings_b,
+                min_score=min_score,
+            )
+        )
+        return matched
+
+    def _greedy_match(
+        self,
+        features_a: list[_AnchorFeatures],
+        features_b: list[_AnchorFeatures],
+        embeddings_a: dict[str, list[float]],
+        embeddings_b: dict[str, list[float]],
+        min_score: float,
+    ) -> list[tuple[Anchor, Anchor, float, str, dict[str, Any]]]:
+        """
+        Жадный 1-to-1 матчинг по убыванию score без перебора всех пар.
+
+        Кандидаты:
+        - точные совпадения нормализованного текста (score = 1.0) — по индексу;
+        - якоря группируются по контексту (embedding chunk-а, source_zone, language,
+          section_path). Внутри пары групп все составляющие score, кроме fuzzy,
+          постоянны, поэтому пары групп, где min_score недостижим даже при
+          fuzzy = 1.0, отбрасываются целиком.
+
+        Оставшиеся пары обрабатываются лениво через кучу по верхней оценке score:
+        оценка уточняется (длины/Jaccard -> quick_ratio -> точный SequenceMatcher)
+        только когда пара оказывается на вершине кучи, а пары с уже сматченными
+        якорями отбрасываются без вычислений. Порядок принятия пар (score по
+        убыванию, затем порядок перебора пар) совпадает с полным перебором.
+
+        Returns:
+            Список (anchor_a, anchor_b, score, method, meta_json)
+        """
+        # Элемент кучи: (-score_or_bound, idx_a, idx_b, stage, payload).
+        # Пара присутствует в куче не более одного раза, поэтому сравнение не доходит до payload.
+        heap: list[tuple[float, int, int, int, Any]] = []
+
+        # 1) Точные совпадения нормализованного текста (score = 1.0 при любом контексте)
+        exact_index_b: dict[str, list[int]] = defaultdict(list)
+        for idx_b, fb in enumerate(features_b):
+            exact_index_b[fb.match_text].append(idx_b)
+        for idx_a, fa in enumerate(features_a):
+            for idx_b in exact_index_b.get(fa.match_text, ()):
+                zone_bonus, lang_bonus = self._context_bonuses(fa.anchor, features_b[idx_b].anchor)
+                final_score = float(min(1.0, 1.0 + zone_bonus + lang_bonus))
                 if final_score >= min_score:
-                    candidates.append((anchor_a, anchor_b, final_score))
-                    # Конвертируем бонусы в стандартные Python типы
-                    meta["zone_bonus"] = float(zone_bonus)
-                    meta["lang_bonus"] = float(lang_bonus)
-        
-        # Сортируем по score (убывание)
-        candidates.sort(key=lambda x: x[2], reverse=True)
-        
-        # Жадный 1-to-1 матчинг
-        matches: list[tuple[Anchor, Anchor, float, str, dict[str, Any]]] = matched
-        
-        for anchor_a, anchor_b, score in candidates:
-            if anchor_a.anchor_id in used_a or anchor_b.anchor_id in used_b:
+                    heap.append((-final_score, idx_a, idx_b, _STAGE_EXACT, ("exact", {"text_sim": 1.0})))
+
+        # 2) Пары якорей из совместимых групп с верхней оценкой score
+        groups_a, group_emb_a = self._group_by_context(features_a, embeddings_a)
+        groups_b, group_emb_b = self._group_by_context(features_b, embeddings_b)
+        # Cosine всех пар групп одним matmul (все якоря группы в одном chunk)
+        cos_matrix = cosine_similarity_matrix(list(group_emb_a.values()), list(group_emb_b.values()))
+        emb_pos_a = {key: i for i, key in enumerate(group_emb_a)}
+        emb_pos_b = {key: i for i, key in enumerate(group_emb_b)}
+        path_scores: dict[tuple[str, str], float] = {}
+
+        for key_a, members_a in groups_a.items():
+            head_a = features_a[members_a[0]].anchor
+            emb_a = group_emb_a.get(key_a)
+            for key_b, members_b in groups_b.items():
+                head_b = features_b[members_b[0]].anchor
+                emb_b = group_emb_b.get(key_b)
+
+                path_key = (head_a.section_path, head_b.section_path)
+                path_score = path_scores.get(path_key)
+                if path_score is None:
+                    path_score = _path_similarity(
+                        features_a[members_a[0]].path_parts, features_b[members_b[0]].path_parts
+                    )
+                    path_scores[path_key] = path_score
+
+                zone_score = 1.0 if head_a.source_zone == head_b.source_zone else 0.0
+                zone_bonus, lang_bonus = self._context_bonuses(head_a, head_b)
+                has_emb = emb_a is not None and emb_b is not None
+
+                # Отсечение пары групп, где min_score недостижим даже при fuzzy = 1.0
+                emb_sim = float(cos_matrix[emb_pos_a[key_a], emb_pos_b[key_b]]) if has_emb else None
+                if _group_score_bound(emb_sim, zone_score, path_score) + zone_bonus + lang_bonus < min_score - _BOUND_EPS:
+                    continue
+
+                context = _PairContext(emb_sim, zone_score, path_score, zone_bonus, lang_bonus)
+                for idx_a in members_a:
+                    fa = features_a[idx_a]
+                    for idx_b in members_b:
+                        fb = features_b[idx_b]
+                        if fa.match_text == fb.match_text:
+                            continue  # уже учтено в п.1
+                        bound = context.final_score(_fuzzy_upper_bound(fa, fb))
+                        if bound >= min_score:
+                            heap.append((-bound, idx_a, idx_b, _STAGE_LENGTH_BOUND, context))
+
+        heapq.heapify(heap)
+
+        matches: list[tuple[Anchor, Anchor, float, str, dict[str, Any]]] = []
+        used_a: set[int] = set()
+        used_b: set[int] = set()
+        while heap:
+            neg_score, idx_a, idx_b, stage, payload = heapq.heappop(heap)
+            if idx_a in used_a or idx_b in used_b:
                 continue
-            
-            # Пересчитываем score для финального матча
-            _, method, meta = self._compute_score(
-                anchor_a,
-                anchor_b,
-                embeddings_a.get(anchor_a.anchor_id),
-                embeddings_b.get(anchor_b.anchor_id),
-            )
-            
-            matches.append((anchor_a, anchor_b, score, method, meta))
-            used_a.add(anchor_a.anchor_id)
-            used_b.add(anchor_b.anchor_id)
-        
+            fa = features_a[idx_a]
+            fb = features_b[idx_b]
+
+            if stage == _STAGE_EXACT:
+                method, meta = payload
+                matches.append((fa.anchor, fb.anchor, -neg_score, method, meta))
+                used_a.add(idx_a)
+                used_b.add(idx_b)
+            elif stage == _STAGE_LENGTH_BOUND:
+                # Уточняем оценку через quick_ratio (мультимножество символов)
+                bound = payload.final_score(_fuzzy_quick_bound(fa, fb))
+                if bound >= min_score:
+                    heapq.heappush(heap, (-bound, idx_a, idx_b, _STAGE_QUICK_BOUND, payload))
+            else:
+                score, method, meta = self._score_features(fa, fb, payload.emb_sim)
+                final_score = payload.with_bonuses(score)
+                if final_score >= min_score:
+                    heapq.heappush(heap, (-final_score, idx_a, idx_b, _STAGE_EXACT, (method, meta)))
+
         return matches
+
+    @staticmethod
+    def _group_by_context(
+        features: list[_AnchorFeatures],
+        embeddings: dict[str, list[float]],
+    ) -> tuple[dict[tuple[Any, ...], list[int]], dict[tuple[Any, ...], list[float]]]:
+        """Группирует якоря по (embedding chunk-а, source_zone, language, section_path)."""
+        groups: dict[tuple[Any, ...], list[int]] = defaultdict(list)
+        group_embeddings: dict[tuple[Any, ...], list[float]] = {}
+        for idx, f in enumerate(features):
+            emb = embeddings.get(f.anchor.anchor_id)
+            key = (
+                id(emb) if emb is not None else None,
+                f.anchor.source_zone,
+                f.anchor.language,
+                f.anchor.section_path,
+            )
+            groups[key].append(idx)
+            if emb is not None:
+                group_embeddings[key] = emb
+        return groups, group_embeddings
+
+    @staticmethod
+    def _context_bonuses(anchor_a: Anchor, anchor_b: Anchor) -> tuple[float, float]:
+        """Бонусы за совпадение source_zone и language (приоритет, но не требование)."""
+        zone_bonus = 0.0
+        lang_bonus = 0.0
+        if anchor_a.source_zone == anchor_b.source_zone:
+            zone_bonus = 0.05
+        if anchor_a.language == anchor_b.language and anchor_a.language != DocumentLanguage.UNKNOWN:
+            lang_bonus = 0.05
+        return zone_bonus, lang_bonus
     
     def _compute_score(
         self,
@@ -373,63 +726,63 @@ class AnchorAligner:
         """
         Вычисляет score между двумя якорями.
         
+        Returns:
+            (score, method, meta_json)
+        """
+        emb_score = None
+        # Проверяем явно на None, так как embedding_a и embedding_b могут быть list[float]
+        if embedding_a is not None and embedding_b is not None:
+            emb_score = self._cosine_similarity(embedding_a, embedding_b)
+        return self._score_features(_AnchorFeatures(anchor_a), _AnchorFeatures(anchor_b), emb_score)
+
+    def _score_features(
+        self,
+        features_a: _AnchorFeatures,
+        features_b: _AnchorFeatures,
+        emb_sim: float | None,
+    ) -> tuple[float, str, dict[str, Any]]:
+        """
+        Вычисляет score по предвычисленным признакам якорей.
+
+        Args:
+            emb_sim: cosine similarity embeddings (None, если embedding нет у одного из якорей)
+
         Returns:
             (score, method, meta_json)
         """
         meta: dict[str, Any] = {}
+        anchor_a = features_a.anchor
+        anchor_b = features_b.anchor
         
         # 1. Exact match
-        text_a_norm = normalize_for_match(anchor_a.text_norm)
-        text_b_norm = normalize_for_match(anchor_b.text_norm)
-        
-        if text_a_norm == text_b_norm:
+        if features_a.match_text == features_b.match_text:
             return (1.0, "exact", {"text_sim": 1.0})
         
         # 2. Fuzzy score (token-based similarity)
-        fuzzy_score = self._fuzzy_score(text_a_norm, text_b_norm)
+        fuzzy_score = _fuzzy_score_prepared(features_a, features_b)
         meta["text_sim"] = fuzzy_score
         
         # 3. Embedding score
         emb_score = 0.0
-        # Проверяем явно на None, так как embedding_a и embedding_b могут быть list[float]
-        if embedding_a is not None and embedding_b is not None:
-            emb_score = self._cosine_similarity(embedding_a, embedding_b)
+        if emb_sim is not None:
+            emb_score = emb_sim
             meta["emb_sim"] = emb_score
         else:
             meta["emb_sim"] = None
         
         # 4. Zone/path agreement
         zone_score = 0.0
-        path_score = 0.0
         
         if anchor_a.source_zone == anchor_b.source_zone:
             zone_score = 1.0
         meta["zone_sim"] = zone_score
         
         # Сравниваем section_path (проверяем общих родителей)
-        path_a_parts = anchor_a.section_path.split("/")
-        path_b_parts = anchor_b.section_path.split("/")
-        common_prefix_len = 0
-        for i, (part_a, part_b) in enumerate(zip(path_a_parts, path_b_parts)):
-            if part_a == part_b:
-                common_prefix_len = i + 1
-            else:
-                break
-        if max(len(path_a_parts), len(path_b_parts)) > 0:
-            path_score = common_prefix_len / max(len(path_a_parts), len(path_b_parts))
+        path_score = _path_similarity(features_a.path_parts, features_b.path_parts)
         meta["path_sim"] = path_score
         
-        # 5. Combined score (усиливаем вклад embedding) + штраф за "прыжок" по разделам
-        if emb_score > 0:
-            combined = 0.65 * emb_score + 0.25 * fuzzy_score + 0.10 * (0.6 * zone_score + 0.4 * path_score)
-            method = "hybrid"
-        else:
-            combined = 0.60 * fuzzy_score + 0.40 * (0.5 * zone_score + 0.5 * path_score)
-            method = "fuzzy"
-
-        # Штраф за существенное расхождение section_path
-        path_penalty = 0.15 * (1.0 - path_score)
-        combined = max(0.0, combined - path_penalty)
+        # 5. Combined score
+        combined, method = _combine_score(fuzzy_score, emb_score, zone_score, path_score)
         
         # Конвертируем все значения в стандартные Python типы для JSON сериализации
         combined = float(combined)
@@ -442,44 +795,18 @@ class AnchorAligner:
         if not text_a or not text_b:
             return 0.0
         
-        # Нормализация текста: удаление всех спецсимволов и лишних пробелов
-        text_a_normalized = re.sub(r'[^\w\s]', '', text_a)  # Удаляем все спецсимволы
-        text_a_normalized = re.sub(r'\s+', ' ', text_a_normalized).strip()  # Удаляем лишние пробелы
-        text_b_normalized = re.sub(r'[^\w\s]', '', text_b)  # Удаляем все спецсимволы
-        text_b_normalized = re.sub(r'\s+', ' ', text_b_normalized).strip()  # Удаляем лишние пробелы
-        
-        # Используем SequenceMatcher для базового fuzzy matching
-        matcher = SequenceMatcher(None, text_a_normalized, text_b_normalized)
-        ratio = matcher.ratio()
-        
-        # Дополнительно: token-based similarity (используем нормализованные тексты)
-        tokens_a = set(text_a_normalized.split())
-        tokens_b = set(text_b_normalized.split())
-        
-        if not tokens_a or not tokens_b:
-            return ratio
-        
-        # Jaccard similarity по токенам
-        intersection = len(tokens_a & tokens_b)
-        union = len(tokens_a | tokens_b)
-        jaccard = intersection / union if union > 0 else 0.0
-        
-        # Комбинируем ratio и jaccard
-        return 0.6 * ratio + 0.4 * jaccard
+        text_a_normalized = _normalize_fuzzy_text(text_a)
+        text_b_normalized = _normalize_fuzzy_text(text_b)
+        return _fuzzy_similarity(
+            text_a_normalized,
+            set(text_a_normalized.split()),
+            text_b_normalized,
+            set(text_b_normalized.split()),
+        )
     
     def _cosine_similarity(self, vec_a: list[float], vec_b: list[float]) -> float:
-        """Вычисляет cosine similarity между двумя векторами."""
-        if len(vec_a) != len(vec_b):
-            return 0.0
-        
-        dot_product = sum(a * b for a, b in zip(vec_a, vec_b))
-        norm_a = math.sqrt(sum(a * a for a in vec_a))
-        norm_b = math.sqrt(sum(b * b for b in vec_b))
-        
-        if norm_a == 0.0 or norm_b == 0.0:
-            return 0.0
-        
-        return dot_product / (norm_a * norm_b)
+        """Вычисляет cosine similarity между двумя векторами (0.0 при разной размерности)."""
+        return cosine_similarity(vec_a, vec_b)
     
     async def _save_matches(
         self,
@@ -487,8 +814,9 @@ class AnchorAligner:
         from_version_id: UUID,
         to_version_id: UUID,
         matches: list[tuple[Anchor, Anchor, float, str, dict[str, Any]]],
+        commit: bool = True,
     ) -> None:
-        """Сохраняет матчи в БД."""
+        """Сохраняет матчи в БД (commit=False — только flush)."""
         # Удаляем старые матчи для этой пары версий
         stmt = select(AnchorMatch).where(
             AnchorMatch.from_doc_version_id == from_version_id,
@@ -518,6 +846,9 @@ class AnchorAligner:
             )
             self.db.add(match)
         
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
+        else:
+            await self.db.flush()
         logger.info(f"Сохранено {len(matches)} матчей в БД")
 
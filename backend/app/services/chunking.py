@@ -12,16 +12,23 @@ import hashlib
 import math
 import re
 from collections import Counter, defaultdict
-from typing import Any
+from collections.abc import Collection, Sequence
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
+import numpy as np
 from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.logging import logger
+from app.db.bulk_copy import bulk_insert_chunks
 from app.db.enums import AnchorContentType
 from app.db.models.anchors import Anchor, Chunk
 
+if TYPE_CHECKING:
+    from app.services.ingestion.anchor_snapshot import AnchorSnapshot
+
 
 def _normalize_text(text: str) -> str:
     if not text:
@@ -42,6 +49,15 @@ def _sha256_hex(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
 
+@lru_cache(maxsize=65536)
+def _token_bucket_sign(tok: str, dims: int) -> tuple[int, float]:
+    """(bucket, sign) токена для feature hashing v1 (sha256 считается один раз на токен)."""
+    h = hashlib.sha256(tok.encode("utf-8")).digest()
+    bucket = int.from_bytes(h[:8], "big") % dims
+    sign = -1.0 if (h[8] & 1) else 1.0
+    return bucket, sign
+
+
 def _hash_embedding_v1(text_norm: str, dims: int = 1536) -> list[float]:
     """Feature hashing в фиксированное пространство dims + L2 normalize.
 
@@ -55,9 +71,7 @@ def _hash_embedding_v1(text_norm: str, dims: int = 1536) -> list[float]:
         return vec
 
     for tok in tokens:
-        h = hashlib.sha256(tok.encode("utf-8")).digest()
-        bucket = int.from_bytes(h[:8], "big") % dims
-        sign = -1.0 if (h[8] & 1) else 1.0
+        bucket, sign = _token_bucket_sign(tok, dims)
         vec[bucket] += sign
 
     # L2 normalize
@@ -68,9 +82,54 @@ def _hash_embedding_v1(text_norm: str, dims: int = 1536) -> list[float]:
     return [x * inv for x in vec]
 
 
+def hash_embeddings_v1_batch(texts_norm: Sequence[str], dims: int = 1536) -> np.ndarray:
+    """Пакетный _hash_embedding_v1: матрица (len(texts_norm), dims) float32.
+
+    Счётчики по bucket-ам накапливаются scatter-add'ом по всем текстам сразу,
+    нормализация считается в float64 так же, как в v1, и только затем результат
+    приводится к float32. Значения побитно совпадают с v1, сохранённым в vector(1536).
+    Строки матрицы можно передавать в pgvector без конвертации в list.
+    """
+    rows: list[int] = []
+    buckets: list[int] = []
+    signs: list[float] = []
+    for row, text_norm in enumerate(texts_norm):
+        for tok in _iter_tokens(text_norm):
+            bucket, sign = _token_bucket_sign(tok, dims)
+            rows.append(row)
+            buckets.append(bucket)
+            signs.append(sign)
+
+    n = len(texts_norm)
+    flat_index = np.asarray(rows, dtype=np.int64) * dims + np.asarray(buckets, dtype=np.int64)
+    counts = np.bincount(
+        flat_index, weights=np.asarray(signs, dtype=np.float64), minlength=n * dims
+    ).reshape(n, dims)
+
+    # L2 normalize (строки с нулевой нормой остаются нулевыми, как в v1)
+    norm_sq = np.einsum("ij,ij->i", counts, counts)
+    nonzero = norm_sq > 0.0
+    inv = np.zeros_like(norm_sq)
+    inv[nonzero] = 1.0 / np.sqrt(norm_sq[nonzero])
+    counts *= inv[:, None]
+    return counts.astype(np.float32)
+
+
 # Версия ChunkingService (увеличивается при изменении логики chunking)
 VERSION = "1.0.0"
 
+# Типы anchors, из которых строятся chunks (включая cell для табличных чанков)
+CHUNK_ANCHOR_TYPES = frozenset(
+    {
+        AnchorContentType.HDR,
+        AnchorContentType.P,
+        AnchorContentType.LI,
+        AnchorContentType.FN,
+        AnchorContentType.TBL,
+        AnchorContentType.CELL,
+    }
+)
+
 
 class ChunkingService:
     """Сервис rebuild chunk-ов для doc_version."""
@@ -78,13 +137,69 @@ class ChunkingService:
     def __init__(self, db: AsyncSession) -> None:
         self.db = db
 
-    async def rebuild_chunks_for_doc_version(self, doc_version_id: UUID, max_tokens: int = 450) -> int:
+    async def rebuild_chunks_for_doc_version(
+        self,
+        doc_version_id: UUID,
+        max_tokens: int = 450,
+        section_paths: Collection[str] | None = None,
+        anchor_snapshot: AnchorSnapshot | None = None,
+    ) -> int:
+        """
+        Пересобирает chunks версии документа.
+
+        section_paths: пересобрать только эти секции (инкрементальная переингестия);
+        chunks строятся внутри секции, поэтому остальные секции не затрагиваются.
+        None — пересобрать весь документ.
+        anchor_snapshot: снимок anchors текущей ингестии; None — anchors читаются из БД.
+
+        Returns:
+            Количество созданных chunks
+        """
         logger.debug(
             "Chunking: старт rebuild_chunks_for_doc_version "
-            f"(doc_version_id={doc_version_id}, max_tokens={max_tokens})"
+            f"(doc_version_id={doc_version_id}, max_tokens={max_tokens}, "
+            f"sections={'all' if section_paths is None else len(section_paths)})"
         )
-        # 1) Идемпотентность: удаляем существующие chunks
-        del_res = await self.db.execute(delete(Chunk).where(Chunk.doc_version_id == doc_version_id))
+        if section_paths is not None and not section_paths:
+            return 0
+
+        # 1) Загружаем anchors нужных типов
+        if anchor_snapshot is not None:
+            anchors = anchor_snapshot.select(CHUNK_ANCHOR_TYPES, section_paths)
+        else:
+            anchors_stmt = (
+                select(Anchor)
+                .where(Anchor.doc_version_id == doc_version_id)
+                .where(Anchor.content_type.in_(CHUNK_ANCHOR_TYPES))
+            )
+            if section_paths is not None:
+                anchors_stmt = anchors_stmt.where(Anchor.section_path.in_(list(section_paths)))
+            anchors = (await self.db.execute(anchors_stmt)).scalars().all()
+
+        # 2) Собираем chunks и заменяем ими существующие (идемпотентно)
+        chunk_objects = self.build_chunks(doc_version_id, anchors, max_tokens=max_tokens)
+        return await self.replace_chunks(doc_version_id, chunk_objects, section_paths=section_paths)
+
+    async def replace_chunks(
+        self,
+        doc_version_id: UUID,
+        chunk_objects: Sequence[Chunk],
+        section_paths: Collection[str] | None = None,
+    ) -> int:
+        """
+        Удаляет существующие chunks версии (только секций section_paths, если заданы)
+        и записывает chunk_objects (результат build_chunks).
+
+        Returns:
+            Количество созданных chunks
+        """
+        if section_paths is not None and not section_paths:
+            return 0
+
+        delete_stmt = delete(Chunk).where(Chunk.doc_version_id == doc_version_id)
+        if section_paths is not None:
+            delete_stmt = delete_stmt.where(Chunk.section_path.in_(list(section_paths)))
+        del_res = await self.db.execute(delete_stmt)
         await self.db.flush()
         try:
             deleted = int(getattr(del_res, "rowcount", 0) or 0)
@@ -92,29 +207,37 @@ class ChunkingService:
             deleted = 0
         logger.debug(f"Chunking: удалено старых chunks={deleted} для doc_version_id={doc_version_id}")
 
-        # 2) Загружаем anchors нужных типов (включая cell для табличных чанков)
-        allowed_types = {
-            AnchorContentType.HDR,
-            AnchorContentType.P,
-            AnchorContentType.LI,
-            AnchorContentType.FN,
-            AnchorContentType.TBL,
-            AnchorContentType.CELL,
-        }
-
-        anchors_stmt = (
-            select(Anchor)
-            .where(Anchor.doc_version_id == doc_version_id)
-            .where(Anchor.content_type.in_(allowed_types))
+        if chunk_objects:
+            await bulk_insert_chunks(self.db, chunk_objects)
+
+        logger.info(
+            f"Chunking: создано {len(chunk_objects)} chunks для doc_version_id={doc_version_id}"
+        )
+        logger.debug(
+            "Chunking: готово replace_chunks "
+            f"(doc_version_id={doc_version_id}, chunks_created={len(chunk_objects)})"
         )
-        anchors = (await self.db.execute(anchors_stmt)).scalars().all()
+        return len(chunk_objects)
+
+    def build_chunks(
+        self,
+        doc_version_id: UUID,
+        anchors: Sequence[Anchor],
+        max_tokens: int = 450,
+    ) -> list[Chunk]:
+        """
+        Собирает chunks (с embedding) из anchors без обращения к БД.
+
+        Чистая CPU-работа над данными в памяти: ингестия выполняет её в потоке,
+        параллельно с другими стадиями (app/services/ingestion/pipeline.py).
+        """
         if not anchors:
             logger.info(f"Chunking: нет anchors для doc_version_id={doc_version_id}")
-            return 0
+            return []
         logger.debug(
             "Chunking: загружены anchors "
             f"(doc_version_id={doc_version_id}, count={len(anchors)}, "
-            f"allowed_types={[t.value for t in sorted(allowed_types, key=lambda x: x.value)]})"
+            f"allowed_types={[t.value for t in sorted(CHUNK_ANCHOR_TYPES, key=lambda x: x.value)]})"
         )
 
         # 3) Группируем по section_path
@@ -127,6 +250,7 @@ class ChunkingService:
         )
 
         chunk_objects: list[Chunk] = []
+        chunk_texts_norm: list[str] = []
 
         # 4) Внутри каждой секции собираем chunks по rough token estimate (chars/4)
         for section_path, sec_anchors in by_section.items():
@@ -187,7 +311,8 @@ class ChunkingService:
                 chunk_id = f"{doc_version_id}:{section_path}:{chunk_ordinal}:{text_hash16}"
 
                 token_estimate = max(1, int(len(text_norm) / 4)) if text_norm else 0
-                embedding = _hash_embedding_v1(text_norm, dims=1536)
+                # embedding считается пакетом для всех chunks документа (см. ниже)
+                chunk_texts_norm.append(text_norm)
 
                 # Определяем source_zone: most_common zone среди anchor_ids в chunk
                 chunk_source_zones = [
@@ -244,7 +369,7 @@ class ChunkingService:
                         section_path=section_path,
                         text=text,
                         anchor_ids=cur_anchor_ids,
-                        embedding=embedding,
+                        embedding=None,
                         metadata_json=metadata,
                         source_zone=source_zone,
                         language=chunk_language,
@@ -372,17 +497,10 @@ class ChunkingService:
             )
 
         if chunk_objects:
-            self.db.add_all(chunk_objects)
-            await self.db.flush()
-
-        logger.info(
-            f"Chunking: создано {len(chunk_objects)} chunks для doc_version_id={doc_version_id}"
-        )
-        logger.debug(
-            "Chunking: готово rebuild_chunks_for_doc_version "
-            f"(doc_version_id={doc_version_id}, chunks_created={len(chunk_objects)})"
-        )
-        return len(chunk_objects)
+            embeddings = hash_embeddings_v1_batch(chunk_texts_norm, dims=1536)
+            for chunk, embedding in zip(chunk_objects, embeddings):
+                chunk.embedding = embedding
+        return chunk_objects
 
     def _format_cell_chunk_text(self, anchor: Anchor) -> str:
         """
@@ -0,0 +1,213 @@
+"""
+Content-addressed кэш эмбеддингов: in-process LRU + таблица embedding_cache.
+
+Ключ — (provider, model, dims, sha256(text)). Используется TopicMappingService
+(эмбеддинги заголовков блоков) и скриптами векторизации топиков, чтобы повторная
+ингестия неизменённого документа не делала HTTP-запросов к провайдеру.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import LLMProvider, settings
+from app.core.logging import logger
+from app.db.models.embedding_cache import EmbeddingCacheEntry
+
+CacheKey = tuple[str, str, int, str]
+
+
+def embedding_dimension(model: str, provider: LLMProvider | None) -> int:
+    """
+    Определяет размерность эмбеддинга для модели.
+
+    Args:
+        model: Название модели
+        provider: Провайдер LLM
+
+    Returns:
+        Размерность эмбеддинга (по умолчанию 1536)
+    """
+    # YandexGPT использует 256 измерений
+    if provider == LLMProvider.YANDEXGPT:
+        return 256
+    # OpenAI text-embedding-3-small использует 1536 измерений
+    if "text-embedding-3-small" in model:
+        return 1536
+    # OpenAI text-embedding-3-large использует 3072 измерения
+    if "text-embedding-3-large" in model:
+        return 3072
+    # По умолчанию 1536 (для text-embedding-ada-002 и других)
+    return 1536
+
+
+def text_hash(text: str) -> str:
+    """sha256 текста (hex) — content-адрес эмбеддинга."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _provider_key(provider: LLMProvider | str) -> str:
+    return provider.value if isinstance(provider, LLMProvider) else str(provider)
+
+
+class EmbeddingCache:
+    """Двухуровневый кэш эмбеддингов (LRU в памяти процесса + Postgres)."""
+
+    def __init__(self, max_size: int = 4096) -> None:
+        self.max_size = max_size
+        self._lru: OrderedDict[CacheKey, list[float]] = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: CacheKey, embedding: list[float]) -> None:
+        self._lru[key] = embedding
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_size:
+            self._lru.popitem(last=False)
+
+    @staticmethod
+    def _is_cacheable(embedding: list[float] | None, dims: int) -> bool:
+        # Нулевой вектор — fallback после ошибки провайдера, его не кэшируем
+        return bool(embedding) and len(embedding) == dims and any(x != 0.0 for x in embedding)
+
+    async def get(
+        self,
+        db: AsyncSession | None,
+        *,
+        provider: LLMProvider | str,
+        model: str,
+        dims: int,
+        text: str,
+    ) -> list[float] | None:
+        """Возвращает эмбеддинг из кэша (память, затем БД) или None."""
+        key: CacheKey = (_provider_key(provider), model, dims, text_hash(text))
+        cached = self._lru.get(key)
+        if cached is not None:
+            self._lru.move_to_end(key)
+            self.memory_hits += 1
+            return cached
+
+        if db is not None:
+            stmt = select(EmbeddingCacheEntry.embedding).where(
+                EmbeddingCacheEntry.provider == key[0],
+                EmbeddingCacheEntry.model == key[1],
+                EmbeddingCacheEntry.dims == key[2],
+                EmbeddingCacheEntry.text_hash == key[3],
+            )
+            stored = (await db.execute(stmt)).scalar_one_or_none()
+            if stored is not None:
+                embedding = [float(x) for x in stored]
+                self._remember(key, embedding)
+                self.db_hits += 1
+                return embedding
+
+        self.misses += 1
+        return None
+
+    async def put(
+        self,
+        db: AsyncSession | None,
+        *,
+        provider: LLMProvider | str,
+        model: str,
+        dims: int,
+        text: str,
+        embedding: list[float],
+    ) -> None:
+        """Сохраняет эмбеддинг в кэш (идемпотентно, нулевые векторы пропускаются)."""
+        if not self._is_cacheable(embedding, dims):
+            return
+        key: CacheKey = (_provider_key(provider), model, dims, text_hash(text))
+        self._remember(key, embedding)
+        if db is None:
+            return
+
+        stmt = (
+            pg_insert(EmbeddingCacheEntry)
+            .values(
+                provider=key[0],
+                model=key[1],
+                dims=key[2],
+                text_hash=key[3],
+                embedding=embedding,
+            )
+            .on_conflict_do_nothing()
+        )
+        try:
+            # SAVEPOINT: ошибка записи в кэш не должна ломать транзакцию вызывающего кода
+            async with db.begin_nested():
+                await db.execute(stmt)
+        except Exception as e:  # noqa: BLE001
+            logger.warning(f"Не удалось сохранить эмбеддинг в embedding_cache: {e}")
+
+    async def get_or_compute(
+        self,
+        db: AsyncSession | None,
+        *,
+        provider: LLMProvider | str,
+        model: str,
+        dims: int,
+        text: str,
+        compute: Callable[[], Awaitable[list[float] | None]],
+    ) -> list[float] | None:
+        """
+        Возвращает эмбеддинг из кэша или вычисляет его через compute() и сохраняет.
+
+        Args:
+            db: Сессия БД (None — только in-process LRU)
+            provider: Провайдер эмбеддингов
+            model: Модель эмбеддингов
+            dims: Ожидаемая размерность
+            text: Векторизуемый текст
+            compute: Корутина-фабрика, выполняющая запрос к провайдеру
+
+        Returns:
+            Эмбеддинг (или результат compute(), если его нельзя кэшировать)
+        """
+        if settings.embedding_cache_enabled:
+            cached = await self.get(db, provider=provider, model=model, dims=dims, text=text)
+            if cached is not None:
+                return cached
+
+        embedding = await compute()
+        if settings.embedding_cache_enabled and embedding is not None:
+            await self.put(
+                db, provider=provider, model=model, dims=dims, text=text, embedding=embedding
+            )
+        return embedding
+
+    def clear(self) -> None:
+        """Очищает in-process LRU и счётчики."""
+        self._lru.clear()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, Any]:
+        """Статистика попаданий (для логов/метрик)."""
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "lru_size": len(self._lru),
+        }
+
+
+# Глобальный экземпляр кэша (LRU разделяется всеми сервисами процесса)
+_embedding_cache_instance: EmbeddingCache | None = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Получить глобальный экземпляр EmbeddingCache."""
+    global _embedding_cache_instance
+    if _embedding_cache_instance is None:
+        _embedding_cache_instance = EmbeddingCache(max_size=settings.embedding_cache_lru_size)
+    return _embedding_cache_instance
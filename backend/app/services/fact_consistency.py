@@ -28,12 +28,13 @@ class FactConsistencyService:
     def __init__(self, db: AsyncSession) -> None:
         self.db = db
 
-    async def check_study_consistency(self, study_id: UUID) -> list[Conflict]:
+    async def check_study_consistency(self, study_id: UUID, *, commit: bool = True) -> list[Conflict]:
         """
         Проверяет все активные факты исследования на логические противоречия и конфликты.
 
         Args:
             study_id: ID исследования для проверки
+            commit: Делать commit; False — только flush, транзакцией управляет вызывающий код (ингестия)
 
         Returns:
             Список обнаруженных Conflict объектов
@@ -92,12 +93,15 @@ class FactConsistencyService:
             )
             self.db.add(conflict_item)
 
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
+        else:
+            await self.db.flush()
 
         # Создаём задачи для критических конфликтов
         critical_conflicts = [c for c in conflicts if c.severity == ConflictSeverity.CRITICAL]
         if critical_conflicts:
-            await self._create_resolve_conflict_tasks(study_id, critical_conflicts)
+            await self._create_resolve_conflict_tasks(study_id, critical_conflicts, commit=commit)
 
         logger.info(
             f"Проверка завершена: найдено {len(conflicts)} конфликтов "
@@ -476,9 +480,9 @@ class FactConsistencyService:
         return [ev.anchor_id for ev in evidences]
 
     async def _create_resolve_conflict_tasks(
-        self, study_id: UUID, critical_conflicts: list[Conflict]
+        self, study_id: UUID, critical_conflicts: list[Conflict], commit: bool = True
     ) -> None:
-        """Создаёт системные задачи для разрешения критических конфликтов."""
+        """Создаёт системные задачи для разрешения критических конфликтов (commit=False — только flush)."""
         # Загружаем все существующие задачи для этого исследования
         stmt = select(Task).where(
             Task.study_id == study_id,
@@ -520,7 +524,10 @@ class FactConsistencyService:
             self.db.add(task)
             logger.info(f"Создана задача resolve_conflict для конфликта {conflict.id}")
 
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
+        else:
+            await self.db.flush()
 
     def _extract_main_value(self, value: Any) -> Any:
         """Извлекает основное значение из value_json."""
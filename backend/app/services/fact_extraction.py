@@ -5,7 +5,7 @@ from __future__ import annotations
 import json
 import re
 from collections import defaultdict
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
 from sqlalchemy import delete, select
@@ -13,12 +13,14 @@ from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.logging import logger
+from app.db.bulk_copy import bulk_insert_fact_evidence
 from app.db.enums import AnchorContentType, EvidenceRole, FactStatus
 from app.db.models.anchors import Anchor
 from app.db.models.facts import Fact, FactEvidence
 from app.db.models.sections import TargetSectionMap
 from app.db.models.studies import Document, DocumentVersion
 from app.db.models.topics import TopicEvidence
+from app.services.fact_extraction_matcher import CompiledRuleSet, compile_rules
 from app.services.fact_extraction_rules import (
     EXTRACTOR_VERSION,
     ExtractionRule,
@@ -27,6 +29,9 @@ from app.services.fact_extraction_rules import (
 )
 from app.services.value_normalizer import ValueNormalizer, ValueNormalizationResult
 
+if TYPE_CHECKING:
+    from app.services.ingestion.anchor_snapshot import AnchorSnapshot
+
 
 class FactExtractionResult:
     """Результат извлечения фактов."""
@@ -72,6 +77,11 @@ class FactExtractionService:
             self._rules_cache = get_extraction_rules()
         return self._rules_cache
 
+    @property
+    def compiled_rules(self) -> CompiledRuleSet:
+        """Правила с префильтром по литералам (компилируются один раз на процесс)."""
+        return compile_rules(self.rules)
+
     @property
     def value_normalizer(self) -> ValueNormalizer:
         """Кэшированный нормализатор значений."""
@@ -79,10 +89,18 @@ class FactExtractionService:
             self._value_normalizer = ValueNormalizer()
         return self._value_normalizer
 
-    async def extract_and_upsert(self, doc_version_id: UUID, *, commit: bool = True) -> FactExtractionResult:
+    async def extract_and_upsert(
+        self,
+        doc_version_id: UUID,
+        *,
+        commit: bool = True,
+        anchor_snapshot: AnchorSnapshot | None = None,
+    ) -> FactExtractionResult:
         """
         Извлекает факты из документа и сохраняет их в БД.
 
+        anchor_snapshot — снимок anchors текущей ингестии (вместо чтения anchors из БД).
+
         Реализация rules-first (без LLM):
         - Загружаем anchors версии документа по типам: hdr/p/li/fn
         - Сортируем: hdr первыми, затем p/li/fn, затем ordinal
@@ -100,7 +118,7 @@ class FactExtractionService:
 
         study_id = doc_version.document.study_id
 
-        anchors = await self._load_anchors_for_fact_extraction(doc_version_id)
+        anchors = await self._load_anchors_for_fact_extraction(doc_version_id, anchor_snapshot)
         logger.info(f"Загружено {len(anchors)} anchors для извлечения фактов")
         allowed_anchor_ids = {a.anchor_id for a in anchors}
 
@@ -132,8 +150,8 @@ class FactExtractionService:
         for cand in all_candidates:
             candidates_by_key[(cand.fact_type, cand.fact_key)].append(cand)
 
-        # Upsert фактов с внутренним арбитражем для одного документа
-        upserted: list[Fact] = []
+        # Внутренний арбитраж для одного документа
+        arbitrated: list[tuple[str, str, ExtractedFactCandidate, list[ExtractedFactCandidate]]] = []
         logger.info(f"Обрабатываем {len(candidates_by_key)} уникальных фактов (fact_type.fact_key)")
         for (fact_type, fact_key), candidates in candidates_by_key.items():
             logger.debug(f"Обрабатываем факт {fact_type}.{fact_key}: {len(candidates)} кандидатов")
@@ -149,12 +167,19 @@ class FactExtractionService:
             if alternatives:
                 logger.info(f"Факт {fact_type}.{fact_key}: выбрано лучшее значение (confidence={best_candidate.confidence:.2f}), {len(alternatives)} альтернатив с отличающимися значениями")
 
-            # Применяем Value Normalizer для двойной проверки (GxP)
-            normalized_candidate = await self._normalize_fact_value(
-                candidate=best_candidate,
-                anchors=anchors,
-            )
-            
+            arbitrated.append((fact_type, fact_key, best_candidate, alternatives))
+
+        # Применяем Value Normalizer для двойной проверки (GxP) — сразу для всех фактов
+        normalized_candidates = await self._normalize_fact_values(
+            candidates=[best_candidate for _, _, best_candidate, _ in arbitrated],
+            anchors=anchors,
+        )
+
+        # Upsert фактов
+        upserted: list[Fact] = []
+        for (fact_type, fact_key, best_candidate, alternatives), normalized_candidate in zip(
+            arbitrated, normalized_candidates
+        ):
             # Используем нормализованный кандидат вместо исходного
             if normalized_candidate:
                 best_candidate = normalized_candidate
@@ -316,21 +341,26 @@ class FactExtractionService:
                 return rule.priority
         return 100  # Дефолтный приоритет
 
-    async def _load_anchors_for_fact_extraction(self, doc_version_id: UUID) -> list[Anchor]:
-        """Загружает anchors для извлечения фактов."""
+    async def _load_anchors_for_fact_extraction(
+        self, doc_version_id: UUID, anchor_snapshot: AnchorSnapshot | None = None
+    ) -> list[Anchor]:
+        """Загружает anchors для извлечения фактов (из снимка ингестии, если он передан)."""
         allowed_types = [
             AnchorContentType.HDR,
             AnchorContentType.P,
             AnchorContentType.LI,
             AnchorContentType.FN,
         ]
-        stmt = (
-            select(Anchor)
-            .where(Anchor.doc_version_id == doc_version_id)
-            .where(Anchor.content_type.in_(allowed_types))
-        )
-        res = await self.db.execute(stmt)
-        anchors = res.scalars().all()
+        if anchor_snapshot is not None:
+            anchors = anchor_snapshot.select(allowed_types)
+        else:
+            stmt = (
+                select(Anchor)
+                .where(Anchor.doc_version_id == doc_version_id)
+                .where(Anchor.content_type.in_(allowed_types))
+            )
+            res = await self.db.execute(stmt)
+            anchors = list(res.scalars().all())
 
         def _type_bucket(ct: AnchorContentType) -> int:
             # hdr first, then p/li/fn
@@ -414,65 +444,54 @@ class FactExtractionService:
         topic_mappings = topic_mappings or {}
         anchor_topic_mapping = anchor_topic_mapping or {}
 
+        # Однократное сканирование anchors префильтром литералов: полный regex правила
+        # запускается только на anchors, где найдены обязательные литералы его паттернов
+        compiled = self.compiled_rules
+        scan = compiled.scan([anchor.text_raw or anchor.text_norm for anchor in anchors])
+        # Признак "anchor относится к preferred_topics" — общий для правил с одинаковыми топиками
+        priority_flags_cache: dict[tuple[str, ...], list[bool]] = {}
+
         # Применяем каждое правило
         logger.info(f"Применяем {len(self.rules)} правил извлечения фактов")
-        for rule in self.rules:
+        for rule_index, rule in enumerate(self.rules):
             logger.debug(f"Применяем правило: {rule.fact_type}.{rule.fact_key} (priority={rule.priority})")
             # Мета-факты (protocol_version, protocol_date, sponsor_name) ищем по всему документу,
-            # игнорируя source_zone, так как они могут быть в любой части документа
-            is_meta_fact = (
-                rule.fact_type == "protocol_meta" 
-                and rule.fact_key in ("protocol_version", "protocol_date", "sponsor_name")
-            )
-            
-            # Разделяем anchors на priority_anchors и fallback_anchors
-            priority_anchors: list[Anchor] = []
-            fallback_anchors: list[Anchor] = []
-            
-            if is_meta_fact:
-                # Для мета-фактов ищем по всему документу, все anchors идут в fallback
-                # (но также проверяем preferred_topics для приоритета)
-                if rule.preferred_topics and anchor_topic_mapping:
+            # игнорируя source_zone: как и для остальных правил, anchors делятся только
+            # по пересечению топиков anchor с rule.preferred_topics.
+            priority_flags: list[bool] | None = None
+            if rule.preferred_topics and anchor_topic_mapping:
+                topics_key = tuple(rule.preferred_topics)
+                priority_flags = priority_flags_cache.get(topics_key)
+                if priority_flags is None:
                     preferred_topic_set = set(rule.preferred_topics)
-                    for anchor in anchors:
-                        anchor_topics = anchor_topic_mapping.get(anchor.anchor_id, set())
-                        # Если есть пересечение топиков anchor с preferred_topics правила
-                        if preferred_topic_set & anchor_topics:
-                            priority_anchors.append(anchor)
-                        else:
-                            # Для мета-фактов включаем все anchors, даже с source_zone == 'unknown'
-                            fallback_anchors.append(anchor)
-                else:
-                    # Если у правила нет preferred_topics, все anchors идут в fallback
-                    fallback_anchors = anchors
-            elif rule.preferred_topics and anchor_topic_mapping:
-                # Определяем, какие anchor_ids относятся к preferred_topics
-                preferred_topic_set = set(rule.preferred_topics)
-                for anchor in anchors:
-                    anchor_topics = anchor_topic_mapping.get(anchor.anchor_id, set())
-                    # Если есть пересечение топиков anchor с preferred_topics правила
-                    if preferred_topic_set & anchor_topics:
-                        priority_anchors.append(anchor)
-                    else:
-                        fallback_anchors.append(anchor)
-            else:
+                    priority_flags = [
+                        bool(preferred_topic_set & anchor_topic_mapping.get(anchor.anchor_id, set()))
+                        for anchor in anchors
+                    ]
+                    priority_flags_cache[topics_key] = priority_flags
+
+            # Разделяем anchors-кандидаты на priority и fallback (в исходном порядке)
+            candidate_indices = compiled.anchors_for_rule(rule_index, scan)
+            if priority_flags is None:
                 # Если у правила нет preferred_topics, все anchors идут в fallback
-                fallback_anchors = anchors
+                priority_indices: list[int] = []
+                fallback_indices = candidate_indices
+            else:
+                priority_indices = [i for i in candidate_indices if priority_flags[i]]
+                fallback_indices = [i for i in candidate_indices if not priority_flags[i]]
 
             # Собираем кандидаты для этого правила
             priority_candidates: list[ExtractedFactCandidate] = []
             fallback_candidates: list[ExtractedFactCandidate] = []
             
             # ШАГ 1: Применяем regex-паттерны к priority_anchors
-            logger.debug(f"Правило {rule.fact_type}.{rule.fact_key}: проверяем {len(priority_anchors)} приоритетных anchors")
-            for anchor in priority_anchors:
-                text = anchor.text_raw or anchor.text_norm
-                if not text:
-                    continue
-
-                # Пробуем RU и EN паттерны
-                for pattern in rule.patterns_ru + rule.patterns_en:
-                    match = pattern.search(text)
+            logger.debug(f"Правило {rule.fact_type}.{rule.fact_key}: проверяем {len(priority_indices)} приоритетных anchors")
+            for anchor_index in priority_indices:
+                anchor = anchors[anchor_index]
+                text = scan.texts[anchor_index]
+
+                # Пробуем RU и EN паттерны (только те, чьи литералы найдены в тексте)
+                for match in compiled.iter_searches(rule_index, text, scan.candidates[anchor_index]):
                     if match:
                         logger.info(f"Правило {rule.fact_type}.{rule.fact_key}: найдено совпадение в приоритетном anchor {anchor.anchor_id[:50]}... | Текст: {text[:100]}...")
                         # Парсим значение
@@ -531,15 +550,13 @@ class FactExtractionService:
 
             # ШАГ 2: Если в приоритетных ничего не найдено, применяем правила к fallback_anchors
             if not priority_candidates:
-                logger.debug(f"Правило {rule.fact_type}.{rule.fact_key}: совпадений в приоритетных не найдено, проверяем {len(fallback_anchors)} fallback anchors")
-                for anchor in fallback_anchors:
-                    text = anchor.text_raw or anchor.text_norm
-                    if not text:
-                        continue
-
-                    # Пробуем RU и EN паттерны
-                    for pattern in rule.patterns_ru + rule.patterns_en:
-                        match = pattern.search(text)
+                logger.debug(f"Правило {rule.fact_type}.{rule.fact_key}: совпадений в приоритетных не найдено, проверяем {len(fallback_indices)} fallback anchors")
+                for anchor_index in fallback_indices:
+                    anchor = anchors[anchor_index]
+                    text = scan.texts[anchor_index]
+
+                    # Пробуем RU и EN паттерны (только те, чьи литералы найдены в тексте)
+                    for match in compiled.iter_searches(rule_index, text, scan.candidates[anchor_index]):
                         if match:
                             logger.info(f"Правило {rule.fact_type}.{rule.fact_key}: найдено совпадение в fallback anchor {anchor.anchor_id[:50]}... | Текст: {text[:100]}...")
                             # Парсим значение
@@ -748,36 +765,55 @@ class FactExtractionService:
 
         return candidates
 
-    async def _normalize_fact_value(
+    async def _normalize_fact_values(
         self,
-        candidate: ExtractedFactCandidate,
+        candidates: list[ExtractedFactCandidate],
         anchors: list[Anchor],
+    ) -> list[ExtractedFactCandidate | None]:
+        """
+        Применяет Value Normalizer для двойной проверки значений фактов (GxP).
+
+        LLM-запросы по всем фактам документа выполняются конкурентно (и, при
+        value_normalization_batch_size > 1, пакетами) — см. ValueNormalizer.normalize_values.
+
+        Returns:
+            Для каждого кандидата: обновленный кандидат с нормализованным значением и статусом,
+            или None если не требуется нормализация
+        """
+        # Индекс anchor_id -> текст строится один раз на документ
+        anchor_texts: dict[str, str] = {}
+        for anchor in anchors:
+            anchor_texts.setdefault(anchor.anchor_id, anchor.text_raw or anchor.text_norm or "")
+
+        items: list[tuple[ExtractedFactCandidate, str]] = []
+        for candidate in candidates:
+            # Получаем текст фрагмента из первого evidence anchor
+            text_fragment = ""
+            if candidate.evidence_anchor_ids:
+                text_fragment = anchor_texts.get(candidate.evidence_anchor_ids[0], "")
+            if not text_fragment:
+                # Если не нашли текст, используем raw_value как fallback
+                text_fragment = candidate.raw_value or ""
+            items.append((candidate, text_fragment))
+
+        # Применяем нормализатор
+        normalization_results = await self.value_normalizer.normalize_values(items)
+        return [
+            self._apply_value_normalization(candidate, normalization_result)
+            for candidate, normalization_result in zip(candidates, normalization_results)
+        ]
+
+    def _apply_value_normalization(
+        self,
+        candidate: ExtractedFactCandidate,
+        normalization_result: ValueNormalizationResult,
     ) -> ExtractedFactCandidate | None:
         """
-        Применяет Value Normalizer для двойной проверки значения факта (GxP).
-        
+        Переносит результат Value Normalizer в кандидата (статус и meta_json.value_normalization).
+
         Returns:
             Обновленный кандидат с нормализованным значением и статусом, или None если не требуется нормализация
         """
-        # Получаем текст фрагмента из первого evidence anchor
-        text_fragment = ""
-        if candidate.evidence_anchor_ids:
-            anchor_id = candidate.evidence_anchor_ids[0]
-            for anchor in anchors:
-                if anchor.anchor_id == anchor_id:
-                    text_fragment = anchor.text_raw or anchor.text_norm or ""
-                    break
-        
-        if not text_fragment:
-            # Если не нашли текст, используем raw_value как fallback
-            text_fragment = candidate.raw_value or ""
-        
-        # Применяем нормализатор
-        normalization_result = await self.value_normalizer.normalize_value(
-            candidate=candidate,
-            text_fragment=text_fragment,
-        )
-        
         # Если статус изменился (validated или conflicting), обновляем кандидата
         # Также обрабатываем случай, когда LLM вернула пустое значение (статус EXTRACTED)
         if normalization_result.status in (FactStatus.VALIDATED, FactStatus.CONFLICTING, FactStatus.EXTRACTED):
@@ -1315,10 +1351,7 @@ class FactExtractionService:
         valid_anchor_ids = _dedupe_keep_order(valid_anchor_ids)
 
         # Все evidence помечаем как PRIMARY (можно расширить логику)
-        for aid in valid_anchor_ids:
-            self.db.add(FactEvidence(fact_id=fact_id, anchor_id=aid, evidence_role=EvidenceRole.PRIMARY))
-
-        await self.db.flush()
+        await bulk_insert_fact_evidence(self.db, fact_id, valid_anchor_ids, EvidenceRole.PRIMARY)
 
 
 def _dedupe_keep_order(items: list[str]) -> list[str]:
@@ -0,0 +1,350 @@
+"""
+Скомпилированный мульти-паттерн матчер для правил извлечения фактов.
+
+Наивный обход "правило × anchor × паттерн" запускает каждый regex на каждом anchor.
+Здесь для каждого паттерна из его AST (re._parser) выводится набор обязательных
+литералов: любое совпадение паттерна содержит хотя бы один из них. Все литералы
+собираются в один trie-regex (аналог Aho-Corasick на движке re), которым каждый
+anchor сканируется один раз. Полный regex правила запускается только на anchors,
+где найден хотя бы один его литерал.
+
+Паттерны, для которых обязательные литералы вывести нельзя (например, чистые
+классы символов), выполняются без префильтра. Поэтому результат совпадает с
+наивным обходом: пропускаются только те pattern.search(), которые гарантированно
+вернули бы None.
+"""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Iterator, Sequence
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import product
+
+try:  # Python 3.11+
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:  # pragma: no cover - Python < 3.11
+    import sre_constants  # type: ignore[no-redef]
+    import sre_parse  # type: ignore[no-redef]
+
+from app.services.fact_extraction_rules import ExtractionRule
+
+# Литералы короче этого порога не фильтруют (встречаются почти в каждом тексте)
+MIN_LITERAL_LEN = 2
+# Ограничение на размер множества строк при раскрытии альтернатив/классов символов
+MAX_LITERAL_SET = 64
+# Класс символов раскрывается в литералы, только если он не шире этого
+MAX_CHARSET_EXPAND = 4
+
+# Символы, из которых строятся литералы (в нижнем регистре)
+_SAFE_CHARS = frozenset(
+    "abcdefghijklmnopqrstuvwxyz0123456789"
+    "абвгдеёжзийклмнопрстуфхцчшщъыьэюя"
+    " .,:;#№%/-+()<>=_'\"&"
+)
+
+_REPEAT_OPS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, "POSSESSIVE_REPEAT"):
+    _REPEAT_OPS.add(sre_constants.POSSESSIVE_REPEAT)
+
+
+@dataclass(frozen=True)
+class _Info:
+    """
+    Сведения о подвыражении.
+
+    exact: все строки, которые подвыражение может сопоставить (None — бесконечно/неизвестно)
+    required: строки, хотя бы одна из которых входит в любое совпадение (None — нет гарантий)
+    """
+
+    exact: frozenset[str] | None
+    required: frozenset[str] | None
+
+
+_EMPTY = _Info(exact=frozenset({""}), required=None)
+_UNKNOWN = _Info(exact=None, required=None)
+
+
+class _CaseFolder:
+    """
+    Приведение текста к виду, в котором ищутся литералы.
+
+    Для символов из _SAFE_CHARS эквивалентность re.IGNORECASE почти везде совпадает
+    с str.lower(); исключения ("ſ" ~ "s", "ı"/"İ" ~ "i", "ᲀ" ~ "в" и т.п.) вычисляются
+    самим движком re и заменяются через translate до lower().
+    """
+
+    def __init__(self) -> None:
+        bmp = "".join(chr(code) for code in range(0x10000))
+        self.extra: dict[int, str] = {}
+        for ch in _SAFE_CHARS:
+            for equivalent in re.findall(re.escape(ch), bmp, re.IGNORECASE):
+                if equivalent.lower() != ch:
+                    self.extra[ord(equivalent)] = ch
+        self._extra_re = (
+            re.compile("[" + "".join(re.escape(chr(code)) for code in self.extra) + "]")
+            if self.extra
+            else None
+        )
+
+    def fold(self, text: str) -> str:
+        if self._extra_re is not None and self._extra_re.search(text):
+            text = text.translate(self.extra)
+        return text.lower()
+
+
+@lru_cache(maxsize=1)
+def _case_folder() -> _CaseFolder:
+    return _CaseFolder()
+
+
+def _literal_char(code: int) -> str | None:
+    ch = chr(code).lower()
+    return ch if len(ch) == 1 and ch in _SAFE_CHARS else None
+
+
+def _set_score(strings: frozenset[str] | None) -> int:
+    """Качество набора литералов: длина самого короткого (0 — бесполезен)."""
+    if not strings:
+        return 0
+    shortest = min(len(s) for s in strings)
+    return shortest if shortest >= MIN_LITERAL_LEN else 0
+
+
+def _better(a: frozenset[str] | None, b: frozenset[str] | None) -> frozenset[str] | None:
+    score_a, score_b = _set_score(a), _set_score(b)
+    if score_b > score_a or (score_b == score_a and score_b and len(b) < len(a)):  # type: ignore[arg-type]
+        return b
+    return a if score_a else None
+
+
+def _charset_info(items: list) -> _Info:
+    chars: set[str] = set()
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            ch = _literal_char(av)
+            if ch is None:
+                return _UNKNOWN
+            chars.add(ch)
+        else:  # NEGATE, RANGE, CATEGORY, ...
+            return _UNKNOWN
+        if len(chars) > MAX_CHARSET_EXPAND:
+            return _UNKNOWN
+    if not chars:
+        return _UNKNOWN
+    return _Info(exact=frozenset(chars), required=None)
+
+
+def _sequence_info(items: Sequence) -> _Info:
+    # run — строки текущей непрерывной цепочки точных элементов
+    run: frozenset[str] = frozenset({""})
+    run_is_whole = True  # цепочка покрывает всю последовательность с начала
+    best: frozenset[str] | None = None
+
+    for op, av in items:
+        info = _node_info(op, av)
+        if info.exact is not None:
+            joined = frozenset(a + b for a, b in product(run, info.exact))
+            if len(joined) <= MAX_LITERAL_SET:
+                run = joined
+                continue
+        # Цепочка прервалась: она — кандидат в обязательные литералы
+        best = _better(best, run)
+        best = _better(best, info.required)
+        run_is_whole = False
+        run = info.exact if info.exact is not None else frozenset({""})
+
+    best = _better(best, run)
+    return _Info(exact=run if run_is_whole else None, required=best)
+
+
+def _node_info(op, av) -> _Info:
+    if op is sre_constants.LITERAL:
+        ch = _literal_char(av)
+        return _Info(exact=frozenset({ch}), required=None) if ch is not None else _UNKNOWN
+    if op is sre_constants.IN:
+        return _charset_info(av)
+    if op is sre_constants.AT:
+        return _EMPTY
+    if op is sre_constants.SUBPATTERN:
+        return _sequence_info(av[-1])
+    if op is getattr(sre_constants, "ATOMIC_GROUP", None):
+        return _sequence_info(av)
+    if op is sre_constants.BRANCH:
+        branches = [_sequence_info(b) for b in av[1]]
+        exact: frozenset[str] | None = None
+        if all(b.exact is not None for b in branches):
+            union = frozenset().union(*(b.exact for b in branches))  # type: ignore[arg-type]
+            exact = union if len(union) <= MAX_LITERAL_SET else None
+        required: frozenset[str] | None = None
+        branch_sets = [b.exact if _set_score(b.exact) else b.required for b in branches]
+        if all(_set_score(s) for s in branch_sets):
+            union = frozenset().union(*branch_sets)  # type: ignore[arg-type]
+            required = union if len(union) <= MAX_LITERAL_SET else None
+        return _Info(exact=exact, required=required)
+    if op in _REPEAT_OPS:
+        min_count, max_count, sub = av
+        if min_count == 0:
+            return _UNKNOWN
+        info = _sequence_info(sub)
+        if min_count == 1 and max_count == 1:
+            return info
+        required = info.exact if _set_score(info.exact) else info.required
+        return _Info(exact=None, required=required)
+    # ANY, NOT_LITERAL, GROUPREF, ASSERT/ASSERT_NOT и т.п.: гарантий нет
+    return _UNKNOWN
+
+
+def required_literals(pattern: re.Pattern) -> frozenset[str] | None:
+    """
+    Набор литералов (в нижнем регистре), хотя бы один из которых содержится
+    в тексте при любом совпадении pattern. None — префильтр неприменим.
+    """
+    try:
+        parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    except re.error:
+        return None
+    info = _sequence_info(list(parsed))
+    required = info.exact if _set_score(info.exact) else info.required
+    return required if _set_score(required) else None
+
+
+def _trie_regex(literals: Sequence[str]) -> str:
+    """Regex в виде trie: на каждой позиции сопоставляет самый длинный литерал."""
+    trie: dict = {}
+    for lit in literals:
+        node = trie
+        for ch in lit:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def _build(node: dict) -> str:
+        terminal = "" in node
+        children = [(ch, child) for ch, child in sorted(node.items()) if ch != ""]
+        if not children:
+            return ""
+        alternatives = [re.escape(ch) + _build(child) for ch, child in children]
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        if terminal:
+            # Жадный необязательный хвост: сначала пробуем более длинный литерал
+            return body + "?" if len(alternatives) == 1 and len(body) == 1 else "(?:" + body + ")?"
+        return body
+
+    return _build(trie)
+
+
+class AnchorScan:
+    """Результат однократного сканирования текстов anchors."""
+
+    def __init__(self, texts: list[str | None], candidates: list[frozenset[int]]) -> None:
+        self.texts = texts
+        # Для каждого anchor — индексы паттернов, литералы которых найдены в тексте
+        self.candidates = candidates
+
+
+class CompiledRuleSet:
+    """Правила извлечения с префильтром по обязательным литералам."""
+
+    def __init__(self, rules: Sequence[ExtractionRule]) -> None:
+        # Паттерны правила в порядке обхода (patterns_ru + patterns_en) с глобальными индексами
+        self.rule_patterns: list[list[tuple[int, re.Pattern]]] = []
+        self.patterns: list[re.Pattern] = []
+        self.unfiltered: set[int] = set()
+        literal_to_patterns: dict[str, set[int]] = {}
+
+        for rule in rules:
+            entries: list[tuple[int, re.Pattern]] = []
+            for pattern in rule.patterns_ru + rule.patterns_en:
+                pid = len(self.patterns)
+                self.patterns.append(pattern)
+                entries.append((pid, pattern))
+                literals = required_literals(pattern)
+                if literals is None:
+                    self.unfiltered.add(pid)
+                    continue
+                for lit in literals:
+                    literal_to_patterns.setdefault(lit, set()).add(pid)
+            self.rule_patterns.append(entries)
+
+        literals = sorted(literal_to_patterns)
+        self._literal_set = frozenset(literals)
+        # Литерал, найденный на позиции, означает и все литералы-префиксы на той же позиции
+        self._patterns_by_found: dict[str, frozenset[int]] = {
+            lit: frozenset().union(
+                *(literal_to_patterns[p] for p in literals if lit.startswith(p))
+            )
+            for lit in literals
+        }
+        self._folder = _case_folder()
+        self._literal_re = re.compile(_trie_regex(literals)) if literals else None
+        self._rule_has_unfiltered = [
+            any(pid in self.unfiltered for pid, _ in entries) for entries in self.rule_patterns
+        ]
+
+    @property
+    def literal_count(self) -> int:
+        return len(self._literal_set)
+
+    def candidate_patterns(self, text: str) -> frozenset[int]:
+        """Индексы фильтруемых паттернов, чьи обязательные литералы есть в тексте."""
+        if self._literal_re is None:
+            return frozenset()
+        folded = self._folder.fold(text)
+        found: set[str] = set()
+        search = self._literal_re.search
+        match = search(folded)
+        while match is not None:
+            found.add(match.group())
+            match = search(folded, match.start() + 1)
+        if not found:
+            return frozenset()
+        return frozenset().union(*(self._patterns_by_found[lit] for lit in found))
+
+    def scan(self, texts: list[str | None]) -> AnchorScan:
+        """Сканирует все тексты один раз."""
+        return AnchorScan(
+            texts=texts,
+            candidates=[self.candidate_patterns(t) if t else frozenset() for t in texts],
+        )
+
+    def anchors_for_rule(self, rule_index: int, scan: AnchorScan) -> list[int]:
+        """Индексы anchors (в исходном порядке), на которых стоит запускать правило."""
+        if self._rule_has_unfiltered[rule_index]:
+            return [i for i, text in enumerate(scan.texts) if text]
+        pids = {pid for pid, _ in self.rule_patterns[rule_index]}
+        return [i for i, cands in enumerate(scan.candidates) if cands and not pids.isdisjoint(cands)]
+
+    def iter_searches(
+        self, rule_index: int, text: str, candidates: frozenset[int]
+    ) -> Iterator[re.Match | None]:
+        """
+        pattern.search(text) для паттернов правила в исходном порядке (RU, затем EN).
+
+        Паттерны, литералы которых не найдены в тексте, пропускаются: их search()
+        заведомо вернул бы None.
+        """
+        for pid, pattern in self.rule_patterns[rule_index]:
+            if pid in candidates or pid in self.unfiltered:
+                yield pattern.search(text)
+
+
+def _rules_key(rules: Sequence[ExtractionRule]) -> tuple:
+    return tuple(
+        tuple((p.pattern, p.flags) for p in rule.patterns_ru + rule.patterns_en) for rule in rules
+    )
+
+
+# Реестр правил статичен, поэтому анализ regex выполняется один раз на процесс
+_compiled_cache: dict[tuple, CompiledRuleSet] = {}
+
+
+def compile_rules(rules: Sequence[ExtractionRule]) -> CompiledRuleSet:
+    """Компилирует правила (кэшируется по набору паттернов)."""
+    key = _rules_key(rules)
+    compiled = _compiled_cache.get(key)
+    if compiled is None:
+        _compiled_cache.clear()
+        compiled = _compiled_cache[key] = CompiledRuleSet(rules)
+    return compiled
@@ -22,6 +22,7 @@ from app.schemas.generation import (
 )
 from app.services.lean_passport import LeanContextBuilder, normalize_passport
 from app.services.core_facts_extractor import CoreFactsExtractor
+from app.services.impact import index_generated_section_refs
 
 
 class GenerationService:
@@ -101,6 +102,8 @@ class GenerationService:
                 qc_report_json=qc_report.model_dump(),
             )
             self.db.add(generated_section)
+            await self.db.flush()
+            await index_generated_section_refs(self.db, generated_section)
             await self.db.commit()
             return GenerateSectionResult(
                 content_text="",
@@ -238,6 +241,9 @@ class GenerationService:
             qc_report_json=qc_report.model_dump(),
         )
         self.db.add(generated_section)
+        await self.db.flush()
+        # Обратный индекс ссылок секции для ImpactService
+        await index_generated_section_refs(self.db, generated_section)
 
         await self.db.commit()
         await self.db.refresh(generation_run)
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import hashlib
 from dataclasses import dataclass
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
 from sqlalchemy import select
@@ -15,6 +15,10 @@ from app.db.models.anchors import Anchor
 from app.services.source_zone_classifier import get_classifier
 
 
+if TYPE_CHECKING:
+    from app.services.ingestion.anchor_snapshot import AnchorSnapshot
+
+
 @dataclass
 class HeadingBlock:
     """Блок заголовка: заголовок + контент до следующего заголовка."""
@@ -37,7 +41,10 @@ class HeadingBlockBuilder:
         self.source_zone_classifier = get_classifier()
 
     async def build_blocks_for_doc_version(
-        self, doc_version_id: UUID, doc_type: Any
+        self,
+        doc_version_id: UUID,
+        doc_type: Any,
+        anchor_snapshot: AnchorSnapshot | None = None,
     ) -> list[HeadingBlock]:
         """
         Строит heading blocks для версии документа.
@@ -52,6 +59,7 @@ class HeadingBlockBuilder:
         Args:
             doc_version_id: ID версии документа
             doc_type: Тип документа (DocumentType enum)
+            anchor_snapshot: Снимок anchors текущей ингестии; None — anchors читаются из БД
 
         Returns:
             Список heading blocks
@@ -59,13 +67,16 @@ class HeadingBlockBuilder:
         logger.info(f"Построение heading blocks для doc_version_id={doc_version_id}")
 
         # Загружаем все anchors, отсортированные по ordinal
-        stmt = (
-            select(Anchor)
-            .where(Anchor.doc_version_id == doc_version_id)
-            .order_by(Anchor.ordinal)
-        )
-        result = await self.db.execute(stmt)
-        anchors = list(result.scalars().all())
+        if anchor_snapshot is not None:
+            anchors = anchor_snapshot.ordered_by_ordinal()
+        else:
+            stmt = (
+                select(Anchor)
+                .where(Anchor.doc_version_id == doc_version_id)
+                .order_by(Anchor.ordinal)
+            )
+            result = await self.db.execute(stmt)
+            anchors = list(result.scalars().all())
 
         if not anchors:
             logger.warning(f"Не найдено anchors для doc_version_id={doc_version_id}")
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import numpy as np
 from collections import Counter, defaultdict
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
 from sqlalchemy import select
@@ -22,6 +22,10 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_distances
 
 
+if TYPE_CHECKING:
+    from app.services.ingestion.anchor_snapshot import AnchorSnapshot
+
+
 def normalize_heading_text(text: str) -> str:
     """Нормализует текст заголовка для кластеризации."""
     if not text:
@@ -45,6 +49,7 @@ class HeadingClusteringService:
         threshold: float = 0.22,
         min_size: int = 3,
         embedding_threshold: float = 0.15,
+        anchor_snapshot: AnchorSnapshot | None = None,
     ) -> list[HeadingCluster]:
         """
         Кластеризует заголовки документа и сохраняет результаты.
@@ -54,6 +59,7 @@ class HeadingClusteringService:
             threshold: Порог distance для кластеризации (по умолчанию 0.22)
             min_size: Минимальный размер кластера (по умолчанию 3)
             embedding_threshold: Порог для merge по embeddings (по умолчанию 0.15)
+            anchor_snapshot: Снимок anchors текущей ингестии; None — anchors читаются из БД
 
         Returns:
             Список созданных/обновленных кластеров
@@ -61,13 +67,16 @@ class HeadingClusteringService:
         logger.info(f"Начало кластеризации заголовков для doc_version_id={doc_version_id}")
 
         # 1. Загружаем все HDR anchors для версии документа
-        stmt = select(Anchor).where(
-            Anchor.doc_version_id == doc_version_id,
-            Anchor.content_type == AnchorContentType.HDR,
-        ).order_by(Anchor.ordinal)
-        
-        result = await self.db.execute(stmt)
-        hdr_anchors = list(result.scalars().all())
+        if anchor_snapshot is not None:
+            hdr_anchors = anchor_snapshot.ordered_by_ordinal([AnchorContentType.HDR])
+        else:
+            stmt = select(Anchor).where(
+                Anchor.doc_version_id == doc_version_id,
+                Anchor.content_type == AnchorContentType.HDR,
+            ).order_by(Anchor.ordinal)
+
+            result = await self.db.execute(stmt)
+            hdr_anchors = list(result.scalars().all())
 
         if not hdr_anchors:
             logger.warning(f"Не найдено заголовков для doc_version_id={doc_version_id}")
@@ -87,7 +96,8 @@ class HeadingClusteringService:
             source_zone_value = anchor.source_zone.value if hasattr(anchor.source_zone, 'value') else anchor.source_zone
             anchor_data.append({
                 "anchor_id": anchor.anchor_id,
-                "anchor_uuid": str(anchor.id),
+                # id неизвестен у anchors из снимка ингестии (генерируется при COPY)
+                "anchor_uuid": str(anchor.id) if anchor.id is not None else None,
                 "section_path": anchor.section_path,
                 "text_raw": anchor.text_raw,
                 "language": language_value,
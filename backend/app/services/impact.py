@@ -3,7 +3,8 @@ from __future__ import annotations
 from typing import Any
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import Text, bindparam, delete, insert, select, union
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.logging import logger
@@ -12,13 +13,100 @@ from app.db.models.anchors import Anchor
 from app.db.models.anchor_matches import AnchorMatch
 from app.db.models.change import ChangeEvent, ImpactItem, Task
 from app.db.models.facts import Fact, FactEvidence
-from app.db.models.generation import GeneratedTargetSection, GenerationRun
+from app.db.models.generation import (
+    GeneratedSectionAnchorRef,
+    GeneratedSectionFactRef,
+    GeneratedTargetSection,
+    GenerationRun,
+)
 from app.db.models.studies import Document, DocumentVersion
 from app.db.models.topics import TopicEvidence
 from app.schemas.impact import ImpactItemOut
 from app.services.anchor_aligner import AnchorAligner
 
 
+def extract_anchor_ids_from_artifacts(artifacts_json: dict[str, Any]) -> set[str]:
+    """
+    Извлекает все anchor_id из artifacts_json.
+
+    Args:
+        artifacts_json: JSON с артефактами генерации
+
+    Returns:
+        Множество anchor_id
+    """
+    anchor_ids: set[str] = set()
+
+    # Извлекаем из citations (legacy)
+    if "citations" in artifacts_json and isinstance(artifacts_json["citations"], list):
+        anchor_ids.update(artifacts_json["citations"])
+
+    # Извлекаем из claim_items
+    if "claim_items" in artifacts_json and isinstance(artifacts_json["claim_items"], list):
+        for claim in artifacts_json["claim_items"]:
+            if isinstance(claim, dict) and "anchor_ids" in claim:
+                if isinstance(claim["anchor_ids"], list):
+                    anchor_ids.update(claim["anchor_ids"])
+
+    # Извлекаем из citation_items
+    if "citation_items" in artifacts_json and isinstance(artifacts_json["citation_items"], list):
+        for citation in artifacts_json["citation_items"]:
+            if isinstance(citation, dict) and "anchor_id" in citation:
+                anchor_ids.add(citation["anchor_id"])
+
+    return anchor_ids
+
+
+def extract_fact_keys_from_artifacts(artifacts_json: dict[str, Any]) -> set[str]:
+    """
+    Извлекает все fact_key из artifacts_json.
+
+    Args:
+        artifacts_json: JSON с артефактами генерации
+
+    Returns:
+        Множество fact_key
+    """
+    fact_keys: set[str] = set()
+
+    # Извлекаем из claim_items.fact_refs
+    if "claim_items" in artifacts_json and isinstance(artifacts_json["claim_items"], list):
+        for claim in artifacts_json["claim_items"]:
+            if isinstance(claim, dict) and "fact_refs" in claim:
+                if isinstance(claim["fact_refs"], list):
+                    fact_keys.update(claim["fact_refs"])
+
+    return fact_keys
+
+
+async def index_generated_section_refs(db: AsyncSession, section: GeneratedTargetSection) -> None:
+    """
+    Пересобирает обратный индекс ссылок секции (anchor_id / fact_key → секция).
+
+    Вызывается при сохранении секции после flush (нужен section.id); коммит — на вызывающей стороне.
+    """
+    artifacts_json = section.artifacts_json if isinstance(section.artifacts_json, dict) else {}
+    anchor_ids = sorted(a for a in extract_anchor_ids_from_artifacts(artifacts_json) if isinstance(a, str))
+    fact_keys = sorted(k for k in extract_fact_keys_from_artifacts(artifacts_json) if isinstance(k, str))
+
+    await db.execute(
+        delete(GeneratedSectionAnchorRef).where(GeneratedSectionAnchorRef.generated_section_id == section.id)
+    )
+    await db.execute(
+        delete(GeneratedSectionFactRef).where(GeneratedSectionFactRef.generated_section_id == section.id)
+    )
+    if anchor_ids:
+        await db.execute(
+            insert(GeneratedSectionAnchorRef),
+            [{"anchor_id": anchor_id, "generated_section_id": section.id} for anchor_id in anchor_ids],
+        )
+    if fact_keys:
+        await db.execute(
+            insert(GeneratedSectionFactRef),
+            [{"fact_key": fact_key, "generated_section_id": section.id} for fact_key in fact_keys],
+        )
+
+
 class ImpactService:
     """Сервис для вычисления воздействия изменений документов."""
 
@@ -102,65 +190,69 @@ class ImpactService:
                 "content_type": row[3].value if hasattr(row[3], "value") else str(row[3]),
             }
 
-        # Шаг 2: Находим все GeneratedTargetSection для этого исследования
-        stmt_sections = (
-            select(GeneratedTargetSection, GenerationRun)
+        # Шаг 2: Находим секции исследования, ссылающиеся на затронутые якоря
+        # (один join по индексу generated_section_anchor_refs)
+        stmt_refs = (
+            select(
+                GeneratedSectionAnchorRef.generated_section_id,
+                GenerationRun.target_doc_type,
+                GenerationRun.target_section,
+                GeneratedSectionAnchorRef.anchor_id,
+            )
+            .join(
+                GeneratedTargetSection,
+                GeneratedTargetSection.id == GeneratedSectionAnchorRef.generated_section_id,
+            )
             .join(GenerationRun, GeneratedTargetSection.generation_run_id == GenerationRun.id)
-            .where(GenerationRun.study_id == change_event.study_id)
+            .where(
+                GenerationRun.study_id == change_event.study_id,
+                GeneratedSectionAnchorRef.anchor_id.in_(list(affected_anchor_ids)),  # type: ignore
+            )
+            .order_by(GeneratedSectionAnchorRef.generated_section_id, GeneratedSectionAnchorRef.anchor_id)
         )
-        sec_res = await self.db.execute(stmt_sections)
-        rows = sec_res.all()
+        ref_rows = (await self.db.execute(stmt_refs)).all()
 
         # Группируем изменения по секциям
         # Структура: {(target_doc_type, target_section): [список измененных якорей]}
         sections_changes: dict[tuple[str, str], list[dict[str, Any]]] = {}
 
-        for section, gen_run in rows:
-            # Извлекаем все anchor_id из artifacts_json (используем существующий метод)
-            artifacts_json = section.artifacts_json if isinstance(section.artifacts_json, dict) else {}
-            section_anchor_ids = self._extract_anchor_ids_from_artifacts(artifacts_json)
-
-            # Находим пересечение с измененными/удаленными якорями
-            affected_in_section = section_anchor_ids & affected_anchor_ids
-
-            if affected_in_section:
-                section_key = (gen_run.target_doc_type.value, gen_run.target_section)
-                if section_key not in sections_changes:
-                    sections_changes[section_key] = []
-
-                # Формируем описания изменений для каждого якоря
-                for anchor_id in affected_in_section:
-                    anchor_info = anchor_info_map.get(anchor_id, {})
-                    section_path = anchor_info.get("section_path", "неизвестный раздел")
-                    ordinal = anchor_info.get("ordinal", 0)
-                    content_type = anchor_info.get("content_type", "p")
-
-                    if anchor_id in changed_anchor_ids:
-                        score, _ = anchor_matches_map[anchor_id]
-                        change_percent = int((1 - score) * 100)
-                        # Формируем описание в зависимости от типа контента
-                        if content_type == "li":
-                            description = f"Изменился текст пункта №{ordinal} в разделе {section_path} (изменение на {change_percent}%)"
-                        elif content_type == "p":
-                            description = f"Изменился текст параграфа в разделе {section_path} (изменение на {change_percent}%)"
-                        else:
-                            description = f"Изменился текст элемента в разделе {section_path} (изменение на {change_percent}%)"
-                    else:  # deleted
-                        if content_type == "li":
-                            description = f"Удален пункт №{ordinal} в разделе {section_path}"
-                        elif content_type == "p":
-                            description = f"Удален параграф в разделе {section_path}"
-                        else:
-                            description = f"Удален элемент в разделе {section_path}"
-
-                    sections_changes[section_key].append({
-                        "anchor_id": anchor_id,
-                        "section_path": section_path,
-                        "description": description,
-                        "ordinal": ordinal,
-                        "content_type": content_type,
-                        "is_deleted": anchor_id in deleted_anchor_ids,
-                    })
+        for _section_id, target_doc_type, target_section, anchor_id in ref_rows:
+            section_key = (target_doc_type.value, target_section)
+            if section_key not in sections_changes:
+                sections_changes[section_key] = []
+
+            # Формируем описание изменения якоря
+            anchor_info = anchor_info_map.get(anchor_id, {})
+            section_path = anchor_info.get("section_path", "неизвестный раздел")
+            ordinal = anchor_info.get("ordinal", 0)
+            content_type = anchor_info.get("content_type", "p")
+
+            if anchor_id in changed_anchor_ids:
+                score, _ = anchor_matches_map[anchor_id]
+                change_percent = int((1 - score) * 100)
+                # Формируем описание в зависимости от типа контента
+                if content_type == "li":
+                    description = f"Изменился текст пункта №{ordinal} в разделе {section_path} (изменение на {change_percent}%)"
+                elif content_type == "p":
+                    description = f"Изменился текст параграфа в разделе {section_path} (изменение на {change_percent}%)"
+                else:
+                    description = f"Изменился текст элемента в разделе {section_path} (изменение на {change_percent}%)"
+            else:  # deleted
+                if content_type == "li":
+                    description = f"Удален пункт №{ordinal} в разделе {section_path}"
+                elif content_type == "p":
+                    description = f"Удален параграф в разделе {section_path}"
+                else:
+                    description = f"Удален элемент в разделе {section_path}"
+
+            sections_changes[section_key].append({
+                "anchor_id": anchor_id,
+                "section_path": section_path,
+                "description": description,
+                "ordinal": ordinal,
+                "content_type": content_type,
+                "is_deleted": anchor_id in deleted_anchor_ids,
+            })
 
         # Шаг 3: Создаем ImpactItem для каждой затронутой секции
         impact_items: list[ImpactItem] = []
@@ -251,20 +343,13 @@ class ImpactService:
         if not anchor_ids:
             return []
 
-        # Получаем topic_evidence для этой версии
+        # Пересечение массивов (&&) по GIN-индексу topic_evidence.anchor_ids
         stmt = select(TopicEvidence).where(
-            TopicEvidence.doc_version_id == doc_version_id
+            TopicEvidence.doc_version_id == doc_version_id,
+            TopicEvidence.anchor_ids.op("&&")(bindparam("anchor_ids", sorted(anchor_ids), type_=ARRAY(Text))),
         )
         result = await self.db.execute(stmt)
-        all_topic_evidences = result.scalars().all()
-
-        # Фильтруем те, которые содержат затронутые anchor_ids
-        affected: list[TopicEvidence] = []
-        for topic_ev in all_topic_evidences:
-            if set(topic_ev.anchor_ids) & anchor_ids:
-                affected.append(topic_ev)
-
-        return affected
+        return list(result.scalars().all())
 
     async def _find_updated_fact_ids(
         self,
@@ -321,87 +406,30 @@ class ImpactService:
         Returns:
             Список затронутых GeneratedTargetSection
         """
-        # Получаем все GeneratedTargetSection для этого study_id
+        # Секции, найденные по обратному индексу ссылок (anchor_id / fact_key)
+        matching_section_ids = []
+        if changed_anchor_ids:
+            matching_section_ids.append(
+                select(GeneratedSectionAnchorRef.generated_section_id).where(
+                    GeneratedSectionAnchorRef.anchor_id.in_(list(changed_anchor_ids))  # type: ignore
+                )
+            )
+        if updated_fact_keys:
+            matching_section_ids.append(
+                select(GeneratedSectionFactRef.generated_section_id).where(
+                    GeneratedSectionFactRef.fact_key.in_(list(updated_fact_keys))  # type: ignore
+                )
+            )
+        if not matching_section_ids:
+            return []
+
         stmt = (
             select(GeneratedTargetSection)
             .join(GenerationRun)
-            .where(GenerationRun.study_id == study_id)
+            .where(
+                GenerationRun.study_id == study_id,
+                GeneratedTargetSection.id.in_(union(*matching_section_ids)),
+            )
         )
         result = await self.db.execute(stmt)
-        all_sections = result.scalars().all()
-
-        affected_sections: list[GeneratedTargetSection] = []
-
-        for section in all_sections:
-            artifacts_json = section.artifacts_json if isinstance(section.artifacts_json, dict) else {}
-
-            # Извлекаем anchor_ids из artifacts_json
-            section_anchor_ids = self._extract_anchor_ids_from_artifacts(artifacts_json)
-
-            # Извлекаем fact_keys из artifacts_json
-            section_fact_keys = self._extract_fact_keys_from_artifacts(artifacts_json)
-
-            # Проверяем, есть ли пересечение с измененными anchor_ids или обновленными фактами
-            if (section_anchor_ids & changed_anchor_ids) or (section_fact_keys & updated_fact_keys):
-                affected_sections.append(section)
-
-        return affected_sections
-
-    def _extract_anchor_ids_from_artifacts(
-        self,
-        artifacts_json: dict[str, Any],
-    ) -> set[str]:
-        """
-        Извлекает все anchor_id из artifacts_json.
-        
-        Args:
-            artifacts_json: JSON с артефактами генерации
-            
-        Returns:
-            Множество anchor_id
-        """
-        anchor_ids: set[str] = set()
-
-        # Извлекаем из citations (legacy)
-        if "citations" in artifacts_json and isinstance(artifacts_json["citations"], list):
-            anchor_ids.update(artifacts_json["citations"])
-
-        # Извлекаем из claim_items
-        if "claim_items" in artifacts_json and isinstance(artifacts_json["claim_items"], list):
-            for claim in artifacts_json["claim_items"]:
-                if isinstance(claim, dict) and "anchor_ids" in claim:
-                    if isinstance(claim["anchor_ids"], list):
-                        anchor_ids.update(claim["anchor_ids"])
-
-        # Извлекаем из citation_items
-        if "citation_items" in artifacts_json and isinstance(artifacts_json["citation_items"], list):
-            for citation in artifacts_json["citation_items"]:
-                if isinstance(citation, dict) and "anchor_id" in citation:
-                    anchor_ids.add(citation["anchor_id"])
-
-        return anchor_ids
-
-    def _extract_fact_keys_from_artifacts(
-        self,
-        artifacts_json: dict[str, Any],
-    ) -> set[str]:
-        """
-        Извлекает все fact_key из artifacts_json.
-        
-        Args:
-            artifacts_json: JSON с артефактами генерации
-            
-        Returns:
-            Множество fact_key
-        """
-        fact_keys: set[str] = set()
-
-        # Извлекаем из claim_items.fact_refs
-        if "claim_items" in artifacts_json and isinstance(artifacts_json["claim_items"], list):
-            for claim in artifacts_json["claim_items"]:
-                if isinstance(claim, dict) and "fact_refs" in claim:
-                    if isinstance(claim["fact_refs"], list):
-                        fact_keys.update(claim["fact_refs"])
-
-        return fact_keys
-
+        return list(result.scalars().all())
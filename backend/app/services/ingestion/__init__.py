@@ -1,35 +1,50 @@
 """Модули для ингестии документов."""
 from __future__ import annotations
 
+import asyncio
 import time
 import urllib.parse
-from datetime import datetime
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from functools import partial
 from pathlib import Path
 from typing import Any
-from uuid import UUID
+from uuid import UUID, uuid4
 
-from sqlalchemy import delete, select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.core.config import settings
 from app.core.logging import logger
-from app.db.enums import DocumentType, EvidenceRole, FactStatus, IngestionStatus, SectionMapStatus
+from app.db.bulk_copy import bulk_insert_anchors, bulk_insert_fact_evidence
+from app.db.enums import DocumentLanguage, DocumentType, FactStatus, IngestionStatus, SectionMapStatus
 from app.db.models.anchors import Anchor, Chunk
 from app.db.models.audit import AuditLog
 from app.db.models.facts import Fact, FactEvidence
 from app.db.models.ingestion_runs import IngestionRun
 from app.db.models.sections import TargetSectionContract, TargetSectionMap
 from app.db.models.studies import Document, DocumentVersion
-from app.services.anchor_aligner import AnchorAligner
-from app.services.ingestion.docx_ingestor import DocxIngestor
-from app.services.ingestion.metrics import get_git_sha, hash_configs
+from app.services.anchor_aligner import AlignmentResult, AnchorAligner, anchor_embeddings_from_chunks
+from app.services.ingestion.anchor_diff import (
+    AnchorDiff,
+    StoredAnchor,
+    apply_anchor_diff,
+    diff_anchors,
+    load_stored_anchors,
+    split_stored_anchors,
+)
+from app.services.ingestion.anchor_snapshot import AnchorSnapshot
+from app.services.ingestion.cpu_pool import run_cpu_bound
+from app.services.ingestion.docx_pipeline import DocxParseResult, parse_docx_document
+from app.services.ingestion.metrics import IngestionMetrics, get_git_sha, hash_configs
 from app.services.ingestion.metrics_collector import MetricsCollector
+from app.services.ingestion.pipeline import Stage, StagePipeline
+from app.services.ingestion.profiling import IngestionProfiler, profiling
 from app.services.ingestion.quality_gate import QualityGate
 from app.services.fact_extraction import FactExtractionService
-from app.services.chunking import ChunkingService
+from app.services.chunking import CHUNK_ANCHOR_TYPES, ChunkingService
 from app.services.section_mapping import SectionMappingService
 from app.services.section_mapping_assist import SectionMappingAssistService
-from app.services.soa_extraction import SoAExtractionService
 from app.services.heading_clustering import HeadingClusteringService
 from app.services.topic_mapping import TopicMappingService
 from app.services.fact_consistency import FactConsistencyService
@@ -97,21 +112,52 @@ class IngestionService:
             # Относительный путь
             return Path(uri)
 
-    async def ingest(self, doc_version_id: UUID, force: bool = False) -> IngestionResult:
+    async def ingest(
+        self,
+        doc_version_id: UUID,
+        force: bool = False,
+        incremental: bool | None = None,
+        defer_metrics: bool | None = None,
+        profile: bool | None = None,
+    ) -> IngestionResult:
         """
         Ингестия документа: извлечение структуры, создание anchors и chunks.
 
-        Примечание: Этот метод НЕ меняет статус документа и НЕ делает commit.
-        Управление статусом и commit выполняется вызывающим кодом (эндпоинтом).
+        Этапы описаны графом стадий (app/services/ingestion/pipeline.py): записи идут
+        в сессии self.db по одной стадии, вычисления chunking и alignment выполняются
+        параллельно с другими стадиями.
+
+        Если у версии уже есть anchors, включён инкрементальный режим, не задан force и
+        последний IngestionRun версии завершился со статусом ok, существующие данные
+        не удаляются: записываются только изменённые anchors (app/services/ingestion/anchor_diff.py),
+        у сдвинутых обновляется позиция, chunks пересобираются для затронутых секций.
+        Alignment, маппинг секций и топиков и извлечение фактов инкрементальными не являются:
+        при изменениях anchors они пересчитываются по всему документу (факты и топики
+        агрегируются по всем секциям), без изменений — пропускаются.
+
+        Примечание: Этот метод НЕ меняет статус документа и НЕ делает commit: все изменения
+        (anchors, chunks, facts, маппинги, IngestionRun, doc_version) коммитит вызывающий код,
+        при ошибке он делает rollback и прежние данные версии сохраняются. Исключение —
+        запись IngestionRun со статусом failed: она фиксируется в отдельной сессии, чтобы
+        пережить rollback вызывающего кода.
 
         Args:
             doc_version_id: ID версии документа
-            force: Принудительная переингестия (удаляет существующие данные)
+            force: Принудительная переингестия: полная пересборка (удаляет существующие данные,
+                инкрементальный режим не используется)
+            incremental: Инкрементальная переингестия; None — settings.ingestion_incremental_enabled
+            defer_metrics: Собирать метрики из БД и QualityGate в фоне после commit
+                (needs_review результата тогда не учитывает QualityGate: статус версии
+                обновляет фоновая задача); None — settings.ingestion_metrics_deferred
+            profile: Профилировать стадии (IngestionRun.profile_json, экспорт flame graph);
+                None — settings.ingestion_profiling_enabled
 
         Returns:
             IngestionResult с результатами ингестии
         """
         ingestion_start_time = time.time()
+        profile_enabled = settings.ingestion_profiling_enabled if profile is None else profile
+        profiler = IngestionProfiler() if profile_enabled else None
         logger.info(f"Начало ингестии документа {doc_version_id}")
 
         # Получаем версию документа
@@ -139,601 +185,81 @@ class IngestionService:
         
         study_id = document.study_id
         
-        # Создаём IngestionRun для отслеживания
+        # IngestionRun добавляется в сессию при успехе; при ошибке записывается
+        # отдельной сессией (_record_failed_run)
         ingestion_run = IngestionRun(
+            id=uuid4(),
             doc_version_id=doc_version_id,
             status="partial",
+            started_at=datetime.now(),
             pipeline_version=get_git_sha(),
             pipeline_config_hash=hash_configs(),
         )
-        self.db.add(ingestion_run)
-        await self.db.flush()
         
+        # Инкрементально сравниваются только anchors DOCX (другие форматы не парсятся) и только
+        # с результатом успешного запуска: после failed/partial сохранённые данные не сверяются
+        incremental_enabled = (
+            file_ext == ".docx"
+            and not force
+            and (settings.ingestion_incremental_enabled if incremental is None else incremental)
+            and await self._last_run_succeeded(doc_version_id)
+        )
+
         # Создаём сборщик метрик
         metrics_collector = MetricsCollector(self.db, str(doc_version_id))
-        
+
+        ctx = _IngestionContext(
+            doc_version_id=doc_version_id,
+            study_id=study_id,
+            document_id=doc_version.document_id,
+            doc_type=document.doc_type,
+            document_language=doc_version.document_language,
+            effective_date=doc_version.effective_date,
+            created_at=doc_version.created_at,
+            file_path=file_path,
+            metrics_collector=metrics_collector,
+            incremental=incremental_enabled,
+            previous_summary=doc_version.ingestion_summary_json or {},
+            defer_metrics=settings.ingestion_metrics_deferred if defer_metrics is None else defer_metrics,
+        )
         errors: list[str] = []
         warnings: list[str] = []
-        anchors_created = 0
-        chunks_created = 0
-        soa_detected = False
-        soa_table_index: int | None = None
-        soa_section_path: str | None = None
-        soa_confidence: float | None = None
-        cell_anchors_created = 0
-        facts_count = 0
-        facts_needs_review: list[str] = []
-        needs_review = False
-        docx_summary: dict[str, Any] | None = None
-        
-        alignment_summary: dict[str, Any] | None = None
-        conflicts_count = 0
-        llm_info: dict[str, Any] | None = None
 
         try:
-            # Re-ingest: удаляем существующие anchors и facts для этого doc_version
-            metrics_collector.start_timing("cleanup")
-            logger.info(f"Удаление существующих chunks для doc_version_id={doc_version_id}")
-            await self.db.execute(delete(Chunk).where(Chunk.doc_version_id == doc_version_id))
-            await self.db.flush()
-
-            logger.info(f"Удаление существующих anchors для doc_version_id={doc_version_id}")
-            delete_stmt = delete(Anchor).where(Anchor.doc_version_id == doc_version_id)
-            await self.db.execute(delete_stmt)
-            await self.db.flush()
-            
-            # Удаляем существующие facts, созданные из этого doc_version
-            logger.info(f"Удаление существующих facts для doc_version_id={doc_version_id}")
-            facts_to_delete = await self.db.execute(
-                select(Fact.id).where(Fact.created_from_doc_version_id == doc_version_id)
-            )
-            fact_ids = [row[0] for row in facts_to_delete.all()]
-            if fact_ids:
-                delete_evidence_stmt = delete(FactEvidence).where(FactEvidence.fact_id.in_(fact_ids))
-                await self.db.execute(delete_evidence_stmt)
-                delete_facts_stmt = delete(Fact).where(Fact.id.in_(fact_ids))
-                await self.db.execute(delete_facts_stmt)
-                await self.db.flush()
-            metrics_collector.end_timing("cleanup")
-
-            # Обрабатываем DOCX
-            if file_ext == ".docx":
-                metrics_collector.start_timing("parse_anchors")
-                logger.info(f"Парсинг DOCX файла: {file_path}")
-                ingestor = DocxIngestor()
-                result = ingestor.ingest(
-                    file_path, 
-                    doc_version_id, 
-                    doc_version.document_language,
-                    document.doc_type
-                )
-            
-            # Bulk insert anchors
-            if result.anchors:
-                anchor_objects = [
-                    Anchor(
-                        doc_version_id=anchor.doc_version_id,
-                        anchor_id=anchor.anchor_id,
-                        section_path=anchor.section_path,
-                        content_type=anchor.content_type,
-                        ordinal=anchor.ordinal,
-                        text_raw=anchor.text_raw,
-                        text_norm=anchor.text_norm,
-                        text_hash=anchor.text_hash,
-                        location_json=anchor.location_json,
-                        source_zone=anchor.source_zone,
-                        language=anchor.language,
-                    )
-                    for anchor in result.anchors
-                ]
-                self.db.add_all(anchor_objects)
-                await self.db.flush()
-                
-                anchors_created = len(result.anchors)
-                logger.info(f"Создано {anchors_created} anchors")
-                metrics_collector.end_timing("parse_anchors")
-                
-                # Собираем метрики по anchors
-                await metrics_collector.collect_anchor_metrics()
-                
-                # Собираем метрики по source_zones
-                await metrics_collector.collect_source_zones_metrics(document.doc_type)
-            
-                # Собираем warnings
-                warnings.extend(result.warnings)
-                
-                # Сохраняем summary из DocxIngestor для передачи в ingestion_summary_json
-                docx_summary = result.summary
-                
-                # Шаг 5: Извлечение SoA
-                metrics_collector.start_timing("soa_extraction")
-                logger.info(f"Запуск извлечения SoA для doc_version_id={doc_version_id}")
-                soa_service = SoAExtractionService(self.db)
-                cell_anchors, soa_result = await soa_service.extract_soa(doc_version_id)
-            
-                if soa_result:
-                    soa_detected = True
-                    soa_table_index = soa_result.table_index
-                    soa_section_path = soa_result.section_path
-                    soa_confidence = soa_result.confidence
-                    logger.info(
-                        f"SoA найден: table_index={soa_result.table_index}, "
-                        f"confidence={soa_result.confidence:.2f}, "
-                        f"visits={len(soa_result.visits)}, procedures={len(soa_result.procedures)}"
-                    )
-                    
-                    # Вычисляем метрики SoA
-                    matrix_cells_total = None
-                    matrix_marked_cells = None
-                    if soa_result.matrix:
-                        matrix_cells_total = len(soa_result.matrix)
-                        # Все записи в матрице уже имеют значение (добавляются только non-empty)
-                        # Поэтому все они считаются "marked"
-                        matrix_marked_cells = len(soa_result.matrix)
-                    
-                    metrics_collector.set_soa_metrics(
-                        found=True,
-                        table_score=soa_result.confidence,
-                        visits_count=len(soa_result.visits) if soa_result.visits else None,
-                        procedures_count=len(soa_result.procedures) if soa_result.procedures else None,
-                        matrix_cells_total=matrix_cells_total,
-                        matrix_marked_cells=matrix_marked_cells,
-                    )
-                    
-                    # Сохраняем cell anchors
-                    if cell_anchors:
-                        cell_anchor_objects = [
-                            Anchor(
-                                doc_version_id=anchor.doc_version_id,
-                                anchor_id=anchor.anchor_id,
-                                section_path=anchor.section_path,
-                                content_type=anchor.content_type,
-                                ordinal=anchor.ordinal,
-                                text_raw=anchor.text_raw,
-                                text_norm=anchor.text_norm,
-                                text_hash=anchor.text_hash,
-                                location_json=anchor.location_json,
-                                source_zone=getattr(anchor, "source_zone", "unknown"),
-                                language=anchor.language,
-                            )
-                            for anchor in cell_anchors
-                        ]
-                        self.db.add_all(cell_anchor_objects)
-                        await self.db.flush()
-                        cell_anchors_created = len(cell_anchors)
-                        anchors_created += len(cell_anchors)
-                        logger.info(f"Создано {len(cell_anchors)} cell anchors")
-                    
-                    # Определяем статус фактов на основе confidence
-                    fact_status = FactStatus.EXTRACTED if soa_result.confidence >= 0.7 else FactStatus.NEEDS_REVIEW
-
-                    # Перед созданием SoA-фактов удаляем ранее сохранённые факты
-                    # по (study_id, fact_type="soa", fact_key in ["visits", "procedures", "matrix"])
-                    # чтобы избежать конфликта уникального индекса uq_facts_study_type_key.
-                    await self.db.execute(
-                        delete(Fact).where(
-                            Fact.study_id == study_id,
-                            Fact.fact_type == "soa",
-                            Fact.fact_key.in_(["visits", "procedures", "matrix"]),
-                        )
-                    )
-                    await self.db.flush()  # Применяем удаление перед созданием новых фактов
-
-                    # Создаём факты для visits
-                    if soa_result.visits:
-                        visit_anchor_ids = _dedupe_keep_order([v.anchor_id for v in soa_result.visits if v.anchor_id])
-                        visits_fact = Fact(
-                            study_id=study_id,
-                            fact_type="soa",
-                            fact_key="visits",
-                            value_json={"visits": [v.model_dump() for v in soa_result.visits]},
-                            status=fact_status,
-                            created_from_doc_version_id=doc_version_id,
-                        )
-                        self.db.add(visits_fact)
-                        await self.db.flush()
-                        
-                        # Создаём evidence для visits
-                        await self.db.execute(
-                            delete(FactEvidence).where(FactEvidence.fact_id == visits_fact.id)
-                        )
-                        for anchor_id in visit_anchor_ids:
-                            evidence = FactEvidence(
-                                fact_id=visits_fact.id,
-                                anchor_id=anchor_id,
-                                evidence_role=EvidenceRole.PRIMARY,
-                            )
-                            self.db.add(evidence)
-                    
-                    # Создаём факты для procedures
-                    if soa_result.procedures:
-                        proc_anchor_ids = _dedupe_keep_order([p.anchor_id for p in soa_result.procedures if p.anchor_id])
-                        procedures_fact = Fact(
-                            study_id=study_id,
-                            fact_type="soa",
-                            fact_key="procedures",
-                            value_json={"procedures": [p.model_dump() for p in soa_result.procedures]},
-                            status=fact_status,
-                            created_from_doc_version_id=doc_version_id,
-                        )
-                        self.db.add(procedures_fact)
-                        await self.db.flush()
-                        
-                        # Создаём evidence для procedures
-                        await self.db.execute(
-                            delete(FactEvidence).where(FactEvidence.fact_id == procedures_fact.id)
-                        )
-                        for anchor_id in proc_anchor_ids:
-                            evidence = FactEvidence(
-                                fact_id=procedures_fact.id,
-                                anchor_id=anchor_id,
-                                evidence_role=EvidenceRole.PRIMARY,
-                            )
-                            self.db.add(evidence)
-                    
-                    # Создаём факт для matrix
-                    if soa_result.matrix:
-                        matrix_anchor_ids = _dedupe_keep_order([m.anchor_id for m in soa_result.matrix if m.anchor_id])
-                        matrix_fact = Fact(
-                            study_id=study_id,
-                            fact_type="soa",
-                            fact_key="matrix",
-                            value_json={"matrix": [m.model_dump() for m in soa_result.matrix]},
-                            status=fact_status,
-                            created_from_doc_version_id=doc_version_id,
-                        )
-                        self.db.add(matrix_fact)
-                        await self.db.flush()
-                        
-                        # Создаём evidence для matrix (ограничиваем размером для производительности)
-                        await self.db.execute(
-                            delete(FactEvidence).where(FactEvidence.fact_id == matrix_fact.id)
-                        )
-                        for anchor_id in matrix_anchor_ids[:100]:  # Ограничиваем первыми 100
-                            evidence = FactEvidence(
-                                fact_id=matrix_fact.id,
-                                anchor_id=anchor_id,
-                                evidence_role=EvidenceRole.PRIMARY,
-                            )
-                            self.db.add(evidence)
-                    
-                    # Добавляем warnings из SoA
-                    warnings.extend(soa_result.warnings)
-                    
-                    # Сохраняем информацию о SoA в ingestion_summary_json (будет обновлено вызывающим кодом)
-                    # Пока просто отмечаем, что SoA найден
-                    
-                    # Если confidence низкий, ставим needs_review
-                    if soa_result.confidence < 0.7:
-                        needs_review = True
-                        logger.info(f"SoA найден, но confidence низкий ({soa_result.confidence:.2f}), требуется проверка")
-                else:
-                    # SoA не найден
-                    logger.info(f"SoA не найден в документе {doc_version_id}")
-                    metrics_collector.set_soa_metrics(found=False)
-                    # Если это протокол, возможно стоит поставить needs_review
-                    if document.doc_type.value == "protocol":
-                        warnings.append("SoA таблица не найдена в протоколе (может потребоваться ручная проверка)")
-                
-                metrics_collector.end_timing("soa_extraction")
-
-                # Шаг 6: Создание chunks (Narrative Index) на основе anchors (исключая cell)
-                metrics_collector.start_timing("chunking")
-                logger.info(f"Запуск chunking для doc_version_id={doc_version_id}")
-                chunking_service = ChunkingService(self.db)
-                chunks_created = await chunking_service.rebuild_chunks_for_doc_version(doc_version_id)
-                metrics_collector.end_timing("chunking")
-                
-                # Собираем метрики по chunks
-                await metrics_collector.collect_chunk_metrics()
-
-                # Шаг 6.1: Выравнивание якорей с предыдущей версией документа (если есть)
-                # Ищем предыдущую версию этого же документа по document_id и effective_date (или created_at, если effective_date NULL)
-                prev_version = None
-                if doc_version.effective_date is not None:
-                    # Если effective_date задан, ищем по effective_date
-                    prev_version_stmt = (
-                        select(DocumentVersion)
-                        .where(
-                            DocumentVersion.document_id == doc_version.document_id,
-                            DocumentVersion.id != doc_version_id,
-                            DocumentVersion.effective_date.isnot(None),
-                            DocumentVersion.effective_date < doc_version.effective_date,
-                        )
-                        .order_by(DocumentVersion.effective_date.desc())
-                    )
-                else:
-                    # Если effective_date не задан (NULL), используем created_at для поиска
-                    prev_version_stmt = (
-                        select(DocumentVersion)
-                        .where(
-                            DocumentVersion.document_id == doc_version.document_id,
-                            DocumentVersion.id != doc_version_id,
-                            DocumentVersion.created_at < doc_version.created_at,
-                        )
-                        .order_by(DocumentVersion.created_at.desc())
-                    )
-                
-                prev_version_result = await self.db.execute(prev_version_stmt)
-                prev_version = prev_version_result.scalars().first()
-
-                if prev_version is not None:
-                    logger.debug(f"DEBUG: Finding previous version for doc {document.id}. Current version date: {doc_version.effective_date}")
-                    # Убеждаемся, что все якоря текущей версии доступны в БД для Aligner
-                    await self.db.flush()
-                    logger.info(f"Aligning with previous version: {prev_version.id}")
-                    aligner = AnchorAligner(self.db)
-                    align_stats = await aligner.align(prev_version.id, doc_version_id)
-                    logger.debug(f"DEBUG: Alignment stats - Matched: {align_stats.matched}, Changed: {align_stats.changed}")
-                    alignment_summary = {
-                        "matched_anchors": align_stats.matched,
-                        "changed_anchors": align_stats.changed,
-                    }
-                else:
-                    logger.info("No previous version found for alignment")
-
-                # Шаг 5.5: Rules-first извлечение фактов (после сохранения anchors и завершения SoA)
-                metrics_collector.start_timing("fact_extraction")
-                logger.info(f"Запуск rules-first извлечения фактов для doc_version_id={doc_version_id}")
-                fact_service = FactExtractionService(self.db)
-                fact_res = await fact_service.extract_and_upsert(doc_version_id, commit=False)
-                facts_count = fact_res.facts_count
-                facts_needs_review = [
-                    f"{f.fact_type}/{f.fact_key}" for f in fact_res.facts if f.status == FactStatus.NEEDS_REVIEW
-                ]
-                if facts_needs_review:
-                    needs_review = True
-                metrics_collector.end_timing("fact_extraction")
-                
-                # Собираем метрики по фактам
-                # Используем факты из результата извлечения, так как они могут быть еще не закоммичены
-                # Но также делаем запрос к базе для полноты картины
-                await metrics_collector.collect_facts_metrics(str(study_id))
-                # Если факты были извлечены, но не попали в метрики (из-за flush), обновляем метрики
-                if facts_count > 0 and metrics_collector.metrics.facts.total == 0:
-                    logger.warning(
-                        f"Факты извлечены ({facts_count}), но не найдены в БД при сборе метрик. "
-                        f"Используем данные из результата извлечения."
-                    )
-                    metrics_collector.metrics.facts.total = facts_count
-                # Проверяем обязательные факты
-                # QualityGate уже импортирован на верхнем уровне
-                metrics_collector.check_required_facts(QualityGate.REQUIRED_FACTS)
-                
-                # Шаг 5.6: Проверка согласованности фактов
-                metrics_collector.start_timing("fact_consistency_check")
-                logger.info(f"Запуск проверки согласованности фактов для study_id={study_id}")
-                consistency_service = FactConsistencyService(self.db)
-                conflicts = await consistency_service.check_study_consistency(study_id)
-                conflicts_count = len(conflicts)
-                if conflicts_count > 0:
-                    needs_review = True
-                    warnings.append("Обнаружены логические несоответствия в данных исследования (факты)")
-                    logger.warning(f"Найдено {conflicts_count} конфликтов в фактах исследования {study_id}")
-                else:
-                    logger.info(f"Конфликтов в фактах не обнаружено для study_id={study_id}")
-                metrics_collector.end_timing("fact_consistency_check")
-                
-                # Шаг 6: Автоматический маппинг секций
-                metrics_collector.start_timing("section_mapping")
-                logger.info(f"Запуск маппинга секций для doc_version_id={doc_version_id}")
-                section_mapping_service = SectionMappingService(self.db)
-                mapping_summary = await section_mapping_service.map_sections(doc_version_id, force=False)
-            
-                # Добавляем предупреждения из маппинга
-                if mapping_summary.mapping_warnings:
-                    warnings.extend(mapping_summary.mapping_warnings)
-                
-                # Если есть секции, требующие проверки, ставим needs_review
-                if mapping_summary.sections_needs_review_count > 0:
-                    needs_review = True
-                
-                logger.info(
-                    f"Маппинг секций завершён: mapped={mapping_summary.sections_mapped_count}, "
-                    f"needs_review={mapping_summary.sections_needs_review_count}"
-                )
-                metrics_collector.end_timing("section_mapping")
-                
-                # Шаг 6.1: Автоматический LLM-assist для проблемных секций
-                if settings.secure_mode and settings.llm_provider and settings.llm_base_url and settings.llm_api_key:
-                    metrics_collector.start_timing("llm_assist_mapping")
-                    logger.info(f"Проверка проблемных секций для LLM-assist (doc_version_id={doc_version_id})")
-                    
-                    try:
-                        # Находим все TargetSectionMap для текущего doc_version_id
-                        problem_section_maps_stmt = select(TargetSectionMap).where(
-                            TargetSectionMap.doc_version_id == doc_version_id
-                        )
-                        problem_section_maps_result = await self.db.execute(problem_section_maps_stmt)
-                        all_section_maps = problem_section_maps_result.scalars().all()
-                        
-                        # Фильтруем проблемные секции: статус needs_review или 0 anchors
-                        problem_section_keys: list[str] = []
-                        for section_map in all_section_maps:
-                            is_problem = (
-                                section_map.status == SectionMapStatus.NEEDS_REVIEW
-                                or not section_map.anchor_ids
-                            )
-                            if is_problem:
-                                problem_section_keys.append(section_map.target_section)
-                        
-                        # Получаем TargetSectionContracts для проблемных секций
-                        if problem_section_keys:
-                            contracts_stmt = select(TargetSectionContract).where(
-                                TargetSectionContract.doc_type == document.doc_type,
-                                TargetSectionContract.target_section.in_(problem_section_keys),
-                                TargetSectionContract.is_active == True,
-                            )
-                            contracts_result = await self.db.execute(contracts_stmt)
-                            problem_contracts = contracts_result.scalars().all()
-                            
-                            # Получаем section_keys из контрактов (на случай, если некоторые не найдены)
-                            valid_section_keys = [c.target_section for c in problem_contracts]
-                            
-                            if valid_section_keys:
-                                logger.info(
-                                    f"Найдено {len(valid_section_keys)} проблемных секций для LLM-assist: {valid_section_keys}"
-                                )
-                                
-                                # Вызываем LLM-assist для проблемных секций
-                                assist_service = SectionMappingAssistService(self.db)
-                                assist_result = await assist_service.assist(
-                                    doc_version_id=doc_version_id,
-                                    section_keys=valid_section_keys,
-                                    max_candidates_per_section=3,
-                                    allow_visual_headings=False,
-                                    apply=True,  # Автоматически применяем результаты
-                                )
-                                
-                                logger.info(
-                                    f"LLM-assist завершён: обработано {len(valid_section_keys)} секций, "
-                                    f"llm_used={assist_result.llm_used}"
-                                )
-                                
-                                # Сохраняем информацию о LLM для логирования
-                                if assist_result.llm_used:
-                                    llm_info = {
-                                        "model": settings.llm_model,
-                                        "provider": settings.llm_provider.value if settings.llm_provider else None,
-                                    }
-                                    # Получаем системный промт из assist service
-                                    try:
-                                        system_prompt = assist_service._build_system_prompt(
-                                            max_candidates_per_section=3,
-                                            document_language=doc_version.document_language
-                                        )
-                                        llm_info["system_prompt"] = system_prompt
-                                    except Exception:
-                                        # Если не удалось получить промт, пропускаем
-                                        pass
-                                
-                                # Обновляем needs_review на основе результатов QC
-                                qc_needs_review_count = sum(
-                                    1 for qc in assist_result.qc.values() 
-                                    if qc.status == "needs_review"
-                                )
-                                if qc_needs_review_count > 0:
-                                    needs_review = True
-                                    logger.info(
-                                        f"LLM-assist: {qc_needs_review_count} секций всё ещё требуют проверки"
-                                    )
-                            else:
-                                logger.debug(
-                                    f"Проблемные секции найдены, но нет активных контрактов для doc_type={document.doc_type}"
-                                )
-                        else:
-                            logger.debug("Проблемных секций не найдено, LLM-assist не требуется")
-                    
-                    except Exception as e:
-                        # Не прерываем ингестию при ошибках LLM-assist
-                        error_msg = f"Ошибка при LLM-assist для проблемных секций: {str(e)}"
-                        warnings.append(error_msg)
-                        logger.warning(error_msg, exc_info=True)
-                    
-                    metrics_collector.end_timing("llm_assist_mapping")
-                else:
-                    logger.debug(
-                        "LLM-assist пропущен: SECURE_MODE=false или API ключи не настроены"
-                    )
-                
-                # Собираем метрики по section_maps (только по 12 core sections для protocol)
-                from app.services.section_mapping import PROTOCOL_CORE_SECTIONS
-                core_sections = (
-                    PROTOCOL_CORE_SECTIONS if document.doc_type == DocumentType.PROTOCOL
-                    else None
-                )
-                await metrics_collector.collect_section_maps_metrics(
-                    expected_sections=12, core_sections=core_sections
-                )
-                
-                # Сохраняем результаты маппинга в docx_summary для передачи в ingestion_summary_json
-                if docx_summary is None:
-                    docx_summary = {}
-                docx_summary["sections_mapped_count"] = mapping_summary.sections_mapped_count
-                docx_summary["sections_needs_review_count"] = mapping_summary.sections_needs_review_count
-                docx_summary["mapping_warnings"] = mapping_summary.mapping_warnings
-                
-                # Шаг 7: Topic mapping (только для протоколов)
-                if document.doc_type.value == "protocol":
-                    metrics_collector.start_timing("topic_mapping")
-                    logger.info(f"Запуск topic mapping для doc_version_id={doc_version_id}")
-                    
-                    try:
-                        # Новый подход: маппинг блоков напрямую на топики
-                        # Кластеризация опциональна и используется только как prior
-                        topic_mapping_service = TopicMappingService(self.db)
-                        assignments, metrics = await topic_mapping_service.map_topics_for_doc_version(
-                            doc_version_id=doc_version_id,
-                            mode="auto",
-                            apply=True,
-                            confidence_threshold=0.55,
-                        )
-                        logger.info(
-                            f"Topic mapping завершён: assignments={len(assignments)}, "
-                            f"mapped_rate={metrics.mapped_rate:.2%}, "
-                            f"blocks_total={metrics.blocks_total}, "
-                            f"clustering_enabled={metrics.clustering_enabled}"
-                        )
-                        
-                        # Строим topic_evidence из block assignments
-                        from app.services.topic_evidence_builder import TopicEvidenceBuilder
-                        evidence_builder = TopicEvidenceBuilder(self.db)
-                        evidence_count = await evidence_builder.build_evidence_for_doc_version(doc_version_id)
-                        logger.info(f"Создано {evidence_count} записей topic_evidence")
-                        
-                        # Сохраняем метрики topic mapping в ingestion summary
-                        if docx_summary is None:
-                            docx_summary = {}
-                        docx_summary["topics"] = {
-                            "blocks_total": metrics.blocks_total,
-                            "blocks_mapped": metrics.blocks_mapped,
-                            "mapped_rate": metrics.mapped_rate,
-                            "low_confidence_rate": metrics.low_confidence_rate,
-                            "unmapped_top_headings": metrics.unmapped_top_headings[:5],
-                            "topic_coverage_topN": metrics.topic_coverage_topN[:5],
-                            "evidence_by_zone": metrics.evidence_by_zone,
-                        }
-                        if metrics.clustering_enabled:
-                            docx_summary["clustering"] = {
-                                "clusters_total": metrics.clusters_total,
-                                "clusters_labeled": metrics.clusters_labeled,
-                                "avg_cluster_size": metrics.avg_cluster_size,
-                            }
-                    except Exception as e:
-                        # Не прерываем ингестию при ошибках topic mapping
-                        error_msg = f"Ошибка при topic mapping: {str(e)}"
-                        warnings.append(error_msg)
-                        logger.warning(error_msg, exc_info=True)
-                    
-                    metrics_collector.end_timing("topic_mapping")
-                    
-                    # Собираем метрики по топикам
-                    await metrics_collector.collect_topics_metrics(document.doc_type)
-                else:
-                    logger.debug(f"Topic mapping пропущен (doc_type={document.doc_type.value}, требуется protocol)")
-                    # Для непротокольных документов всё равно собираем метрики (они будут нулевыми)
-                    await metrics_collector.collect_topics_metrics(document.doc_type)
-                
-            else:
+            stages = self._build_stages(ctx, file_ext)
+            with profiling(profiler):
+                await StagePipeline(stages).run(self.db, metrics_collector)
+                if file_ext == ".docx" and ctx.anchors_created:
+                    # Метрики по section_maps и по топикам собираются после завершения всех стадий
+                    if ctx.defer_metrics:
+                        ctx.deferred_metrics.add("mapping")
+                    else:
+                        await self._collect_mapping_metrics(ctx, metrics_collector)
+            warnings.extend(ctx.collected_warnings())
+
+            if file_ext != ".docx":
                 # Неподдерживаемый формат (PDF и др.)
                 warning_msg = f"Формат файла {file_ext} не поддерживается в шаге 4 (DOCX ingestion not implemented for this format)"
                 warnings.append(warning_msg)
-                needs_review = True
+                ctx.needs_review = True
                 errors.append(warning_msg)
                 logger.warning(warning_msg)
-            
+
             # Финализируем метрики
             metrics_collector.finalize()
-            
-            # Применяем QualityGate
-            quality_json, quality_warnings = QualityGate.evaluate(
-                metrics_collector.metrics,
-                document.doc_type,
-            )
-            warnings.extend(quality_warnings)
-            if quality_json.get("needs_review"):
-                needs_review = True
-            
+
+            # Применяем QualityGate (при отложенных метриках — после их сбора)
+            needs_review = ctx.needs_review
+            quality_json: dict[str, Any] = {}
+            if not ctx.deferred_metrics:
+                quality_json, quality_warnings = QualityGate.evaluate(
+                    metrics_collector.metrics,
+                    document.doc_type,
+                )
+                warnings.extend(quality_warnings)
+                if quality_json.get("needs_review"):
+                    needs_review = True
+
             # Обновляем IngestionRun
             ingestion_duration_ms = int((time.time() - ingestion_start_time) * 1000)
             ingestion_run.status = "ok"
@@ -741,36 +267,43 @@ class IngestionService:
             ingestion_run.duration_ms = ingestion_duration_ms
             summary_json = metrics_collector.metrics.to_summary_json()
             # Принудительно записываем данные SoA и Alignment в корень для удобства извлечения
-            summary_json["soa_confidence"] = soa_confidence
+            alignment_summary = ctx.alignment_summary
+            if alignment_summary is None and not ctx.anchors_changed:
+                # Anchors не изменились — alignment пропущен, его результат прежний
+                alignment_summary = ctx.previous_summary
+            summary_json["soa_confidence"] = ctx.soa_confidence
             summary_json["matched_anchors"] = alignment_summary.get("matched_anchors", 0) if alignment_summary else 0
             summary_json["changed_anchors"] = alignment_summary.get("changed_anchors", 0) if alignment_summary else 0
             # Добавляем информацию о LLM, если он был использован
-            if llm_info:
-                summary_json["llm_info"] = llm_info
-            # Добавляем anchors_created и chunks_created в корень для консистентности (используем локальные переменные)
-            summary_json["anchors_created"] = anchors_created
-            summary_json["chunks_created"] = chunks_created
+            if ctx.llm_info:
+                summary_json["llm_info"] = ctx.llm_info
+            # Добавляем anchors_created и chunks_created в корень для консистентности
+            summary_json["anchors_created"] = ctx.anchors_created
+            summary_json["chunks_created"] = ctx.chunks_created
             # Добавляем количество найденных конфликтов
-            summary_json["conflicts_found"] = conflicts_count
-            # Добавляем метрики topic mapping и fact extraction в корень для удобства извлечения
-            summary_json["topics_mapped_count"] = metrics_collector.metrics.topics.mapped_count
-            summary_json["topics_mapped_rate"] = round(metrics_collector.metrics.topics.mapped_rate, 4)
-            summary_json["facts_extracted_total"] = metrics_collector.metrics.facts.total
-            summary_json["facts_validated_count"] = metrics_collector.metrics.facts.validated_count
-            summary_json["facts_conflicting_count"] = metrics_collector.metrics.facts.conflicting_count
+            summary_json["conflicts_found"] = ctx.conflicts_count
+            if ctx.anchor_diff is not None:
+                summary_json["incremental"] = ctx.anchor_diff.to_summary()
+            summary_json.update(_root_metrics_summary(metrics_collector.metrics))
+            if ctx.deferred_metrics:
+                summary_json["metrics_pending"] = True
+                self._schedule_deferred_metrics(ctx, ingestion_run.id)
             ingestion_run.summary_json = summary_json
             ingestion_run.quality_json = quality_json
             ingestion_run.warnings_json = warnings
             ingestion_run.errors_json = errors
-            
+            if profiler is not None:
+                self._store_profile(ingestion_run, profiler)
+            self.db.add(ingestion_run)
+
             # Обновляем doc_version
             doc_version.last_ingestion_run_id = ingestion_run.id
             doc_version.ingestion_summary_json = ingestion_run.summary_json  # Зеркалируем для обратной совместимости
-            
+
             logger.info(
                 f"Ингестия завершена для {doc_version_id}: "
-                f"{anchors_created} anchors, {chunks_created} chunks, "
-                f"soa_detected={soa_detected}, needs_review={needs_review}"
+                f"{ctx.anchors_created} anchors, {ctx.chunks_created} chunks, "
+                f"soa_detected={ctx.soa_detected}, needs_review={needs_review}"
             )
             # Выводим финальную строку BENCHMARK_SIGNAL
             topics_mapped = metrics_collector.metrics.topics.mapped_count
@@ -784,38 +317,990 @@ class IngestionService:
 
             return IngestionResult(
                 doc_version_id=doc_version_id,
-                anchors_created=anchors_created,
-                chunks_created=chunks_created,
-                soa_detected=soa_detected,
-                soa_table_index=soa_table_index,
-                soa_section_path=soa_section_path,
-                soa_confidence=soa_confidence,
-                cell_anchors_created=cell_anchors_created,
-                facts_count=facts_count,
-                facts_needs_review=facts_needs_review,
+                anchors_created=ctx.anchors_created,
+                chunks_created=ctx.chunks_created,
+                soa_detected=ctx.soa_detected,
+                soa_table_index=ctx.soa_table_index,
+                soa_section_path=ctx.soa_section_path,
+                soa_confidence=ctx.soa_confidence,
+                cell_anchors_created=ctx.cell_anchors_created,
+                facts_count=ctx.facts_count,
+                facts_needs_review=ctx.facts_needs_review,
                 warnings=warnings if warnings else None,
                 needs_review=needs_review,
-                docx_summary=docx_summary if file_ext == ".docx" else None,
+                docx_summary=ctx.docx_summary if file_ext == ".docx" else None,
             )
-            
+
         except Exception as e:
             # Обработка ошибок
             error_msg = str(e)
             errors.append(error_msg)
             logger.error(f"Ошибка при ингестии {doc_version_id}: {error_msg}", exc_info=True)
-            
+
             # Обновляем IngestionRun с ошибкой
             ingestion_duration_ms = int((time.time() - ingestion_start_time) * 1000)
             ingestion_run.status = "failed"
             ingestion_run.finished_at = datetime.now()
             ingestion_run.duration_ms = ingestion_duration_ms
             ingestion_run.errors_json = errors
-            ingestion_run.warnings_json = warnings
+            ingestion_run.warnings_json = warnings or ctx.collected_warnings()
             if metrics_collector.metrics:
                 ingestion_run.summary_json = metrics_collector.metrics.to_summary_json()
-            
+            if profiler is not None:
+                self._store_profile(ingestion_run, profiler)
+            await self._record_failed_run(ingestion_run)
+
             raise
 
+    async def _last_run_succeeded(self, doc_version_id: UUID) -> bool:
+        """Завершился ли последний IngestionRun версии со статусом ok."""
+        result = await self.db.execute(
+            select(IngestionRun.status)
+            .where(IngestionRun.doc_version_id == doc_version_id)
+            .order_by(IngestionRun.started_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none() == "ok"
+
+    async def _record_failed_run(self, ingestion_run: IngestionRun) -> None:
+        """
+        Фиксирует IngestionRun со статусом failed в отдельной сессии.
+
+        Изменения ингестии в self.db откатит вызывающий код, а запись о неудачном
+        запуске должна сохраниться (по ней, в частности, следующая ингестия версии
+        выбирает полную пересборку вместо инкрементальной).
+        """
+        try:
+            async with self._session_factory()() as session:
+                session.add(ingestion_run)
+                await session.commit()
+        except Exception as e:
+            logger.error(
+                f"Не удалось сохранить IngestionRun {ingestion_run.id} со статусом failed: {e}",
+                exc_info=True,
+            )
+
+    def _session_factory(self) -> async_sessionmaker[AsyncSession]:
+        """Фабрика отдельных сессий на engine self.db (вне транзакции ингестии)."""
+        return async_sessionmaker(self.db.bind, expire_on_commit=False)
+
+    @staticmethod
+    def _store_profile(ingestion_run: IngestionRun, profiler: IngestionProfiler) -> None:
+        """Сохраняет профиль в IngestionRun и выгружает flame graph, если задан каталог."""
+        profile_json = profiler.finish()
+        if settings.ingestion_profile_export_dir:
+            try:
+                profile_json["exports"] = profiler.export(
+                    settings.ingestion_profile_export_dir, str(ingestion_run.id)
+                )
+            except OSError as e:
+                logger.warning(f"Не удалось выгрузить профиль ингестии {ingestion_run.id}: {e}")
+        ingestion_run.profile_json = profile_json
+        total = profile_json["total"]
+        logger.info(
+            f"Профиль ингестии {ingestion_run.doc_version_id}: wall={total['wall_ms']} мс, "
+            f"cpu={total['cpu_ms']} мс, db={total['db_ms']} мс ({total['db_queries']} запросов), "
+            f"llm={total['llm_calls']} вызовов, embeddings={total['embedding_calls']} вызовов, "
+            f"peak_rss={total['peak_rss_mb']} МБ"
+        )
+
+    def _build_stages(self, ctx: _IngestionContext, file_ext: str) -> list[Stage]:
+        """
+        Граф стадий ингестии: parse_anchors -> soa_extraction, затем две ветви —
+        chunking -> alignment и fact_extraction -> section_mapping -> llm_assist_mapping;
+        fact_consistency_check ждёт фактов и alignment, topic_mapping — chunks и фактов.
+
+        У chunking и alignment есть фаза compute без сессии ингестии (сборка chunks по
+        снимку anchors, матчинг с предыдущей версией в отдельной сессии чтения): она идёт
+        параллельно с записью стадий другой ветви. Остальные стадии читают данные, записанные
+        ранее в этой же транзакции (факты SoA, section maps, кэш эмбеддингов), поэтому
+        целиком выполняются в сессии ингестии.
+        """
+
+        def has_anchors() -> bool:
+            return ctx.anchors_created > 0
+
+        def anchors_changed() -> bool:
+            return has_anchors() and ctx.anchors_changed
+
+        def llm_assist_enabled() -> bool:
+            return anchors_changed() and bool(
+                settings.secure_mode and settings.llm_provider and settings.llm_base_url and settings.llm_api_key
+            )
+
+        def is_protocol() -> bool:
+            return anchors_changed() and ctx.doc_type == DocumentType.PROTOCOL
+
+        stages = [Stage("cleanup", partial(self._run_cleanup, ctx), provides=("clean_slate",))]
+        if file_ext == ".docx":
+            stages += [
+                Stage(
+                    "parse_anchors",
+                    partial(self._run_parse_anchors, ctx),
+                    requires=("clean_slate",),
+                    provides=("anchors",),
+                ),
+                Stage(
+                    "soa_extraction",
+                    partial(self._run_soa_extraction, ctx),
+                    requires=("anchors",),
+                    provides=("cell_anchors", "soa_facts"),
+                    condition=has_anchors,
+                ),
+                # Narrative Index включает табличные чанки, поэтому ждёт cell anchors SoA
+                Stage(
+                    "chunking",
+                    partial(self._run_chunking, ctx),
+                    requires=("anchors", "cell_anchors"),
+                    provides=("chunks",),
+                    condition=has_anchors,
+                    compute=partial(self._compute_chunks, ctx),
+                ),
+                Stage(
+                    "alignment",
+                    partial(self._run_alignment, ctx),
+                    requires=("anchors", "cell_anchors", "chunks"),
+                    provides=("anchor_matches",),
+                    condition=anchors_changed,
+                    compute=partial(self._compute_alignment, ctx),
+                ),
+                Stage(
+                    "fact_extraction",
+                    partial(self._run_fact_extraction, ctx),
+                    requires=("anchors", "soa_facts"),
+                    provides=("facts",),
+                    condition=has_anchors,
+                ),
+                Stage(
+                    "fact_consistency_check",
+                    partial(self._run_fact_consistency, ctx),
+                    requires=("facts", "soa_facts", "anchor_matches"),
+                    provides=("conflicts",),
+                    condition=has_anchors,
+                ),
+                # fact_extraction читает target_section_maps и topic_evidence предыдущего запуска,
+                # поэтому маппинг секций и топиков, перезаписывающий их, идёт после неё
+                Stage(
+                    "section_mapping",
+                    partial(self._run_section_mapping, ctx),
+                    requires=("anchors", "cell_anchors", "soa_facts", "facts"),
+                    provides=("section_maps",),
+                    condition=anchors_changed,
+                ),
+                Stage(
+                    "llm_assist_mapping",
+                    partial(self._run_llm_assist_mapping, ctx),
+                    requires=("section_maps",),
+                    provides=("assisted_section_maps",),
+                    condition=llm_assist_enabled,
+                ),
+                Stage(
+                    "topic_mapping",
+                    partial(self._run_topic_mapping, ctx),
+                    requires=("anchors", "chunks", "facts"),
+                    provides=("topic_evidence",),
+                    condition=is_protocol,
+                ),
+            ]
+        ctx.warnings = {stage.name: [] for stage in stages}
+        return stages
+
+    async def _run_cleanup(self, ctx: _IngestionContext, db: AsyncSession) -> None:
+        """
+        Re-ingest: удаляет существующие chunks, anchors и facts этого doc_version.
+
+        В инкрементальном режиме вместо удаления загружает сохранённые anchors для сравнения.
+        """
+        doc_version_id = ctx.doc_version_id
+        if ctx.incremental:
+            stored_anchors = await load_stored_anchors(db, doc_version_id)
+            if stored_anchors:
+                logger.info(
+                    f"Инкрементальная переингестия doc_version_id={doc_version_id}: "
+                    f"сохранено {len(stored_anchors)} anchors"
+                )
+                ctx.stored_anchors = stored_anchors
+                return
+        await self._delete_version_data(db, doc_version_id)
+
+    async def _delete_version_data(self, db: AsyncSession, doc_version_id: UUID) -> None:
+        """Удаляет chunks, anchors и facts doc_version."""
+        logger.info(f"Удаление существующих chunks для doc_version_id={doc_version_id}")
+        await db.execute(delete(Chunk).where(Chunk.doc_version_id == doc_version_id))
+        await db.flush()
+
+        logger.info(f"Удаление существующих anchors для doc_version_id={doc_version_id}")
+        delete_stmt = delete(Anchor).where(Anchor.doc_version_id == doc_version_id)
+        await db.execute(delete_stmt)
+        await db.flush()
+
+        # Удаляем существующие facts, созданные из этого doc_version
+        logger.info(f"Удаление существующих facts для doc_version_id={doc_version_id}")
+        await self._delete_version_facts(db, doc_version_id)
+
+    @staticmethod
+    async def _delete_version_facts(
+        db: AsyncSession, doc_version_id: UUID, exclude_fact_type: str | None = None
+    ) -> None:
+        """Удаляет facts (и их evidence), созданные из doc_version."""
+        facts_stmt = select(Fact.id).where(Fact.created_from_doc_version_id == doc_version_id)
+        if exclude_fact_type is not None:
+            facts_stmt = facts_stmt.where(Fact.fact_type != exclude_fact_type)
+        facts_to_delete = await db.execute(facts_stmt)
+        fact_ids = [row[0] for row in facts_to_delete.all()]
+        if fact_ids:
+            delete_evidence_stmt = delete(FactEvidence).where(FactEvidence.fact_id.in_(fact_ids))
+            await db.execute(delete_evidence_stmt)
+            delete_facts_stmt = delete(Fact).where(Fact.id.in_(fact_ids))
+            await db.execute(delete_facts_stmt)
+            await db.flush()
+
+    async def _run_parse_anchors(self, ctx: _IngestionContext, db: AsyncSession) -> None:
+        """Парсинг DOCX и сохранение anchors."""
+        logger.info(f"Парсинг DOCX файла: {ctx.file_path}")
+        # Парсинг, заголовки, source_zone и скоринг SoA — в пуле процессов,
+        # чтобы не блокировать event loop; DOCX парсится там один раз
+        parse_result = await run_cpu_bound(
+            parse_docx_document,
+            ctx.file_path,
+            ctx.doc_version_id,
+            ctx.document_language,
+            ctx.doc_type,
+        )
+        ctx.parse_result = parse_result
+        result = parse_result.ingest
+        for step, duration_ms in parse_result.timings_ms.items():
+            ctx.metrics_collector.record_timing(step, duration_ms)
+
+        if ctx.stored_anchors is not None:
+            if result.anchors:
+                stored_paragraphs, _ = split_stored_anchors(ctx.stored_anchors)
+                ctx.anchor_diff = diff_anchors(stored_paragraphs, result.anchors)
+                await apply_anchor_diff(db, ctx.doc_version_id, ctx.anchor_diff)
+            else:
+                # Остальные стадии не запустятся — удаляем данные версии, как при полной переингестии
+                ctx.anchor_diff = diff_anchors(ctx.stored_anchors, [])
+                await self._delete_version_data(db, ctx.doc_version_id)
+            logger.info(f"Изменения anchors: {ctx.anchor_diff.to_summary()}")
+
+        if not result.anchors:
+            return
+
+        # Bulk insert anchors
+        if ctx.anchor_diff is None:
+            await bulk_insert_anchors(db, result.anchors)
+        # Результат парсинга — полный набор anchors версии (и при инкрементальной записи)
+        ctx.anchor_snapshot = AnchorSnapshot(ctx.doc_version_id, result.anchors)
+        ctx.anchors_created = len(result.anchors)
+        logger.info(f"Создано {ctx.anchors_created} anchors")
+
+        # Собираем метрики по anchors и source_zones
+        metrics_collector = ctx.metrics_collector.with_session(db)
+        # Метрики по anchors считаются в памяти по результату парсинга, без запросов к БД
+        await metrics_collector.collect_anchor_metrics(result.anchors)
+        await metrics_collector.collect_source_zones_metrics(ctx.doc_type)
+
+        ctx.warnings["parse_anchors"].extend(result.warnings)
+        # Сохраняем summary из DocxIngestor для передачи в ingestion_summary_json
+        ctx.docx_summary = result.summary
+
+    async def _run_soa_extraction(self, ctx: _IngestionContext, db: AsyncSession) -> None:
+        """Шаг 5: сохранение cell anchors и фактов SoA (таблица найдена при парсинге)."""
+        doc_version_id = ctx.doc_version_id
+        study_id = ctx.study_id
+        logger.info(f"Запуск извлечения SoA для doc_version_id={doc_version_id}")
+        cell_anchors, soa_result = ctx.parse_result.cell_anchors, ctx.parse_result.soa_result
+        warnings = ctx.warnings["soa_extraction"]
+
+        # Cell anchors хранятся только при найденном SoA (в обоих режимах): без SoA
+        # инкрементальная запись удаляет сохранённые cell anchors, как полная пересборка
+        if ctx.anchor_diff is not None:
+            _, stored_cells = split_stored_anchors(ctx.stored_anchors)
+            cell_diff = diff_anchors(stored_cells, cell_anchors if soa_result else [])
+            await apply_anchor_diff(db, doc_version_id, cell_diff)
+            ctx.anchor_diff.merge(cell_diff)
+        if cell_anchors and soa_result:
+            ctx.anchor_snapshot = ctx.anchor_snapshot.extend(cell_anchors)
+
+        if soa_result:
+            ctx.soa_detected = True
+            ctx.soa_table_index = soa_result.table_index
+            ctx.soa_section_path = soa_result.section_path
+            ctx.soa_confidence = soa_result.confidence
+            logger.info(
+                f"SoA найден: table_index={soa_result.table_index}, "
+                f"confidence={soa_result.confidence:.2f}, "
+                f"visits={len(soa_result.visits)}, procedures={len(soa_result.procedures)}"
+            )
+
+            # Вычисляем метрики SoA
+            matrix_cells_total = None
+            matrix_marked_cells = None
+            if soa_result.matrix:
+                matrix_cells_total = len(soa_result.matrix)
+                # Все записи в матрице уже имеют значение (добавляются только non-empty)
+                # Поэтому все они считаются "marked"
+                matrix_marked_cells = len(soa_result.matrix)
+
+            ctx.metrics_collector.set_soa_metrics(
+                found=True,
+                table_score=soa_result.confidence,
+                visits_count=len(soa_result.visits) if soa_result.visits else None,
+                procedures_count=len(soa_result.procedures) if soa_result.procedures else None,
+                matrix_cells_total=matrix_cells_total,
+                matrix_marked_cells=matrix_marked_cells,
+            )
+
+            # Сохраняем cell anchors
+            if cell_anchors:
+                if ctx.anchor_diff is None:
+                    await bulk_insert_anchors(db, cell_anchors)
+                ctx.cell_anchors_created = len(cell_anchors)
+                ctx.anchors_created += len(cell_anchors)
+                logger.info(f"Создано {len(cell_anchors)} cell anchors")
+
+            # Определяем статус фактов на основе confidence
+            fact_status = FactStatus.EXTRACTED if soa_result.confidence >= 0.7 else FactStatus.NEEDS_REVIEW
+
+            # Перед созданием SoA-фактов удаляем ранее сохранённые факты
+            # по (study_id, fact_type="soa", fact_key in ["visits", "procedures", "matrix"])
+            # чтобы избежать конфликта уникального индекса uq_facts_study_type_key.
+            await db.execute(
+                delete(Fact).where(
+                    Fact.study_id == study_id,
+                    Fact.fact_type == "soa",
+                    Fact.fact_key.in_(["visits", "procedures", "matrix"]),
+                )
+            )
+            await db.flush()  # Применяем удаление перед созданием новых фактов
+
+            # Создаём факты для visits
+            if soa_result.visits:
+                visit_anchor_ids = _dedupe_keep_order([v.anchor_id for v in soa_result.visits if v.anchor_id])
+                visits_fact = Fact(
+                    study_id=study_id,
+                    fact_type="soa",
+                    fact_key="visits",
+                    value_json={"visits": [v.model_dump() for v in soa_result.visits]},
+                    status=fact_status,
+                    created_from_doc_version_id=doc_version_id,
+                )
+                db.add(visits_fact)
+                await db.flush()
+
+                # Создаём evidence для visits
+                await db.execute(
+                    delete(FactEvidence).where(FactEvidence.fact_id == visits_fact.id)
+                )
+                await bulk_insert_fact_evidence(db, visits_fact.id, visit_anchor_ids)
+
+            # Создаём факты для procedures
+            if soa_result.procedures:
+                proc_anchor_ids = _dedupe_keep_order([p.anchor_id for p in soa_result.procedures if p.anchor_id])
+                procedures_fact = Fact(
+                    study_id=study_id,
+                    fact_type="soa",
+                    fact_key="procedures",
+                    value_json={"procedures": [p.model_dump() for p in soa_result.procedures]},
+                    status=fact_status,
+                    created_from_doc_version_id=doc_version_id,
+                )
+                db.add(procedures_fact)
+                await db.flush()
+
+                # Создаём evidence для procedures
+                await db.execute(
+                    delete(FactEvidence).where(FactEvidence.fact_id == procedures_fact.id)
+                )
+                await bulk_insert_fact_evidence(db, procedures_fact.id, proc_anchor_ids)
+
+            # Создаём факт для matrix
+            if soa_result.matrix:
+                matrix_anchor_ids = _dedupe_keep_order([m.anchor_id for m in soa_result.matrix if m.anchor_id])
+                matrix_fact = Fact(
+                    study_id=study_id,
+                    fact_type="soa",
+                    fact_key="matrix",
+                    value_json={"matrix": [m.model_dump() for m in soa_result.matrix]},
+                    status=fact_status,
+                    created_from_doc_version_id=doc_version_id,
+                )
+                db.add(matrix_fact)
+                await db.flush()
+
+                # Создаём evidence для matrix (ограничиваем размером для производительности)
+                await db.execute(
+                    delete(FactEvidence).where(FactEvidence.fact_id == matrix_fact.id)
+                )
+                await bulk_insert_fact_evidence(db, matrix_fact.id, matrix_anchor_ids[:100])  # Ограничиваем первыми 100
+
+            # Добавляем warnings из SoA
+            warnings.extend(soa_result.warnings)
+
+            # Если confidence низкий, ставим needs_review
+            if soa_result.confidence < 0.7:
+                ctx.needs_review = True
+                logger.info(f"SoA найден, но confidence низкий ({soa_result.confidence:.2f}), требуется проверка")
+        else:
+            # SoA не найден
+            logger.info(f"SoA не найден в документе {doc_version_id}")
+            ctx.metrics_collector.set_soa_metrics(found=False)
+            # Если это протокол, возможно стоит поставить needs_review
+            if ctx.doc_type.value == "protocol":
+                warnings.append("SoA таблица не найдена в протоколе (может потребоваться ручная проверка)")
+
+    async def _compute_chunks(self, ctx: _IngestionContext) -> None:
+        """Шаг 6: сборка chunks (Narrative Index) из снимка anchors в потоке, без сессии."""
+        logger.info(f"Запуск chunking для doc_version_id={ctx.doc_version_id}")
+        section_paths = ctx.chunk_sections
+        if section_paths is not None and not section_paths:
+            return
+        anchors = ctx.anchor_snapshot.select(CHUNK_ANCHOR_TYPES, section_paths)
+        ctx.chunks = await asyncio.to_thread(
+            ChunkingService(self.db).build_chunks, ctx.doc_version_id, anchors
+        )
+
+    async def _run_chunking(self, ctx: _IngestionContext, db: AsyncSession) -> None:
+        """Шаг 6: запись chunks, собранных _compute_chunks, и метрики по ним."""
+        chunking_service = ChunkingService(db)
+        ctx.chunks_created = await chunking_service.replace_chunks(
+            ctx.doc_version_id, ctx.chunks, section_paths=ctx.chunk_sections
+        )
+
+        if ctx.defer_metrics:
+            ctx.deferred_metrics.add("chunks")
+            if ctx.anchor_diff is not None:
+                # chunks_created — все chunks версии, а не только пересобранные
+                ctx.chunks_created = (
+                    await db.execute(select(func.count(Chunk.id)).where(Chunk.doc_version_id == ctx.doc_version_id))
+                ).scalar_one()
+            return
+
+        # Собираем метрики по chunks
+        metrics_collector = ctx.metrics_collector.with_session(db)
+        await metrics_collector.collect_chunk_metrics()
+        if ctx.anchor_diff is not None:
+            # chunks_created — все chunks версии, а не только пересобранные
+            ctx.chunks_created = metrics_collector.metrics.chunks.total
+
+    async def _compute_alignment(self, ctx: _IngestionContext) -> None:
+        """
+        Шаг 6.1: выравнивание якорей с предыдущей версией документа (если есть).
+
+        Выполняется в отдельной сессии чтения: предыдущая версия и её chunks закоммичены,
+        а anchors и chunks текущей версии берутся из памяти (снимок и результат chunking).
+        """
+        async with self._session_factory()() as read_db:
+            prev_version = await self._find_previous_version(ctx, read_db)
+            if prev_version is None:
+                logger.info("No previous version found for alignment")
+                return
+
+            logger.debug(f"DEBUG: Finding previous version for doc {ctx.document_id}. Current version date: {ctx.effective_date}")
+            logger.info(f"Aligning with previous version: {prev_version.id}")
+            ctx.alignment = await AnchorAligner(read_db).match(
+                prev_version,
+                ctx.doc_version_id,
+                anchor_snapshot_b=ctx.anchor_snapshot,
+                embeddings_b=await self._current_anchor_embeddings(ctx, read_db),
+            )
+
+    async def _run_alignment(self, ctx: _IngestionContext, db: AsyncSession) -> None:
+        """Шаг 6.1: запись матчей, вычисленных _compute_alignment."""
+        if ctx.alignment is None:
+            return
+        await AnchorAligner(db).save(ctx.alignment, commit=False)
+        align_stats = ctx.alignment.stats
+        logger.debug(f"DEBUG: Alignment stats - Matched: {align_stats.matched}, Changed: {align_stats.changed}")
+        ctx.alignment_summary = {
+            "matched_anchors": align_stats.matched,
+            "changed_anchors": align_stats.changed,
+        }
+
+    @staticmethod
+    async def _find_previous_version(ctx: _IngestionContext, db: AsyncSession) -> DocumentVersion | None:
+        """Предыдущая версия этого же документа по effective_date (или created_at, если effective_date NULL)."""
+        doc_version_id = ctx.doc_version_id
+        if ctx.effective_date is not None:
+            # Если effective_date задан, ищем по effective_date
+            prev_version_stmt = (
+                select(DocumentVersion)
+                .where(
+                    DocumentVersion.document_id == ctx.document_id,
+                    DocumentVersion.id != doc_version_id,
+                    DocumentVersion.effective_date.isnot(None),
+                    DocumentVersion.effective_date < ctx.effective_date,
+                )
+                .order_by(DocumentVersion.effective_date.desc())
+            )
+        else:
+            # Если effective_date не задан (NULL), используем created_at для поиска
+            prev_version_stmt = (
+                select(DocumentVersion)
+                .where(
+                    DocumentVersion.document_id == ctx.document_id,
+                    DocumentVersion.id != doc_version_id,
+                    DocumentVersion.created_at < ctx.created_at,
+                )
+                .order_by(DocumentVersion.created_at.desc())
+            )
+
+        prev_version_result = await db.execute(prev_version_stmt)
+        return prev_version_result.scalars().first()
+
+    @staticmethod
+    async def _current_anchor_embeddings(ctx: _IngestionContext, db: AsyncSession) -> dict[str, list[float]]:
+        """
+        Embeddings anchors текущей версии по её chunks. Пересобранные chunks берутся из памяти
+        (в БД они ещё не закоммичены); при инкрементальной записи chunks остальных секций
+        не менялись и читаются из БД.
+        """
+        chunks: list[Any] = list(ctx.chunks)
+        if ctx.anchor_diff is not None:
+            stmt = select(Chunk).where(Chunk.doc_version_id == ctx.doc_version_id)
+            if ctx.anchor_diff.affected_sections:
+                stmt = stmt.where(Chunk.section_path.not_in(list(ctx.anchor_diff.affected_sections)))
+            chunks.extend((await db.execute(stmt)).scalars().all())
+        return anchor_embeddings_from_chunks(chunks, {anchor.anchor_id for anchor in ctx.anchor_snapshot})
+
+    async def _run_fact_extraction(self, ctx: _IngestionContext, db: AsyncSession) -> None:
+        """Шаг 5.5: rules-first извлечение фактов (после сохранения anchors и фактов SoA)."""
+        if ctx.anchors_changed:
+            if ctx.anchor_diff is not None:
+                # Факты этой версии не удалялись при cleanup: убираем прежние (кроме SoA,
+                # которые уже пересозданы), чтобы не остались факты из удалённого текста
+                await self._delete_version_facts(db, ctx.doc_version_id, exclude_fact_type="soa")
+            logger.info(f"Запуск rules-first извлечения фактов для doc_version_id={ctx.doc_version_id}")
+            fact_service = FactExtractionService(db)
+            fact_res = await fact_service.extract_and_upsert(
+                ctx.doc_version_id, commit=False, anchor_snapshot=ctx.anchor_snapshot
+            )
+            ctx.facts_count = fact_res.facts_count
+            ctx.facts_needs_review = [
+                f"{f.fact_type}/{f.fact_key}" for f in fact_res.facts if f.status == FactStatus.NEEDS_REVIEW
+            ]
+        else:
+            # Anchors не изменились — сохранённые факты актуальны
+            logger.info(f"Anchors не изменились, извлечение фактов пропущено для doc_version_id={ctx.doc_version_id}")
+            stored_facts = (
+                await db.execute(
+                    select(Fact.fact_type, Fact.fact_key, Fact.status).where(
+                        Fact.created_from_doc_version_id == ctx.doc_version_id,
+                        Fact.fact_type != "soa",
+                    )
+                )
+            ).all()
+            ctx.facts_count = len(stored_facts)
+            ctx.facts_needs_review = [
+                f"{fact_type}/{fact_key}"
+                for fact_type, fact_key, status in stored_facts
+                if status == FactStatus.NEEDS_REVIEW
+            ]
+        if ctx.facts_needs_review:
+            ctx.needs_review = True
+
+        if ctx.defer_metrics:
+            ctx.deferred_metrics.add("facts")
+        else:
+            # Собираем метрики по фактам (факты ещё не закоммичены, но видны сессии ингестии)
+            await self._collect_facts_metrics(ctx, ctx.metrics_collector.with_session(db))
+
+    @staticmethod
+    async def _collect_facts_metrics(ctx: _IngestionContext, metrics_collector: MetricsCollector) -> None:
+        """Метрики по фактам исследования и проверка обязательных фактов."""
+        await metrics_collector.collect_facts_metrics(str(ctx.study_id))
+        # Если факты были извлечены, но не попали в метрики (из-за flush), обновляем метрики
+        if ctx.facts_count > 0 and metrics_collector.metrics.facts.total == 0:
+            logger.warning(
+                f"Факты извлечены ({ctx.facts_count}), но не найдены в БД при сборе метрик. "
+                f"Используем данные из результата извлечения."
+            )
+            metrics_collector.metrics.facts.total = ctx.facts_count
+        # Проверяем обязательные факты
+        metrics_collector.check_required_facts(QualityGate.REQUIRED_FACTS)
+
+    @staticmethod
+    async def _collect_mapping_metrics(ctx: _IngestionContext, metrics_collector: MetricsCollector) -> None:
+        """Метрики по section_maps (только по 12 core sections для protocol) и по топикам."""
+        from app.services.section_mapping import PROTOCOL_CORE_SECTIONS
+        core_sections = PROTOCOL_CORE_SECTIONS if ctx.doc_type == DocumentType.PROTOCOL else None
+        await metrics_collector.collect_section_maps_metrics(
+            expected_sections=12, core_sections=core_sections
+        )
+        # Для непротокольных документов метрики топиков будут нулевыми
+        await metrics_collector.collect_topics_metrics(ctx.doc_type)
+
+    def _schedule_deferred_metrics(self, ctx: _IngestionContext, ingestion_run_id: UUID) -> None:
+        """
+        Запускает сбор отложенных метрик после commit сессии вызывающего кода.
+
+        До commit IngestionRun и результаты стадий могут быть не видны другой сессии,
+        поэтому задача создаётся из события after_commit (один раз).
+        """
+        session_factory = self._session_factory()
+
+        def _on_commit(_session: Any) -> None:
+            task = asyncio.get_running_loop().create_task(
+                self._collect_deferred_metrics(ctx, ingestion_run_id, session_factory)
+            )
+            _deferred_metrics_tasks.add(task)
+            task.add_done_callback(_deferred_metrics_tasks.discard)
+
+        event.listen(self.db.sync_session, "after_commit", _on_commit, once=True)
+
+    async def _collect_deferred_metrics(
+        self,
+        ctx: _IngestionContext,
+        ingestion_run_id: UUID,
+        session_factory: async_sessionmaker[AsyncSession],
+    ) -> None:
+        """
+        Собирает отложенные метрики, применяет QualityGate и в одной транзакции дополняет
+        IngestionRun и версию документа (см. _apply_deferred_quality).
+        """
+        try:
+            async with session_factory() as db:
+                metrics_collector = ctx.metrics_collector.with_session(db)
+                if "chunks" in ctx.deferred_metrics:
+                    await metrics_collector.collect_chunk_metrics()
+                if "facts" in ctx.deferred_metrics:
+                    await self._collect_facts_metrics(ctx, metrics_collector)
+                if "mapping" in ctx.deferred_metrics:
+                    await self._collect_mapping_metrics(ctx, metrics_collector)
+                metrics_collector.finalize()
+                quality_json, quality_warnings = QualityGate.evaluate(metrics_collector.metrics, ctx.doc_type)
+
+                ingestion_run = await db.get(IngestionRun, ingestion_run_id)
+                if ingestion_run is None:
+                    logger.warning(f"IngestionRun {ingestion_run_id} не найден для отложенных метрик")
+                    return
+                summary_json = {
+                    **(ingestion_run.summary_json or {}),
+                    **metrics_collector.metrics.to_summary_json(),
+                    **_root_metrics_summary(metrics_collector.metrics),
+                }
+                summary_json.pop("metrics_pending", None)
+                ingestion_run.summary_json = summary_json
+                ingestion_run.quality_json = quality_json
+                ingestion_run.warnings_json = [*(ingestion_run.warnings_json or []), *quality_warnings]
+                await self._apply_deferred_quality(db, ctx, ingestion_run, quality_json, quality_warnings)
+                await db.commit()
+                logger.info(
+                    f"Отложенные метрики собраны для {ctx.doc_version_id}: "
+                    f"needs_review={quality_json.get('needs_review', False)}"
+                )
+        except Exception as e:
+            logger.error(f"Ошибка при сборе отложенных метрик для {ctx.doc_version_id}: {e}", exc_info=True)
+
+    @staticmethod
+    async def _apply_deferred_quality(
+        db: AsyncSession,
+        ctx: _IngestionContext,
+        ingestion_run: IngestionRun,
+        quality_json: dict[str, Any],
+        quality_warnings: list[str],
+    ) -> None:
+        """
+        Переносит результат отложенного QualityGate в версию документа: снимает metrics_pending
+        с ingestion_summary_json, добавляет предупреждения и, как при синхронном QualityGate
+        (needs_review или предупреждения -> needs_review), переводит ready в needs_review.
+
+        Версия не меняется, если её последняя ингестия — уже другой IngestionRun.
+        """
+        doc_version = await db.get(DocumentVersion, ctx.doc_version_id)
+        if doc_version is None or doc_version.last_ingestion_run_id != ingestion_run.id:
+            return
+        needs_review = bool(quality_json.get("needs_review")) or bool(quality_warnings)
+        summary = dict(doc_version.ingestion_summary_json or {})
+        summary.pop("metrics_pending", None)
+        if quality_warnings:
+            summary["warnings"] = [*(summary.get("warnings") or []), *quality_warnings]
+        if needs_review:
+            summary["needs_review"] = True
+            if isinstance(summary.get("mapping_status"), dict):
+                summary["mapping_status"] = {**summary["mapping_status"], "status": "needs_review"}
+            if doc_version.ingestion_status == IngestionStatus.READY:
+                doc_version.ingestion_status = IngestionStatus.NEEDS_REVIEW
+        doc_version.ingestion_summary_json = summary
+
+    async def _run_fact_consistency(self, ctx: _IngestionContext, db: AsyncSession) -> None:
+        """Шаг 5.6: проверка согласованности фактов."""
+        study_id = ctx.study_id
+        logger.info(f"Запуск проверки согласованности фактов для study_id={study_id}")
+        consistency_service = FactConsistencyService(db)
+        conflicts = await consistency_service.check_study_consistency(study_id, commit=False)
+        ctx.conflicts_count = len(conflicts)
+        if ctx.conflicts_count > 0:
+            ctx.needs_review = True
+            ctx.warnings["fact_consistency_check"].append(
+                "Обнаружены логические несоответствия в данных исследования (факты)"
+            )
+            logger.warning(f"Найдено {ctx.conflicts_count} конфликтов в фактах исследования {study_id}")
+        else:
+            logger.info(f"Конфликтов в фактах не обнаружено для study_id={study_id}")
+
+    async def _run_section_mapping(self, ctx: _IngestionContext, db: AsyncSession) -> None:
+        """Шаг 6: автоматический маппинг секций."""
+        logger.info(f"Запуск маппинга секций для doc_version_id={ctx.doc_version_id}")
+        section_mapping_service = SectionMappingService(db)
+        mapping_summary = await section_mapping_service.map_sections(
+            ctx.doc_version_id, force=False, anchor_snapshot=ctx.anchor_snapshot, commit=False
+        )
+
+        # Добавляем предупреждения из маппинга
+        if mapping_summary.mapping_warnings:
+            ctx.warnings["section_mapping"].extend(mapping_summary.mapping_warnings)
+
+        # Если есть секции, требующие проверки, ставим needs_review
+        if mapping_summary.sections_needs_review_count > 0:
+            ctx.needs_review = True
+
+        logger.info(
+            f"Маппинг секций завершён: mapped={mapping_summary.sections_mapped_count}, "
+            f"needs_review={mapping_summary.sections_needs_review_count}"
+        )
+
+        # Сохраняем результаты маппинга в docx_summary для передачи в ingestion_summary_json
+        if ctx.docx_summary is None:
+            ctx.docx_summary = {}
+        ctx.docx_summary["sections_mapped_count"] = mapping_summary.sections_mapped_count
+        ctx.docx_summary["sections_needs_review_count"] = mapping_summary.sections_needs_review_count
+        ctx.docx_summary["mapping_warnings"] = mapping_summary.mapping_warnings
+
+    async def _run_llm_assist_mapping(self, ctx: _IngestionContext, db: AsyncSession) -> None:
+        """Шаг 6.1: автоматический LLM-assist для проблемных секций."""
+        doc_version_id = ctx.doc_version_id
+        logger.info(f"Проверка проблемных секций для LLM-assist (doc_version_id={doc_version_id})")
+
+        try:
+            # Savepoint: ошибка откатывает только эту стадию, ингестия продолжается
+            async with db.begin_nested():
+                # Находим все TargetSectionMap для текущего doc_version_id
+                problem_section_maps_stmt = select(TargetSectionMap).where(
+                    TargetSectionMap.doc_version_id == doc_version_id
+                )
+                problem_section_maps_result = await db.execute(problem_section_maps_stmt)
+                all_section_maps = problem_section_maps_result.scalars().all()
+
+                # Фильтруем проблемные секции: статус needs_review или 0 anchors
+                problem_section_keys: list[str] = []
+                for section_map in all_section_maps:
+                    is_problem = (
+                        section_map.status == SectionMapStatus.NEEDS_REVIEW
+                        or not section_map.anchor_ids
+                    )
+                    if is_problem:
+                        problem_section_keys.append(section_map.target_section)
+
+                # Получаем TargetSectionContracts для проблемных секций
+                if problem_section_keys:
+                    contracts_stmt = select(TargetSectionContract).where(
+                        TargetSectionContract.doc_type == ctx.doc_type,
+                        TargetSectionContract.target_section.in_(problem_section_keys),
+                        TargetSectionContract.is_active == True,
+                    )
+                    contracts_result = await db.execute(contracts_stmt)
+                    problem_contracts = contracts_result.scalars().all()
+
+                    # Получаем section_keys из контрактов (на случай, если некоторые не найдены)
+                    valid_section_keys = [c.target_section for c in problem_contracts]
+
+                    if valid_section_keys:
+                        logger.info(
+                            f"Найдено {len(valid_section_keys)} проблемных секций для LLM-assist: {valid_section_keys}"
+                        )
+
+                        # Вызываем LLM-assist для проблемных секций
+                        assist_service = SectionMappingAssistService(db)
+                        assist_result = await assist_service.assist(
+                            doc_version_id=doc_version_id,
+                            section_keys=valid_section_keys,
+                            max_candidates_per_section=3,
+                            allow_visual_headings=False,
+                            apply=True,  # Автоматически применяем результаты
+                            anchor_snapshot=ctx.anchor_snapshot,
+                            commit=False,
+                        )
+
+                        logger.info(
+                            f"LLM-assist завершён: обработано {len(valid_section_keys)} секций, "
+                            f"llm_used={assist_result.llm_used}"
+                        )
+
+                        # Сохраняем информацию о LLM для логирования
+                        if assist_result.llm_used:
+                            llm_info: dict[str, Any] = {
+                                "model": settings.llm_model,
+                                "provider": settings.llm_provider.value if settings.llm_provider else None,
+                            }
+                            # Получаем системный промт из assist service
+                            try:
+                                system_prompt = assist_service._build_system_prompt(
+                                    max_candidates_per_section=3,
+                                    document_language=ctx.document_language
+                                )
+                                llm_info["system_prompt"] = system_prompt
+                            except Exception:
+                                # Если не удалось получить промт, пропускаем
+                                pass
+                            ctx.llm_info = llm_info
+
+                        # Обновляем needs_review на основе результатов QC
+                        qc_needs_review_count = sum(
+                            1 for qc in assist_result.qc.values()
+                            if qc.status == "needs_review"
+                        )
+                        if qc_needs_review_count > 0:
+                            ctx.needs_review = True
+                            logger.info(
+                                f"LLM-assist: {qc_needs_review_count} секций всё ещё требуют проверки"
+                            )
+                    else:
+                        logger.debug(
+                            f"Проблемные секции найдены, но нет активных контрактов для doc_type={ctx.doc_type}"
+                        )
+                else:
+                    logger.debug("Проблемных секций не найдено, LLM-assist не требуется")
+
+        except Exception as e:
+            # Не прерываем ингестию при ошибках LLM-assist
+            error_msg = f"Ошибка при LLM-assist для проблемных секций: {str(e)}"
+            ctx.warnings["llm_assist_mapping"].append(error_msg)
+            logger.warning(error_msg, exc_info=True)
+
+    async def _run_topic_mapping(self, ctx: _IngestionContext, db: AsyncSession) -> None:
+        """Шаг 7: topic mapping и topic_evidence (только для протоколов)."""
+        doc_version_id = ctx.doc_version_id
+        logger.info(f"Запуск topic mapping для doc_version_id={doc_version_id}")
+
+        try:
+            # Savepoint: ошибка откатывает только эту стадию, ингестия продолжается
+            async with db.begin_nested():
+                # Новый подход: маппинг блоков напрямую на топики
+                # Кластеризация опциональна и используется только как prior
+                topic_mapping_service = TopicMappingService(db)
+                assignments, metrics = await topic_mapping_service.map_topics_for_doc_version(
+                    doc_version_id=doc_version_id,
+                    mode="auto",
+                    apply=True,
+                    confidence_threshold=0.55,
+                    anchor_snapshot=ctx.anchor_snapshot,
+                    commit=False,
+                )
+                logger.info(
+                    f"Topic mapping завершён: assignments={len(assignments)}, "
+                    f"mapped_rate={metrics.mapped_rate:.2%}, "
+                    f"blocks_total={metrics.blocks_total}, "
+                    f"clustering_enabled={metrics.clustering_enabled}"
+                )
+
+                # Строим topic_evidence из block assignments
+                from app.services.topic_evidence_builder import TopicEvidenceBuilder
+                evidence_builder = TopicEvidenceBuilder(db)
+                evidence_count = await evidence_builder.build_evidence_for_doc_version(
+                    doc_version_id, ctx.anchor_snapshot, commit=False
+                )
+                logger.info(f"Создано {evidence_count} записей topic_evidence")
+
+                # Сохраняем метрики topic mapping в ingestion summary
+                if ctx.docx_summary is None:
+                    ctx.docx_summary = {}
+                ctx.docx_summary["topics"] = {
+                    "blocks_total": metrics.blocks_total,
+                    "blocks_mapped": metrics.blocks_mapped,
+                    "mapped_rate": metrics.mapped_rate,
+                    "low_confidence_rate": metrics.low_confidence_rate,
+                    "unmapped_top_headings": metrics.unmapped_top_headings[:5],
+                    "topic_coverage_topN": metrics.topic_coverage_topN[:5],
+                    "evidence_by_zone": metrics.evidence_by_zone,
+                }
+                if metrics.clustering_enabled:
+                    ctx.docx_summary["clustering"] = {
+                        "clusters_total": metrics.clusters_total,
+                        "clusters_labeled": metrics.clusters_labeled,
+                        "avg_cluster_size": metrics.avg_cluster_size,
+                    }
+        except Exception as e:
+            # Не прерываем ингестию при ошибках topic mapping
+            error_msg = f"Ошибка при topic mapping: {str(e)}"
+            ctx.warnings["topic_mapping"].append(error_msg)
+            logger.warning(error_msg, exc_info=True)
+
+
+@dataclass
+class _IngestionContext:
+    """Состояние одной ингестии, общее для стадий пайплайна."""
+
+    doc_version_id: UUID
+    study_id: UUID
+    document_id: UUID
+    doc_type: DocumentType
+    document_language: DocumentLanguage
+    effective_date: date | None
+    created_at: datetime
+    file_path: Path
+    metrics_collector: MetricsCollector
+    incremental: bool = False
+    # summary предыдущей ингестии (для результатов пропущенных стадий)
+    previous_summary: dict[str, Any] = field(default_factory=dict)
+    # Сохранённые anchors версии; None — полная переингестия
+    stored_anchors: dict[str, StoredAnchor] | None = None
+    anchor_diff: AnchorDiff | None = None
+    # Предупреждения по стадиям (в порядке объявления стадий, а не завершения)
+    warnings: dict[str, list[str]] = field(default_factory=dict)
+    parse_result: DocxParseResult | None = None
+    # Anchors версии в памяти (после parse_anchors; cell anchors добавляет soa_extraction)
+    anchor_snapshot: AnchorSnapshot | None = None
+    # Результаты фаз compute: собранные chunks и матчи с предыдущей версией
+    chunks: list[Chunk] = field(default_factory=list)
+    alignment: AlignmentResult | None = None
+    anchors_created: int = 0
+    chunks_created: int = 0
+    soa_detected: bool = False
+    soa_table_index: int | None = None
+    soa_section_path: str | None = None
+    soa_confidence: float | None = None
+    cell_anchors_created: int = 0
+    facts_count: int = 0
+    facts_needs_review: list[str] = field(default_factory=list)
+    needs_review: bool = False
+    docx_summary: dict[str, Any] | None = None
+    alignment_summary: dict[str, Any] | None = None
+    conflicts_count: int = 0
+    llm_info: dict[str, Any] | None = None
+    # Метрики из БД собираются после commit (settings.ingestion_metrics_deferred)
+    defer_metrics: bool = False
+    # Группы метрик, отложенные стадиями: chunks, facts, mapping
+    deferred_metrics: set[str] = field(default_factory=set)
+
+    @property
+    def chunk_sections(self) -> set[str] | None:
+        """Секции для пересборки chunks: инкрементально — затронутые, иначе None (все)."""
+        return self.anchor_diff.affected_sections if self.anchor_diff is not None else None
+
+    @property
+    def anchors_changed(self) -> bool:
+        """False, если инкрементальная переингестия не нашла изменений в anchors."""
+        return self.anchor_diff is None or not self.anchor_diff.is_empty
+
+    def collected_warnings(self) -> list[str]:
+        return [warning for stage_warnings in self.warnings.values() for warning in stage_warnings]
+
+
+# Фоновые задачи отложенных метрик (ссылки нужны, чтобы задачи не собрал GC)
+_deferred_metrics_tasks: set[asyncio.Task[None]] = set()
+
+
+def _root_metrics_summary(metrics: IngestionMetrics) -> dict[str, Any]:
+    """Метрики topic mapping и fact extraction в корне summary_json для удобства извлечения."""
+    return {
+        "topics_mapped_count": metrics.topics.mapped_count,
+        "topics_mapped_rate": round(metrics.topics.mapped_rate, 4),
+        "facts_extracted_total": metrics.facts.total,
+        "facts_validated_count": metrics.facts.validated_count,
+        "facts_conflicting_count": metrics.facts.conflicting_count,
+    }
+
 
 def _dedupe_keep_order(items: list[str]) -> list[str]:
     seen: set[str] = set()
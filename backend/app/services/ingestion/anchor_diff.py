@@ -0,0 +1,262 @@
+"""
+Инкрементальная переингестия: сравнение нового набора anchors с сохранённым.
+
+anchor_id строится из хеша содержимого (текст + section_path для абзацев, текст + строка
+и колонка для ячеек), поэтому якоря сопоставляются по anchor_id, а сравниваются по
+отпечатку содержимого (текст, тип, section_path, source_zone, язык, location_json без
+позиционных ключей). Изменённые якоря переписываются целиком (delete + COPY), а их
+section_path попадают в affected_sections — по ним пересобираются chunks.
+
+Позиция якоря (ordinal и позиционные ключи location_json, например глобальный
+para_index) сдвигается у всех якорей ниже вставленного или удалённого абзаца. Такие
+якоря обновляются на месте (UPDATE ordinal/location_json) и секцию не затрагивают,
+если порядок якорей в ней не изменился.
+"""
+from __future__ import annotations
+
+import json
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.bulk_copy import bulk_insert_anchors
+from app.db.enums import AnchorContentType, SourceZone
+from app.db.models.anchors import Anchor
+
+# Размер пачки anchor_id в DELETE ... IN (лимит параметров запроса PostgreSQL — 65535)
+DELETE_BATCH_SIZE = 5000
+
+# Ключи location_json, задающие только позицию якоря в документе: сдвигаются при вставке
+# или удалении абзацев и таблиц выше по тексту
+POSITION_KEYS = frozenset({"para_index", "para_index_hint", "table_id", "table_index"})
+
+
+@dataclass(frozen=True)
+class StoredAnchor:
+    """Сохранённый якорь: то, что нужно для сравнения с новым набором."""
+
+    anchor_id: str
+    section_path: str
+    content_type: AnchorContentType
+    fingerprint: tuple[Any, ...]
+    # Позиция (ordinal, location_json) и порядок в секции — см. anchor_position/anchor_order_key
+    position: tuple[Any, ...] = ()
+    order_key: tuple[Any, ...] = ()
+    # Первичный ключ строки anchors (для обновления позиции на месте)
+    id: UUID | None = None
+
+
+@dataclass
+class AnchorDiff:
+    """Разница между сохранёнными и новыми anchors одной версии документа."""
+
+    # Новые и изменённые якоря (записываются через COPY)
+    to_insert: list[Any] = field(default_factory=list)
+    # Удалённые и изменённые anchor_id (удаляются перед вставкой)
+    to_delete: list[str] = field(default_factory=list)
+    # Якоря с прежним содержимым и новой позицией: (id строки, новый якорь)
+    to_move: list[tuple[UUID | None, Any]] = field(default_factory=list)
+    added: int = 0
+    removed: int = 0
+    updated: int = 0
+    # Из unchanged: содержимое прежнее, позиция сдвинулась
+    moved: int = 0
+    unchanged: int = 0
+    affected_sections: set[str] = field(default_factory=set)
+
+    @property
+    def is_empty(self) -> bool:
+        """Содержимое и порядок anchors не изменились (сдвиг позиций не в счёт)."""
+        return not self.to_insert and not self.to_delete and not self.affected_sections
+
+    def merge(self, other: AnchorDiff) -> None:
+        self.to_insert.extend(other.to_insert)
+        self.to_delete.extend(other.to_delete)
+        self.to_move.extend(other.to_move)
+        self.added += other.added
+        self.removed += other.removed
+        self.updated += other.updated
+        self.moved += other.moved
+        self.unchanged += other.unchanged
+        self.affected_sections |= other.affected_sections
+
+    def to_summary(self) -> dict[str, Any]:
+        return {
+            "added": self.added,
+            "removed": self.removed,
+            "updated": self.updated,
+            "moved": self.moved,
+            "unchanged": self.unchanged,
+            "affected_sections": len(self.affected_sections),
+        }
+
+
+def _value(value: Any) -> Any:
+    return value.value if isinstance(value, Enum) else value
+
+
+def _json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _location(anchor: Any) -> dict[str, Any]:
+    return anchor.location_json if isinstance(anchor.location_json, dict) else {}
+
+
+def anchor_fingerprint(anchor: Any) -> tuple[Any, ...]:
+    """
+    Отпечаток содержимого якоря (для AnchorCreate, CellAnchorCreate и Anchor): всё, что
+    пишется в БД, кроме позиции — ordinal и позиционных ключей location_json.
+    """
+    location = _location(anchor)
+    return (
+        anchor.section_path,
+        _value(anchor.content_type),
+        anchor.text_raw,
+        anchor.text_norm,
+        anchor.text_hash,
+        _json({key: value for key, value in location.items() if key not in POSITION_KEYS}),
+        _value(getattr(anchor, "source_zone", None) or SourceZone.UNKNOWN),
+        _value(anchor.language),
+    )
+
+
+def anchor_position(anchor: Any) -> tuple[Any, ...]:
+    """Позиция якоря в документе: ordinal и позиционные ключи location_json."""
+    location = _location(anchor)
+    return (anchor.ordinal, _json({key: location[key] for key in POSITION_KEYS if key in location}))
+
+
+def anchor_order_key(anchor: Any) -> tuple[Any, ...]:
+    """Порядок якоря внутри секции — тот же, что у ChunkingService при сборке chunks."""
+    try:
+        para_index = int(_location(anchor)["para_index"])
+    except (KeyError, TypeError, ValueError):
+        para_index = 10**9
+    return (para_index, anchor.ordinal, anchor.anchor_id)
+
+
+def stored_anchor(anchor: Any) -> StoredAnchor:
+    """StoredAnchor для якоря (Anchor из БД или AnchorCreate / CellAnchorCreate)."""
+    return StoredAnchor(
+        anchor_id=anchor.anchor_id,
+        section_path=anchor.section_path,
+        content_type=AnchorContentType(_value(anchor.content_type)),
+        fingerprint=anchor_fingerprint(anchor),
+        position=anchor_position(anchor),
+        order_key=anchor_order_key(anchor),
+        id=getattr(anchor, "id", None),
+    )
+
+
+async def load_stored_anchors(db: AsyncSession, doc_version_id: UUID) -> dict[str, StoredAnchor]:
+    """Загружает отпечатки сохранённых anchors версии документа (anchor_id -> StoredAnchor)."""
+    result = await db.execute(select(Anchor).where(Anchor.doc_version_id == doc_version_id))
+    return {anchor.anchor_id: stored_anchor(anchor) for anchor in result.scalars().all()}
+
+
+def diff_anchors(stored: Mapping[str, StoredAnchor], new_anchors: Iterable[Any]) -> AnchorDiff:
+    """
+    Сравнивает новые anchors с сохранёнными.
+
+    Args:
+        stored: Сохранённые якоря (обычно одного вида — paragraph или cell)
+        new_anchors: Новые AnchorCreate / CellAnchorCreate
+
+    Returns:
+        AnchorDiff: что удалить, что вставить, чью позицию обновить и какие секции затронуты
+    """
+    diff = AnchorDiff()
+    seen: set[str] = set()
+    # Порядок неизменённых якорей по секциям: (ключ порядка в новом наборе, в сохранённом)
+    order_by_section: dict[str, list[tuple[tuple[Any, ...], tuple[Any, ...]]]] = {}
+    for anchor in new_anchors:
+        seen.add(anchor.anchor_id)
+        previous = stored.get(anchor.anchor_id)
+        if previous is None:
+            diff.added += 1
+        elif previous.fingerprint == anchor_fingerprint(anchor):
+            diff.unchanged += 1
+            if previous.position != anchor_position(anchor):
+                diff.moved += 1
+                diff.to_move.append((previous.id, anchor))
+            order_by_section.setdefault(anchor.section_path, []).append(
+                (anchor_order_key(anchor), previous.order_key)
+            )
+            continue
+        else:
+            diff.updated += 1
+            diff.to_delete.append(anchor.anchor_id)
+            diff.affected_sections.add(previous.section_path)
+        diff.to_insert.append(anchor)
+        diff.affected_sections.add(anchor.section_path)
+
+    for anchor_id, previous in stored.items():
+        if anchor_id not in seen:
+            diff.removed += 1
+            diff.to_delete.append(anchor_id)
+            diff.affected_sections.add(previous.section_path)
+
+    # Секция без добавленных и удалённых якорей затронута, только если якоря в ней
+    # переставлены: chunks склеивают текст секции в этом порядке
+    for section_path, keys in order_by_section.items():
+        if section_path in diff.affected_sections:
+            continue
+        new_order = [new_key[-1] for new_key, _ in sorted(keys, key=lambda pair: pair[0])]
+        stored_order = [new_key[-1] for new_key, _ in sorted(keys, key=lambda pair: pair[1])]
+        if new_order != stored_order:
+            diff.affected_sections.add(section_path)
+    return diff
+
+
+async def apply_anchor_diff(db: AsyncSession, doc_version_id: UUID, diff: AnchorDiff) -> None:
+    """Удаляет устаревшие anchors, обновляет позиции сдвинутых и записывает новые/изменённые."""
+    if diff.to_move:
+        # ORM bulk UPDATE по первичному ключу (executemany)
+        await db.execute(
+            update(Anchor),
+            [
+                {"id": anchor_pk, "ordinal": anchor.ordinal, "location_json": anchor.location_json}
+                for anchor_pk, anchor in diff.to_move
+            ],
+        )
+    for start in range(0, len(diff.to_delete), DELETE_BATCH_SIZE):
+        batch = diff.to_delete[start:start + DELETE_BATCH_SIZE]
+        await db.execute(
+            delete(Anchor).where(Anchor.doc_version_id == doc_version_id, Anchor.anchor_id.in_(batch))
+        )
+    if diff.to_delete:
+        await db.flush()
+    if diff.to_insert:
+        await bulk_insert_anchors(db, diff.to_insert)
+
+
+def split_stored_anchors(
+    stored: Mapping[str, StoredAnchor],
+) -> tuple[dict[str, StoredAnchor], dict[str, StoredAnchor]]:
+    """Делит сохранённые якоря на paragraph-anchors (DocxIngestor) и cell anchors (SoA)."""
+    paragraphs: dict[str, StoredAnchor] = {}
+    cells: dict[str, StoredAnchor] = {}
+    for anchor_id, anchor in stored.items():
+        target = cells if anchor.content_type == AnchorContentType.CELL else paragraphs
+        target[anchor_id] = anchor
+    return paragraphs, cells
+
+
+__all__ = [
+    "AnchorDiff",
+    "StoredAnchor",
+    "anchor_fingerprint",
+    "anchor_order_key",
+    "anchor_position",
+    "apply_anchor_diff",
+    "diff_anchors",
+    "load_stored_anchors",
+    "split_stored_anchors",
+    "stored_anchor",
+]
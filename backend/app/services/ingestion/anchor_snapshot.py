@@ -0,0 +1,171 @@
+"""
+Снимок anchors версии документа в памяти на время одной ингестии.
+
+Снимок строится один раз из результата парсинга (после записи anchors и cell anchors SoA)
+и передаётся стадиям вместо повторных SELECT по anchors с гидрацией тысяч ORM-объектов:
+chunking, извлечение фактов, маппинг секций, heading blocks, кластеризация заголовков
+и TopicEvidenceBuilder.
+
+Записи (SnapshotAnchor) совместимы по атрибутам с моделью Anchor для чтения (anchor_id,
+section_path, content_type, ordinal, text_raw, text_norm, location_json, source_zone,
+language, confidence). Снимок неизменяем и общий для всех стадий: записи и
+location_json изменять нельзя. Индексы хранят позиции записей в порядке документа.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Collection, Iterable, Iterator
+from typing import Any
+from uuid import UUID
+
+from app.db.enums import AnchorContentType, DocumentLanguage, SourceZone
+
+
+def _source_zone(value: Any) -> SourceZone:
+    if isinstance(value, SourceZone):
+        return value
+    try:
+        return SourceZone(value or SourceZone.UNKNOWN.value)
+    except ValueError:
+        return SourceZone.UNKNOWN
+
+
+def _language(value: Any) -> DocumentLanguage:
+    if isinstance(value, DocumentLanguage):
+        return value
+    try:
+        return DocumentLanguage(value or DocumentLanguage.UNKNOWN.value)
+    except ValueError:
+        return DocumentLanguage.UNKNOWN
+
+
+def _para_index(location_json: Any) -> int | None:
+    if not isinstance(location_json, dict):
+        return None
+    try:
+        return int(location_json["para_index"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class SnapshotAnchor:
+    """Компактная read-only запись anchor (атрибуты как у модели Anchor)."""
+
+    __slots__ = (
+        "id",
+        "doc_version_id",
+        "anchor_id",
+        "section_path",
+        "content_type",
+        "ordinal",
+        "text_raw",
+        "text_norm",
+        "text_hash",
+        "location_json",
+        "source_zone",
+        "language",
+        "confidence",
+        "para_index",
+    )
+
+    def __init__(self, anchor: Any) -> None:
+        # id известен только для anchors, прочитанных из БД (при COPY он генерируется при записи)
+        self.id: UUID | None = getattr(anchor, "id", None)
+        self.doc_version_id: UUID = anchor.doc_version_id
+        self.anchor_id: str = anchor.anchor_id
+        self.section_path: str = anchor.section_path
+        self.content_type = AnchorContentType(anchor.content_type)
+        self.ordinal: int = anchor.ordinal
+        self.text_raw: str = anchor.text_raw
+        self.text_norm: str = anchor.text_norm
+        self.text_hash: str = anchor.text_hash
+        self.location_json: dict[str, Any] = anchor.location_json
+        self.source_zone = _source_zone(anchor.source_zone)
+        self.language = _language(anchor.language)
+        self.confidence: float | None = getattr(anchor, "confidence", None)
+        self.para_index = _para_index(anchor.location_json)
+
+    def __repr__(self) -> str:
+        return f"SnapshotAnchor(anchor_id={self.anchor_id!r}, content_type={self.content_type.value})"
+
+
+class AnchorSnapshot:
+    """Неизменяемый снимок anchors версии документа с индексами."""
+
+    __slots__ = ("doc_version_id", "_records", "_by_id", "_by_section", "_by_type", "_by_para_index")
+
+    def __init__(self, doc_version_id: UUID, anchors: Iterable[Any] = ()) -> None:
+        self.doc_version_id = doc_version_id
+        self._records: tuple[SnapshotAnchor, ...] = tuple(
+            anchor if isinstance(anchor, SnapshotAnchor) else SnapshotAnchor(anchor) for anchor in anchors
+        )
+        self._by_id: dict[str, int] = {}
+        by_section: dict[str, list[int]] = defaultdict(list)
+        by_type: dict[AnchorContentType, list[int]] = defaultdict(list)
+        by_para_index: dict[int, list[int]] = defaultdict(list)
+        for pos, record in enumerate(self._records):
+            self._by_id[record.anchor_id] = pos
+            by_section[record.section_path].append(pos)
+            by_type[record.content_type].append(pos)
+            if record.para_index is not None:
+                by_para_index[record.para_index].append(pos)
+        self._by_section = {key: tuple(value) for key, value in by_section.items()}
+        self._by_type = {key: tuple(value) for key, value in by_type.items()}
+        self._by_para_index = {key: tuple(value) for key, value in by_para_index.items()}
+
+    def extend(self, anchors: Iterable[Any]) -> AnchorSnapshot:
+        """Новый снимок с добавленными anchors (например, cell anchors SoA)."""
+        return AnchorSnapshot(self.doc_version_id, (*self._records, *anchors))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[SnapshotAnchor]:
+        return iter(self._records)
+
+    def __contains__(self, anchor_id: object) -> bool:
+        return anchor_id in self._by_id
+
+    def get(self, anchor_id: str) -> SnapshotAnchor | None:
+        pos = self._by_id.get(anchor_id)
+        return self._records[pos] if pos is not None else None
+
+    def by_ids(self, anchor_ids: Iterable[str]) -> list[SnapshotAnchor]:
+        """Anchors по списку anchor_id (отсутствующие пропускаются, порядок — как в списке)."""
+        return [self._records[pos] for pos in (self._by_id.get(a) for a in anchor_ids) if pos is not None]
+
+    def select(
+        self,
+        content_types: Collection[AnchorContentType] | None = None,
+        section_paths: Collection[str] | None = None,
+    ) -> list[SnapshotAnchor]:
+        """Anchors с фильтром по типам и секциям (в порядке документа); None — без фильтра."""
+        positions: Iterable[int] | None = None
+        if content_types is not None:
+            positions = {pos for ct in content_types for pos in self._by_type.get(ct, ())}
+        if section_paths is not None:
+            section_positions = {pos for sp in section_paths for pos in self._by_section.get(sp, ())}
+            positions = section_positions if positions is None else section_positions & set(positions)
+        if positions is None:
+            return list(self._records)
+        return [self._records[pos] for pos in sorted(positions)]
+
+    def in_section(self, section_path: str) -> list[SnapshotAnchor]:
+        return [self._records[pos] for pos in self._by_section.get(section_path, ())]
+
+    def at_para_index(self, para_index: int) -> list[SnapshotAnchor]:
+        return [self._records[pos] for pos in self._by_para_index.get(para_index, ())]
+
+    def ordered_by_ordinal(
+        self, content_types: Collection[AnchorContentType] | None = None
+    ) -> list[SnapshotAnchor]:
+        """Как ORDER BY ordinal (при равном ordinal — порядок документа)."""
+        return sorted(self.select(content_types), key=lambda a: a.ordinal)
+
+    @property
+    def section_paths(self) -> list[str]:
+        """section_path в порядке первого появления в документе."""
+        return list(self._by_section)
+
+
+__all__ = ["AnchorSnapshot", "SnapshotAnchor"]
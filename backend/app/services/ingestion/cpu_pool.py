@@ -0,0 +1,81 @@
+"""
+Пул процессов для CPU-bound этапов ингестии.
+
+Парсинг DOCX (python-docx/lxml), детекция заголовков, классификация source_zone
+и скоринг таблиц SoA — синхронная работа на сотни миллисекунд/секунды. Вызванная
+прямо из async-кода, она блокирует event loop (uvicorn/воркер очереди), и все
+остальные запросы ждут окончания парсинга. Поэтому эти этапы выполняются в
+ProcessPoolExecutor: event loop свободен, а несколько документов разбираются
+параллельно на разных ядрах.
+
+Один пул на процесс (get_cpu_executor), размер — settings.ingestion_cpu_workers;
+0 — выполнение в потоке (asyncio.to_thread), например для отладки.
+Функции, передаваемые в пул, должны быть объявлены на уровне модуля, а их
+аргументы и результаты — сериализуемы через pickle.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, TypeVar
+
+from app.core.config import settings
+from app.core.logging import logger
+
+T = TypeVar("T")
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def get_cpu_executor() -> ProcessPoolExecutor | None:
+    """
+    Общий пул процессов для CPU-bound этапов (None, если ingestion_cpu_workers = 0).
+
+    Используется контекст spawn: fork процесса с запущенным event loop, потоками
+    и открытыми соединениями к БД небезопасен.
+    """
+    global _executor
+    if settings.ingestion_cpu_workers <= 0:
+        return None
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.ingestion_cpu_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info(f"Пул процессов ингестии создан: workers={settings.ingestion_cpu_workers}")
+    return _executor
+
+
+def shutdown_cpu_executor() -> None:
+    """Останавливает пул процессов (при завершении приложения/воркера)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+async def run_cpu_bound(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Выполняет fn(*args, **kwargs) в пуле процессов, не блокируя event loop.
+
+    Если процесс пула аварийно завершился (например, OOM на большом документе),
+    пул пересоздаётся при следующем вызове, а исключение пробрасывается вызывающему.
+    """
+    global _executor
+    call = functools.partial(fn, *args, **kwargs)
+    executor = get_cpu_executor()
+    if executor is None:
+        return await asyncio.to_thread(call)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, call)
+    except BrokenProcessPool:
+        logger.error("Пул процессов ингестии аварийно завершился, будет пересоздан")
+        if _executor is executor:
+            _executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+        raise
@@ -6,10 +6,9 @@ import re
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
-from docx import Document
 from docx.oxml.text.paragraph import CT_P
 from docx.text.paragraph import Paragraph
 
@@ -17,6 +16,9 @@ from app.db.enums import AnchorContentType, DocumentLanguage, DocumentType
 from app.services.ingestion.heading_detector import HeadingDetector, HeadingHit, DocStats
 from app.services.source_zone_classifier import get_classifier
 
+if TYPE_CHECKING:
+    from app.services.ingestion.parsed_docx import ParsedDocx, ParsedParagraph
+
 # Регулярные выражения для детекции языка
 _CYR_RE = re.compile(r"[А-Яа-яЁё]")
 _LAT_RE = re.compile(r"[A-Za-z]")
@@ -216,7 +218,8 @@ class DocxIngestor:
         doc_version_id: UUID, 
         document_language: DocumentLanguage,
         doc_type: DocumentType,
-        timeout_seconds: int = 600
+        timeout_seconds: int = 600,
+        parsed: ParsedDocx | None = None,
     ) -> DocxIngestResult:
         """
         Парсит DOCX документ и создаёт anchors.
@@ -227,6 +230,7 @@ class DocxIngestor:
             document_language: Язык документа
             doc_type: Тип документа (определяет набор правил классификации source_zone)
             timeout_seconds: Максимальное время обработки документа в секундах (по умолчанию 600 = 10 минут)
+            parsed: Уже распарсенный документ (ParsedDocx). Если не передан, файл парсится здесь.
             
         Returns:
             DocxIngestResult с anchors, summary и warnings
@@ -247,15 +251,16 @@ class DocxIngestor:
                 )
         
         file_path = Path(file_path)
-        if not file_path.exists():
-            raise FileNotFoundError(f"Файл не найден: {file_path}")
-        
-        # Загружаем документ
-        doc = Document(str(file_path))
+        if parsed is None:
+            from app.services.ingestion.parsed_docx import ParsedDocx
+
+            # Загружаем документ (XML парсится один раз, см. ParsedDocx)
+            parsed = ParsedDocx.load(file_path)
+        doc = parsed.doc
         check_timeout()
         
-        # Вычисляем статистику документа для visual fallback
-        doc_stats = HeadingDetector.compute_doc_stats(list(doc.paragraphs))
+        # Статистика документа для visual fallback (посчитана при парсинге)
+        doc_stats = parsed.doc_stats
         check_timeout()
         
         # Первый проход: детект только style/outline/numbering
@@ -267,24 +272,24 @@ class DocxIngestor:
         detector._rejection_counter = rejection_counter
         
         # Собираем hits для всех параграфов
-        paragraph_hits: list[tuple[Paragraph, HeadingHit]] = []
+        paragraph_hits: list[tuple[ParsedParagraph, HeadingHit]] = []
         heading_count = 0
         
         para_index_for_detection = 0
-        for paragraph in doc.paragraphs:
+        for parsed_para in parsed.paragraphs:
             # Проверяем таймаут каждые 100 параграфов для оптимизации
             if para_index_for_detection % 100 == 0:
                 check_timeout()
             
             para_index_for_detection += 1
-            hit = detector.detect(paragraph, para_index=para_index_for_detection)
-            paragraph_hits.append((paragraph, hit))
+            hit = detector.detect(parsed_para.paragraph, para_index=para_index_for_detection)
+            paragraph_hits.append((parsed_para, hit))
             if hit.is_heading:
                 heading_count += 1
         
         # Определяем, нужен ли visual fallback
         # Если заголовков мало (< 3 на документ > 50 параграфов) → rerun с visual fallback
-        total_paragraphs = len([p for p in doc.paragraphs if normalize_text(p.text)])
+        total_paragraphs = parsed.non_empty_paragraphs_count
         enable_visual = False
         
         if heading_count == 0 or (total_paragraphs > 50 and heading_count < 3):
@@ -300,14 +305,14 @@ class DocxIngestor:
             paragraph_hits = []
             heading_count = 0
             para_index_for_detection = 0
-            for paragraph in doc.paragraphs:
+            for parsed_para in parsed.paragraphs:
                 # Проверяем таймаут каждые 100 параграфов для оптимизации
                 if para_index_for_detection % 100 == 0:
                     check_timeout()
                 
                 para_index_for_detection += 1
-                hit = detector.detect(paragraph, para_index=para_index_for_detection)
-                paragraph_hits.append((paragraph, hit))
+                hit = detector.detect(parsed_para.paragraph, para_index=para_index_for_detection)
+                paragraph_hits.append((parsed_para, hit))
                 if hit.is_heading:
                     heading_count += 1
         
@@ -338,23 +343,24 @@ class DocxIngestor:
         para_index = 0  # Счётчик всех параграфов для location_json
         
         # Проходим по всем параграфам документа с hits
-        for paragraph, hit in paragraph_hits:
+        for parsed_para, hit in paragraph_hits:
             # Проверяем таймаут каждые 100 параграфов для оптимизации
             if para_index % 100 == 0:
                 check_timeout()
             
             para_index += 1
+            paragraph = parsed_para.paragraph
             
-            # Получаем сырой текст
-            text_raw = paragraph.text
+            # Сырой и нормализованный текст посчитаны при парсинге
+            text_raw = parsed_para.text_raw
             
             # Пропускаем пустые параграфы
-            text_norm = normalize_text(text_raw)
+            text_norm = parsed_para.text_norm
             if not text_norm:
                 continue
             
             # Определяем стиль
-            style_name = paragraph.style.name if paragraph.style else "Normal"
+            style_name = parsed_para.style_name
             
             # Определяем content_type и обновляем стек заголовков
             content_type: AnchorContentType
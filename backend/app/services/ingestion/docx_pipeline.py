@@ -0,0 +1,59 @@
+"""CPU-bound часть ингестии DOCX, выполняемая в пуле процессов (см. cpu_pool)."""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from uuid import UUID
+
+from app.db.enums import DocumentLanguage, DocumentType
+from app.schemas.common import SoAResult
+from app.services.ingestion.docx_ingestor import DocxIngestor, DocxIngestResult
+from app.services.ingestion.parsed_docx import ParsedDocx
+from app.services.soa_extraction import CellAnchorCreate, SoAExtractionService
+
+
+@dataclass
+class DocxParseResult:
+    """Результат разбора DOCX в пуле процессов (передаётся обратно через pickle)."""
+
+    ingest: DocxIngestResult
+    cell_anchors: list[CellAnchorCreate] = field(default_factory=list)
+    soa_result: SoAResult | None = None
+    # Время CPU-этапов внутри процесса пула, мс
+    timings_ms: dict[str, int] = field(default_factory=dict)
+
+
+def parse_docx_document(
+    file_path: str | Path,
+    doc_version_id: UUID,
+    document_language: DocumentLanguage,
+    doc_type: DocumentType,
+) -> DocxParseResult:
+    """
+    Парсит DOCX, строит anchors (заголовки, source_zone) и извлекает SoA.
+
+    Выполняется целиком в одном процессе пула: ParsedDocx (дерево lxml) не
+    сериализуется, поэтому документ разбирается один раз и переиспользуется
+    DocxIngestor и SoAExtractionService, а наружу возвращаются только DTO.
+    """
+    start = time.perf_counter()
+    parsed = ParsedDocx.load(file_path)
+    ingest_result = DocxIngestor().ingest(
+        file_path,
+        doc_version_id,
+        document_language,
+        doc_type,
+        parsed=parsed,
+    )
+    result = DocxParseResult(ingest=ingest_result)
+    result.timings_ms["docx_parse_cpu"] = int((time.perf_counter() - start) * 1000)
+
+    # SoA ищется только в документах, из которых получились anchors
+    if ingest_result.anchors:
+        start = time.perf_counter()
+        result.cell_anchors, result.soa_result = SoAExtractionService().extract_soa_from_parsed(
+            parsed, doc_version_id
+        )
+        result.timings_ms["soa_scoring_cpu"] = int((time.perf_counter() - start) * 1000)
+    return result
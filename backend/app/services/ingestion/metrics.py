@@ -136,6 +136,7 @@ class IngestionMetrics:
     """Полные метрики ингестии документа."""
     
     timings_ms: dict[str, int] = field(default_factory=dict)  # этап -> время в мс
+    critical_path: list[str] = field(default_factory=list)  # самая долгая цепочка зависимых стадий (нижняя граница общего времени)
     anchors: AnchorMetrics = field(default_factory=AnchorMetrics)
     chunks: ChunkMetrics = field(default_factory=ChunkMetrics)
     soa: SoAMetrics = field(default_factory=SoAMetrics)
@@ -182,6 +183,7 @@ class IngestionMetrics:
         """
         return {
             "timings_ms": self.timings_ms,
+            "critical_path": self.critical_path,
             "anchors": {
                 "total": self.anchors.total,
                 "by_content_type": self.anchors.by_content_type,
@@ -2,16 +2,19 @@
 
 from __future__ import annotations
 
+import copy
 import time
-from collections import defaultdict
-from typing import Any
+from collections import Counter
+from collections.abc import Iterable, Sequence
+from enum import Enum
+from typing import TYPE_CHECKING, Any
 
 from uuid import UUID
 
-from sqlalchemy import func, select
+from sqlalchemy import and_, case, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.enums import DocumentType, FactStatus, SectionMapStatus, SourceZone
+from app.db.enums import AnchorContentType, DocumentType, FactStatus, SectionMapStatus, SourceZone
 from app.db.models.anchors import Anchor, Chunk
 from app.db.models.facts import Fact
 from app.db.models.sections import TargetSectionMap
@@ -28,16 +31,38 @@ from app.services.ingestion.metrics import (
     compute_percentiles,
 )
 
+if TYPE_CHECKING:
+    from app.services.ingestion.docx_ingestor import AnchorCreate
+
+
+def _enum_value(value: Any) -> str:
+    """Значение enum-поля (из БД приходит Enum, у AnchorCreate source_zone — строка)."""
+    return value.value if isinstance(value, Enum) else str(value)
+
 
 class MetricsCollector:
-    """Сборщик метрик из базы данных."""
+    """
+    Сборщик метрик ингестии.
+
+    Каждая группа метрик — один запрос к своей таблице (или подсчёт в памяти по данным,
+    которые уже есть у пайплайна) и один проход по строкам.
+    """
     
     def __init__(self, db: AsyncSession, doc_version_id: str) -> None:
         self.db = db
         self.doc_version_id = doc_version_id
         self.metrics = IngestionMetrics()
         self._timing_start: dict[str, float] = {}
-    
+
+    def with_session(self, db: AsyncSession) -> MetricsCollector:
+        """
+        Сборщик, читающий из другой сессии, но пишущий в те же метрики.
+        Нужен стадиям пайплайна и отложенному сбору метрик (своя сессия после commit).
+        """
+        collector = copy.copy(self)
+        collector.db = db
+        return collector
+
     def start_timing(self, step: str) -> None:
         """Начинает отсчёт времени для этапа."""
         self._timing_start[step] = time.time()
@@ -48,203 +73,163 @@ class MetricsCollector:
             duration_ms = int((time.time() - self._timing_start[step]) * 1000)
             self.metrics.timings_ms[step] = duration_ms
             del self._timing_start[step]
+
+    def record_timing(self, step: str, duration_ms: int) -> None:
+        """Сохраняет длительность этапа, измеренную вне сборщика (например, в пуле процессов)."""
+        self.metrics.timings_ms[step] = duration_ms
     
-    async def collect_anchor_metrics(self) -> None:
-        """Собирает метрики по anchors."""
-        # Запрос для подсчёта anchors
-        stmt = select(
-            func.count(Anchor.id).label("total"),
-            func.count().filter(Anchor.source_zone == SourceZone.UNKNOWN).label("unknown_count"),
-            func.count().filter(func.length(Anchor.text_norm) < 10).label("empty_or_short"),
-            func.count().filter(Anchor.confidence < 0.5).label("low_confidence"),
-        ).where(Anchor.doc_version_id == UUID(self.doc_version_id))
-        
-        result = await self.db.execute(stmt)
-        row = result.one()
-        
-        self.metrics.anchors.total = row.total or 0
-        self.metrics.anchors.empty_or_short = row.empty_or_short or 0
-        
-        if self.metrics.anchors.total > 0:
-            unknown_count = row.unknown_count or 0
-            self.metrics.anchors.unknown_rate = unknown_count / self.metrics.anchors.total
-            low_confidence_count = row.low_confidence or 0
-            self.metrics.anchors.low_confidence_rate = low_confidence_count / self.metrics.anchors.total
-        
-        # Группировка по content_type
-        stmt = select(
-            Anchor.content_type,
-            func.count(Anchor.id).label("count"),
-        ).where(Anchor.doc_version_id == UUID(self.doc_version_id)).group_by(Anchor.content_type)
-        
-        result = await self.db.execute(stmt)
-        for row in result.all():
-            self.metrics.anchors.by_content_type[row.content_type.value] = row.count
-        
-        # Группировка по source_zone
-        stmt = select(
-            Anchor.source_zone,
-            func.count(Anchor.id).label("count"),
-        ).where(Anchor.doc_version_id == UUID(self.doc_version_id)).group_by(Anchor.source_zone)
-        
-        result = await self.db.execute(stmt)
-        for row in result.all():
-            self.metrics.anchors.by_source_zone[row.source_zone.value] = row.count
-        
-        # Группировка по language
-        stmt = select(
-            Anchor.language,
-            func.count(Anchor.id).label("count"),
-        ).where(Anchor.doc_version_id == UUID(self.doc_version_id)).group_by(Anchor.language)
-        
-        result = await self.db.execute(stmt)
-        for row in result.all():
-            self.metrics.anchors.by_language[row.language.value] = row.count
-        
-        # Длины текстов для процентилей
-        stmt = select(func.length(Anchor.text_norm)).where(
-            Anchor.doc_version_id == UUID(self.doc_version_id)
-        )
-        result = await self.db.execute(stmt)
-        text_lengths = [row[0] for row in result.all() if row[0] is not None]
-        
+    async def collect_anchor_metrics(self, anchors: Sequence[AnchorCreate] | None = None) -> None:
+        """
+        Собирает метрики по anchors за один проход.
+
+        Args:
+            anchors: Anchors, которые уже есть у пайплайна (результат парсинга) — метрики
+                считаются в памяти без обращения к БД. None — один запрос к таблице anchors.
+        """
+        if anchors is not None:
+            rows: Iterable[tuple[Any, Any, Any, int | None, float | None, str]] = (
+                (a.content_type, a.source_zone, a.language, len(a.text_norm), None, a.text_norm)
+                for a in anchors
+            )
+        else:
+            stmt = select(
+                Anchor.content_type,
+                Anchor.source_zone,
+                Anchor.language,
+                func.length(Anchor.text_norm),
+                Anchor.confidence,
+                # Текст нужен только для топа unknown-заголовков
+                case(
+                    (
+                        and_(
+                            Anchor.content_type == AnchorContentType.HDR,
+                            Anchor.source_zone == SourceZone.UNKNOWN,
+                        ),
+                        Anchor.text_norm,
+                    ),
+                    else_=None,
+                ),
+            ).where(Anchor.doc_version_id == UUID(self.doc_version_id))
+            rows = (await self.db.execute(stmt)).tuples().all()
+
+        metrics = self.metrics.anchors
+        by_content_type: Counter[str] = Counter()
+        by_source_zone: Counter[str] = Counter()
+        by_language: Counter[str] = Counter()
+        unknown_headings: Counter[str] = Counter()
+        text_lengths: list[int] = []
+        total = empty_or_short = low_confidence = 0
+        for content_type, source_zone, language, text_len, confidence, text_norm in rows:
+            total += 1
+            content_type, source_zone = _enum_value(content_type), _enum_value(source_zone)
+            by_content_type[content_type] += 1
+            by_source_zone[source_zone] += 1
+            by_language[_enum_value(language)] += 1
+            if text_len is not None:
+                text_lengths.append(text_len)
+                if text_len < 10:
+                    empty_or_short += 1
+            if confidence is not None and confidence < 0.5:
+                low_confidence += 1
+            if (
+                text_norm is not None
+                and content_type == AnchorContentType.HDR.value
+                and source_zone == SourceZone.UNKNOWN.value
+            ):
+                unknown_headings[text_norm] += 1
+
+        metrics.total = total
+        metrics.empty_or_short = empty_or_short
+        if total > 0:
+            metrics.unknown_rate = by_source_zone[SourceZone.UNKNOWN.value] / total
+            metrics.low_confidence_rate = low_confidence / total
+        metrics.by_content_type.update(by_content_type)
+        metrics.by_source_zone.update(by_source_zone)
+        metrics.by_language.update(by_language)
         if text_lengths:
-            self.metrics.anchors.text_len = compute_percentiles(text_lengths)
-        
+            metrics.text_len = compute_percentiles(text_lengths)
         # Топ unknown headings (заголовки с source_zone=unknown)
-        from app.db.enums import AnchorContentType
-        stmt = select(
-            Anchor.text_norm,
-            func.count(Anchor.id).label("count"),
-        ).where(
-            Anchor.doc_version_id == UUID(self.doc_version_id),
-            Anchor.content_type == AnchorContentType.HDR,
-            Anchor.source_zone == SourceZone.UNKNOWN,
-        ).group_by(Anchor.text_norm).order_by(func.count(Anchor.id).desc()).limit(10)
-        
-        result = await self.db.execute(stmt)
-        for row in result.all():
-            self.metrics.anchors.top_unknown_headings.append({
-                "heading": row.text_norm[:100],  # Ограничиваем длину
-                "count": row.count,
+        for heading, count in unknown_headings.most_common(10):
+            metrics.top_unknown_headings.append({
+                "heading": heading[:100],  # Ограничиваем длину
+                "count": count,
             })
     
     async def collect_chunk_metrics(self) -> None:
-        """Собирает метрики по chunks."""
-        # Подсчёт chunks
-        stmt = select(func.count(Chunk.id)).where(Chunk.doc_version_id == UUID(self.doc_version_id))
-        result = await self.db.execute(stmt)
-        self.metrics.chunks.total = result.scalar() or 0
-        
-        # Группировка по source_zone
+        """Собирает метрики по chunks (один запрос к таблице chunks)."""
+        token_estimate = Chunk.metadata_json["token_estimate"]
         stmt = select(
             Chunk.source_zone,
-            func.count(Chunk.id).label("count"),
-        ).where(Chunk.doc_version_id == UUID(self.doc_version_id)).group_by(Chunk.source_zone)
-        
-        result = await self.db.execute(stmt)
-        for row in result.all():
-            self.metrics.chunks.by_source_zone[row.source_zone.value] = row.count
-        
-        # Группировка по language
-        stmt = select(
             Chunk.language,
-            func.count(Chunk.id).label("count"),
-        ).where(Chunk.doc_version_id == UUID(self.doc_version_id)).group_by(Chunk.language)
-        
-        result = await self.db.execute(stmt)
-        for row in result.all():
-            self.metrics.chunks.by_language[row.language.value] = row.count
-        
-        # Token estimates из metadata_json
-        stmt = select(Chunk.metadata_json).where(Chunk.doc_version_id == UUID(self.doc_version_id))
-        result = await self.db.execute(stmt)
-        token_estimates = []
-        for row in result.all():
-            if row.metadata_json and isinstance(row.metadata_json, dict):
-                tokens = row.metadata_json.get("token_estimate")
-                if isinstance(tokens, (int, float)):
-                    token_estimates.append(float(tokens))
-        
+            # Только числовые token_estimate; metadata_json целиком не выгружается
+            case(
+                (func.jsonb_typeof(token_estimate) == "number", token_estimate.as_float()),
+                else_=None,
+            ),
+            func.array_length(Chunk.anchor_ids, 1),
+        ).where(Chunk.doc_version_id == UUID(self.doc_version_id))
+        rows = (await self.db.execute(stmt)).tuples().all()
+
+        by_source_zone: Counter[str] = Counter()
+        by_language: Counter[str] = Counter()
+        token_estimates: list[float] = []
+        anchor_counts: list[int] = []
+        for source_zone, language, tokens, anchor_count in rows:
+            by_source_zone[_enum_value(source_zone)] += 1
+            by_language[_enum_value(language)] += 1
+            if tokens is not None:
+                token_estimates.append(float(tokens))
+            if anchor_count is not None:
+                anchor_counts.append(anchor_count)
+
+        self.metrics.chunks.total = len(rows)
+        self.metrics.chunks.by_source_zone.update(by_source_zone)
+        self.metrics.chunks.by_language.update(by_language)
         if token_estimates:
             self.metrics.chunks.token_estimate = compute_percentiles(token_estimates)
-        
-        # Anchor counts из anchor_ids
-        stmt = select(func.array_length(Chunk.anchor_ids, 1)).where(
-            Chunk.doc_version_id == UUID(self.doc_version_id)
-        )
-        result = await self.db.execute(stmt)
-        anchor_counts = [row[0] for row in result.all() if row[0] is not None]
-        
         if anchor_counts:
             self.metrics.chunks.anchor_count = compute_percentiles(anchor_counts, [50, 95])
     
     async def collect_facts_metrics(self, study_id: str) -> None:
-        """Собирает метрики по фактам."""
+        """Собирает метрики по фактам (один сгруппированный запрос)."""
         from app.core.logging import logger
         
-        # Подсчёт фактов - считаем все факты для study_id, не только для текущей версии документа
-        # Факты относятся к исследованию в целом, а не к конкретной версии документа
-        stmt = select(func.count(Fact.id)).where(
-            Fact.study_id == UUID(study_id),
-        )
-        result = await self.db.execute(stmt)
-        facts_total = result.scalar() or 0
-        self.metrics.facts.total = facts_total
-        
-        logger.debug(
-            f"Facts metrics для study_id={study_id}: total={facts_total}, "
-            f"doc_version_id={self.doc_version_id}"
-        )
-        
-        # Группировка по fact_key (fact_type/fact_key)
+        # Считаем все факты для study_id, не только для текущей версии документа:
+        # факты относятся к исследованию в целом, а не к конкретной версии документа
         stmt = select(
             Fact.fact_type,
             Fact.fact_key,
-            func.count(Fact.id).label("count"),
-        ).where(
-            Fact.study_id == UUID(study_id),
-        ).group_by(Fact.fact_type, Fact.fact_key)
-        
-        result = await self.db.execute(stmt)
-        for row in result.all():
-            key = f"{row.fact_type}/{row.fact_key}"
-            self.metrics.facts.by_fact_key[key] = row.count
-        
-        # Группировка по status
-        stmt = select(
             Fact.status,
             func.count(Fact.id).label("count"),
+            # Валидными считаются факты со статусом 'extracted' или 'validated' с confidence >= 0.7
+            # (confidence None — не валидный: нужна явная уверенность)
+            func.count().filter(Fact.confidence >= 0.7).label("confident"),
         ).where(
             Fact.study_id == UUID(study_id),
-        ).group_by(Fact.status)
-        
-        result = await self.db.execute(stmt)
-        for row in result.all():
-            self.metrics.facts.by_status[row.status.value] = row.count
-        
-        # Конфликтующие факты
-        conflicting_count = self.metrics.facts.by_status.get(FactStatus.CONFLICTING.value, 0)
-        self.metrics.facts.conflicting_count = conflicting_count
-        
-        # Факты со статусом 'extracted' или 'validated' с confidence >= 0.7
-        # Получаем все факты для проверки
-        stmt = select(Fact.status, Fact.confidence).where(
-            Fact.study_id == UUID(study_id),
-        )
+        ).group_by(Fact.fact_type, Fact.fact_key, Fact.status)
         result = await self.db.execute(stmt)
+
+        by_fact_key: Counter[str] = Counter()
+        by_status: Counter[str] = Counter()
         validated_count = 0
         for row in result.all():
-            status = row.status
-            confidence = row.confidence
-            # Считаем валидными факты со статусом 'extracted' или 'validated' с confidence >= 0.7
-            if status in (FactStatus.EXTRACTED, FactStatus.VALIDATED):
-                # Если confidence None, не считаем валидным (нужна явная уверенность >= 0.7)
-                if confidence is not None and confidence >= 0.7:
-                    validated_count += 1
-        
+            by_fact_key[f"{row.fact_type}/{row.fact_key}"] += row.count
+            by_status[row.status.value] += row.count
+            if row.status in (FactStatus.EXTRACTED, FactStatus.VALIDATED):
+                validated_count += row.confident
+
+        facts_total = sum(by_status.values())
+        self.metrics.facts.total = facts_total
+        self.metrics.facts.by_fact_key.update(by_fact_key)
+        self.metrics.facts.by_status.update(by_status)
+        self.metrics.facts.conflicting_count = self.metrics.facts.by_status.get(FactStatus.CONFLICTING.value, 0)
         self.metrics.facts.validated_count = validated_count
         
+        logger.debug(
+            f"Facts metrics для study_id={study_id}: total={facts_total}, "
+            f"doc_version_id={self.doc_version_id}"
+        )
+        
         # Проверка обязательных фактов (будет заполнено позже при проверке)
         # Здесь просто инициализируем список
         self.metrics.facts.missing_required = []
@@ -255,7 +240,7 @@ class MetricsCollector:
         core_sections: list[str] | None = None
     ) -> None:
         """
-        Собирает метрики по маппингу секций.
+        Собирает метрики по маппингу секций (один запрос к target_section_maps).
         
         Args:
             expected_sections: Ожидаемое количество секций (по умолчанию 12)
@@ -264,63 +249,40 @@ class MetricsCollector:
         """
         self.metrics.section_maps.expected = expected_sections
         
-        # Подсчёт всех section_maps
-        stmt = select(func.count(TargetSectionMap.id)).where(
-            TargetSectionMap.doc_version_id == UUID(self.doc_version_id)
-        )
-        result = await self.db.execute(stmt)
-        total_count = result.scalar() or 0
-        
-        # Если указаны core_sections, считаем coverage_rate только по ним
-        core_section_keys = None
-        if core_sections:
-            core_section_keys = set(core_sections)
-            stmt = select(func.count(TargetSectionMap.id)).where(
-                TargetSectionMap.doc_version_id == UUID(self.doc_version_id),
-                TargetSectionMap.target_section.in_(core_section_keys),
-                TargetSectionMap.status.in_([SectionMapStatus.MAPPED, SectionMapStatus.NEEDS_REVIEW]),  # Учитываем только не-overridden
-            )
-            result = await self.db.execute(stmt)
-            mapped_core_count = result.scalar() or 0
-            self.metrics.section_maps.total = mapped_core_count
-        else:
-            # Без core_sections используем общий подсчёт
-            self.metrics.section_maps.total = total_count
-        
-        # Группировка по status
-        stmt = select(
-            TargetSectionMap.status,
-            func.count(TargetSectionMap.id).label("count"),
-        ).where(TargetSectionMap.doc_version_id == UUID(self.doc_version_id)).group_by(TargetSectionMap.status)
-        
-        result = await self.db.execute(stmt)
-        for row in result.all():
-            self.metrics.section_maps.by_status[row.status.value] = row.count
-        
-        # Информация по каждой target_section
         stmt = select(
             TargetSectionMap.target_section,
             TargetSectionMap.status,
             TargetSectionMap.confidence,
         ).where(TargetSectionMap.doc_version_id == UUID(self.doc_version_id))
-        
-        result = await self.db.execute(stmt)
-        mapped_core_keys = set()
-        for row in result.all():
+        rows = (await self.db.execute(stmt)).all()
+
+        core_section_keys = set(core_sections) if core_sections else set()
+        by_status: Counter[str] = Counter()
+        mapped_core_count = 0
+        mapped_core_keys: set[str] = set()
+        for row in rows:
+            by_status[row.status.value] += 1
             self.metrics.section_maps.per_target_section[row.target_section] = {
                 "status": row.status.value,
                 "confidence": float(row.confidence) if row.confidence else None,
             }
-            # Собираем ключи маппированных core секций (статус mapped или needs_review, но не overridden)
-            if core_sections and core_section_keys and row.target_section in core_section_keys:
-                if row.status in (SectionMapStatus.MAPPED, SectionMapStatus.NEEDS_REVIEW):
-                    mapped_core_keys.add(row.target_section)
-        
-        # Вычисляем missing_core_keys
+            # Маппированные core секции: статус mapped или needs_review, но не overridden
+            if row.target_section in core_section_keys and row.status in (
+                SectionMapStatus.MAPPED, SectionMapStatus.NEEDS_REVIEW
+            ):
+                mapped_core_count += 1
+                mapped_core_keys.add(row.target_section)
+        self.metrics.section_maps.by_status.update(by_status)
+
         if core_sections:
+            # coverage_rate считается только по core_sections
+            self.metrics.section_maps.total = mapped_core_count
             self.metrics.section_maps.missing_core_keys = [
                 key for key in core_sections if key not in mapped_core_keys
             ]
+        else:
+            # Без core_sections используем общий подсчёт
+            self.metrics.section_maps.total = len(rows)
     
     def set_soa_metrics(
         self,
@@ -361,7 +323,12 @@ class MetricsCollector:
         self.metrics.source_zones.zone_set_key = doc_type.value
         self.metrics.source_zones.allowed_zones = registry.get_allowed_zones(doc_type)
         
-        # Собираем статистику по зонам из anchors
+        # Статистика по зонам совпадает с группировкой anchors: если метрики anchors уже
+        # собраны, повторный запрос не нужен
+        if self.metrics.anchors.total:
+            self.metrics.source_zones.by_zone_counts.update(self.metrics.anchors.by_source_zone)
+            return
+
         stmt = select(
             Anchor.source_zone,
             func.count(Anchor.id).label("count"),
@@ -369,8 +336,7 @@ class MetricsCollector:
         
         result = await self.db.execute(stmt)
         for row in result.all():
-            zone_key = row.source_zone.value if hasattr(row.source_zone, 'value') else str(row.source_zone)
-            self.metrics.source_zones.by_zone_counts[zone_key] = row.count
+            self.metrics.source_zones.by_zone_counts[_enum_value(row.source_zone)] = row.count
     
     async def collect_topics_metrics(self, doc_type: DocumentType) -> None:
         """Собирает метрики по маппингу топиков."""
@@ -378,57 +344,46 @@ class MetricsCollector:
         if doc_type != DocumentType.PROTOCOL:
             return
         
-        from app.db.models.topics import HeadingBlockTopicAssignment, Topic
-        from app.services.topic_repository import TopicRepository
+        from app.db.models.topics import HeadingBlockTopicAssignment
+        from app.services.topic_registry import get_topic_registry
         from app.core.logging import logger
         
-        # Получаем workspace_id из документа
-        doc_version = await self.db.get(DocumentVersion, UUID(self.doc_version_id))
-        if not doc_version:
+        # workspace_id документа — одним запросом по версии
+        stmt = (
+            select(Document.workspace_id)
+            .join(DocumentVersion, DocumentVersion.document_id == Document.id)
+            .where(DocumentVersion.id == UUID(self.doc_version_id))
+        )
+        workspace_id = (await self.db.execute(stmt)).scalar_one_or_none()
+        if workspace_id is None:
             logger.warning(f"DocumentVersion {self.doc_version_id} не найден для collect_topics_metrics")
             return
         
-        document = await self.db.get(Document, doc_version.document_id)
-        if not document:
-            logger.warning(f"Document {doc_version.document_id} не найден для collect_topics_metrics")
-            return
-        
-        workspace_id = document.workspace_id
-        
-        # Получаем список всех активных топиков, применимых к протоколу
-        topic_repo = TopicRepository(self.db)
-        all_topics = await topic_repo.list_topics(workspace_id=workspace_id, is_active=True)
-        
-        # Фильтруем топики по applicable_to (если пусто, применим ко всем)
-        applicable_topics = []
-        for topic in all_topics:
-            applicable_to = topic.applicable_to_json or []
-            if not applicable_to or doc_type.value in applicable_to:
-                applicable_topics.append(topic.topic_key)
+        # Активные топики, применимые к doc_type (applicable_to пуст — применим ко всем);
+        # реестр уже скомпилировал их при topic mapping и не обращается к таблице topics повторно
+        topics, active_topics_total = await get_topic_registry().get_topics(self.db, workspace_id, doc_type)
+        applicable_topics = [topic.topic_key for topic in topics]
         
         # Общее количество мастер-топиков (берём максимальное из 15 или фактическое количество)
         total_topics = max(15, len(applicable_topics)) if applicable_topics else 15
         self.metrics.topics.total_topics = total_topics
         
-        # Получаем уникальные topic_key из heading_block_topic_assignments для этой версии документа
+        # topic_key и число привязок из heading_block_topic_assignments для этой версии документа
         # Используем HeadingBlockTopicAssignment вместо TopicEvidence, так как привязки хранятся там
-        stmt = select(func.distinct(HeadingBlockTopicAssignment.topic_key)).where(
-            HeadingBlockTopicAssignment.doc_version_id == UUID(self.doc_version_id)
-        )
-        result = await self.db.execute(stmt)
-        mapped_topic_keys = {row[0] for row in result.all()}
-        
-        # Дополнительная проверка: сколько всего assignments в БД
-        stmt_count = select(func.count(HeadingBlockTopicAssignment.id)).where(
+        stmt = select(
+            HeadingBlockTopicAssignment.topic_key,
+            func.count(HeadingBlockTopicAssignment.id),
+        ).where(
             HeadingBlockTopicAssignment.doc_version_id == UUID(self.doc_version_id)
-        )
-        result_count = await self.db.execute(stmt_count)
-        assignments_count = result_count.scalar() or 0
+        ).group_by(HeadingBlockTopicAssignment.topic_key)
+        assignment_counts = dict((await self.db.execute(stmt)).tuples().all())
+        mapped_topic_keys = set(assignment_counts)
+        assignments_count = sum(assignment_counts.values())
         
         logger.info(
             f"Topics metrics для doc_version_id={self.doc_version_id}: "
             f"workspace_id={workspace_id}, "
-            f"all_topics_in_workspace={len(all_topics)}, "
+            f"all_topics_in_workspace={active_topics_total}, "
             f"applicable_topics={len(applicable_topics)} ({applicable_topics[:10] if applicable_topics else []}), "
             f"assignments_in_db={assignments_count}, "
             f"mapped_topic_keys={len(mapped_topic_keys)} ({sorted(list(mapped_topic_keys))[:10] if mapped_topic_keys else []})"
@@ -0,0 +1,177 @@
+"""Однократно распарсенный DOCX документ, разделяемый между этапами ингестии."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+
+from docx import Document
+from docx.document import Document as DocxDocument
+from docx.oxml.table import CT_Tbl
+from docx.oxml.text.paragraph import CT_P
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from app.services.ingestion.docx_ingestor import normalize_text
+from app.services.ingestion.heading_detector import DocStats, HeadingDetector
+
+# Параметры контекста таблицы (совпадают с историческими значениями SoAExtractionService)
+TABLE_CONTEXT_MAX_PREV_PARAS = 6
+TABLE_CONTEXT_MAX_HEADING_STACK = 4
+
+
+def style_heading_level(style_name: str | None) -> int | None:
+    """Уровень заголовка по имени стиля вида "Heading N" (иначе None)."""
+    if not style_name or not style_name.startswith("Heading"):
+        return None
+    level_str = style_name.replace("Heading", "").strip()
+    if not level_str.isdigit():
+        return None
+    try:
+        return int(level_str)
+    except ValueError:
+        return None
+
+
+@dataclass
+class ParsedParagraph:
+    """Параграф тела документа с предвычисленными текстом и стилем."""
+
+    para_index: int  # 1-based позиция среди параграфов тела (как location_json.para_index)
+    paragraph: Paragraph
+    text_raw: str
+    text_norm: str
+    style_name: str | None
+
+
+@dataclass
+class TableContext:
+    """Ближайший контекст таблицы: стек style-заголовков и предыдущие параграфы."""
+
+    heading_context: str  # "H1 / H2 / ..." или "ROOT"
+    prev_paragraphs: list[str]
+
+
+@dataclass
+class ParsedDocx:
+    """
+    Результат однократного парсинга DOCX (python-docx).
+
+    Строится один раз на ингестию и передаётся в DocxIngestor, HeadingDetector
+    и SoAExtractionService, чтобы не перечитывать XML и не обходить тело документа
+    повторно.
+    """
+
+    file_path: Path
+    doc: DocxDocument
+    paragraphs: list[ParsedParagraph]
+    # Параграфы тела в исходном порядке (эквивалент doc.paragraphs)
+    raw_paragraphs: list[Paragraph]
+    tables: list[Table]
+    body_blocks: list[Paragraph | Table]
+    table_contexts: list[TableContext]
+    # Итоговый стек style-заголовков ("Heading N") после обхода всех параграфов
+    heading_stack: list[tuple[int, str]]
+    doc_stats: DocStats
+    non_empty_paragraphs_count: int = 0
+
+    @classmethod
+    def load(cls, file_path: str | Path) -> ParsedDocx:
+        """
+        Открывает DOCX и собирает все производные структуры за один обход тела.
+
+        Args:
+            file_path: Путь к DOCX файлу
+
+        Returns:
+            ParsedDocx
+        """
+        file_path = Path(file_path)
+        if not file_path.exists():
+            raise FileNotFoundError(f"Файл не найден: {file_path}")
+        return cls.from_document(Document(str(file_path)), file_path)
+
+    @classmethod
+    def from_document(cls, doc: DocxDocument, file_path: str | Path | None = None) -> ParsedDocx:
+        """Строит ParsedDocx из уже открытого python-docx Document."""
+        raw_paragraphs = doc.paragraphs
+        tables = doc.tables
+
+        # Имя стиля по styleId: doc.styles резолвится один раз на уникальный стиль
+        style_names: dict[str | None, str | None] = {}
+
+        def _style_name(p: Paragraph) -> str | None:
+            style_id = p._p.style
+            if style_id not in style_names:
+                style = p.style
+                style_names[style_id] = style.name if style else "Normal"
+            return style_names[style_id]
+
+        paragraphs: list[ParsedParagraph] = []
+        body_blocks: list[Paragraph | Table] = []
+        table_contexts: list[TableContext] = []
+        heading_stack: list[tuple[int, str]] = []
+        ctx_heading_stack: list[tuple[int, str]] = []
+        prev_paras: list[str] = []
+        non_empty = 0
+
+        # doc.paragraphs / doc.tables — прямые дети body (p_lst / tbl_lst) в том же порядке,
+        # поэтому обход body восстанавливает их взаимный порядок без повторного создания прокси.
+        p_iter = iter(raw_paragraphs)
+        t_iter = iter(tables)
+        para_index = 0
+        for child in doc.element.body.iterchildren():
+            if isinstance(child, CT_P):
+                paragraph = next(p_iter)
+                para_index += 1
+                text_raw = paragraph.text
+                text_norm = normalize_text(text_raw)
+                style_name = _style_name(paragraph)
+                paragraphs.append(
+                    ParsedParagraph(
+                        para_index=para_index,
+                        paragraph=paragraph,
+                        text_raw=text_raw,
+                        text_norm=text_norm,
+                        style_name=style_name,
+                    )
+                )
+                body_blocks.append(paragraph)
+                if not text_norm:
+                    continue
+                non_empty += 1
+
+                level = style_heading_level(style_name)
+                prev_paras.append(text_norm)
+                if len(prev_paras) > TABLE_CONTEXT_MAX_PREV_PARAS:
+                    prev_paras = prev_paras[-TABLE_CONTEXT_MAX_PREV_PARAS:]
+                if level:
+                    heading_stack = [h for h in heading_stack if h[0] < level]
+                    heading_stack.append((level, text_norm))
+                    ctx_heading_stack = [h for h in ctx_heading_stack if h[0] < level]
+                    ctx_heading_stack.append((level, text_norm))
+                    if len(ctx_heading_stack) > TABLE_CONTEXT_MAX_HEADING_STACK:
+                        ctx_heading_stack = ctx_heading_stack[-TABLE_CONTEXT_MAX_HEADING_STACK:]
+            elif isinstance(child, CT_Tbl):
+                table = next(t_iter)
+                body_blocks.append(table)
+                table_contexts.append(
+                    TableContext(
+                        heading_context=(
+                            " / ".join(h[1] for h in ctx_heading_stack) if ctx_heading_stack else "ROOT"
+                        ),
+                        prev_paragraphs=list(prev_paras),
+                    )
+                )
+
+        return cls(
+            file_path=Path(file_path) if file_path is not None else Path(""),
+            doc=doc,
+            paragraphs=paragraphs,
+            raw_paragraphs=raw_paragraphs,
+            tables=tables,
+            body_blocks=body_blocks,
+            table_contexts=table_contexts,
+            heading_stack=heading_stack,
+            doc_stats=HeadingDetector.compute_doc_stats(raw_paragraphs),
+            non_empty_paragraphs_count=non_empty,
+        )
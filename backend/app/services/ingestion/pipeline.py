@@ -0,0 +1,246 @@
+"""
+Граф стадий пайплайна ингестии.
+
+Стадия объявляет артефакты, которые ей нужны (requires), и артефакты, которые она
+создаёт (provides). StagePipeline запускает стадию, как только готовы её входы,
+пропуская стадии с ложным condition.
+
+Все записи идут в одной сессии вызывающего кода и без commit: ингестия атомарна,
+при ошибке вызывающий код откатывает её целиком. AsyncSession не допускает
+конкурентного использования, поэтому работа стадии делится на две фазы:
+- compute (необязательная) — вычисление без сессии ингестии: по AnchorSnapshot и другим
+  данным в памяти, CPU-работа в потоке, чтение закоммиченных данных в отдельной сессии.
+  compute готовых стадий выполняются одновременно друг с другом и с записью других стадий;
+- run — работа в сессии ингестии (запись результата compute или вся стадия, если она
+  читает данные, записанные ранее в этой же транзакции). run выполняются по одному,
+  среди готовых — в порядке объявления.
+
+Время стадии — сумма её фаз. Общее время ограничено снизу самой долгой цепочкой
+зависимостей (critical_path) и суммарным временем фаз run (session); оба значения
+сохраняются в метриках.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import logger
+from app.services.ingestion.metrics_collector import MetricsCollector
+from app.services.ingestion.profiling import profile_stage
+
+StageFn = Callable[[AsyncSession], Awaitable[None]]
+ComputeFn = Callable[[], Awaitable[None]]
+
+
+@dataclass
+class Stage:
+    """Стадия пайплайна: корутина, получающая сессию БД ингестии, и необязательная фаза compute."""
+
+    name: str
+    run: StageFn
+    requires: tuple[str, ...] = ()
+    provides: tuple[str, ...] = ()
+    # Проверяется, когда входы готовы; False — стадия пропускается, её артефакты считаются готовыми
+    condition: Callable[[], bool] | None = None
+    # Вычисление без сессии ингестии; run запускается после его завершения
+    compute: ComputeFn | None = None
+
+
+@dataclass
+class PipelineReport:
+    """Итог выполнения графа стадий."""
+
+    # Время стадий (compute + run), без ожидания сессии
+    durations_ms: dict[str, int] = field(default_factory=dict)
+    skipped: list[str] = field(default_factory=list)
+    # Самая длинная по времени цепочка зависимых стадий
+    critical_path: list[str] = field(default_factory=list)
+    critical_path_ms: int = 0
+    # Суммарное время фаз run (сессия ингестии занята)
+    session_ms: int = 0
+
+
+class StagePipeline:
+    """Планировщик стадий по зависимостям артефактов."""
+
+    def __init__(self, stages: list[Stage]) -> None:
+        self.stages = stages
+        self._deps = self._resolve_dependencies(stages)
+        self._order = {stage.name: pos for pos, stage in enumerate(stages)}
+
+    @staticmethod
+    def _resolve_dependencies(stages: list[Stage]) -> dict[str, set[str]]:
+        """Строит зависимости стадия -> стадии-поставщики и проверяет граф."""
+        producers: dict[str, str] = {}
+        names: set[str] = set()
+        for stage in stages:
+            if stage.name in names:
+                raise ValueError(f"Стадия {stage.name} объявлена дважды")
+            names.add(stage.name)
+            for artifact in stage.provides:
+                if artifact in producers:
+                    raise ValueError(
+                        f"Артефакт {artifact} создают две стадии: {producers[artifact]} и {stage.name}"
+                    )
+                producers[artifact] = stage.name
+
+        deps: dict[str, set[str]] = {}
+        for stage in stages:
+            missing = [a for a in stage.requires if a not in producers]
+            if missing:
+                raise ValueError(f"Стадия {stage.name} требует артефакты без поставщика: {missing}")
+            deps[stage.name] = {producers[a] for a in stage.requires} - {stage.name}
+
+        # Проверка на циклы (алгоритм Кана)
+        remaining = {name: set(d) for name, d in deps.items()}
+        while remaining:
+            ready = [name for name, d in remaining.items() if not d]
+            if not ready:
+                raise ValueError(f"Цикл в графе стадий: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for d in remaining.values():
+                d.difference_update(ready)
+        return deps
+
+    async def run(self, session: AsyncSession, metrics_collector: MetricsCollector) -> PipelineReport:
+        """
+        Выполняет граф; фазы run — в сессии session (без commit). При ошибке стадии
+        выполняющиеся compute отменяются, следующие стадии не запускаются,
+        исключение пробрасывается вызывающему коду.
+
+        Время каждой стадии, критический путь и время сессии сохраняются в metrics_collector.
+        """
+        report = PipelineReport()
+        pending = list(self.stages)
+        done: set[str] = set()
+        computing: dict[asyncio.Task[int], Stage] = {}
+        # Стадии, ожидающие сессию (compute завершён или отсутствует)
+        writable: list[Stage] = []
+
+        try:
+            while pending or computing or writable:
+                # Завершённые compute переходят к записи, новые стадии стартуют до занятия сессии
+                for task in [task for task in computing if task.done()]:
+                    self._finish_compute(task, computing, writable, report)
+                self._start_ready(pending, done, computing, writable, report)
+
+                if writable:
+                    # Сессия свободна: первая в порядке объявления готовая стадия
+                    stage = min(writable, key=lambda s: self._order[s.name])
+                    writable.remove(stage)
+                    run_ms = await self._run_phase(stage.name, stage.run(session))
+                    report.session_ms += run_ms
+                    report.durations_ms[stage.name] = report.durations_ms.get(stage.name, 0) + run_ms
+                    metrics_collector.record_timing(stage.name, report.durations_ms[stage.name])
+                    done.add(stage.name)
+                    continue
+
+                if not computing:
+                    break
+                await asyncio.wait(computing, return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            for task in computing:
+                task.cancel()
+            await asyncio.gather(*computing, return_exceptions=True)
+            raise
+
+        report.critical_path, report.critical_path_ms = self._critical_path(report.durations_ms)
+        metrics_collector.record_timing("critical_path", report.critical_path_ms)
+        metrics_collector.record_timing("session", report.session_ms)
+        metrics_collector.metrics.critical_path = list(report.critical_path)
+        logger.info(
+            f"Стадии ингестии завершены: critical_path={' -> '.join(report.critical_path)} "
+            f"({report.critical_path_ms} мс), session={report.session_ms} мс"
+        )
+        return report
+
+    def _start_ready(
+        self,
+        pending: list[Stage],
+        done: set[str],
+        computing: dict[asyncio.Task[int], Stage],
+        writable: list[Stage],
+        report: PipelineReport,
+    ) -> None:
+        """Запускает compute стадий с готовыми входами (стадии без compute ждут сессию)."""
+        progressed = True
+        while progressed:
+            progressed = False
+            for stage in list(pending):
+                if not self._deps[stage.name] <= done:
+                    continue
+                pending.remove(stage)
+                progressed = True
+                if stage.condition is not None and not stage.condition():
+                    logger.debug(f"Стадия {stage.name} пропущена")
+                    report.skipped.append(stage.name)
+                    done.add(stage.name)
+                elif stage.compute is not None:
+                    task = asyncio.create_task(
+                        self._run_phase(stage.name, stage.compute()),
+                        name=f"ingestion-stage-{stage.name}",
+                    )
+                    computing[task] = stage
+                else:
+                    writable.append(stage)
+
+    @staticmethod
+    def _finish_compute(
+        task: asyncio.Task[int],
+        computing: dict[asyncio.Task[int], Stage],
+        writable: list[Stage],
+        report: PipelineReport,
+    ) -> None:
+        """Переводит стадию с завершённым compute в очередь записи (ошибка compute пробрасывается)."""
+        stage = computing.pop(task)
+        report.durations_ms[stage.name] = task.result()
+        writable.append(stage)
+
+    @staticmethod
+    async def _run_phase(name: str, phase: Awaitable[None]) -> int:
+        """
+        Выполняет фазу стадии; возвращает длительность в мс.
+
+        При активном профилировании (app/services/ingestion/profiling.py) запросы и
+        вызовы LLM внутри фазы относятся к стадии.
+        """
+        started = time.perf_counter()
+        with profile_stage(name):
+            await phase
+        return int((time.perf_counter() - started) * 1000)
+
+    def _critical_path(self, durations_ms: dict[str, int]) -> tuple[list[str], int]:
+        """Самая длинная цепочка зависимостей по фактическим длительностям стадий."""
+        finish: dict[str, int] = {}
+        previous: dict[str, str | None] = {}
+        # Стадии объявлены в топологическом порядке не обязательно — обходим по готовности
+        remaining = [stage.name for stage in self.stages]
+        while remaining:
+            for name in list(remaining):
+                deps = self._deps[name]
+                if not all(d in finish for d in deps):
+                    continue
+                remaining.remove(name)
+                best = max(deps, key=lambda d: finish[d], default=None)
+                previous[name] = best
+                finish[name] = durations_ms.get(name, 0) + (finish[best] if best is not None else 0)
+
+        if not finish:
+            return [], 0
+        last = max(finish, key=lambda name: finish[name])
+        path: list[str] = []
+        node: str | None = last
+        while node is not None:
+            if node in durations_ms:
+                path.append(node)
+            node = previous[node]
+        path.reverse()
+        return path, finish[last]
+
+
+__all__ = ["PipelineReport", "Stage", "StagePipeline"]
@@ -0,0 +1,327 @@
+"""
+Профилирование ингестии по стадиям (opt-in: settings.ingestion_profiling_enabled
+или IngestionService.ingest(profile=True)).
+
+Для каждой стадии StagePipeline собираются:
+- wall_ms — время стадии (сумма фаз compute и run, см. app/services/ingestion/pipeline.py);
+- cpu_ms — процессорное время процесса за время стадии (time.process_time). Сюда входит
+  и работа других задач event loop и потоков (стадий, идущих параллельно, другой
+  ингестии в том же процессе);
+  CPU дочерних процессов cpu_pool не входит;
+- db_ms / db_queries — время и число SQL-запросов (события SQLAlchemy
+  before/after_cursor_execute на Engine, запрос с ошибкой закрывается в handle_error).
+  COPY из app.db.bulk_copy идёт напрямую через psycopg-курсор в обход этих событий,
+  поэтому замеряется явно (record_db_time);
+- llm_calls / llm_ms и embedding_calls / embedding_ms — HTTP-вызовы через LLMTransport;
+- peak_rss_mb — пиковый RSS процесса на момент завершения стадии.
+
+Текущая стадия хранится в contextvar: asyncio-задачи, созданные внутри стадии, копируют
+контекст, а greenlet_spawn SQLAlchemy переносит его в greenlet, где вызываются события
+курсора. Запросы и вызовы вне стадий относятся к корню "ingest".
+
+Результат сохраняется в IngestionRun.profile_json и, если задан
+settings.ingestion_profile_export_dir, выгружается в формате collapsed stacks
+(flamegraph.pl, speedscope) и в JSON-формате speedscope.
+"""
+from __future__ import annotations
+
+import json
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.logging import logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+ROOT_FRAME = "ingest"
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+_current_stage: ContextVar[StageProfile | None] = ContextVar("ingestion_profile_stage", default=None)
+_active_profiler: ContextVar[IngestionProfiler | None] = ContextVar("ingestion_profiler", default=None)
+_db_hooks_installed = False
+
+
+def peak_rss_mb() -> float | None:
+    """Пиковый RSS текущего процесса в МБ (None, если модуль resource недоступен)."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает КБ, macOS — байты
+    divider = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(max_rss / divider, 1)
+
+
+@dataclass
+class StageProfile:
+    """Счётчики одной стадии (или корня ingest)."""
+
+    name: str
+    wall_ms: float = 0.0
+    cpu_ms: float = 0.0
+    db_ms: float = 0.0
+    db_queries: int = 0
+    llm_calls: int = 0
+    llm_ms: float = 0.0
+    embedding_calls: int = 0
+    embedding_ms: float = 0.0
+    peak_rss_mb: float | None = None
+
+    def record_query(self, duration_ms: float) -> None:
+        self.db_queries += 1
+        self.db_ms += duration_ms
+
+    def record_call(self, kind: str, duration_ms: float) -> None:
+        if kind == "embedding":
+            self.embedding_calls += 1
+            self.embedding_ms += duration_ms
+        else:
+            self.llm_calls += 1
+            self.llm_ms += duration_ms
+
+    @property
+    def self_ms(self) -> float:
+        """Время стадии без БД и внешних вызовов (внутри стадии они могут идти параллельно)."""
+        return max(0.0, self.wall_ms - self.db_ms - self.llm_ms - self.embedding_ms)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "wall_ms": round(self.wall_ms, 1),
+            "cpu_ms": round(self.cpu_ms, 1),
+            "db_ms": round(self.db_ms, 1),
+            "db_queries": self.db_queries,
+            "llm_calls": self.llm_calls,
+            "llm_ms": round(self.llm_ms, 1),
+            "embedding_calls": self.embedding_calls,
+            "embedding_ms": round(self.embedding_ms, 1),
+            "peak_rss_mb": self.peak_rss_mb,
+        }
+
+
+@dataclass
+class IngestionProfiler:
+    """Профиль одного запуска ингестии."""
+
+    root: StageProfile = field(default_factory=lambda: StageProfile(ROOT_FRAME))
+    stages: dict[str, StageProfile] = field(default_factory=dict)
+    _started: float = field(default_factory=time.perf_counter)
+    _cpu_started: float = field(default_factory=time.process_time)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageProfile]:
+        """Замеряет стадию; запросы и вызовы внутри блока относятся к ней."""
+        profile = self.stages.setdefault(name, StageProfile(name))
+        token = _current_stage.set(profile)
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        try:
+            yield profile
+        finally:
+            profile.wall_ms += (time.perf_counter() - started) * 1000
+            profile.cpu_ms += (time.process_time() - cpu_started) * 1000
+            profile.peak_rss_mb = peak_rss_mb()
+            _current_stage.reset(token)
+
+    def finish(self) -> dict[str, Any]:
+        """Итог для IngestionRun.profile_json."""
+        self.root.wall_ms = (time.perf_counter() - self._started) * 1000
+        self.root.cpu_ms = (time.process_time() - self._cpu_started) * 1000
+        self.root.peak_rss_mb = peak_rss_mb()
+        everything = [self.root, *self.stages.values()]
+        return {
+            "total": {
+                "wall_ms": round(self.root.wall_ms, 1),
+                "cpu_ms": round(self.root.cpu_ms, 1),
+                "db_ms": round(sum(p.db_ms for p in everything), 1),
+                "db_queries": sum(p.db_queries for p in everything),
+                "llm_calls": sum(p.llm_calls for p in everything),
+                "llm_ms": round(sum(p.llm_ms for p in everything), 1),
+                "embedding_calls": sum(p.embedding_calls for p in everything),
+                "embedding_ms": round(sum(p.embedding_ms for p in everything), 1),
+                "peak_rss_mb": self.root.peak_rss_mb,
+            },
+            # Запросы и вызовы вне стадий (загрузка версии, итоговый commit и т.п.)
+            "outside_stages": {
+                "db_ms": round(self.root.db_ms, 1),
+                "db_queries": self.root.db_queries,
+                "llm_calls": self.root.llm_calls,
+                "embedding_calls": self.root.embedding_calls,
+            },
+            "stages": {name: profile.to_json() for name, profile in self.stages.items()},
+        }
+
+    def collapsed_stacks(self) -> list[tuple[list[str], float]]:
+        """Стеки ingest;<стадия>;<категория> с весом в мс."""
+        stacks: list[tuple[list[str], float]] = []
+        for profile in self.stages.values():
+            for category, value in (
+                ("db", profile.db_ms),
+                ("llm", profile.llm_ms),
+                ("embedding", profile.embedding_ms),
+                ("self", profile.self_ms),
+            ):
+                if value > 0:
+                    stacks.append(([ROOT_FRAME, profile.name, category], value))
+        # Вне стадий: время корня за вычетом стадий (не меньше 0)
+        outside_ms = max(0.0, self.root.wall_ms - sum(p.wall_ms for p in self.stages.values()))
+        if self.root.db_ms > 0:
+            stacks.append(([ROOT_FRAME, "db"], self.root.db_ms))
+        if outside_ms - self.root.db_ms > 0:
+            stacks.append(([ROOT_FRAME], outside_ms - self.root.db_ms))
+        return stacks
+
+    def to_collapsed(self) -> str:
+        """Формат collapsed stacks (flamegraph.pl / speedscope): "a;b;c <вес>" построчно."""
+        return "".join(
+            f"{';'.join(frames)} {max(1, round(weight))}\n" for frames, weight in self.collapsed_stacks()
+        )
+
+    def to_speedscope(self, name: str) -> dict[str, Any]:
+        """Профиль в JSON-формате speedscope (sampled, единицы — миллисекунды)."""
+        frames: list[dict[str, str]] = []
+        frame_index: dict[str, int] = {}
+        samples: list[list[int]] = []
+        weights: list[float] = []
+        for stack, weight in self.collapsed_stacks():
+            sample = []
+            for frame in stack:
+                if frame not in frame_index:
+                    frame_index[frame] = len(frames)
+                    frames.append({"name": frame})
+                sample.append(frame_index[frame])
+            samples.append(sample)
+            weights.append(round(weight, 1))
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "clinnexus-ingestion-profiler",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": round(sum(weights), 1),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+    def export(self, directory: str | Path, run_id: str) -> dict[str, str]:
+        """Пишет <run_id>.collapsed.txt и <run_id>.speedscope.json; возвращает пути."""
+        target = Path(directory)
+        target.mkdir(parents=True, exist_ok=True)
+        collapsed_path = target / f"{run_id}.collapsed.txt"
+        speedscope_path = target / f"{run_id}.speedscope.json"
+        collapsed_path.write_text(self.to_collapsed(), encoding="utf-8")
+        speedscope_path.write_text(
+            json.dumps(self.to_speedscope(f"ingestion {run_id}"), ensure_ascii=False),
+            encoding="utf-8",
+        )
+        return {"collapsed": str(collapsed_path), "speedscope": str(speedscope_path)}
+
+
+@contextmanager
+def profile_stage(name: str) -> Iterator[StageProfile | None]:
+    """Замер стадии активного профайлера; без профилирования ничего не делает."""
+    profiler = _active_profiler.get()
+    if profiler is None:
+        yield None
+        return
+    with profiler.stage(name) as profile:
+        yield profile
+
+
+@contextmanager
+def profiling(profiler: IngestionProfiler | None) -> Iterator[IngestionProfiler | None]:
+    """
+    Делает профайлер текущим для кода внутри блока и созданных в нём задач
+    (None — профилирование выключено).
+    """
+    if profiler is None:
+        yield None
+        return
+    install_db_hooks()
+    profiler_token = _active_profiler.set(profiler)
+    stage_token = _current_stage.set(profiler.root)
+    try:
+        yield profiler
+    finally:
+        _current_stage.reset(stage_token)
+        _active_profiler.reset(profiler_token)
+
+
+def record_external_call(kind: str, duration_ms: float) -> None:
+    """Учитывает вызов LLM ("llm") или эмбеддинга ("embedding") в текущей стадии."""
+    profile = _current_stage.get()
+    if profile is not None:
+        profile.record_call(kind, duration_ms)
+
+
+def record_db_time(duration_ms: float) -> None:
+    """Учитывает операцию БД, выполненную в обход событий SQLAlchemy (COPY через драйвер)."""
+    profile = _current_stage.get()
+    if profile is not None:
+        profile.record_query(duration_ms)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _current_stage.get() is not None:
+        conn.info.setdefault("ingestion_profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    profile = _current_stage.get()
+    starts = conn.info.get("ingestion_profile_query_start")
+    if profile is None or not starts:
+        return
+    profile.record_query((time.perf_counter() - starts.pop()) * 1000)
+
+
+def _handle_error(exception_context) -> None:
+    # after_cursor_execute при ошибке не вызывается: снимаем начало запроса здесь
+    conn = exception_context.connection
+    starts = conn.info.get("ingestion_profile_query_start") if conn is not None else None
+    if not starts:
+        return
+    started = starts.pop()
+    profile = _current_stage.get()
+    if profile is not None:
+        profile.record_query((time.perf_counter() - started) * 1000)
+
+
+def install_db_hooks() -> None:
+    """Регистрирует события курсора на всех Engine (один раз на процесс)."""
+    global _db_hooks_installed
+    if _db_hooks_installed:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _db_hooks_installed = True
+    logger.debug("Профилирование ингестии: события SQLAlchemy зарегистрированы")
+
+
+__all__ = [
+    "IngestionProfiler",
+    "StageProfile",
+    "install_db_hooks",
+    "peak_rss_mb",
+    "profile_stage",
+    "profiling",
+    "record_db_time",
+    "record_external_call",
+]
@@ -0,0 +1,151 @@
+"""Стабильный ingestion_summary_json для версии документа (MVP шаги 1–6)."""
+from __future__ import annotations
+
+from typing import Any
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.enums import IngestionStatus
+from app.db.models.facts import Fact
+from app.db.models.studies import DocumentVersion
+
+
+def _ensure_list(value: Any) -> list[Any]:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+async def build_ingestion_summary(
+    *,
+    db: AsyncSession,
+    version: DocumentVersion,
+    ingestion_result: Any | None,
+    final_status: IngestionStatus,
+    warnings: list[str] | None = None,
+    errors: list[str] | None = None,
+) -> dict[str, Any]:
+    """
+    Формирует ingestion_summary_json со стабильной схемой (MVP шаги 1–6).
+
+    Требуемые ключи (всегда присутствуют):
+    - anchors_created
+    - soa_found
+    - soa_facts_written
+    - chunks_created
+    - mapping_status
+    - warnings
+    - errors
+    """
+    base_summary: dict[str, Any] = version.ingestion_summary_json or {}
+
+    anchors_created = int(getattr(ingestion_result, "anchors_created", 0) or 0) if ingestion_result else 0
+    chunks_created = int(getattr(ingestion_result, "chunks_created", 0) or 0) if ingestion_result else 0
+    soa_found = bool(getattr(ingestion_result, "soa_detected", False)) if ingestion_result else False
+
+    # SoA facts actually written: проверяем по БД и извлекаем количество элементов из value_json
+    soa_facts_counts: dict[str, int] = {"visits": 0, "procedures": 0, "matrix": 0}
+    soa_facts_written_flags: dict[str, bool] = {"visits": False, "procedures": False, "matrix": False}
+    
+    if ingestion_result is not None:
+        # Получаем факты SoA с их value_json
+        facts_res = await db.execute(
+            select(Fact.fact_key, Fact.value_json)
+            .where(
+                Fact.created_from_doc_version_id == version.id,
+                Fact.fact_type == "soa",
+                Fact.fact_key.in_(("visits", "procedures", "matrix")),
+            )
+        )
+        
+        for row in facts_res.all():
+            fact_key = str(row.fact_key)
+            value_json = row.value_json or {}
+            
+            # Извлекаем количество элементов из value_json
+            if fact_key == "visits":
+                visits_list = value_json.get("visits", [])
+                if isinstance(visits_list, list):
+                    soa_facts_counts["visits"] = len(visits_list)
+                    soa_facts_written_flags["visits"] = len(visits_list) > 0
+            elif fact_key == "procedures":
+                procedures_list = value_json.get("procedures", [])
+                if isinstance(procedures_list, list):
+                    soa_facts_counts["procedures"] = len(procedures_list)
+                    soa_facts_written_flags["procedures"] = len(procedures_list) > 0
+            elif fact_key == "matrix":
+                matrix_list = value_json.get("matrix", [])
+                if isinstance(matrix_list, list):
+                    soa_facts_counts["matrix"] = len(matrix_list)
+                    soa_facts_written_flags["matrix"] = len(matrix_list) > 0
+
+    soa_facts_written = {
+        "visits": soa_facts_written_flags["visits"],
+        "procedures": soa_facts_written_flags["procedures"],
+        "matrix": soa_facts_written_flags["matrix"],
+        "counts": soa_facts_counts,
+    }
+
+    # Маппинг секций: минимальная стабильная схема
+    sections_mapped_count = None
+    sections_needs_review_count = None
+    if ingestion_result is not None and getattr(ingestion_result, "docx_summary", None):
+        ds = getattr(ingestion_result, "docx_summary") or {}
+        if "sections_mapped_count" in ds:
+            sections_mapped_count = ds.get("sections_mapped_count")
+        if "sections_needs_review_count" in ds:
+            sections_needs_review_count = ds.get("sections_needs_review_count")
+
+    mapping_status = {
+        "sections_mapped_count": sections_mapped_count,
+        "sections_needs_review_count": sections_needs_review_count,
+        "status": "needs_review" if final_status == IngestionStatus.NEEDS_REVIEW else ("failed" if final_status == IngestionStatus.FAILED else "ready"),
+    }
+
+    stable_summary: dict[str, Any] = {
+        "anchors_created": anchors_created,
+        "soa_found": soa_found,
+        "soa_facts_written": soa_facts_written,
+        "chunks_created": chunks_created,
+        "mapping_status": mapping_status,
+        "warnings": _ensure_list(warnings),
+        "errors": _ensure_list(errors),
+        # Дублируем для обратной совместимости с существующими тестами/клиентами:
+        "soa_detected": bool(getattr(ingestion_result, "soa_detected", False)) if ingestion_result else False,
+        "needs_review": bool(getattr(ingestion_result, "needs_review", False)) if ingestion_result else (final_status == IngestionStatus.NEEDS_REVIEW),
+    }
+
+    # Сохраняем метаданные загруженного файла, если уже были записаны при upload
+    for k in ("filename", "size_bytes"):
+        if k in base_summary and k not in stable_summary:
+            stable_summary[k] = base_summary[k]
+
+    # Сохраняем поля alignment и soa_confidence из base_summary (записываются в корень в ingestion service)
+    for k in ("matched_anchors", "changed_anchors", "soa_confidence"):
+        if k in base_summary:
+            stable_summary[k] = base_summary[k]
+
+    # Прокидываем sha256 из модели в summary для трассировки
+    if version.source_sha256:
+        stable_summary["source_sha256"] = version.source_sha256
+
+    # При желании сохраняем дополнительные поля, но не полагаемся на них как на часть стабильной схемы
+    if ingestion_result is not None:
+        stable_summary["facts_extraction"] = {
+            "facts_count": getattr(ingestion_result, "facts_count", 0),
+            "needs_review": getattr(ingestion_result, "facts_needs_review", []),
+        }
+        if getattr(ingestion_result, "soa_detected", False):
+            stable_summary["soa"] = {
+                "table_index": getattr(ingestion_result, "soa_table_index", None),
+                "section_path": getattr(ingestion_result, "soa_section_path", None),
+                "confidence": getattr(ingestion_result, "soa_confidence", None),
+                "cell_anchors_created": getattr(ingestion_result, "cell_anchors_created", 0),
+            }
+        if getattr(ingestion_result, "docx_summary", None):
+            stable_summary["docx_summary"] = getattr(ingestion_result, "docx_summary")
+
+    return stable_summary
@@ -12,6 +12,7 @@ from pydantic import BaseModel, ValidationError
 
 from app.core.config import LLMProvider, settings
 from app.core.logging import logger
+from app.services.llm_transport import get_llm_transport
 
 
 class LLMCandidate(BaseModel):
@@ -214,19 +215,21 @@ class LLMClient:
             "max_tokens": 2000,
         }
 
-        async with httpx.AsyncClient(timeout=self.timeout_sec) as client:
-            start = time.perf_counter()
-            try:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                return response.json()
-            except httpx.ReadTimeout as e:
-                elapsed = time.perf_counter() - start
-                logger.error(
-                    f"[LLM] ReadTimeout (request_id={request_id}, url={url!r}, timeout_sec={self.timeout_sec}, "
-                    f"elapsed={elapsed})"
-                )
-                raise
+        transport = get_llm_transport()
+        start = time.perf_counter()
+        try:
+            response = await transport.post(
+                self.provider, url, headers=headers, json=payload, timeout=self.timeout_sec
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.ReadTimeout as e:
+            elapsed = time.perf_counter() - start
+            logger.error(
+                f"[LLM] ReadTimeout (request_id={request_id}, url={url!r}, timeout_sec={self.timeout_sec}, "
+                f"elapsed={elapsed})"
+            )
+            raise
 
     async def _call_openai_compatible(
         self, messages: list[dict[str, str]], request_id: str
@@ -244,19 +247,21 @@ class LLMClient:
             "max_tokens": 2000,
         }
 
-        async with httpx.AsyncClient(timeout=self.timeout_sec) as client:
-            start = time.perf_counter()
-            try:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                return response.json()
-            except httpx.ReadTimeout:
-                elapsed = time.perf_counter() - start
-                logger.error(
-                    f"[LLM] ReadTimeout (request_id={request_id}, url={url!r}, timeout_sec={self.timeout_sec}, "
-                    f"elapsed={elapsed})"
-                )
-                raise
+        transport = get_llm_transport()
+        start = time.perf_counter()
+        try:
+            response = await transport.post(
+                self.provider, url, headers=headers, json=payload, timeout=self.timeout_sec
+            )
+            response.raise_for_status()
+            return response.json()
+        except httpx.ReadTimeout:
+            elapsed = time.perf_counter() - start
+            logger.error(
+                f"[LLM] ReadTimeout (request_id={request_id}, url={url!r}, timeout_sec={self.timeout_sec}, "
+                f"elapsed={elapsed})"
+            )
+            raise
 
     async def _call_local(
         self, messages: list[dict[str, str]], request_id: str
@@ -281,62 +286,70 @@ class LLMClient:
             "stream": False,
         }
 
-        async with httpx.AsyncClient(timeout=self.timeout_sec) as client:
-            try:
-                response = await client.post(ollama_url, headers=headers, json=ollama_payload)
-                response.raise_for_status()
-                result = response.json()
-                # Ollama возвращает ответ в другом формате
-                if "message" in result:
-                    return {
-                        "choices": [
-                            {
-                                "message": {
-                                    "content": result["message"].get("content", ""),
-                                }
+        transport = get_llm_transport()
+        try:
+            response = await transport.post(
+                self.provider,
+                ollama_url,
+                headers=headers,
+                json=ollama_payload,
+                timeout=self.timeout_sec,
+            )
+            response.raise_for_status()
+            result = response.json()
+            # Ollama возвращает ответ в другом формате
+            if "message" in result:
+                return {
+                    "choices": [
+                        {
+                            "message": {
+                                "content": result["message"].get("content", ""),
                             }
-                        ]
-                    }
-                # Иногда локальные прокси могут вернуть уже OpenAI-like формат — просто отдаём как есть
-                return result
-            except httpx.HTTPStatusError as e:
-                status = e.response.status_code if e.response is not None else None
+                        }
+                    ]
+                }
+            # Иногда локальные прокси могут вернуть уже OpenAI-like формат — просто отдаём как есть
+            return result
+        except httpx.HTTPStatusError as e:
+            status = e.response.status_code if e.response is not None else None
+            body_preview = ""
+            try:
+                body_preview = (e.response.text or "")[:500] if e.response is not None else ""
+            except Exception:
                 body_preview = ""
-                try:
-                    body_preview = (e.response.text or "")[:500] if e.response is not None else ""
-                except Exception:
-                    body_preview = ""
 
-                # Если /api/chat не поддерживается (часто 404), пробуем OpenAI-compatible endpoint
-                if status in (400, 404, 405):
-                    logger.warning(
-                        f"[LLM] LOCAL endpoint /api/chat недоступен (status={status}) — "
-                        f"пробуем OpenAI-compatible /v1/chat/completions (request_id={request_id}). "
-                        f"body[:500]={body_preview!r}"
-                    )
-                else:
-                    logger.warning(
-                        f"[LLM] Ошибка LOCAL /api/chat (status={status}) — "
-                        f"пробуем fallback /v1/chat/completions (request_id={request_id}). "
-                        f"body[:500]={body_preview!r}"
-                    )
+            # Если /api/chat не поддерживается (часто 404), пробуем OpenAI-compatible endpoint
+            if status in (400, 404, 405):
+                logger.warning(
+                    f"[LLM] LOCAL endpoint /api/chat недоступен (status={status}) — "
+                    f"пробуем OpenAI-compatible /v1/chat/completions (request_id={request_id}). "
+                    f"body[:500]={body_preview!r}"
+                )
+            else:
+                logger.warning(
+                    f"[LLM] Ошибка LOCAL /api/chat (status={status}) — "
+                    f"пробуем fallback /v1/chat/completions (request_id={request_id}). "
+                    f"body[:500]={body_preview!r}"
+                )
+
+        # Fallback: OpenAI-compatible без жёсткой зависимости от auth.
+        # Некоторые локальные рантаймы требуют Bearer (можно передать любой), некоторые игнорируют.
+        oa_url = f"{self.base_url}/v1/chat/completions"
+        oa_headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            oa_headers["Authorization"] = f"Bearer {self.api_key}"
+        oa_payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "max_tokens": 2000,
+        }
 
-            # Fallback: OpenAI-compatible без жёсткой зависимости от auth.
-            # Некоторые локальные рантаймы требуют Bearer (можно передать любой), некоторые игнорируют.
-            oa_url = f"{self.base_url}/v1/chat/completions"
-            oa_headers = {"Content-Type": "application/json"}
-            if self.api_key:
-                oa_headers["Authorization"] = f"Bearer {self.api_key}"
-            oa_payload = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": self.temperature,
-                "max_tokens": 2000,
-            }
-
-            response2 = await client.post(oa_url, headers=oa_headers, json=oa_payload)
-            response2.raise_for_status()
-            return response2.json()
+        response2 = await transport.post(
+            self.provider, oa_url, headers=oa_headers, json=oa_payload, timeout=self.timeout_sec
+        )
+        response2.raise_for_status()
+        return response2.json()
 
     async def _call_yandexgpt(
         self, messages: list[dict[str, str]], request_id: str
@@ -389,75 +402,77 @@ class LLMClient:
         max_retries = 3
         retry_delays = [1, 2, 4]  # секунды
         
-        async with httpx.AsyncClient(timeout=self.timeout_sec) as client:
-            start = time.perf_counter()
-            last_exception = None
-            
-            for attempt in range(max_retries):
-                try:
-                    response = await client.post(url, headers=headers, json=payload)
-                    response.raise_for_status()
-                    result = response.json()
-                    
-                    # OpenAI-совместимый API возвращает ответ в стандартном формате OpenAI
-                    # {
-                    #   "choices": [{"message": {"role": "assistant", "content": "..."}}]
-                    # }
-                    if "choices" in result and len(result["choices"]) > 0:
-                        return result
-                    
-                    # Если формат ответа отличается, пытаемся извлечь текст напрямую
-                    logger.warning(
-                        f"[LLM] Неожиданный формат ответа YandexGPT (request_id={request_id}): {result}"
-                    )
-                    # Fallback: пытаемся найти текст в ответе
-                    content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-                    if not content:
-                        content = str(result)
-                    
-                    return {
-                        "choices": [
-                            {
-                                "message": {
-                                    "role": "assistant",
-                                    "content": content,
-                                }
+        transport = get_llm_transport()
+        start = time.perf_counter()
+        last_exception = None
+        
+        for attempt in range(max_retries):
+            try:
+                response = await transport.post(
+                    self.provider, url, headers=headers, json=payload, timeout=self.timeout_sec
+                )
+                response.raise_for_status()
+                result = response.json()
+                
+                # OpenAI-совместимый API возвращает ответ в стандартном формате OpenAI
+                # {
+                #   "choices": [{"message": {"role": "assistant", "content": "..."}}]
+                # }
+                if "choices" in result and len(result["choices"]) > 0:
+                    return result
+                
+                # Если формат ответа отличается, пытаемся извлечь текст напрямую
+                logger.warning(
+                    f"[LLM] Неожиданный формат ответа YandexGPT (request_id={request_id}): {result}"
+                )
+                # Fallback: пытаемся найти текст в ответе
+                content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+                if not content:
+                    content = str(result)
+                
+                return {
+                    "choices": [
+                        {
+                            "message": {
+                                "role": "assistant",
+                                "content": content,
                             }
-                        ]
-                    }
-                except httpx.ReadTimeout as e:
-                    elapsed = time.perf_counter() - start
-                    logger.error(
-                        f"[LLM] ReadTimeout (request_id={request_id}, url={url!r}, timeout_sec={self.timeout_sec}, "
-                        f"elapsed={elapsed})"
-                    )
-                    raise
-                except httpx.HTTPStatusError as e:
-                    status_code = e.response.status_code if e.response else None
-                    last_exception = e
-                    
-                    # Ретраи только для 502, 503, 504
-                    if status_code in (502, 503, 504) and attempt < max_retries - 1:
-                        delay = retry_delays[attempt]
-                        logger.warning(
-                            f"[LLM] LLM API busy ({status_code}), retrying... (attempt {attempt + 1})"
-                        )
-                        await asyncio.sleep(delay)
-                        continue
-                    
-                    # Для других ошибок или если попытки закончились - логируем и пробрасываем
-                    error_body = ""
-                    try:
-                        if e.response is not None:
-                            error_body = e.response.text[:500]
-                    except Exception:
-                        pass
-                    logger.error(
-                        f"[LLM] HTTP ошибка YandexGPT (request_id={request_id}, status={status_code}): {error_body}"
+                        }
+                    ]
+                }
+            except httpx.ReadTimeout as e:
+                elapsed = time.perf_counter() - start
+                logger.error(
+                    f"[LLM] ReadTimeout (request_id={request_id}, url={url!r}, timeout_sec={self.timeout_sec}, "
+                    f"elapsed={elapsed})"
+                )
+                raise
+            except httpx.HTTPStatusError as e:
+                status_code = e.response.status_code if e.response else None
+                last_exception = e
+                
+                # Ретраи только для 502, 503, 504
+                if status_code in (502, 503, 504) and attempt < max_retries - 1:
+                    delay = retry_delays[attempt]
+                    logger.warning(
+                        f"[LLM] LLM API busy ({status_code}), retrying... (attempt {attempt + 1})"
                     )
-                    raise
-            
-            # Если все попытки исчерпаны, пробрасываем последнее исключение
-            if last_exception:
-                raise last_exception
+                    await asyncio.sleep(delay)
+                    continue
+                
+                # Для других ошибок или если попытки закончились - логируем и пробрасываем
+                error_body = ""
+                try:
+                    if e.response is not None:
+                        error_body = e.response.text[:500]
+                except Exception:
+                    pass
+                logger.error(
+                    f"[LLM] HTTP ошибка YandexGPT (request_id={request_id}, status={status_code}): {error_body}"
+                )
+                raise
+        
+        # Если все попытки исчерпаны, пробрасываем последнее исключение
+        if last_exception:
+            raise last_exception
 
@@ -0,0 +1,256 @@
+"""
+Общий HTTP-транспорт для вызовов LLM и эмбеддингов.
+
+Один httpx.AsyncClient на процесс (keep-alive пул, HTTP/2 при наличии пакета h2)
+вместо нового клиента на каждый запрос, поэтому TCP/TLS handshake не повторяется.
+Поверх клиента:
+- token bucket на провайдера (azure_openai / openai_compatible / local / yandexgpt);
+- семафор, ограничивающий число одновременных запросов в процессе;
+- повтор при HTTP 429 с учётом Retry-After; пауза применяется ко всему bucket-у,
+  чтобы параллельные ингестии не продолжали долбить провайдера.
+
+Лимиты действуют в пределах процесса (общего состояния между процессами нет): общий
+лимит провайдера settings.llm_rate_limit_rps делится на settings.llm_rate_limit_processes —
+число процессов, которые одновременно обращаются к провайдерам (API + воркеры ингестии).
+
+Используется LLMClient, SectionMappingService (LLM triage), ValueNormalizer,
+TextTransformer и TopicMappingService (эмбеддинги).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import httpx
+
+from app.core.config import LLMProvider, settings
+from app.core.logging import logger
+
+
+def _provider_key(provider: LLMProvider | str | None) -> str:
+    if isinstance(provider, LLMProvider):
+        return provider.value
+    return str(provider or "default")
+
+
+def _h2_available() -> bool:
+    """HTTP/2 в httpx требует опциональный пакет h2 (httpx[http2])."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class TokenBucket:
+    """
+    Token bucket для ограничения частоты запросов к одному провайдеру.
+
+    rate <= 0 отключает ограничение частоты (пауза после 429 всё равно действует).
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Ждёт, пока не будет доступен токен, и забирает его."""
+        while True:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            if self.rate <= 0:
+                return
+            self._refill(now)
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return
+            await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def penalize(self, delay_sec: float) -> None:
+        """Приостанавливает выдачу токенов на delay_sec (после 429)."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay_sec)
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+
+
+class LLMTransport:
+    """Пул соединений + лимиты провайдеров для всех HTTP-вызовов LLM/эмбеддингов."""
+
+    def __init__(
+        self,
+        *,
+        max_connections: int | None = None,
+        max_keepalive_connections: int | None = None,
+        http2: bool | None = None,
+        max_concurrency: int | None = None,
+        rate_limits_rps: dict[str, float] | None = None,
+        burst: float | None = None,
+        processes: int | None = None,
+        max_retries: int | None = None,
+        backoff_sec: float | None = None,
+        max_backoff_sec: float | None = None,
+        http_transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        use_http2 = settings.llm_http2 if http2 is None else http2
+        if use_http2 and not _h2_available():
+            logger.debug("LLMTransport: пакет h2 не установлен, используем HTTP/1.1")
+            use_http2 = False
+
+        self.loop = asyncio.get_running_loop()
+        self.rate_limits_rps = (
+            settings.llm_rate_limit_rps if rate_limits_rps is None else rate_limits_rps
+        )
+        self.burst = settings.llm_rate_limit_burst if burst is None else burst
+        # Лимит частоты и всплеск делятся между процессами, разделяющими квоту провайдера
+        self.processes = max(settings.llm_rate_limit_processes if processes is None else processes, 1)
+        self.max_retries = settings.llm_rate_limit_max_retries if max_retries is None else max_retries
+        self.backoff_sec = settings.llm_rate_limit_backoff_sec if backoff_sec is None else backoff_sec
+        self.max_backoff_sec = (
+            settings.llm_rate_limit_max_backoff_sec if max_backoff_sec is None else max_backoff_sec
+        )
+        self._client = httpx.AsyncClient(
+            transport=http_transport,
+            http2=use_http2,
+            timeout=settings.llm_timeout_sec,
+            limits=httpx.Limits(
+                max_connections=max_connections or settings.llm_http_max_connections,
+                max_keepalive_connections=(
+                    max_keepalive_connections or settings.llm_http_max_keepalive_connections
+                ),
+            ),
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.llm_max_concurrency)
+        self._buckets: dict[str, TokenBucket] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client
+
+    @property
+    def is_closed(self) -> bool:
+        return self._client.is_closed
+
+    def bucket(self, provider: LLMProvider | str | None) -> TokenBucket:
+        """Token bucket провайдера (создаётся при первом обращении): доля процесса в общем лимите."""
+        key = _provider_key(provider)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(
+                rate=float(self.rate_limits_rps.get(key, 0.0)) / self.processes,
+                capacity=self.burst / self.processes,
+            )
+            self._buckets[key] = bucket
+        return bucket
+
+    def _retry_delay(self, response: httpx.Response, attempt: int) -> float:
+        """Задержка перед повтором: Retry-After, иначе экспоненциальный backoff."""
+        delay: float | None = None
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+        if delay is None or delay < 0:
+            delay = self.backoff_sec * (2**attempt)
+        return min(delay, self.max_backoff_sec)
+
+    async def post(
+        self,
+        provider: LLMProvider | str | None,
+        url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        json: Any = None,
+        timeout: float | None = None,
+        kind: str = "llm",
+    ) -> httpx.Response:
+        """
+        POST-запрос к провайдеру с учётом лимитов.
+
+        Статус ответа не проверяется (raise_for_status вызывает вызывающий код),
+        кроме 429: такие ответы повторяются до max_retries раз.
+
+        Args:
+            provider: Провайдер (ключ token bucket)
+            url: URL запроса
+            headers: Заголовки
+            json: Тело запроса
+            timeout: Таймаут запроса (по умолчанию settings.llm_timeout_sec)
+            kind: Вид вызова для профилирования ингестии ("llm" или "embedding")
+
+        Returns:
+            httpx.Response
+        """
+        # Импорт внутри метода: app.services.ingestion импортирует сервисы, использующие транспорт
+        from app.services.ingestion.profiling import record_external_call
+
+        bucket = self.bucket(provider)
+        request_timeout = timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            async with self._semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await self._client.post(
+                        url, headers=headers, json=json, timeout=request_timeout
+                    )
+                finally:
+                    record_external_call(kind, (time.perf_counter() - started) * 1000)
+            if response.status_code != 429 or attempt >= self.max_retries:
+                return response
+
+            delay = self._retry_delay(response, attempt)
+            bucket.penalize(delay)
+            attempt += 1
+            logger.warning(
+                f"[LLMTransport] 429 от провайдера {_provider_key(provider)} "
+                f"(url={url!r}), повтор через {delay:.1f}с (попытка {attempt}/{self.max_retries})"
+            )
+            await response.aclose()
+
+    async def aclose(self) -> None:
+        """Закрывает пул соединений."""
+        await self._client.aclose()
+
+
+# Глобальный экземпляр транспорта (httpx-клиент и примитивы asyncio привязаны к event loop)
+_transport_instance: LLMTransport | None = None
+
+
+def get_llm_transport() -> LLMTransport:
+    """Получить общий LLMTransport для текущего event loop."""
+    global _transport_instance
+    loop = asyncio.get_running_loop()
+    if (
+        _transport_instance is None
+        or _transport_instance.loop is not loop
+        or _transport_instance.is_closed
+    ):
+        _transport_instance = LLMTransport()
+    return _transport_instance
+
+
+async def close_llm_transport() -> None:
+    """Закрывает общий транспорт (при остановке приложения/воркера)."""
+    global _transport_instance
+    transport = _transport_instance
+    _transport_instance = None
+    if transport is not None and transport.loop is asyncio.get_running_loop():
+        await transport.aclose()
@@ -0,0 +1,216 @@
+"""
+Кэш данных passport tuning (clusters.json и cluster_to_section_key.json) в памяти процесса.
+
+Файл разбирается один раз и переиспользуется, пока не изменились его (путь, mtime_ns, size):
+правки файла вручную или другим процессом подхватываются при следующем запросе.
+save_mapping после атомарной записи кладёт в кэш новое содержимое (put), поэтому
+следующий GET не перечитывает файл. Запись в кэш — замена одной ссылки на кортеж
+(отпечаток, значение), читатели видят либо старую, либо новую версию целиком.
+
+Для кластеров строится ClusterIndex: готовые объекты Cluster и токенный индекс по
+top_titles_ru/en для поиска.
+"""
+from __future__ import annotations
+
+import json
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, Generic, TypeVar
+
+from app.core.logging import logger
+from app.schemas.passport_tuning import Cluster, ClusterMappingItem, MappingMode
+
+T = TypeVar("T")
+
+# Сколько результатов поиска по кластерам хранится до сброса
+SEARCH_CACHE_SIZE = 1024
+
+# (путь, mtime_ns, size) файла, из которого построено значение
+FileStamp = tuple[str, int, int]
+
+
+def _file_stamp(path: Path) -> FileStamp | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return (str(path), stat.st_mtime_ns, stat.st_size)
+
+
+class CachedJsonFile(Generic[T]):
+    """JSON-файл, разобранный loader'ом и закэшированный по отпечатку файла."""
+
+    def __init__(self, loader: Callable[[Any], T]) -> None:
+        self._loader = loader
+        self._entry: tuple[FileStamp, T] | None = None
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> T | None:
+        """
+        Значение для файла (None — файла нет).
+
+        Raises:
+            json.JSONDecodeError: файл не является корректным JSON
+        """
+        stamp = _file_stamp(path)
+        if stamp is None:
+            return None
+        entry = self._entry
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+
+        with self._lock:
+            entry = self._entry
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+            with open(path, "r", encoding="utf-8") as f:
+                value = self._loader(json.load(f))
+            # Файл мог измениться во время чтения: тогда значение не кэшируется
+            if _file_stamp(path) == stamp:
+                self._entry = (stamp, value)
+            return value
+
+    def put(self, path: Path, data: Any) -> None:
+        """Кэширует содержимое только что записанного файла (без повторного чтения)."""
+        stamp = _file_stamp(path)
+        value = self._loader(data)
+        with self._lock:
+            self._entry = (stamp, value) if stamp is not None else None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entry = None
+
+
+class ClusterIndex:
+    """Кластеры из clusters.json с токенным индексом для поиска по заголовкам."""
+
+    def __init__(self, clusters: list[Cluster]) -> None:
+        self.clusters = clusters
+        # Склеенные заголовки в нижнем регистре (как в исходном поиске по подстроке)
+        self._titles: list[tuple[str, str]] = [
+            (" ".join(c.top_titles_ru).lower(), " ".join(c.top_titles_en).lower()) for c in clusters
+        ]
+        postings: dict[str, set[int]] = {}
+        for pos, (titles_ru, titles_en) in enumerate(self._titles):
+            for token in (*titles_ru.split(), *titles_en.split()):
+                postings.setdefault(token, set()).add(pos)
+        self._postings = {token: frozenset(positions) for token, positions in postings.items()}
+        self._search_cache: dict[str, list[Cluster]] = {}
+
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    def search(self, query: str | None) -> list[Cluster]:
+        """
+        Кластеры, у которых query (без учёта регистра) — подстрока top_titles_ru или top_titles_en.
+
+        Каждое слово запроса целиком входит в одно слово заголовка, поэтому кандидаты
+        берутся из индекса (слова словаря, содержащие слово запроса), а подстрока
+        проверяется только для кандидатов.
+        """
+        if not query or not query.strip():
+            return self.clusters
+        needle = query.lower().strip()
+        cached = self._search_cache.get(needle)
+        if cached is not None:
+            return cached
+
+        candidates: set[int] | None = None
+        for word in needle.split():
+            positions: set[int] = set()
+            for token, token_positions in self._postings.items():
+                if word in token:
+                    positions.update(token_positions)
+            candidates = positions if candidates is None else candidates & positions
+            if not candidates:
+                break
+
+        result = [
+            self.clusters[pos]
+            for pos in sorted(candidates or ())
+            if needle in self._titles[pos][0] or needle in self._titles[pos][1]
+        ]
+        if len(self._search_cache) >= SEARCH_CACHE_SIZE:
+            self._search_cache.clear()
+        self._search_cache[needle] = result
+        return result
+
+
+def build_cluster_index(clusters_data: list[dict[str, Any]]) -> ClusterIndex:
+    """Cluster-объекты из содержимого clusters.json."""
+    clusters = [
+        Cluster(
+            # cluster_id приводится к строке
+            cluster_id=str(item.get("cluster_id", "")),
+            top_titles_ru=item.get("top_titles_ru", []),
+            top_titles_en=item.get("top_titles_en", []),
+            examples=item.get("examples", []),
+            stats=item.get("stats", {}),
+            candidate_section_1=item.get("candidate_section_1"),
+            candidate_section_2=item.get("candidate_section_2"),
+            candidate_section_3=item.get("candidate_section_3"),
+            default_section=item.get("default_section"),  # Для обратной совместимости
+        )
+        for item in clusters_data
+    ]
+    return ClusterIndex(clusters)
+
+
+def build_mapping_items(mapping_data: dict[str, Any]) -> dict[str, ClusterMappingItem]:
+    """
+    Валидированные элементы cluster_to_section_key.json (невалидные пропускаются).
+
+    Обратная совместимость: без mapping_mode — "single", без notes — None.
+    """
+    items: dict[str, ClusterMappingItem] = {}
+    for cluster_id, item_data in mapping_data.items():
+        try:
+            item_data = {"mapping_mode": MappingMode.SINGLE.value, "notes": None, **item_data}
+            items[str(cluster_id)] = ClusterMappingItem.model_validate(item_data)
+        except Exception as e:
+            logger.warning(f"Ошибка валидации маппинга для cluster_id={cluster_id}: {e}")
+    return items
+
+
+def mapping_item_json(item: ClusterMappingItem) -> dict[str, str | None]:
+    """Элемент маппинга в формате файла и ответа API."""
+    return {
+        "doc_type": item.doc_type.value if item.doc_type else None,
+        "section_key": item.section_key,
+        "title_ru": item.title_ru if item.title_ru else None,
+        "mapping_mode": item.mapping_mode.value,
+        "notes": item.notes if item.notes else None,
+    }
+
+
+_clusters_cache_instance: CachedJsonFile[ClusterIndex] | None = None
+_mapping_cache_instance: CachedJsonFile[dict[str, ClusterMappingItem]] | None = None
+
+
+def get_clusters_cache() -> CachedJsonFile[ClusterIndex]:
+    """Глобальный кэш clusters.json."""
+    global _clusters_cache_instance
+    if _clusters_cache_instance is None:
+        _clusters_cache_instance = CachedJsonFile(build_cluster_index)
+    return _clusters_cache_instance
+
+
+def get_mapping_cache() -> CachedJsonFile[dict[str, ClusterMappingItem]]:
+    """Глобальный кэш cluster_to_section_key.json."""
+    global _mapping_cache_instance
+    if _mapping_cache_instance is None:
+        _mapping_cache_instance = CachedJsonFile(build_mapping_items)
+    return _mapping_cache_instance
+
+
+__all__ = [
+    "CachedJsonFile",
+    "ClusterIndex",
+    "build_cluster_index",
+    "build_mapping_items",
+    "get_clusters_cache",
+    "get_mapping_cache",
+    "mapping_item_json",
+]
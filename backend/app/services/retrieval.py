@@ -1,16 +1,61 @@
+"""
+Векторный поиск chunks (pgvector).
+
+Запрос векторизуется тем же feature hashing v1, что и chunks при ингестии
+(_hash_embedding_v1), и сравнивается по косинусному расстоянию (оператор <=>,
+индекс idx_chunks_embedding_hnsw с vector_cosine_ops).
+
+Стратегия поиска:
+- если фильтры (study_id / doc_type / doc_version_ids) сужают поиск до небольшого
+  числа chunks, выполняется точный поиск по ним (MATERIALIZED CTE, без обхода графа);
+- иначе — приближённый поиск по HNSW c hnsw.ef_search. Фильтры применяются к
+  кандидатам индекса, поэтому при фильтрах ef_search увеличивается пропорционально
+  limit; если кандидатов всё равно не хватило, обход повторяется с максимальным
+  ef_search (pgvector >= 0.8: вместо этого hnsw.iterative_scan).
+"""
+
 from __future__ import annotations
 
 from typing import Any
+from uuid import UUID
 
+import numpy as np
+from sqlalchemy import Float, bindparam, func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
+from app.core.config import settings
 from app.core.logging import logger
-from app.db.enums import DocumentType
-from app.db.models.anchors import Chunk
+from app.db.bulk_copy import ensure_vector_adapter
+from app.db.enums import DocumentLanguage, DocumentType
+from app.db.models.anchors import Chunk, Vector1536
+from app.db.models.studies import Document, DocumentVersion
 from app.schemas.anchors import ChunkOut
+from app.services.chunking import _normalize_text, hash_embeddings_v1_batch
 from app.services.zone_config import get_zone_config_service
 
+# Максимальное значение hnsw.ef_search в pgvector
+HNSW_MAX_EF_SEARCH = 1000
+
+# Версия расширения vector (определяется один раз на процесс)
+_pgvector_version: tuple[int, ...] | None = None
+
+
+def embed_query(query: str) -> np.ndarray:
+    """Вектор запроса в пространстве chunks (feature hashing v1, float32)."""
+    return hash_embeddings_v1_batch([_normalize_text(query)], dims=1536)[0]
+
+
+def _as_list(value: Any) -> list[Any]:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return list(value)
+    return [value]
+
+
+def _enum_values(values: list[Any]) -> list[str]:
+    return [v.value if hasattr(v, "value") else str(v) for v in values]
+
 
 class RetrievalService:
     """Сервис для поиска релевантных chunks по запросу."""
@@ -27,41 +72,25 @@ class RetrievalService:
         """
         Поиск релевантных chunks по запросу.
 
-        TODO: Реальная реализация должна:
-        - Векторизовать query
-        - Использовать pgvector для поиска похожих chunks
-        - Применять filters (study_id, doc_type, section_path и т.д.)
-        - Возвращать топ-k результатов
-        
-        TODO (в будущем): Добавить фильтр по language:
-        - Если target doc на RU — брать anchors/chunks language=ru
-        - Если mixed — применять prefer_language
+        Args:
+            query: Поисковый запрос
+            filters: Фильтры:
+                - study_id: UUID исследования
+                - doc_type: тип(ы) документа (DocumentType | str | list)
+                - doc_version_ids: ID версий документов
+                - source_zones: зона(ы) chunks (source_zone / source_zones)
+                - language: язык chunks (DocumentLanguage | str)
+                - prefer_language: предпочитаемый язык (для mixed-документов;
+                  не исключает другие языки, а поднимает их в ранжировании)
+            k: Количество результатов
+
+        Returns:
+            Топ-k chunks по убыванию score (косинусное сходство)
         """
         logger.info(f"Поиск chunks для запроса: {query[:50]}...")
-
-        # TODO: Реальная логика поиска
-        # Здесь должна быть логика:
-        # 1. Векторизовать query (использовать ту же модель, что и для chunks)
-        # 2. Выполнить векторный поиск с фильтрами
-        # 3. Вернуть топ-k результатов
-        
-        # TODO: Фильтр по language (когда будет реализовано):
-        # - Если target_doc.document_language == DocumentLanguage.RU:
-        #     stmt = stmt.where(Chunk.language == DocumentLanguage.RU)
-        # - Если target_doc.document_language == DocumentLanguage.MIXED:
-        #     prefer_language = filters.get("prefer_language")
-        #     if prefer_language:
-        #         # Предпочитаем prefer_language, но не исключаем другие
-        #         stmt = stmt.order_by(case((Chunk.language == prefer_language, 0), else_=1))
-
-        # Заглушка: возвращаем пустой список
-        # В реальной реализации здесь будет:
-        # - query_vector = embed(query)
-        # - stmt = select(Chunk).where(...).order_by(Chunk.embedding.cosine_distance(query_vector)).limit(k)
-        # - results = await self.db.execute(stmt)
-
-        logger.info(f"Найдено 0 chunks (заглушка)")
-        return []
+        results = await self._search(query, filters or {}, k)
+        logger.info(f"Найдено {len(results)} chunks")
+        return results
 
     async def retrieve_with_zone_crosswalk(
         self,
@@ -75,47 +104,247 @@ class RetrievalService:
         """
         Поиск chunks с использованием zone_crosswalk для cross-doc retrieval.
 
+        Chunks ищутся в целевых зонах crosswalk, а веса зон используются как prior
+        при re-ranking: score = (1 - w) * similarity + w * zone_weight,
+        где w = settings.retrieval_crosswalk_prior_weight.
+
         Args:
             query: Поисковый запрос
             source_doc_type: Тип исходного документа
             target_doc_type: Тип целевого документа
             source_zones: Исходные зоны для перевода
-            filters: Дополнительные фильтры
+            filters: Дополнительные фильтры (см. retrieve)
             k: Количество результатов
 
         Returns:
             Список chunks с учётом перевода зон через crosswalk
         """
         zone_config = get_zone_config_service()
-        
+
         # Если source_zones не заданы, используем все зоны из zone_set
         if not source_zones:
             source_zones = zone_config.get_zone_set(source_doc_type)
-        
-        # Собираем целевые зоны с весами через crosswalk
-        target_zones_with_weights: list[tuple[str, float]] = []
+
+        # Собираем целевые зоны с весами через crosswalk (для зоны берём максимальный вес)
+        zone_weights: dict[str, float] = {}
         for source_zone in source_zones:
             crosswalk_result = zone_config.get_crosswalk_zones(
                 source_doc_type=source_doc_type,
                 source_zone=source_zone,
                 target_doc_type=target_doc_type,
             )
-            target_zones_with_weights.extend(crosswalk_result)
-        
-        # Сортируем по весу и берём топ зоны
-        target_zones_with_weights.sort(key=lambda x: x[1], reverse=True)
-        top_target_zones = [zone for zone, _ in target_zones_with_weights[:5]]  # Топ-5 зон
-        
+            for zone, weight in crosswalk_result:
+                zone_weights[zone] = max(weight, zone_weights.get(zone, 0.0))
+
         logger.info(
             f"Cross-doc retrieval: {source_doc_type} -> {target_doc_type}, "
-            f"source_zones={source_zones}, target_zones={top_target_zones}"
+            f"source_zones={source_zones}, target_zones={sorted(zone_weights, key=zone_weights.get, reverse=True)}"
+        )
+
+        search_filters = dict(filters or {})
+        search_filters.setdefault("doc_type", target_doc_type)
+        if zone_weights and not (search_filters.get("source_zones") or search_filters.get("source_zone")):
+            search_filters["source_zones"] = list(zone_weights)
+
+        results = await self._search(query, search_filters, k, zone_weights=zone_weights)
+        logger.info(f"Найдено {len(results)} chunks (crosswalk)")
+        return results
+
+    async def _search(
+        self,
+        query: str,
+        filters: dict[str, Any],
+        k: int,
+        zone_weights: dict[str, float] | None = None,
+    ) -> list[ChunkOut]:
+        """Векторный поиск с фильтрами и re-ranking (crosswalk / prefer_language)."""
+        if k <= 0:
+            return []
+
+        query_vector = embed_query(query)
+        if not np.any(query_vector):
+            # Пустой запрос -> нулевой вектор, косинусное расстояние не определено
+            return []
+
+        doc_version_ids = await self._resolve_doc_version_ids(filters)
+        if doc_version_ids is not None and not doc_version_ids:
+            return []
+
+        conditions = self._chunk_conditions(filters, doc_version_ids)
+        await ensure_vector_adapter(self.db)
+        prefer_language = filters.get("prefer_language")
+        rerank = bool(zone_weights) or prefer_language is not None
+        limit = k * max(1, settings.retrieval_candidate_multiplier) if rerank else k
+
+        if doc_version_ids is not None and await self._is_small_scope(conditions):
+            rows = await self._exact_search(query_vector, conditions, limit)
+        else:
+            rows = await self._ann_search(query_vector, conditions, limit)
+
+        results = [self._to_chunk_out(row) for row in rows]
+        if rerank:
+            prior_weight = settings.retrieval_crosswalk_prior_weight
+            prefer_value = _enum_values([prefer_language])[0] if prefer_language is not None else None
+            for chunk, row in zip(results, rows):
+                similarity = 1.0 - float(row.distance)
+                score = similarity
+                if zone_weights:
+                    zone_weight = zone_weights.get(chunk.source_zone or "", 0.0)
+                    score = (1.0 - prior_weight) * similarity + prior_weight * zone_weight
+                if prefer_value is not None and chunk.language != prefer_value:
+                    score -= settings.retrieval_prefer_language_penalty
+                chunk.score = score
+        results.sort(key=lambda c: c.score if c.score is not None else float("-inf"), reverse=True)
+        return results[:k]
+
+    async def _resolve_doc_version_ids(self, filters: dict[str, Any]) -> list[UUID] | None:
+        """
+        Переводит фильтры study_id / doc_type / doc_version_ids в список версий документов.
+
+        Returns:
+            None — ограничений по документам нет; иначе список doc_version_id
+        """
+        doc_version_ids = _as_list(filters.get("doc_version_ids") or filters.get("doc_version_id"))
+        study_id = filters.get("study_id")
+        doc_types = _as_list(filters.get("doc_type"))
+        if not (doc_version_ids or study_id or doc_types):
+            return None
+
+        stmt = select(DocumentVersion.id).join(Document, Document.id == DocumentVersion.document_id)
+        if doc_version_ids:
+            stmt = stmt.where(DocumentVersion.id.in_(doc_version_ids))
+        if study_id:
+            stmt = stmt.where(Document.study_id == study_id)
+        if doc_types:
+            stmt = stmt.where(
+                Document.doc_type.in_([DocumentType(v) for v in _enum_values(doc_types)])
+            )
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
+
+    @staticmethod
+    def _chunk_conditions(filters: dict[str, Any], doc_version_ids: list[UUID] | None) -> list[Any]:
+        conditions: list[Any] = []
+        if doc_version_ids is not None:
+            conditions.append(Chunk.doc_version_id.in_(doc_version_ids))
+        source_zones = _as_list(filters.get("source_zones") or filters.get("source_zone"))
+        if source_zones:
+            conditions.append(Chunk.source_zone.in_(_enum_values(source_zones)))
+        language = filters.get("language")
+        if language is not None:
+            conditions.append(Chunk.language == DocumentLanguage(_enum_values([language])[0]))
+        return conditions
+
+    async def _is_small_scope(self, conditions: list[Any]) -> bool:
+        """True, если под фильтры попадает не больше retrieval_exact_search_max_chunks chunks."""
+        max_chunks = settings.retrieval_exact_search_max_chunks
+        # LIMIT ограничивает стоимость подсчёта для больших выборок
+        scoped = select(Chunk.id).where(*conditions).limit(max_chunks + 1).subquery()
+        count = (await self.db.execute(select(func.count()).select_from(scoped))).scalar_one()
+        return count <= max_chunks
+
+    @staticmethod
+    def _distance(query_vector: np.ndarray) -> Any:
+        return Chunk.embedding.op("<=>", return_type=Float)(
+            bindparam("query_vector", query_vector, type_=Vector1536())
+        )
+
+    @staticmethod
+    def _result_columns() -> list[Any]:
+        # embedding не выбираем: 1536 float на строку не нужны вызывающему коду
+        return [
+            Chunk.id,
+            Chunk.chunk_id,
+            Chunk.doc_version_id,
+            Chunk.section_path,
+            Chunk.text,
+            Chunk.anchor_ids,
+            Chunk.source_zone,
+            Chunk.language,
+            Chunk.metadata_json,
+        ]
+
+    async def _exact_search(
+        self, query_vector: np.ndarray, conditions: list[Any], limit: int
+    ) -> list[Any]:
+        """Точный поиск: расстояния считаются для всех chunks под фильтрами."""
+        # MATERIALIZED не даёт планировщику заменить сортировку обходом HNSW с пост-фильтром
+        scoped = (
+            select(*self._result_columns(), self._distance(query_vector).label("distance"))
+            .where(*conditions)
+            .cte("scoped_chunks")
+            .prefix_with("MATERIALIZED")
+        )
+        stmt = select(scoped).order_by(scoped.c.distance).limit(limit)
+        return self._drop_undefined(list((await self.db.execute(stmt)).all()))
+
+    async def _ann_search(
+        self, query_vector: np.ndarray, conditions: list[Any], limit: int
+    ) -> list[Any]:
+        """Приближённый поиск по HNSW-индексу."""
+        distance = self._distance(query_vector)
+        stmt = (
+            select(*self._result_columns(), distance.label("distance"))
+            .where(*conditions)
+            .order_by(distance)
+            .limit(limit)
+        )
+
+        ef_search = max(settings.retrieval_hnsw_ef_search, limit)
+        if conditions:
+            ef_search = max(ef_search, limit * settings.retrieval_filtered_ef_factor)
+        ef_search = min(ef_search, HNSW_MAX_EF_SEARCH)
+        iterative = bool(conditions) and await self._supports_iterative_scan()
+        await self._set_hnsw_params(ef_search, iterative)
+        rows = list((await self.db.execute(stmt)).all())
+
+        if conditions and not iterative and len(rows) < limit and ef_search < HNSW_MAX_EF_SEARCH:
+            # Пост-фильтр отбросил кандидатов из списка ef_search — расширяем обход графа
+            logger.debug(
+                f"Retrieval: фильтры оставили {len(rows)}/{limit} кандидатов при "
+                f"ef_search={ef_search}, повтор с ef_search={HNSW_MAX_EF_SEARCH}"
+            )
+            await self._set_hnsw_params(HNSW_MAX_EF_SEARCH, False)
+            rows = list((await self.db.execute(stmt)).all())
+
+        return self._drop_undefined(rows)
+
+    @staticmethod
+    def _drop_undefined(rows: list[Any]) -> list[Any]:
+        # Нулевые векторы (пустые chunks) дают NaN-расстояние (в Postgres NaN сортируется последним)
+        return [row for row in rows if row.distance is not None and row.distance == row.distance]
+
+    async def _set_hnsw_params(self, ef_search: int, iterative: bool) -> None:
+        # SET LOCAL действует до конца текущей транзакции
+        await self.db.execute(text(f"SET LOCAL hnsw.ef_search = {int(ef_search)}"))
+        if iterative:
+            await self.db.execute(text("SET LOCAL hnsw.iterative_scan = relaxed_order"))
+
+    async def _supports_iterative_scan(self) -> bool:
+        """hnsw.iterative_scan появился в pgvector 0.8.0."""
+        global _pgvector_version
+        if _pgvector_version is None:
+            version = (
+                await self.db.execute(
+                    text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+                )
+            ).scalar_one_or_none()
+            _pgvector_version = tuple(
+                int(part) for part in (version or "0").split(".") if part.isdigit()
+            )
+        return _pgvector_version >= (0, 8)
+
+    @staticmethod
+    def _to_chunk_out(row: Any) -> ChunkOut:
+        return ChunkOut(
+            id=row.id,
+            chunk_id=row.chunk_id,
+            doc_version_id=row.doc_version_id,
+            section_path=row.section_path,
+            text=row.text,
+            anchor_ids=list(row.anchor_ids or []),
+            metadata=row.metadata_json,
+            source_zone=_enum_values([row.source_zone])[0] if row.source_zone is not None else None,
+            language=_enum_values([row.language])[0] if row.language is not None else None,
+            score=1.0 - float(row.distance),
         )
-        
-        # TODO: Реальная реализация должна использовать target_zones для фильтрации chunks
-        # Здесь будет логика:
-        # 1. Векторизовать query
-        # 2. Фильтровать chunks по target_zones (chunk.source_zone in top_target_zones)
-        # 3. Применять веса из crosswalk для ранжирования
-        # 4. Возвращать топ-k результатов
-        
-        return []
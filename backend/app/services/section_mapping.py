@@ -1,9 +1,11 @@
 """Сервис для автоматического маппинга семантических секций на anchors документа."""
 from __future__ import annotations
 
+import json
 import re
-from dataclasses import dataclass
-from typing import Any
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
 from sqlalchemy import select
@@ -22,10 +24,15 @@ from app.db.models.anchors import Anchor
 from app.db.models.facts import Fact, FactEvidence
 from app.db.models.sections import TargetSectionContract, TargetSectionMap
 from app.db.models.studies import Document, DocumentVersion
+from app.services.section_mapping_index import CompiledSignals, OutlineIndex
 from app.services.text_normalization import normalize_for_match, normalize_for_regex
 from app.services.zone_config import get_zone_config_service
 from app.services.lean_passport import normalize_passport
 from app.services.llm_client import LLMClient
+from app.services.llm_transport import get_llm_transport
+
+if TYPE_CHECKING:
+    from app.services.ingestion.anchor_snapshot import AnchorSnapshot
 
 
 @dataclass
@@ -56,6 +63,8 @@ class DocumentOutline:
     """Структура документа (заголовки в порядке появления)."""
 
     headings: list[tuple[Anchor, int]]  # (anchor, level)
+    # Индекс заголовков/anchors для матчинга сигналов и захвата блоков (строится один раз на документ)
+    index: OutlineIndex | None = field(default=None, repr=False)
 
 
 @dataclass
@@ -70,6 +79,23 @@ class LanguageAwareSignals:
     confidence_cap: float | None = None  # Максимальный confidence (для mixed/unknown)
 
 
+@dataclass(frozen=True)
+class ContractSignals:
+    """Эффективные сигналы контракта, скомпилированные для матчинга заголовков."""
+
+    signals: LanguageAwareSignals
+    signals_source: str
+    compiled: CompiledSignals
+    min_heading_level: int
+    max_heading_level: int
+
+
+# Кэш скомпилированных сигналов между документами (LRU).
+# Ключ: (contract.id, contract.version, язык документа, отпечаток полей контракта, влияющих на сигналы)
+CONTRACT_SIGNALS_CACHE_SIZE = 1024
+_contract_signals_cache: OrderedDict[tuple[Any, ...], ContractSignals] = OrderedDict()
+
+
 # Версия SectionMappingService (увеличивается при изменении логики маппинга)
 VERSION = "1.0.0"
 
@@ -380,7 +406,75 @@ class SectionMappingService:
                 document_language=document_language,
             )
         return signals, signals_source
-    
+
+    def _get_contract_signals(
+        self,
+        contract: TargetSectionContract,
+        document_language: DocumentLanguage,
+    ) -> ContractSignals:
+        """
+        Возвращает скомпилированные signals контракта (кэш между документами).
+
+        Сиды могут менять retrieval_recipe_json in-place без смены версии,
+        поэтому в ключ кэша входит отпечаток recipe и полей, из которых выводятся auto-signals.
+        """
+        recipe = contract.retrieval_recipe_json or {}
+        fingerprint = json.dumps(
+            [contract.target_section, contract.title, recipe], sort_keys=True, ensure_ascii=False, default=str
+        )
+        key = (contract.id, contract.version, document_language, fingerprint)
+        cached = _contract_signals_cache.get(key)
+        if cached is not None:
+            _contract_signals_cache.move_to_end(key)
+            return cached
+
+        signals, signals_source = self._get_effective_signals(
+            contract=contract,
+            recipe_json=recipe,
+            document_language=document_language,
+        )
+        min_h, max_h = self._get_heading_level_bounds(recipe)
+        compiled = ContractSignals(
+            signals=signals,
+            signals_source=signals_source,
+            compiled=CompiledSignals.compile(
+                signals.must_keywords,
+                signals.should_keywords,
+                signals.not_keywords,
+                signals.regex_patterns,
+            ),
+            min_heading_level=min_h,
+            max_heading_level=max_h,
+        )
+        _contract_signals_cache[key] = compiled
+        if len(_contract_signals_cache) > CONTRACT_SIGNALS_CACHE_SIZE:
+            _contract_signals_cache.popitem(last=False)
+        return compiled
+
+    def _get_heading_level_bounds(self, recipe_json: dict[str, Any]) -> tuple[int, int]:
+        """Допустимые уровни заголовков для первого прохода матчинга."""
+        # Дефолт: H1–H3. Можно задать в recipe_json.mapping или recipe_json.context_build.
+        min_level = 1
+        max_level = 3
+        mapping_cfg = recipe_json.get("mapping")
+        if isinstance(mapping_cfg, dict):
+            if isinstance(mapping_cfg.get("min_heading_level"), int):
+                min_level = mapping_cfg["min_heading_level"]
+            if isinstance(mapping_cfg.get("max_heading_level"), int):
+                max_level = mapping_cfg["max_heading_level"]
+        ctx_cfg = recipe_json.get("context_build")
+        if isinstance(ctx_cfg, dict):
+            if isinstance(ctx_cfg.get("min_heading_level"), int):
+                min_level = ctx_cfg["min_heading_level"]
+            if isinstance(ctx_cfg.get("max_heading_level"), int):
+                max_level = ctx_cfg["max_heading_level"]
+        # Safety clamp
+        min_level = max(1, min(9, min_level))
+        max_level = max(1, min(9, max_level))
+        if min_level > max_level:
+            min_level, max_level = 1, 2
+        return min_level, max_level
+
     def _get_signals(
         self, recipe_json: dict[str, Any], document_language: DocumentLanguage
     ) -> LanguageAwareSignals:
@@ -595,7 +689,11 @@ class SectionMappingService:
             )
 
     async def map_sections(
-        self, doc_version_id: UUID, force: bool = False
+        self,
+        doc_version_id: UUID,
+        force: bool = False,
+        anchor_snapshot: AnchorSnapshot | None = None,
+        commit: bool = True,
     ) -> MappingSummary:
         """
         Автоматический маппинг секций для версии документа.
@@ -603,6 +701,8 @@ class SectionMappingService:
         Args:
             doc_version_id: ID версии документа
             force: Если True, пересоздать все system mappings (кроме overridden)
+            anchor_snapshot: Снимок anchors текущей ингестии; None — anchors читаются из БД
+            commit: Делать commit; False — только flush, транзакцией управляет вызывающий код (ингестия)
 
         Returns:
             MappingSummary с результатами маппинга
@@ -654,9 +754,12 @@ class SectionMappingService:
             )
 
         # Получаем все anchors версии
-        anchors_stmt = select(Anchor).where(Anchor.doc_version_id == doc_version_id)
-        anchors_result = await self.db.execute(anchors_stmt)
-        all_anchors = anchors_result.scalars().all()
+        if anchor_snapshot is not None:
+            all_anchors = list(anchor_snapshot)
+        else:
+            anchors_stmt = select(Anchor).where(Anchor.doc_version_id == doc_version_id)
+            anchors_result = await self.db.execute(anchors_stmt)
+            all_anchors = anchors_result.scalars().all()
         
         # Сортируем anchors по para_index
         all_anchors = sorted(
@@ -780,7 +883,10 @@ class SectionMappingService:
         # Разрешаем конфликты (если один anchor попал в несколько секций)
         await self._resolve_conflicts(doc_version_id, new_maps)
 
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
+        else:
+            await self.db.flush()
 
         logger.info(
             f"Маппинг завершён для doc_version_id={doc_version_id}: "
@@ -809,7 +915,7 @@ class SectionMappingService:
                 level = self._extract_heading_level(anchor)
                 headings.append((anchor, level))
 
-        return DocumentOutline(headings=headings)
+        return DocumentOutline(headings=headings, index=OutlineIndex(anchors, headings))
 
     def _extract_heading_level(self, anchor: Anchor) -> int:
         """
@@ -875,12 +981,11 @@ class SectionMappingService:
         if not recipe:
             return None
 
-        # Получаем эффективные signals (explicit или auto-derived)
-        signals, signals_source = self._get_effective_signals(
-            contract=contract,
-            recipe_json=recipe,
-            document_language=document_language,
-        )
+        # Получаем эффективные signals (explicit или auto-derived), скомпилированные один раз на версию контракта
+        contract_signals = self._get_contract_signals(contract, document_language)
+        signals = contract_signals.signals
+        signals_source = contract_signals.signals_source
+        index = outline.index or OutlineIndex(all_anchors, outline.headings)
 
         # Диагностический summary (INFO, компактно) — по каждой попытке маппинга section_key.
         # Детали top-3 кандидатов включаются только при MAPPING_DEBUG_LOGS=1.
@@ -899,39 +1004,11 @@ class SectionMappingService:
         )
 
         candidates: list[HeadingCandidate] = []
+        min_h = contract_signals.min_heading_level
+        max_h = contract_signals.max_heading_level
 
-        def _get_heading_level_bounds(recipe_json: dict[str, Any]) -> tuple[int, int]:
-            # Дефолт: H1–H3. Можно задать в recipe_json.mapping или recipe_json.context_build.
-            min_level = 1
-            max_level = 3
-            mapping_cfg = recipe_json.get("mapping")
-            if isinstance(mapping_cfg, dict):
-                if isinstance(mapping_cfg.get("min_heading_level"), int):
-                    min_level = mapping_cfg["min_heading_level"]
-                if isinstance(mapping_cfg.get("max_heading_level"), int):
-                    max_level = mapping_cfg["max_heading_level"]
-            ctx_cfg = recipe_json.get("context_build")
-            if isinstance(ctx_cfg, dict):
-                if isinstance(ctx_cfg.get("min_heading_level"), int):
-                    min_level = ctx_cfg["min_heading_level"]
-                if isinstance(ctx_cfg.get("max_heading_level"), int):
-                    max_level = ctx_cfg["max_heading_level"]
-            # Safety clamp
-            min_level = max(1, min(9, min_level))
-            max_level = max(1, min(9, max_level))
-            if min_level > max_level:
-                min_level, max_level = 1, 2
-            return min_level, max_level
-
-        min_h, max_h = _get_heading_level_bounds(recipe)
-
-        def _iter_headings_filtered(allow_any_level: bool):
-            for heading_anchor, level in outline.headings:
-                if allow_any_level:
-                    yield heading_anchor, level
-                else:
-                    if min_h <= level <= max_h:
-                        yield heading_anchor, level
+        # Оценки заголовков считаются один раз по индексу и переиспользуются в обоих проходах
+        heading_scores = index.score_headings(contract_signals.compiled)
 
         # Делаем 2 прохода: сначала по [min..max] (дефолт H1–H2), если нет кандидатов — по всем.
         for pass_idx, allow_any_level in enumerate([False, True], start=1):
@@ -952,76 +1029,35 @@ class SectionMappingService:
             any_regex_match_seen = False
 
             # Проходим по заголовкам
-            for heading_anchor, level in _iter_headings_filtered(allow_any_level):
+            for position, (heading_anchor, level) in enumerate(outline.headings):
+                if not allow_any_level and not (min_h <= level <= max_h):
+                    continue
                 candidate_hdr_count += 1
-                score = 0.0
-                reasons: list[str] = []
-                matched_must: list[str] = []
-                matched_should: list[str] = []
-                matched_not: list[str] = []
-                matched_regex: str | None = None
-
-                # Нормализуем текст заголовка для матчинга keywords
-                text_normalized = normalize_for_match(heading_anchor.text_norm)
-                text_for_regex = normalize_for_regex(heading_anchor.text_norm)
+                heading_score = heading_scores.get(position)
+                score = heading_score.score if heading_score else 0.0
+
                 if logger.isEnabledFor(10):  # DEBUG
                     raw_preview = (heading_anchor.text_norm or "")[:120]
-                    norm_preview = (text_normalized or "")[:120]
+                    norm_preview = (index.text_for_match[position] or "")[:120]
                     logger.debug(
                         "SectionMapping: compare heading "
                         f"(target_section={contract.target_section}, level={level}, "
                         f"anchor_id={heading_anchor.anchor_id}, "
                         f"text_raw[:120]={raw_preview!r}, text_norm_for_match[:120]={norm_preview!r})"
                     )
-
-                # Проверка keywords must
-                for keyword in signals.must_keywords:
-                    keyword_normalized = normalize_for_match(keyword)
-                    if keyword_normalized in text_normalized:
-                        score += 2.0
-                        reasons.append(f"must:'{keyword}'")
-                        matched_must.append(keyword)
-
-                # Проверка keywords should
-                for keyword in signals.should_keywords:
-                    keyword_normalized = normalize_for_match(keyword)
-                    if keyword_normalized in text_normalized:
-                        score += 1.0
-                        reasons.append(f"should:'{keyword}'")
-                        matched_should.append(keyword)
-
-                # Проверка negative keywords
-                for keyword in signals.not_keywords:
-                    keyword_normalized = normalize_for_match(keyword)
-                    if keyword_normalized in text_normalized:
-                        score -= 3.0
-                        reasons.append(f"not:'{keyword}'")
-                        matched_not.append(keyword)
-
-                # Проверка regex (на нормализованном тексте для regex)
-                for pattern in signals.regex_patterns:
-                    try:
-                        if re.search(pattern, text_for_regex, re.IGNORECASE):
-                            score += 3.0
-                            reasons.append(f"regex:'{pattern}'")
-                            matched_regex = pattern
-                            any_regex_match_seen = True
-                            break  # Первый матч достаточен
-                    except re.error:
-                        logger.warning(f"Некорректный regex pattern: {pattern}")
-
-                # Детальный breakdown только если есть хоть какие-то совпадения
-                if (matched_must or matched_should or matched_not or matched_regex) and logger.isEnabledFor(10):
-                    logger.debug(
-                        "SectionMapping: match breakdown "
-                        f"(target_section={contract.target_section}, anchor_id={heading_anchor.anchor_id}, "
-                        f"matched_must={matched_must}, matched_should={matched_should}, "
-                        f"matched_not={matched_not}, matched_regex={matched_regex}, "
-                        f"score={score:.1f})"
-                    )
+                    # Детальный breakdown только если есть хоть какие-то совпадения
+                    if heading_score:
+                        logger.debug(
+                            "SectionMapping: match breakdown "
+                            f"(target_section={contract.target_section}, anchor_id={heading_anchor.anchor_id}, "
+                            f"reasons={heading_score.reasons}, score={score:.1f})"
+                        )
+                if heading_score and heading_score.matched_regex:
+                    any_regex_match_seen = True
 
                 # Если score >= threshold, добавляем кандидата
                 if score >= signals.threshold:
+                    reasons = heading_score.reasons if heading_score else []
                     candidates.append(
                         HeadingCandidate(
                             anchor_id=heading_anchor.anchor_id,
@@ -1045,10 +1081,10 @@ class SectionMappingService:
                             score,
                             heading_anchor,
                             level,
-                            len(matched_must),
-                            len(matched_should),
-                            len(matched_not),
-                            bool(matched_regex),
+                            heading_score.matched_must if heading_score else 0,
+                            heading_score.matched_should if heading_score else 0,
+                            heading_score.matched_not if heading_score else 0,
+                            bool(heading_score and heading_score.matched_regex),
                         )
                     )
 
@@ -1571,31 +1607,21 @@ class SectionMappingService:
         heading_anchor = heading_candidate.anchor
         heading_level = self._extract_heading_level(heading_anchor)
 
+        index = outline.index or OutlineIndex(all_anchors, outline.headings)
+
         # Находим позицию заголовка в списке anchors
         heading_para_index = heading_anchor.location_json.get("para_index", 0)
 
         # Находим следующий заголовок с level <= heading_level
-        end_para_index = None
-        for anchor, level in outline.headings:
-            anchor_para_index = anchor.location_json.get("para_index", 0)
-            if anchor_para_index > heading_para_index and level <= heading_level:
-                end_para_index = anchor_para_index
-                break
+        end_para_index = index.block_end_para_index(heading_anchor, heading_level)
         logger.debug(
             "SectionMapping: capture_heading_block bounds "
             f"(target_section={contract.target_section}, heading_anchor_id={heading_anchor.anchor_id}, "
             f"heading_level={heading_level}, start_para_index={heading_para_index}, end_para_index={end_para_index})"
         )
 
-        # Собираем все anchors между start и end
-        candidate_anchors: list[Anchor] = []
-        for anchor in all_anchors:
-            para_index = anchor.location_json.get("para_index", 0)
-            if para_index >= heading_para_index:
-                if end_para_index is None or para_index < end_para_index:
-                    candidate_anchors.append(anchor)
-                else:
-                    break
+        # Собираем все anchors между start и end (bisect по para_index)
+        candidate_anchors = index.capture_block(heading_para_index, end_para_index)
         
         # Получаем prefer/fallback зоны из контракта
         passport = normalize_passport(
@@ -1631,15 +1657,18 @@ class SectionMappingService:
             fallback_zones = zone_config.apply_topic_zone_priors(fallback_zones, topic_key)
         
         # Фильтруем и приоритизируем anchors по зонам
-        prefer_zone_anchors = [a for a in candidate_anchors if a.source_zone in prefer_zones]
-        fallback_zone_anchors = [
-            a for a in candidate_anchors
-            if a.source_zone in fallback_zones and a not in prefer_zone_anchors
-        ]
-        other_anchors = [
-            a for a in candidate_anchors
-            if a not in prefer_zone_anchors and a not in fallback_zone_anchors
-        ]
+        prefer_zone_set = set(prefer_zones)
+        fallback_zone_set = set(fallback_zones)
+        prefer_zone_anchors: list[Anchor] = []
+        fallback_zone_anchors: list[Anchor] = []
+        other_anchors: list[Anchor] = []
+        for anchor in candidate_anchors:
+            if anchor.source_zone in prefer_zone_set:
+                prefer_zone_anchors.append(anchor)
+            elif anchor.source_zone in fallback_zone_set:
+                fallback_zone_anchors.append(anchor)
+            else:
+                other_anchors.append(anchor)
         
         # Собираем финальный список: сначала prefer, затем fallback, затем остальные
         final_anchors = prefer_zone_anchors + fallback_zone_anchors + other_anchors
@@ -1659,38 +1688,24 @@ class SectionMappingService:
         )
 
         # Вычисляем confidence с учетом языка
-        recipe = contract.retrieval_recipe_json
-        signals, _signals_source = self._get_effective_signals(
-            contract=contract,
-            recipe_json=recipe or {},
-            document_language=document_language,
-        )
+        contract_signals = self._get_contract_signals(contract, document_language)
+        signals = contract_signals.signals
+        compiled = contract_signals.compiled
 
         confidence = 0.5  # Базовый confidence
 
         # Проверяем regex match
-        has_regex_match = False
         text_for_regex = normalize_for_regex(heading_anchor.text_norm)
-        for pattern in signals.regex_patterns:
-            try:
-                if re.search(pattern, text_for_regex, re.IGNORECASE):
-                    has_regex_match = True
-                    break
-            except re.error:
-                pass
+        has_regex_match = any(pattern.search(text_for_regex) for _, pattern in compiled.regex)
 
         # Проверяем must match (на нормализованном тексте)
         text_normalized = normalize_for_match(heading_anchor.text_norm)
-        has_must_match = any(
-            normalize_for_match(kw) in text_normalized for kw in signals.must_keywords
-        )
+        has_must_match = any(kw in text_normalized for _, kw in compiled.must)
 
         # Если must_keywords не дали совпадения, проверяем should_keywords со штрафом
         has_should_match = False
         if not has_must_match:
-            has_should_match = any(
-                normalize_for_match(kw) in text_normalized for kw in signals.should_keywords
-            )
+            has_should_match = any(kw in text_normalized for _, kw in compiled.should)
 
         if has_regex_match and has_must_match:
             confidence = 0.9
@@ -1774,7 +1789,6 @@ class SectionMappingService:
 
         try:
             import json
-            import httpx
             import uuid
             
             llm_client = LLMClient()
@@ -1842,10 +1856,15 @@ class SectionMappingService:
                     "max_tokens": 500,
                 }
 
-            async with httpx.AsyncClient(timeout=llm_client.timeout_sec) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                response_data = response.json()
+            response = await get_llm_transport().post(
+                llm_client.provider,
+                url,
+                headers=headers,
+                json=payload,
+                timeout=llm_client.timeout_sec,
+            )
+            response.raise_for_status()
+            response_data = response.json()
 
             # Парсим ответ
             content = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
@@ -4,7 +4,7 @@ from __future__ import annotations
 import json
 import uuid
 from dataclasses import dataclass
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
 from sqlalchemy import select
@@ -26,6 +26,9 @@ from app.services.llm_client import LLMClient
 from app.services.section_mapping import DocumentOutline, SectionMappingService
 from app.services.section_mapping_qc import QCError, QCResult, SectionMappingQCGate
 
+if TYPE_CHECKING:
+    from app.services.ingestion.anchor_snapshot import AnchorSnapshot
+
 
 @dataclass
 class SectionQCReport:
@@ -69,6 +72,8 @@ class SectionMappingAssistService:
         max_candidates_per_section: int = 3,
         allow_visual_headings: bool = False,
         apply: bool = False,
+        anchor_snapshot: AnchorSnapshot | None = None,
+        commit: bool = True,
     ) -> AssistResult:
         """
         Выполняет LLM-assisted mapping для указанных секций.
@@ -79,6 +84,8 @@ class SectionMappingAssistService:
             max_candidates_per_section: Максимум кандидатов на секцию
             allow_visual_headings: Разрешить визуальные заголовки
             apply: Если True, применить изменения в section_maps
+            anchor_snapshot: Снимок anchors текущей ингестии; None — anchors читаются из БД
+            commit: Делать commit после apply; False — только flush, транзакцией управляет вызывающий код (ингестия)
 
         Returns:
             AssistResult с кандидатами и QC отчётом
@@ -123,9 +130,12 @@ class SectionMappingAssistService:
             raise ValueError(f"TargetSectionContracts не найдены для: {missing_keys}")
 
         # 4. Получаем все anchors
-        anchors_stmt = select(Anchor).where(Anchor.doc_version_id == doc_version_id)
-        anchors_result = await self.db.execute(anchors_stmt)
-        all_anchors = anchors_result.scalars().all()
+        if anchor_snapshot is not None:
+            all_anchors = list(anchor_snapshot)
+        else:
+            anchors_stmt = select(Anchor).where(Anchor.doc_version_id == doc_version_id)
+            anchors_result = await self.db.execute(anchors_stmt)
+            all_anchors = anchors_result.scalars().all()
 
         all_anchors = sorted(
             all_anchors,
@@ -305,6 +315,7 @@ class SectionMappingAssistService:
                 outline=outline,
                 existing_maps=existing_maps,
                 request_id=request_id,
+                commit=commit,
             )
         else:
             logger.info(
@@ -510,6 +521,7 @@ class SectionMappingAssistService:
         outline: DocumentOutline,
         existing_maps: dict[str, TargetSectionMap],
         request_id: str,
+        commit: bool = True,
     ) -> None:
         """
         Применяет маппинги в target_section_maps (только для status=mapped и derived_confidence >= 0.75).
@@ -522,6 +534,7 @@ class SectionMappingAssistService:
             outline: Структура документа
             existing_maps: Существующие маппинги
             request_id: ID запроса для логирования
+            commit: Делать commit (False — только flush)
         """
         for section_key, qc_report in qc_reports.items():
             # Пропускаем overridden маппинги
@@ -634,6 +647,9 @@ class SectionMappingAssistService:
                 )
                 self.db.add(section_map)
 
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
+        else:
+            await self.db.flush()
         logger.info(f"[Assist] Применены маппинги (request_id={request_id})")
 
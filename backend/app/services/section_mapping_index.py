@@ -0,0 +1,212 @@
+"""
+Индекс заголовков документа и скомпилированные сигналы контрактов для SectionMappingService.
+
+OutlineIndex строится один раз на документ: нормализованный текст и токены каждого
+заголовка, инвертированный индекс токенов и мемоизированные множества заголовков,
+в которых встречается keyword / срабатывает regex. Поэтому стоимость маппинга растёт
+с числом различных сигналов, а не с произведением «контракты × заголовки × keywords».
+Блок секции (от заголовка до следующего заголовка того же/выше уровня) берётся срезом
+по отсортированному массиву para_index через bisect.
+"""
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from app.core.logging import logger
+from app.db.models.anchors import Anchor
+from app.services.text_normalization import normalize_for_match, normalize_for_regex
+
+# Веса совпадений при оценке заголовка (см. SectionMappingService._find_heading_candidate)
+MUST_WEIGHT = 2.0
+SHOULD_WEIGHT = 1.0
+NOT_WEIGHT = -3.0
+REGEX_WEIGHT = 3.0
+
+
+@dataclass(frozen=True)
+class CompiledSignals:
+    """Сигналы контракта в виде, готовом к матчингу: нормализованные keywords и скомпилированные regex."""
+
+    must: tuple[tuple[str, str], ...]  # (keyword, normalize_for_match(keyword))
+    should: tuple[tuple[str, str], ...]
+    not_keywords: tuple[tuple[str, str], ...]
+    regex: tuple[tuple[str, re.Pattern[str]], ...]  # некорректные паттерны отброшены
+
+    @classmethod
+    def compile(
+        cls,
+        must_keywords: Sequence[str],
+        should_keywords: Sequence[str],
+        not_keywords: Sequence[str],
+        regex_patterns: Sequence[str],
+    ) -> CompiledSignals:
+        compiled_regex: list[tuple[str, re.Pattern[str]]] = []
+        for pattern in regex_patterns:
+            try:
+                compiled_regex.append((pattern, re.compile(pattern, re.IGNORECASE)))
+            except re.error:
+                logger.warning(f"Некорректный regex pattern: {pattern}")
+        return cls(
+            must=tuple((kw, normalize_for_match(kw)) for kw in must_keywords),
+            should=tuple((kw, normalize_for_match(kw)) for kw in should_keywords),
+            not_keywords=tuple((kw, normalize_for_match(kw)) for kw in not_keywords),
+            regex=tuple(compiled_regex),
+        )
+
+
+@dataclass
+class HeadingScore:
+    """Оценка заголовка по сигналам контракта."""
+
+    score: float = 0.0
+    reasons: list[str] | None = None
+    matched_must: int = 0
+    matched_should: int = 0
+    matched_not: int = 0
+    matched_regex: str | None = None
+
+
+def _para_index(anchor: Anchor) -> int | None:
+    location = anchor.location_json if isinstance(anchor.location_json, dict) else {}
+    value = location.get("para_index")
+    return value if isinstance(value, int) else None
+
+
+class OutlineIndex:
+    """Индекс заголовков и anchors одного документа (anchors отсортированы по para_index)."""
+
+    def __init__(self, anchors: Sequence[Anchor], headings: Sequence[tuple[Anchor, int]]) -> None:
+        self.headings = list(headings)
+        self.levels = [level for _, level in self.headings]
+        self.heading_para = [_para_index(a) or 0 for a, _ in self.headings]
+        self.text_for_match = [normalize_for_match(a.text_norm) for a, _ in self.headings]
+        self.text_for_regex = [normalize_for_regex(a.text_norm) for a, _ in self.headings]
+        self.tokens = [frozenset(text.split()) for text in self.text_for_match]
+        self._position_by_anchor_id = {a.anchor_id: i for i, (a, _) in enumerate(self.headings)}
+
+        # Инвертированный индекс: токен -> позиции заголовков
+        self._postings: dict[str, set[int]] = defaultdict(set)
+        for position, tokens in enumerate(self.tokens):
+            for token in tokens:
+                self._postings[token].add(position)
+
+        # Anchors с para_index (по возрастанию) и без него (например, cell anchors SoA)
+        self._positioned: list[Anchor] = []
+        self._positioned_para: list[int] = []
+        self._unpositioned: list[Anchor] = []
+        for anchor in anchors:
+            para = _para_index(anchor)
+            if para is None:
+                self._unpositioned.append(anchor)
+            else:
+                self._positioned.append(anchor)
+                self._positioned_para.append(para)
+
+        self._keyword_hits: dict[str, frozenset[int]] = {}
+        self._regex_hits: dict[str, frozenset[int]] = {}
+
+    def headings_with_keyword(self, keyword_normalized: str) -> frozenset[int]:
+        """Позиции заголовков, в нормализованном тексте которых есть keyword (подстрокой)."""
+        hits = self._keyword_hits.get(keyword_normalized)
+        if hits is not None:
+            return hits
+        if keyword_normalized and not any(ch.isspace() for ch in keyword_normalized):
+            # Keyword без пробелов — подстрока текста только внутри одного токена:
+            # проверяем словарь токенов, а не каждый заголовок
+            positions: set[int] = set()
+            for token, token_positions in self._postings.items():
+                if keyword_normalized in token:
+                    positions |= token_positions
+            hits = frozenset(positions)
+        else:
+            hits = frozenset(
+                i for i, text in enumerate(self.text_for_match) if keyword_normalized in text
+            )
+        self._keyword_hits[keyword_normalized] = hits
+        return hits
+
+    def headings_with_regex(self, pattern: str, compiled: re.Pattern[str]) -> frozenset[int]:
+        """Позиции заголовков, текст которых (normalize_for_regex) матчит паттерн."""
+        hits = self._regex_hits.get(pattern)
+        if hits is None:
+            hits = frozenset(i for i, text in enumerate(self.text_for_regex) if compiled.search(text))
+            self._regex_hits[pattern] = hits
+        return hits
+
+    def score_headings(self, signals: CompiledSignals) -> dict[int, HeadingScore]:
+        """
+        Оценивает заголовки по сигналам контракта.
+
+        Возвращает только заголовки хотя бы с одним совпадением; у остальных score = 0.
+        """
+        scores: dict[int, HeadingScore] = {}
+
+        def _entry(position: int) -> HeadingScore:
+            entry = scores.get(position)
+            if entry is None:
+                entry = scores[position] = HeadingScore(reasons=[])
+            return entry
+
+        for keyword, normalized in signals.must:
+            for position in self.headings_with_keyword(normalized):
+                entry = _entry(position)
+                entry.score += MUST_WEIGHT
+                entry.reasons.append(f"must:'{keyword}'")
+                entry.matched_must += 1
+        for keyword, normalized in signals.should:
+            for position in self.headings_with_keyword(normalized):
+                entry = _entry(position)
+                entry.score += SHOULD_WEIGHT
+                entry.reasons.append(f"should:'{keyword}'")
+                entry.matched_should += 1
+        for keyword, normalized in signals.not_keywords:
+            for position in self.headings_with_keyword(normalized):
+                entry = _entry(position)
+                entry.score += NOT_WEIGHT
+                entry.reasons.append(f"not:'{keyword}'")
+                entry.matched_not += 1
+        # Для regex достаточно первого сработавшего паттерна
+        for pattern, compiled in signals.regex:
+            for position in self.headings_with_regex(pattern, compiled):
+                entry = _entry(position)
+                if entry.matched_regex is not None:
+                    continue
+                entry.score += REGEX_WEIGHT
+                entry.reasons.append(f"regex:'{pattern}'")
+                entry.matched_regex = pattern
+        return scores
+
+    def heading_position(self, anchor_id: str) -> int | None:
+        return self._position_by_anchor_id.get(anchor_id)
+
+    def block_end_para_index(self, heading_anchor: Anchor, heading_level: int) -> int | None:
+        """para_index следующего заголовка с level <= heading_level (конец блока) или None."""
+        start = _para_index(heading_anchor) or 0
+        position = self.heading_position(heading_anchor.anchor_id)
+        first = position + 1 if position is not None else 0
+        for i in range(first, len(self.headings)):
+            if self.heading_para[i] > start and self.levels[i] <= heading_level:
+                return self.heading_para[i]
+        return None
+
+    def capture_block(self, start_para_index: int, end_para_index: int | None) -> list[Anchor]:
+        """Anchors с start <= para_index < end (в порядке para_index)."""
+        lo = bisect_left(self._positioned_para, start_para_index)
+        hi = (
+            bisect_left(self._positioned_para, end_para_index, lo)
+            if end_para_index is not None
+            else len(self._positioned)
+        )
+        block = self._positioned[lo:hi]
+        # Anchors без para_index считаются стоящими в позиции 0 (как location_json.get("para_index", 0))
+        # и сортируются в конец документа: попадают только в блок, открытый до конца документа с 0
+        if end_para_index is None and start_para_index <= 0:
+            block = block + self._unpositioned
+        return block
+
+
+__all__ = ["CompiledSignals", "HeadingScore", "OutlineIndex"]
@@ -0,0 +1,93 @@
+"""
+Векторизованное косинусное сходство embeddings (NumPy, float32).
+
+Embeddings складываются в матрицы float32 с нормированными строками, и матрица
+сходства n×m считается одним matmul (на каждую размерность). Используется
+TopicMappingService (блоки × топики) и AnchorAligner (якоря/группы × якоря/группы).
+
+Векторы разной размерности (например, OpenAI 1536 и YandexGPT 256) не сравниваются:
+сходство таких пар — 0.0, а сами пары можно получить через mismatched_dimensions
+для предупреждения в логах. Нулевые векторы тоже дают 0.0.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from collections.abc import Sequence
+
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Нормирует строки матрицы (float32); нулевые строки остаются нулевыми."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0.0] = np.inf
+    return matrix / norms
+
+
+def _rows_by_dimension(vectors: Sequence[Sequence[float]]) -> dict[int, list[int]]:
+    rows: dict[int, list[int]] = defaultdict(list)
+    for idx, vector in enumerate(vectors):
+        rows[len(vector)].append(idx)
+    return rows
+
+
+def cosine_similarity_matrix(
+    vectors_a: Sequence[Sequence[float]],
+    vectors_b: Sequence[Sequence[float]],
+    *,
+    clip: bool = False,
+) -> np.ndarray:
+    """
+    Матрица косинусного сходства len(vectors_a) × len(vectors_b) (float32).
+
+    Args:
+        vectors_a: Векторы строк
+        vectors_b: Векторы столбцов
+        clip: Ограничить значения диапазоном [0, 1]
+
+    Returns:
+        np.ndarray: сходство; для пар разной размерности и нулевых векторов — 0.0
+    """
+    result = np.zeros((len(vectors_a), len(vectors_b)), dtype=np.float32)
+    if not len(vectors_a) or not len(vectors_b):
+        return result
+    rows_b = _rows_by_dimension(vectors_b)
+    for dim, idx_a in _rows_by_dimension(vectors_a).items():
+        idx_b = rows_b.get(dim)
+        if not idx_b or dim == 0:
+            continue
+        mat_a = normalize_rows(np.asarray([vectors_a[i] for i in idx_a], dtype=np.float32))
+        mat_b = normalize_rows(np.asarray([vectors_b[j] for j in idx_b], dtype=np.float32))
+        result[np.ix_(idx_a, idx_b)] = mat_a @ mat_b.T
+    if clip:
+        np.clip(result, 0.0, 1.0, out=result)
+    return result
+
+
+def mismatched_dimensions(
+    vectors_a: Sequence[Sequence[float]],
+    vectors_b: Sequence[Sequence[float]],
+) -> set[tuple[int, int]]:
+    """Пары размерностей (меньшая, большая), которые встречаются в a и b, но не совпадают."""
+    dims_a = {len(v) for v in vectors_a}
+    dims_b = {len(v) for v in vectors_b}
+    return {
+        (min(dim_a, dim_b), max(dim_a, dim_b))
+        for dim_a in dims_a
+        for dim_b in dims_b
+        if dim_a != dim_b
+    }
+
+
+def cosine_similarity(vec_a: Sequence[float], vec_b: Sequence[float], *, clip: bool = False) -> float:
+    """Косинусное сходство одной пары векторов (0.0 при разной размерности или нулевом векторе)."""
+    return float(cosine_similarity_matrix([vec_a], [vec_b], clip=clip)[0, 0])
+
+
+__all__ = [
+    "cosine_similarity",
+    "cosine_similarity_matrix",
+    "mismatched_dimensions",
+    "normalize_rows",
+]
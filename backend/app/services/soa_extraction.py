@@ -22,7 +22,13 @@ from app.db.models.anchors import Anchor
 from app.db.models.facts import Fact, FactEvidence
 from app.db.models.studies import Document as DocumentModel, DocumentVersion
 from app.schemas.common import SoAResult, SoAVisit, SoAProcedure, SoAMatrixEntry, SoANote
+from app.services.ingestion.cpu_pool import run_cpu_bound
 from app.services.ingestion.docx_ingestor import normalize_text, get_text_hash, normalize_section_path, detect_text_language
+from app.services.ingestion.parsed_docx import (
+    TABLE_CONTEXT_MAX_HEADING_STACK,
+    TABLE_CONTEXT_MAX_PREV_PARAS,
+    ParsedDocx,
+)
 
 
 @dataclass
@@ -58,8 +64,17 @@ VERSION = "1.0.0"
 class SoAExtractionService:
     """Сервис для извлечения Schedule of Activities из документа."""
 
-    def __init__(self, db: AsyncSession) -> None:
+    def __init__(self, db: AsyncSession | None = None) -> None:
+        # db нужен только extract_soa; extract_soa_from_parsed работает без БД (в пуле процессов)
         self.db = db
+        # Распарсенный документ текущего извлечения (контексты таблиц посчитаны за один проход)
+        self._parsed: ParsedDocx | None = None
+
+    def _tables(self, doc: Document) -> list[Table]:
+        """Таблицы документа (из ParsedDocx, если это тот же документ)."""
+        if self._parsed is not None and self._parsed.doc is doc:
+            return self._parsed.tables
+        return doc.tables
 
     def _iter_doc_body_blocks(self, doc: Document):
         """
@@ -96,6 +111,16 @@ class SoAExtractionService:
         heading_context: "H1 / H2 / ..."
         prev_paragraphs: тексты нескольких параграфов перед таблицей.
         """
+        if (
+            self._parsed is not None
+            and self._parsed.doc is doc
+            and max_prev_paras == TABLE_CONTEXT_MAX_PREV_PARAS
+            and max_heading_stack == TABLE_CONTEXT_MAX_HEADING_STACK
+            and 0 <= table_index < len(self._parsed.table_contexts)
+        ):
+            ctx = self._parsed.table_contexts[table_index]
+            return ctx.heading_context, list(ctx.prev_paragraphs)
+
         heading_stack: list[tuple[int, str]] = []
         prev_paras: list[str] = []
         cur_table_idx = -1
@@ -355,12 +380,13 @@ class SoAExtractionService:
         heading_stack: list[tuple[int, str]],
     ) -> TableScore | None:
         """Обнаруживает таблицу SoA в документе."""
-        if len(doc.tables) == 0:
+        tables = self._tables(doc)
+        if len(tables) == 0:
             return None
         
         scores: list[TableScore] = []
         
-        for i, table in enumerate(doc.tables):
+        for i, table in enumerate(tables):
             score_result = self._score_table_for_soa(table, i, doc, heading_stack)
             scores.append(score_result)
 
@@ -394,7 +420,7 @@ class SoAExtractionService:
             else:
                 # Детальное логирование причины браковки
                 heading_context, _ = self._get_context_for_table(doc, best_score.table_index)
-                table = doc.tables[best_score.table_index]
+                table = tables[best_score.table_index]
                 
                 # Анализируем причины низкого score
                 rejection_reasons = []
@@ -422,7 +448,12 @@ class SoAExtractionService:
                     rejection_reasons.append(f"table too small ({len(table.rows)} rows, {len(table.rows[0].cells) if len(table.rows) > 0 else 0} cols)")
                 
                 # Проверяем контекст
-                ctx_text = " ".join([heading_context] + [normalize_text(p.text) for p in doc.paragraphs[:10]])
+                first_paragraphs = (
+                    [pp.text_norm for pp in self._parsed.paragraphs[:10]]
+                    if self._parsed is not None and self._parsed.doc is doc
+                    else [normalize_text(p.text) for p in doc.paragraphs[:10]]
+                )
+                ctx_text = " ".join([heading_context] + first_paragraphs)
                 ctx_delta, _ = self._soa_context_score(ctx_text)
                 if ctx_delta < 0:
                     rejection_reasons.append("negative context (appendix/scale)")
@@ -827,13 +858,47 @@ class SoAExtractionService:
             warnings=warnings,
         )
 
+    def _resolve_docx_path(self, doc_version: DocumentVersion) -> Path | None:
+        """Локальный путь к DOCX версии документа по source_file_uri (None, если файла нет/не DOCX)."""
+        if not doc_version.source_file_uri:
+            logger.warning(f"DocumentVersion {doc_version.id} не имеет source_file_uri")
+            return None
+        
+        # Преобразуем URI в локальный путь
+        uri = doc_version.source_file_uri
+        if uri.startswith("file://"):
+            parsed_uri = urllib.parse.urlparse(uri)
+            path = urllib.parse.unquote(parsed_uri.path)
+            # На Windows file:///C:/path становится /C:/path, убираем ведущий /
+            if path.startswith("/") and len(path) > 3 and path[2] == ":":
+                path = path[1:]
+            file_path = Path(path)
+        else:
+            file_path = Path(uri)
+        
+        if not file_path.exists():
+            logger.warning(f"Файл не найден: {file_path}")
+            return None
+        
+        if file_path.suffix.lower() != ".docx":
+            logger.warning(f"Файл не является DOCX: {file_path}")
+            return None
+        
+        return file_path
+
     async def extract_soa(
         self,
         doc_version_id: UUID,
+        parsed: ParsedDocx | None = None,
     ) -> tuple[list[CellAnchorCreate], SoAResult | None]:
         """
         Извлекает Schedule of Activities из версии документа.
 
+        Args:
+            doc_version_id: ID версии документа
+            parsed: Уже распарсенный DOCX. Если не передан, файл открывается по
+                source_file_uri и разбирается в пуле процессов (cpu_pool).
+
         Returns:
             (cell_anchors, soa_result) - список cell anchors и результат извлечения SoA
         """
@@ -849,36 +914,32 @@ class SoAExtractionService:
         if not document:
             raise ValueError(f"Document {doc_version.document_id} не найден")
         
-        # Проверяем наличие файла
-        if not doc_version.source_file_uri:
-            logger.warning(f"DocumentVersion {doc_version_id} не имеет source_file_uri")
-            return [], None
-        
-        # Загружаем DOCX документ
-        # Преобразуем URI в локальный путь
-        uri = doc_version.source_file_uri
-        if uri.startswith("file://"):
-            parsed = urllib.parse.urlparse(uri)
-            path = urllib.parse.unquote(parsed.path)
-            # На Windows file:///C:/path становится /C:/path, убираем ведущий /
-            if path.startswith("/") and len(path) > 3 and path[2] == ":":
-                path = path[1:]
-            file_path = Path(path)
-        else:
-            file_path = Path(uri)
-        
-        if not file_path.exists():
-            logger.warning(f"Файл не найден: {file_path}")
-            return [], None
-        
-        if file_path.suffix.lower() != ".docx":
-            logger.warning(f"Файл не является DOCX: {file_path}")
+        if parsed is not None:
+            return self.extract_soa_from_parsed(parsed, doc_version_id)
+
+        file_path = self._resolve_docx_path(doc_version)
+        if file_path is None:
             return [], None
-        
-        doc = Document(str(file_path))
+        return await run_cpu_bound(extract_soa_from_file, file_path, doc_version_id)
+
+    def extract_soa_from_parsed(
+        self,
+        parsed: ParsedDocx,
+        doc_version_id: UUID,
+    ) -> tuple[list[CellAnchorCreate], SoAResult | None]:
+        """
+        Извлекает SoA из уже распарсенного DOCX (синхронно, без обращений к БД).
+
+        Выполняется в пуле процессов ингестии: скоринг таблиц и разбор ячеек — CPU-bound.
+
+        Returns:
+            (cell_anchors, soa_result) - список cell anchors и результат извлечения SoA
+        """
+        self._parsed = parsed
+        doc = parsed.doc
         
         # Проверяем наличие таблиц в документе
-        tables_count = len(doc.tables)
+        tables_count = len(parsed.tables)
         logger.info(f"Найдено таблиц в документе: {tables_count}")
         
         if tables_count == 0:
@@ -886,7 +947,7 @@ class SoAExtractionService:
             return [], None
         
         # Логируем информацию о таблицах для отладки
-        for i, table in enumerate(doc.tables):
+        for i, table in enumerate(parsed.tables):
             rows_count = len(table.rows)
             cols_count = len(table.rows[0].cells) if rows_count > 0 else 0
             logger.debug(
@@ -894,20 +955,8 @@ class SoAExtractionService:
                 f"первая строка: {[normalize_text(cell.text)[:30] for cell in table.rows[0].cells[:5]] if rows_count > 0 else []}"
             )
         
-        # Собираем heading_stack из параграфов (для определения section_path)
-        heading_stack: list[tuple[int, str]] = []
-        for para in doc.paragraphs:
-            style_name = para.style.name if para.style else "Normal"
-            if style_name.startswith('Heading') and style_name.replace('Heading', '').strip().isdigit():
-                level_str = style_name.replace('Heading', '').strip()
-                try:
-                    level = int(level_str)
-                    text_norm = normalize_text(para.text)
-                    if text_norm:
-                        heading_stack = [h for h in heading_stack if h[0] < level]
-                        heading_stack.append((level, text_norm))
-                except ValueError:
-                    pass
+        # heading_stack из параграфов (для определения section_path) собран при парсинге
+        heading_stack = list(parsed.heading_stack)
         
         # Обнаруживаем SoA таблицу
         soa_table_score = self._detect_soa_table(doc, heading_stack)
@@ -922,7 +971,7 @@ class SoAExtractionService:
         )
         
         # Извлекаем SoA из таблицы
-        table = doc.tables[soa_table_score.table_index]
+        table = parsed.tables[soa_table_score.table_index]
         ordinal_counters: dict[tuple[str, AnchorContentType], int] = {}
         
         cell_anchors, soa_result = self._extract_soa_from_table(
@@ -942,3 +991,11 @@ class SoAExtractionService:
         )
         
         return cell_anchors, soa_result
+
+
+def extract_soa_from_file(
+    file_path: str | Path,
+    doc_version_id: UUID,
+) -> tuple[list[CellAnchorCreate], SoAResult | None]:
+    """Открывает DOCX и извлекает SoA (точка входа для пула процессов, см. cpu_pool)."""
+    return SoAExtractionService().extract_soa_from_parsed(ParsedDocx.load(file_path), doc_version_id)
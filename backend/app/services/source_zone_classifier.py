@@ -1,8 +1,22 @@
-"""Классификатор source_zone для section_path заголовков документов."""
+"""
+Классификатор source_zone для section_path заголовков документов.
+
+Классификация вызывается для каждого anchor, а у сотен anchors один и тот же section_path,
+поэтому результаты мемоизируются:
+- совпадения одного сегмента пути со всеми зонами — по (doc_type, сегмент);
+- накопленные совпадения префикса пути — по (doc_type, сегменты префикса): дочерний путь
+  дополняет результат родительского одним сегментом;
+- итоговый SourceZoneResult — по (doc_type, сегменты, heading_text, language).
+Размер кэшей ограничен (CLASSIFY_CACHE_SIZE). Паттерны зоны объединены в одну
+альтернацию: она отсекает сегменты без совпадений за один проход, а первый сработавший
+паттерн (он определяет силу совпадения) ищется только для совпавших сегментов.
+"""
 from __future__ import annotations
 
 import re
+from collections.abc import Iterable, Sequence
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
@@ -12,8 +26,42 @@ from app.core.logging import logger
 from app.db.enums import DocumentType
 from app.services.zone_set_registry import get_registry
 
+# Размер каждого из кэшей классификации (сегменты, префиксы путей, итоговые результаты)
+CLASSIFY_CACHE_SIZE = 16384
 
-@dataclass
+# Пути без зоны
+_UNCLASSIFIED_PATHS = ("ROOT", "__FRONTMATTER__", "FOOTNOTES")
+# Глобальные inline-флаги в начале паттерна, например "(?i)"
+_LEADING_FLAGS_RE = re.compile(r"^\(\?([imsx]+)\)")
+# Обратные ссылки ломаются при объединении паттернов в альтернацию
+_BACKREFERENCE_RE = re.compile(r"\\\d|\(\?P=")
+
+# (число совпавших сегментов, сумма силы совпадений) по зонам в порядке приоритета
+_ZoneTotals = tuple[tuple[int, float], ...]
+
+
+def _merge_patterns(pattern_strs: Sequence[str]) -> re.Pattern[str] | None:
+    """
+    Одна альтернация из паттернов зоны (глобальные флаги становятся локальными "(?i:...)").
+
+    None — паттерны нельзя объединить (обратные ссылки, ошибка компиляции).
+    """
+    if not pattern_strs or any(_BACKREFERENCE_RE.search(p) for p in pattern_strs):
+        return None
+    parts = []
+    for pattern_str in pattern_strs:
+        flags = _LEADING_FLAGS_RE.match(pattern_str)
+        if flags:
+            parts.append(f"(?{flags.group(1)}:{pattern_str[flags.end():]})")
+        else:
+            parts.append(f"(?:{pattern_str})")
+    try:
+        return re.compile("|".join(parts))
+    except re.error:
+        return None
+
+
+@dataclass(frozen=True)
 class SourceZoneResult:
     """Результат классификации source_zone."""
 
@@ -36,6 +84,13 @@ class SourceZoneClassifier:
         # Кэш правил для каждого doc_type
         self._rules_cache: dict[str, list[dict[str, Any]]] = {}
         self._compiled_patterns_cache: dict[str, list[tuple[str, list[re.Pattern[str]]]]] = {}
+        # Объединённая альтернация паттернов каждой зоны (None — проверять паттерны по одному)
+        self._merged_patterns_cache: dict[str, list[re.Pattern[str] | None]] = {}
+
+        # Ограниченные кэши классификации (см. docstring модуля)
+        self._segment_matches = lru_cache(maxsize=CLASSIFY_CACHE_SIZE)(self._match_segment)
+        self._prefix_totals = lru_cache(maxsize=CLASSIFY_CACHE_SIZE)(self._accumulate_prefix)
+        self._classify_cached = lru_cache(maxsize=CLASSIFY_CACHE_SIZE)(self._classify_segments)
         
         # Реестр наборов зон для валидации
         self.zone_registry = get_registry()
@@ -115,6 +170,7 @@ class SourceZoneClassifier:
         rules = self._load_rules_for_doc_type(doc_type)
         
         compiled: list[tuple[str, list[re.Pattern[str]]]] = []
+        merged: list[re.Pattern[str] | None] = []
         # Список зон в порядке приоритета (более специфичные первыми)
         priority_order = [
             "serious_adverse_events",  # Более специфичная, чем adverse_events
@@ -142,6 +198,7 @@ class SourceZoneClassifier:
         for zone_name in priority_order:
             if priority_zones[zone_name] is not None:
                 compiled.append((zone_name, priority_zones[zone_name]))
+                merged.append(_merge_patterns([p.pattern for p in priority_zones[zone_name]]))
         
         # Затем добавляем остальные зоны
         for zone_config in rules:
@@ -159,9 +216,11 @@ class SourceZoneClassifier:
                                 f"pattern={pattern_str}: {e}"
                             )
                 compiled.append((zone_name, patterns))
+                merged.append(_merge_patterns([p.pattern for p in patterns]))
         
         # Сохраняем в кэш
         self._compiled_patterns_cache[doc_type_str] = compiled
+        self._merged_patterns_cache[doc_type_str] = merged
 
         return compiled
 
@@ -187,80 +246,129 @@ class SourceZoneClassifier:
         """
         # Нормализуем section_path: если строка, разбиваем на сегменты
         if isinstance(section_path, str):
-            if not section_path or section_path in ("ROOT", "__FRONTMATTER__", "FOOTNOTES"):
+            if not section_path or section_path in _UNCLASSIFIED_PATHS:
                 return SourceZoneResult(zone="unknown", confidence=0.0, matched_rule_id=None)
-            path_segments = [seg.strip() for seg in section_path.split("/") if seg.strip()]
+            path_segments = tuple(seg.strip() for seg in section_path.split("/") if seg.strip())
         else:
-            path_segments = [seg.strip() for seg in section_path if seg.strip()]
+            path_segments = tuple(seg.strip() for seg in section_path if seg.strip())
 
         if not path_segments:
             return SourceZoneResult(zone="unknown", confidence=0.0, matched_rule_id=None)
 
-        # Загружаем скомпилированные паттерны для данного doc_type
-        compiled_patterns = self._compile_patterns_for_doc_type(doc_type)
+        # heading_text проверяется как дополнительный сегмент
+        heading = heading_text.strip() if heading_text else None
+        return self._classify_cached(doc_type, path_segments, heading, language)
 
-        # Добавляем heading_text в список для проверки, если он предоставлен
-        text_to_check = path_segments.copy()
-        if heading_text:
-            text_to_check.append(heading_text.strip())
+    def classify_many(
+        self,
+        doc_type: DocumentType,
+        items: Iterable[tuple[str | list[str], str | None]],
+        language: str | None = None,
+    ) -> list[SourceZoneResult]:
+        """
+        Классифицирует набор (section_path, heading_text) одного документа.
 
-        # Ищем совпадения по всем сегментам пути и heading_text
-        # Проверяем каждый zone с его паттернами в порядке приоритета
-        # (первый найденный матч возвращаем сразу - более специфичные зоны идут первыми)
-        best_match: tuple[str, float, str | None] | None = None
-        
-        for zone_name, patterns in compiled_patterns:
-            matches_count = 0
-            total_segments = len(text_to_check)
-            match_strength = 0.0  # Сила совпадения: exact phrase > regex partial > weak token
-
-            # Проверяем каждый сегмент пути на соответствие паттернам этой zone
-            for segment in text_to_check:
-                segment_lower = segment.lower()
+        Каждый различный префикс пути классифицируется один раз; дочерние пути
+        дополняют накопленные совпадения родителя.
+
+        Returns:
+            Результаты в порядке items
+        """
+        results: list[SourceZoneResult] = []
+        seen: dict[tuple[Any, str | None], SourceZoneResult] = {}
+        for section_path, heading_text in items:
+            key = (section_path if isinstance(section_path, str) else tuple(section_path), heading_text)
+            result = seen.get(key)
+            if result is None:
+                result = self.classify(doc_type, section_path, heading_text, language)
+                seen[key] = result
+            results.append(result)
+        return results
+
+    def _match_segment(self, doc_type: DocumentType, segment: str) -> tuple[float, ...]:
+        """
+        Сила совпадения сегмента с каждой зоной (0.0 — нет совпадения).
+
+        Сила определяется первым совпавшим паттерном зоны:
+        exact phrase (1.0) > сильное частичное (0.7) > слабое частичное (0.4).
+        """
+        compiled_patterns = self._compile_patterns_for_doc_type(doc_type)
+        merged_patterns = self._merged_patterns_cache[doc_type.value]
+        segment_lower = segment.lower()
+        strengths: list[float] = []
+        for (_zone_name, patterns), merged in zip(compiled_patterns, merged_patterns):
+            strength = 0.0
+            if merged is None or merged.search(segment):
                 for pattern in patterns:
                     match = pattern.search(segment)
                     if match:
-                        matches_count += 1
-                        # Определяем силу совпадения
                         if match.group(0).lower() == segment_lower:
-                            match_strength += 1.0  # Точное совпадение
+                            strength = 1.0  # Точное совпадение
                         elif len(match.group(0)) >= len(segment) * 0.8:
-                            match_strength += 0.7  # Сильное частичное совпадение
+                            strength = 0.7  # Сильное частичное совпадение
                         else:
-                            match_strength += 0.4  # Слабое частичное совпадение
+                            strength = 0.4  # Слабое частичное совпадение
                         break  # Один матч на сегмент достаточно
+            strengths.append(strength)
+        return tuple(strengths)
 
-            if matches_count > 0:
-                # Confidence = комбинация доли совпавших сегментов и силы совпадения
-                base_confidence = matches_count / total_segments
-                strength_bonus = match_strength / total_segments
-                confidence = min(base_confidence + strength_bonus * 0.3, 1.0)
-                
-                # Сохраняем лучший матч (по confidence)
-                if best_match is None or confidence > best_match[1]:
-                    best_match = (zone_name, confidence, zone_name)
-                
-                # Если confidence очень высокий, возвращаем сразу
-                if confidence >= 0.9:
-                    # Нормализуем зону через реестр перед возвратом
-                    normalized_zone = self.zone_registry.normalize_zone(doc_type, zone_name)
-                    return SourceZoneResult(
-                        zone=normalized_zone, 
-                        confidence=confidence,
-                        matched_rule_id=zone_name
-                    )
-
-        # Возвращаем лучший матч или unknown
-        if best_match:
-            # Нормализуем зону через реестр
-            normalized_zone = self.zone_registry.normalize_zone(doc_type, best_match[0])
-            return SourceZoneResult(
-                zone=normalized_zone,
-                confidence=best_match[1],
-                matched_rule_id=best_match[2]
-            )
-        
-        return SourceZoneResult(zone="unknown", confidence=0.0, matched_rule_id=None)
+    def _accumulate_prefix(self, doc_type: DocumentType, segments: tuple[str, ...]) -> _ZoneTotals:
+        """Совпадения по зонам для префикса пути: результат родителя + последний сегмент."""
+        if len(segments) > 1:
+            parent = self._prefix_totals(doc_type, segments[:-1])
+        else:
+            parent = tuple((0, 0.0) for _ in self._compile_patterns_for_doc_type(doc_type))
+        return self._add_segment(parent, self._segment_matches(doc_type, segments[-1]))
+
+    @staticmethod
+    def _add_segment(totals: _ZoneTotals, strengths: tuple[float, ...]) -> _ZoneTotals:
+        return tuple(
+            (count + 1, strength_sum + strength) if strength > 0.0 else (count, strength_sum)
+            for (count, strength_sum), strength in zip(totals, strengths)
+        )
+
+    def _classify_segments(
+        self,
+        doc_type: DocumentType,
+        path_segments: tuple[str, ...],
+        heading: str | None,
+        language: str | None,
+    ) -> SourceZoneResult:
+        """Классификация нормализованных сегментов (кэшируется в _classify_cached)."""
+        compiled_patterns = self._compile_patterns_for_doc_type(doc_type)
+        totals = self._prefix_totals(doc_type, path_segments)
+        total_segments = len(path_segments)
+        if heading is not None:
+            totals = self._add_segment(totals, self._segment_matches(doc_type, heading))
+            total_segments += 1
+
+        # Зоны проверяются в порядке приоритета (более специфичные идут первыми);
+        # первая зона с очень высоким confidence возвращается сразу
+        best_match: tuple[str, float] | None = None
+        for (zone_name, _patterns), (matches_count, match_strength) in zip(compiled_patterns, totals):
+            if matches_count == 0:
+                continue
+            # Confidence = комбинация доли совпавших сегментов и силы совпадения
+            base_confidence = matches_count / total_segments
+            strength_bonus = match_strength / total_segments
+            confidence = min(base_confidence + strength_bonus * 0.3, 1.0)
+
+            # Сохраняем лучший матч (по confidence)
+            if best_match is None or confidence > best_match[1]:
+                best_match = (zone_name, confidence)
+
+            if confidence >= 0.9:
+                break
+
+        if best_match is None:
+            return SourceZoneResult(zone="unknown", confidence=0.0, matched_rule_id=None)
+        zone_name, confidence = best_match
+        # Нормализуем зону через реестр
+        return SourceZoneResult(
+            zone=self.zone_registry.normalize_zone(doc_type, zone_name),
+            confidence=confidence,
+            matched_rule_id=zone_name,
+        )
 
 
 # Глобальный экземпляр классификатора (singleton pattern для переиспользования)
@@ -13,6 +13,7 @@ import httpx
 from app.core.config import LLMProvider, settings
 from app.core.logging import logger
 from app.services.llm_client import LLMClient
+from app.services.llm_transport import get_llm_transport
 
 
 class TextTransformer:
@@ -192,65 +193,75 @@ class TextTransformer:
                 return fallback_text
 
             # Выполняем запрос
-            async with httpx.AsyncClient(timeout=self.llm_client.timeout_sec) as client:
-                try:
-                    response = await client.post(url, headers=headers, json=payload)
-                    response.raise_for_status()
-                    response_data = response.json()
-                except httpx.HTTPStatusError as e:
-                    # Для LOCAL провайдера пробуем fallback на OpenAI-compatible endpoint
-                    if (
-                        self.llm_client.provider == LLMProvider.LOCAL
-                        and e.response is not None
-                        and e.response.status_code in (400, 404, 405)
-                    ):
-                        logger.warning(
-                            f"[TextTransformer] LOCAL endpoint /api/chat недоступен, "
-                            f"пробуем OpenAI-compatible endpoint (request_id={request_id})"
-                        )
-                        oa_url = f"{self.llm_client.base_url}/v1/chat/completions"
-                        oa_headers = {"Content-Type": "application/json"}
-                        if self.llm_client.api_key:
-                            oa_headers["Authorization"] = (
-                                f"Bearer {self.llm_client.api_key}"
-                            )
-                        oa_payload = {
-                            "model": self.llm_client.model,
-                            "messages": messages,
-                            "temperature": self.llm_client.temperature,
-                            "max_tokens": 4000,
-                        }
-                        response = await client.post(
-                            oa_url, headers=oa_headers, json=oa_payload
-                        )
-                        response.raise_for_status()
-                        response_data = response.json()
-                    else:
-                        error_body = ""
-                        try:
-                            if e.response is not None:
-                                error_body = e.response.text[:500]
-                        except Exception:
-                            pass
-                        logger.error(
-                            f"[TextTransformer] Ошибка HTTP при запросе к LLM "
-                            f"(request_id={request_id}, status={e.response.status_code if e.response else None}): "
-                            f"{error_body}"
+            transport = get_llm_transport()
+            try:
+                response = await transport.post(
+                    self.llm_client.provider,
+                    url,
+                    headers=headers,
+                    json=payload,
+                    timeout=self.llm_client.timeout_sec,
+                )
+                response.raise_for_status()
+                response_data = response.json()
+            except httpx.HTTPStatusError as e:
+                # Для LOCAL провайдера пробуем fallback на OpenAI-compatible endpoint
+                if (
+                    self.llm_client.provider == LLMProvider.LOCAL
+                    and e.response is not None
+                    and e.response.status_code in (400, 404, 405)
+                ):
+                    logger.warning(
+                        f"[TextTransformer] LOCAL endpoint /api/chat недоступен, "
+                        f"пробуем OpenAI-compatible endpoint (request_id={request_id})"
+                    )
+                    oa_url = f"{self.llm_client.base_url}/v1/chat/completions"
+                    oa_headers = {"Content-Type": "application/json"}
+                    if self.llm_client.api_key:
+                        oa_headers["Authorization"] = (
+                            f"Bearer {self.llm_client.api_key}"
                         )
-                        return fallback_text
-                except httpx.ReadTimeout as e:
-                    logger.error(
-                        f"[TextTransformer] Таймаут при запросе к LLM "
-                        f"(request_id={request_id}, timeout_sec={self.llm_client.timeout_sec})"
+                    oa_payload = {
+                        "model": self.llm_client.model,
+                        "messages": messages,
+                        "temperature": self.llm_client.temperature,
+                        "max_tokens": 4000,
+                    }
+                    response = await transport.post(
+                        self.llm_client.provider,
+                        oa_url,
+                        headers=oa_headers,
+                        json=oa_payload,
+                        timeout=self.llm_client.timeout_sec,
                     )
-                    return fallback_text
-                except Exception as e:
+                    response.raise_for_status()
+                    response_data = response.json()
+                else:
+                    error_body = ""
+                    try:
+                        if e.response is not None:
+                            error_body = e.response.text[:500]
+                    except Exception:
+                        pass
                     logger.error(
-                        f"[TextTransformer] Неожиданная ошибка при запросе к LLM "
-                        f"(request_id={request_id}): {e}",
-                        exc_info=True,
+                        f"[TextTransformer] Ошибка HTTP при запросе к LLM "
+                        f"(request_id={request_id}, status={e.response.status_code if e.response else None}): "
+                        f"{error_body}"
                     )
                     return fallback_text
+            except httpx.ReadTimeout as e:
+                logger.error(
+                    f"[TextTransformer] Таймаут при запросе к LLM "
+                    f"(request_id={request_id}, timeout_sec={self.llm_client.timeout_sec})"
+                )
+                return fallback_text
+            except Exception as e:
+                logger.error(
+                    f"[TextTransformer] Неожиданная ошибка при запросе к LLM "
+                    f"(request_id={request_id}): {e}",
+                    exc_info=True,
+                )
+                return fallback_text
 
             # Извлекаем content из ответа
             if (
@@ -2,18 +2,22 @@ from __future__ import annotations
 
 import uuid
 from collections import defaultdict
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.logging import logger
 from app.db.enums import DocumentLanguage
-from app.db.models.anchors import Anchor, Chunk
+from app.db.models.anchors import Chunk
 from app.db.models.topics import HeadingBlockTopicAssignment, TopicEvidence
 from app.services.heading_block_builder import HeadingBlockBuilder
 
 
+if TYPE_CHECKING:
+    from app.services.ingestion.anchor_snapshot import AnchorSnapshot
+
+
 class TopicEvidenceBuilder:
     """Сервис для построения topic_evidence из heading_block_topic_assignments и blocks."""
 
@@ -21,7 +25,10 @@ class TopicEvidenceBuilder:
         self.db = db
 
     async def build_evidence_for_doc_version(
-        self, doc_version_id: uuid.UUID
+        self,
+        doc_version_id: uuid.UUID,
+        anchor_snapshot: AnchorSnapshot | None = None,
+        commit: bool = True,
     ) -> int:
         """
         Пересобирает topic_evidence для указанной версии документа.
@@ -34,6 +41,9 @@ class TopicEvidenceBuilder:
 
         Args:
             doc_version_id: UUID версии документа
+            anchor_snapshot: Снимок anchors текущей ингестии для построения блоков;
+                None — anchors читаются из БД
+            commit: Делать commit; False — только flush, транзакцией управляет вызывающий код (ингестия)
 
         Returns:
             Количество созданных/обновленных записей topic_evidence
@@ -69,7 +79,9 @@ class TopicEvidenceBuilder:
 
         # Строим блоки для получения anchor_ids
         block_builder = HeadingBlockBuilder(self.db)
-        blocks = await block_builder.build_blocks_for_doc_version(doc_version_id, document.doc_type)
+        blocks = await block_builder.build_blocks_for_doc_version(
+            doc_version_id, document.doc_type, anchor_snapshot
+        )
 
         # Создаем маппинг heading_block_id -> block
         block_by_id: dict[str, Any] = {block.heading_block_id: block for block in blocks}
@@ -79,11 +91,6 @@ class TopicEvidenceBuilder:
         result = await self.db.execute(stmt)
         chunks = result.scalars().all()
 
-        # Получаем все anchors для определения source_zone и language
-        stmt = select(Anchor).where(Anchor.doc_version_id == doc_version_id)
-        result = await self.db.execute(stmt)
-        anchors = {a.anchor_id: a for a in result.scalars().all()}
-
         # Агрегируем anchor_ids и chunk_ids по (topic_key, source_zone, language)
         evidence_map: dict[
             tuple[str, str, DocumentLanguage], dict[str, Any]
@@ -172,7 +179,10 @@ class TopicEvidenceBuilder:
             self.db.add(evidence)
             created_count += 1
 
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
+        else:
+            await self.db.flush()
         logger.info(
             f"Создано {created_count} записей topic_evidence для doc_version_id={doc_version_id}"
         )
@@ -7,15 +7,15 @@
 """
 from __future__ import annotations
 
-import math
 import re
 from collections import Counter, defaultdict
 from dataclasses import dataclass
 from difflib import SequenceMatcher
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from uuid import UUID
 
 import httpx
+import numpy as np
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from tenacity import (
@@ -28,20 +28,28 @@ from tenacity import (
 
 from app.core.config import LLMProvider, settings
 from app.core.logging import logger
-from app.db.enums import DocumentLanguage, DocumentType, SourceZone
+from app.db.enums import DocumentLanguage, SourceZone
 from app.db.models.anchors import Anchor
 from app.db.models.studies import Document, DocumentVersion
 from app.db.models.topics import (
     HeadingBlockTopicAssignment,
     HeadingCluster,
-    Topic,
     TopicMappingRun,
 )
+from app.services.embedding_cache import embedding_dimension, get_embedding_cache
 from app.services.heading_block_builder import HeadingBlock, HeadingBlockBuilder
+from app.services.similarity import cosine_similarity_matrix, mismatched_dimensions
 from app.services.heading_clustering import HeadingClusteringService
+from app.services.llm_transport import get_llm_transport
 from app.services.source_zone_classifier import get_classifier
 from app.services.text_normalization import normalize_for_match
-from app.services.topic_repository import TopicRepository
+from app.services.topic_registry import CompiledTopicProfile, get_topic_registry
+
+if TYPE_CHECKING:
+    from app.services.ingestion.anchor_snapshot import AnchorSnapshot
+
+# Сколько первых anchors контента блока используется для "первых двух предложений"
+FIRST_SENTENCES_MAX_ANCHORS = 5
 
 
 @dataclass
@@ -91,6 +99,8 @@ class TopicMappingService:
         apply: bool = True,
         confidence_threshold: float = 0.55,
         zone_match_threshold_boost: float = 0.15,  # Снижение threshold при совпадении по source_zone
+        anchor_snapshot: AnchorSnapshot | None = None,
+        commit: bool = True,
     ) -> tuple[list[HeadingBlockTopicAssignment], MappingMetrics]:
         """
         Выполняет маппинг блоков на топики для версии документа.
@@ -100,6 +110,9 @@ class TopicMappingService:
             mode: Режим маппинга ("auto" или "assist")
             apply: Сохранять ли результаты в БД
             confidence_threshold: Минимальный confidence для маппинга
+            anchor_snapshot: Снимок anchors текущей ингестии (heading blocks, кластеризация
+                и anchors блоков строятся без запросов); None — anchors читаются из БД
+            commit: Делать commit при apply; False — транзакцией управляет вызывающий код (ингестия)
 
         Returns:
             Кортеж (список назначений, метрики)
@@ -121,7 +134,7 @@ class TopicMappingService:
 
         # 1. Строим heading blocks
         block_builder = HeadingBlockBuilder(self.db)
-        blocks = await block_builder.build_blocks_for_doc_version(doc_version_id, doc_type)
+        blocks = await block_builder.build_blocks_for_doc_version(doc_version_id, doc_type, anchor_snapshot)
 
         if not blocks:
             logger.warning(f"Не найдено блоков для doc_version_id={doc_version_id}")
@@ -138,20 +151,13 @@ class TopicMappingService:
 
         logger.info(f"Найдено {len(blocks)} блоков")
 
-        # 2. Загружаем активные топики
-        topic_repo = TopicRepository(self.db)
-        all_topics = await topic_repo.list_topics(
-            workspace_id=document.workspace_id, is_active=True
+        # 2. Активные топики с эффективными профилями и zone priors — из реестра
+        #    (компилируется один раз на (workspace, doc_type), пока не изменятся topics/topic_zone_priors)
+        topics, active_topics_total = await get_topic_registry().get_topics(
+            self.db, document.workspace_id, doc_type
         )
 
-        # Фильтруем топики по applicable_to
-        topics = []
-        for topic in all_topics:
-            applicable_to = topic.applicable_to_json or []
-            if not applicable_to or doc_type.value in applicable_to:
-                topics.append(topic)
-
-        logger.info(f"Найдено {len(topics)} применимых топиков из {len(all_topics)} активных")
+        logger.info(f"Найдено {len(topics)} применимых топиков из {active_topics_total} активных")
 
         # Подсчитываем топики с эмбеддингами для логирования
         topics_with_embeddings = sum(1 for topic in topics if topic.topic_embedding is not None)
@@ -160,13 +166,8 @@ class TopicMappingService:
             f"Topics with embeddings: {topics_with_embeddings}/{len(topics)}"
         )
 
-        # 3. Загружаем zone priors
-        zone_priors_by_topic: dict[str, dict[str, float]] = {}
-        for topic in topics:
-            priors = await topic_repo.get_zone_priors(topic.topic_key, doc_type)
-            zone_priors_by_topic[topic.topic_key] = {
-                prior.zone_key: prior.weight for prior in priors
-            }
+        # 3. Предзагрузка anchors блоков (один set-based запрос на документ)
+        anchors_by_id = await self._load_block_anchors(blocks, anchor_snapshot)
 
         # 4. Опциональная кластеризация (если включена)
         cluster_prior_map: dict[str, str] = {}  # heading_block_id -> topic_key
@@ -181,6 +182,7 @@ class TopicMappingService:
                     threshold=0.22,
                     min_size=3,
                     embedding_threshold=0.15,
+                    anchor_snapshot=anchor_snapshot,
                 )
 
                 # Загружаем cluster assignments (если есть)
@@ -198,7 +200,7 @@ class TopicMappingService:
                     for block in blocks:
                         # Ищем кластер, который содержит этот заголовок
                         # (предполагаем, что cluster_id хранится в location_json заголовка)
-                        heading_anchor = await self._get_heading_anchor(block.heading_anchor_id)
+                        heading_anchor = anchors_by_id.get(block.heading_anchor_id)
                         if heading_anchor:
                             cluster_id = heading_anchor.location_json.get("cluster_id")
                             if cluster_id is not None and cluster_id in cluster_assignments:
@@ -209,15 +211,19 @@ class TopicMappingService:
                 logger.warning(f"Ошибка при кластеризации: {e}, продолжаем без кластеризации")
                 clustering_enabled = False
 
-        # 5. Маппим каждый блок на топики (с отслеживанием предыдущего замаппленного блока)
+        # 5. Embedding similarity блоки × топики: один эмбеддинг на блок и одна матрица на документ
+        embedding_scores = await self._embedding_similarity_matrix(blocks, topics, anchors_by_id)
+
+        # 6. Маппим каждый блок на топики (с отслеживанием предыдущего замаппленного блока)
         assignments: list[HeadingBlockTopicAssignment] = []
         all_scores: list[list[BlockTopicScore]] = []
         unmapped_headings: list[str] = []
         previous_mapped_topic: str | None = None  # Для бонуса соседства
 
-        for block in blocks:
+        for block_idx, block in enumerate(blocks):
             block_scores = await self._score_topics_for_block(
-                block, topics, doc_type, zone_priors_by_topic, topic_repo, 
+                block, topics,
+                embedding_scores[block_idx],
                 cluster_prior_map.get(block.heading_block_id),
                 previous_mapped_topic,
             )
@@ -258,6 +264,7 @@ class TopicMappingService:
                                 ],
                                 "signals": best_score.signals_json,
                             },
+                            commit=commit,
                         )
                         assignments.append(assignment)
                         # Обновляем предыдущий замаппленный топик для бонуса соседства
@@ -275,17 +282,18 @@ class TopicMappingService:
                 unmapped_headings.append(block.heading_text)
                 previous_mapped_topic = None  # Сбрасываем, если блок не замапплен
 
-        # 6. Вычисляем метрики
+        # 7. Вычисляем метрики
         metrics = self._calculate_metrics(
             blocks, all_scores, assignments, confidence_threshold, clustering_enabled
         )
 
-        # 7. Сохраняем TopicMappingRun
+        # 8. Сохраняем TopicMappingRun
         if apply:
             await self._save_mapping_run(
                 doc_version_id=doc_version_id,
                 mode=mode,
                 metrics=metrics,
+                commit=commit,
             )
 
         logger.info(
@@ -298,65 +306,54 @@ class TopicMappingService:
     async def _score_topics_for_block(
         self,
         block: HeadingBlock,
-        topics: list[Topic],
-        doc_type: DocumentType,
-        zone_priors_by_topic: dict[str, dict[str, float]],
-        topic_repo: TopicRepository,
+        topics: list[CompiledTopicProfile],
+        embedding_scores: np.ndarray,
         cluster_prior_topic_key: str | None = None,
         previous_mapped_topic: str | None = None,
     ) -> list[BlockTopicScore]:
-        """Вычисляет score блока против всех топиков."""
+        """
+        Вычисляет score блока против всех топиков.
+
+        Профили топиков скомпилированы в TopicRegistry, embedding similarity блока с топиками
+        (строка матрицы блоки × топики, в порядке topics) посчитана в map_topics_for_doc_version,
+        поэтому метод не обращается к БД и к провайдеру эмбеддингов.
+        """
         scores: list[BlockTopicScore] = []
 
         # Получаем текст для анализа
         heading_text = block.heading_text
         text_preview = block.text_preview
-        
-        # Получаем первые два предложения текста блока для расширенного семантического сравнения
-        first_two_sentences = await self._get_first_two_sentences(block)
-
-        for topic in topics:
-            # Получаем профиль топика
-            topic_profile = topic.topic_profile_json or {}
-            profiles_by_doc_type = topic_profile.get("profiles_by_doc_type", {})
-            doc_type_profile = profiles_by_doc_type.get(doc_type.value, {})
-
-            # Объединяем базовый профиль с doc_type-специфичным
-            effective_profile = {**topic_profile}
-            if doc_type_profile:
-                for key in ["aliases_ru", "aliases_en", "keywords_ru", "keywords_en", "headings_ru", "headings_en"]:
-                    base_list = effective_profile.get(key, []) or []
-                    doc_type_list = doc_type_profile.get(key, []) or []
-                    effective_profile[key] = list(set(base_list + doc_type_list))
-                for key in doc_type_profile:
-                    if key not in ["aliases_ru", "aliases_en", "keywords_ru", "keywords_en", "headings_ru", "headings_en"]:
-                        effective_profile[key] = doc_type_profile[key]
+        # Нормализованные тексты блока (один раз на блок, а не на каждый топик)
+        heading_norm = normalize_for_match(heading_text)
+        heading_lower_norm = normalize_for_match(heading_text.lower())
+        keywords_text_norm = normalize_for_match(f"{heading_text} {text_preview}".lower())
 
+        for topic_idx, topic in enumerate(topics):
             # 0. Проверка отрицательных паттернов (исключений)
-            if self._check_exclude_patterns(heading_text, effective_profile, block.language):
+            if self._check_exclude_patterns(heading_lower_norm, topic, block.language):
                 # Если найден исключающий паттерн, пропускаем этот топик
                 continue
 
             # 1. Heading match score (aliases/regex)
             # При language='ru' также используем topic.title_ru для нечеткого поиска
             heading_match_score, heading_signals = self._calculate_heading_match_score(
-                heading_text, effective_profile, block.language, topic.title_ru
+                heading_norm, topic, block.language
             )
 
             # 2. Text keywords match score
             # При language='ru' также проверяем слова из topic.title_ru
             text_keywords_score, keywords_signals = self._calculate_text_keywords_score(
-                heading_text, text_preview, effective_profile, block.language, topic.title_ru
+                keywords_text_norm, topic, block.language
             )
 
             # 3. Source zone prior и штраф за зону
             zone_prior = 0.5
             zone_penalty = 1.0  # Множитель штрафа (1.0 = без штрафа)
             has_strong_zone_match = False  # Флаг для динамического threshold
-            topic_priors = zone_priors_by_topic.get(topic.topic_key, {})
+            topic_priors = topic.zone_priors
             # Получаем разрешенные зоны из topic_profile для использования в бусте
-            topic_zones = effective_profile.get("source_zones", [])
-            dissimilar_zones = effective_profile.get("dissimilar_zones", [])
+            topic_zones = topic.source_zones
+            dissimilar_zones = topic.dissimilar_zones
             
             if block.source_zone.value in topic_priors:
                 zone_prior = topic_priors[block.source_zone.value]
@@ -394,9 +391,7 @@ class TopicMappingService:
                     f"Missing embedding for Topic '{topic.topic_key}'. "
                     f"Semantic matching skipped for Block '{heading_text[:40]}...'"
                 )
-            embedding_similarity_score = await self._calculate_embedding_similarity(
-                topic, heading_text, first_two_sentences
-            )
+            embedding_similarity_score = float(embedding_scores[topic_idx])
 
             # 6. Бонус соседства
             neighbor_bonus = 0.0
@@ -501,34 +496,27 @@ class TopicMappingService:
 
     def _calculate_heading_match_score(
         self,
-        heading_text: str,
-        topic_profile: dict[str, Any],
+        heading_norm: str,
+        topic: CompiledTopicProfile,
         language: DocumentLanguage,
-        topic_title_ru: str | None = None,
     ) -> tuple[float, dict[str, Any]]:
         """
         Вычисляет score по exact/fuzzy match заголовка со aliases.
-        
+
+        heading_norm — normalize_for_match(заголовка); aliases топика нормализованы в TopicRegistry.
         При language='ru' также проверяет нечеткое совпадение с topic.title_ru,
         если aliases не дали результата или дали слабый результат.
         """
-        aliases_ru = topic_profile.get("aliases_ru", []) or topic_profile.get("headings_ru", [])
-        aliases_en = topic_profile.get("aliases_en", []) or topic_profile.get("headings_en", [])
-
         best_match_ratio = 0.0
         best_match_alias = None
 
-        aliases_to_check = []
+        aliases_to_check: list[tuple[str, str]] = []
         if language in (DocumentLanguage.RU, DocumentLanguage.MIXED):
-            aliases_to_check.extend([(alias, "ru") for alias in aliases_ru])
+            aliases_to_check.extend(topic.aliases_ru)
         if language in (DocumentLanguage.EN, DocumentLanguage.MIXED):
-            aliases_to_check.extend([(alias, "en") for alias in aliases_en])
-
-        heading_norm = normalize_for_match(heading_text)
-
-        for alias, lang in aliases_to_check:
-            alias_norm = normalize_for_match(alias)
+            aliases_to_check.extend(topic.aliases_en)
 
+        for alias, alias_norm in aliases_to_check:
             if heading_norm == alias_norm:
                 ratio = 1.0
             else:
@@ -543,20 +531,19 @@ class TopicMappingService:
         # делаем нечеткий поиск по title_ru (если aliases не дали хорошего результата)
         if (
             language in (DocumentLanguage.RU, DocumentLanguage.MIXED)
-            and topic_title_ru
+            and topic.title_ru_norm is not None
             and best_match_ratio < 0.7  # Используем title_ru только если aliases не дали сильного совпадения
         ):
-            title_ru_norm = normalize_for_match(topic_title_ru)
-            if heading_norm == title_ru_norm:
+            if heading_norm == topic.title_ru_norm:
                 title_ratio = 1.0
             else:
-                matcher = SequenceMatcher(None, heading_norm, title_ru_norm)
+                matcher = SequenceMatcher(None, heading_norm, topic.title_ru_norm)
                 title_ratio = matcher.ratio()
             
             # Используем title_ru только если он дает лучший результат
             if title_ratio > best_match_ratio:
                 best_match_ratio = title_ratio
-                best_match_alias = topic_title_ru
+                best_match_alias = topic.title_ru
 
         return best_match_ratio, {
             "best_match_ratio": best_match_ratio,
@@ -565,44 +552,32 @@ class TopicMappingService:
 
     def _calculate_text_keywords_score(
         self,
-        heading_text: str,
-        text_preview: str,
-        topic_profile: dict[str, Any],
+        text_norm: str,
+        topic: CompiledTopicProfile,
         language: DocumentLanguage,
-        topic_title_ru: str | None = None,
     ) -> tuple[float, dict[str, Any]]:
         """
         Вычисляет score по keyword match в тексте.
-        
+
+        text_norm — normalize_for_match(f"{заголовок} {text_preview}".lower()).
         При language='ru' также проверяет наличие слов из topic.title_ru в тексте,
         если keywords не дали результата.
         """
-        keywords_ru = topic_profile.get("keywords_ru", [])
-        keywords_en = topic_profile.get("keywords_en", [])
-
-        keywords_to_check = []
+        keywords_to_check: list[tuple[str, str]] = []
         if language in (DocumentLanguage.RU, DocumentLanguage.MIXED):
-            keywords_to_check.extend(keywords_ru)
+            keywords_to_check.extend(topic.keywords_ru)
         if language in (DocumentLanguage.EN, DocumentLanguage.MIXED):
-            keywords_to_check.extend(keywords_en)
+            keywords_to_check.extend(topic.keywords_en)
 
         # Если keywords пустые, но есть title_ru для русского языка, используем его как fallback
-        if not keywords_to_check and language in (DocumentLanguage.RU, DocumentLanguage.MIXED) and topic_title_ru:
-            # Разбиваем title_ru на слова (игнорируем стоп-слова)
-            title_words = [w for w in normalize_for_match(topic_title_ru).split() if len(w) > 3]
-            keywords_to_check.extend(title_words)
+        # (слова title_ru длиннее 3 символов, см. CompiledTopicProfile.title_words_ru)
+        if not keywords_to_check and language in (DocumentLanguage.RU, DocumentLanguage.MIXED):
+            keywords_to_check.extend(topic.title_words_ru)
 
         if not keywords_to_check:
             return 0.0, {"reason": "no_keywords"}
 
-        text_to_search = f"{heading_text} {text_preview}".lower()
-        text_norm = normalize_for_match(text_to_search)
-
-        matched_keywords = []
-        for keyword in keywords_to_check:
-            keyword_norm = normalize_for_match(keyword)
-            if keyword_norm in text_norm:
-                matched_keywords.append(keyword)
+        matched_keywords = [keyword for keyword, keyword_norm in keywords_to_check if keyword_norm in text_norm]
 
         if not matched_keywords:
             return 0.0, {"matched_keywords": []}
@@ -615,59 +590,63 @@ class TopicMappingService:
             "match_ratio": match_ratio,
         }
 
-    async def _get_heading_anchor(self, anchor_id: str) -> Anchor | None:
-        """Получает anchor по anchor_id."""
-        stmt = select(Anchor).where(Anchor.anchor_id == anchor_id)
+    async def _load_block_anchors(
+        self, blocks: list[HeadingBlock], anchor_snapshot: AnchorSnapshot | None = None
+    ) -> dict[str, Anchor]:
+        """
+        Загружает одним запросом (или берёт из снимка ингестии) anchors, нужные маппингу:
+        заголовки блоков (для cluster prior) и первые anchors контента (для первых двух предложений).
+        """
+        anchor_ids: set[str] = set()
+        for block in blocks:
+            anchor_ids.add(block.heading_anchor_id)
+            anchor_ids.update(block.content_anchor_ids[:FIRST_SENTENCES_MAX_ANCHORS])
+        if not anchor_ids:
+            return {}
+        if anchor_snapshot is not None:
+            return {anchor.anchor_id: anchor for anchor in anchor_snapshot.by_ids(anchor_ids)}
+
+        stmt = select(Anchor).where(Anchor.anchor_id.in_(anchor_ids))
         result = await self.db.execute(stmt)
-        return result.scalar_one_or_none()
+        return {anchor.anchor_id: anchor for anchor in result.scalars().all()}
 
     def _check_exclude_patterns(
         self,
-        heading_text: str,
-        topic_profile: dict[str, Any],
+        heading_norm: str,
+        topic: CompiledTopicProfile,
         language: DocumentLanguage,
     ) -> bool:
         """
         Проверяет отрицательные паттерны (исключения) в заголовке.
-        
+
+        heading_norm — normalize_for_match(заголовка.lower()); паттерны нормализованы в TopicRegistry.
         Возвращает True, если найден исключающий паттерн (топик НЕ должен использоваться).
         """
-        exclude_patterns_ru = topic_profile.get("exclude_patterns_ru", [])
-        exclude_patterns_en = topic_profile.get("exclude_patterns_en", [])
-
-        patterns_to_check = []
+        patterns_to_check: list[str] = []
         if language in (DocumentLanguage.RU, DocumentLanguage.MIXED):
-            patterns_to_check.extend(exclude_patterns_ru)
+            patterns_to_check.extend(topic.exclude_ru)
         if language in (DocumentLanguage.EN, DocumentLanguage.MIXED):
-            patterns_to_check.extend(exclude_patterns_en)
-
-        if not patterns_to_check:
-            return False
+            patterns_to_check.extend(topic.exclude_en)
 
-        heading_norm = normalize_for_match(heading_text.lower())
+        # Проверяем точное вхождение или подстроку
+        return any(pattern_norm in heading_norm for pattern_norm in patterns_to_check)
 
-        for pattern in patterns_to_check:
-            pattern_norm = normalize_for_match(pattern.lower())
-            # Проверяем точное вхождение или подстроку
-            if pattern_norm in heading_norm:
-                return True
-
-        return False
-
-    async def _get_first_two_sentences(self, block: HeadingBlock) -> str:
+    def _first_two_sentences(self, block: HeadingBlock, anchors_by_id: dict[str, Anchor]) -> str:
         """
         Извлекает первые два предложения из текста блока.
         
-        Использует content_anchor_ids для получения текста из anchors.
+        Использует первые content_anchor_ids блока (в порядке документа),
+        anchors предзагружены через _load_block_anchors.
         """
         if not block.content_anchor_ids:
             return ""
 
-        # Загружаем anchors блока (только первые несколько для производительности)
-        anchor_ids_to_load = block.content_anchor_ids[:5]  # Берем первые 5 anchors
-        stmt = select(Anchor).where(Anchor.anchor_id.in_(anchor_ids_to_load))
-        result = await self.db.execute(stmt)
-        anchors = list(result.scalars().all())
+        # Берем только первые несколько anchors блока
+        anchors = [
+            anchors_by_id[anchor_id]
+            for anchor_id in block.content_anchor_ids[:FIRST_SENTENCES_MAX_ANCHORS]
+            if anchor_id in anchors_by_id
+        ]
 
         if not anchors:
             return ""
@@ -686,58 +665,79 @@ class TopicMappingService:
 
         return first_two
 
-    async def _calculate_embedding_similarity(
+    async def _embedding_similarity_matrix(
         self,
-        topic: Topic,
-        heading_text: str,
-        first_two_sentences: str,
-    ) -> float:
+        blocks: list[HeadingBlock],
+        topics: list[CompiledTopicProfile],
+        anchors_by_id: dict[str, Anchor],
+    ) -> np.ndarray:
         """
-        Вычисляет семантическое сходство через embedding.
-        
-        Сравнивает topic_embedding с заголовком и первыми двумя предложениями текста блока.
-        
+        Вычисляет семантическое сходство всех блоков со всеми топиками через embedding.
+
+        Для каждого блока один раз генерируется эмбеддинг заголовка и первых двух предложений
+        текста, затем матрица cosine similarity блоки × топики считается одним matmul
+        (app.services.similarity). Пары разной размерности (OpenAI 1536 vs YandexGPT 256)
+        получают 0.0 и один WARNING на сочетание размерностей.
+
         Используется модель text-embedding-3-small (OpenAI), которая является мультиязычной.
         Однако, если topic_embedding был создан из английского текста, а текст блока на русском,
         сходство может быть ниже. Рекомендуется создавать topic_embedding из описаний на том же языке,
         что и целевые документы, или использовать мультиязычные описания.
-        
-        Возвращает score от 0.0 до 1.0.
+
+        Returns:
+            np.ndarray формы (len(blocks), len(topics)) со значениями от 0.0 до 1.0
         """
-        # Если у топика нет embedding, возвращаем 0.0
-        # (WARNING уже выведен в _score_topics_for_block перед вызовом)
-        if topic.topic_embedding is None:
-            return 0.0
-        
-        # Проверяем, что topic_embedding - это список float
-        if not isinstance(topic.topic_embedding, list):
-            logger.warning(
-                f"topic_embedding для топика {topic.topic_key} имеет неожиданный тип: "
-                f"{type(topic.topic_embedding)}. Semantic matching skipped."
-            )
-            return 0.0
-        
-        # Генерируем эмбеддинг для заголовка и первых двух предложений
-        text_to_embed = f"{heading_text}. {first_two_sentences}".strip()
-        if not text_to_embed:
-            logger.warning(
-                f"Missing text for Block '{heading_text[:40]}...'. "
-                f"Cannot generate embedding. Semantic matching skipped for Topic '{topic.topic_key}'."
-            )
-            return 0.0
-        
-        try:
-            cluster_embedding = await self._generate_embedding(text_to_embed)
-            if cluster_embedding is None:
-                return 0.0
-            
-            # Вычисляем cosine similarity между topic_embedding и cluster_embedding
-            similarity = self._cosine_similarity(topic.topic_embedding, cluster_embedding)
-            return similarity
-        except Exception as e:
-            logger.warning(f"Ошибка при вычислении embedding similarity для топика {topic.topic_key}: {e}")
-            return 0.0
-    
+        scores = np.zeros((len(blocks), len(topics)), dtype=np.float32)
+
+        # Топики без embedding пропускаются (WARNING выводится в _score_topics_for_block)
+        topic_columns: list[int] = []
+        for topic_idx, topic in enumerate(topics):
+            if topic.topic_embedding is None:
+                continue
+            if not isinstance(topic.topic_embedding, list):
+                logger.warning(
+                    f"topic_embedding для топика {topic.topic_key} имеет неожиданный тип: "
+                    f"{type(topic.topic_embedding)}. Semantic matching skipped."
+                )
+                continue
+            topic_columns.append(topic_idx)
+        if not topic_columns or not blocks:
+            return scores
+
+        block_rows: list[int] = []
+        block_embeddings: list[list[float]] = []
+        for block_idx, block in enumerate(blocks):
+            first_two_sentences = self._first_two_sentences(block, anchors_by_id)
+            text_to_embed = f"{block.heading_text}. {first_two_sentences}".strip()
+            if not text_to_embed:
+                logger.warning(
+                    f"Missing text for Block '{block.heading_text[:40]}...'. "
+                    f"Cannot generate embedding. Semantic matching skipped."
+                )
+                continue
+            try:
+                block_embedding = await self._generate_embedding(text_to_embed)
+            except Exception as e:
+                logger.warning(
+                    f"Ошибка при вычислении embedding для блока '{block.heading_text[:40]}': {e}"
+                )
+                continue
+            if block_embedding is None:
+                continue
+            block_rows.append(block_idx)
+            block_embeddings.append(block_embedding)
+        if not block_rows:
+            return scores
+
+        topic_embeddings = [topics[topic_idx].topic_embedding for topic_idx in topic_columns]
+        for dim_a, dim_b in mismatched_dimensions(block_embeddings, topic_embeddings):
+            self._warn_dimension_mismatch(dim_a, dim_b)
+
+        scores[np.ix_(block_rows, topic_columns)] = cosine_similarity_matrix(
+            block_embeddings, topic_embeddings, clip=True
+        )
+        return scores
+
     def _get_embedding_dimension(self, model: str, provider: LLMProvider) -> int:
         """
         Определяет размерность эмбеддинга для модели.
@@ -749,17 +749,7 @@ class TopicMappingService:
         Returns:
             Размерность эмбеддинга (по умолчанию 1536)
         """
-        # YandexGPT использует 256 измерений
-        if provider == LLMProvider.YANDEXGPT:
-            return 256
-        # OpenAI text-embedding-3-small использует 1536 измерений
-        if "text-embedding-3-small" in model:
-            return 1536
-        # OpenAI text-embedding-3-large использует 3072 измерения
-        if "text-embedding-3-large" in model:
-            return 3072
-        # По умолчанию 1536 (для text-embedding-ada-002 и других)
-        return 1536
+        return embedding_dimension(model, provider)
 
     async def _generate_embedding(
         self,
@@ -787,6 +777,22 @@ class TopicMappingService:
             logger.debug("LLM настройки не заданы, пропускаем генерацию эмбеддинга")
             return None
         
+        # Заголовки блоков повторяются между версиями/переингестиями: сначала смотрим в кэш
+        return await get_embedding_cache().get_or_compute(
+            self.db,
+            provider=settings.llm_provider,
+            model=model,
+            dims=self._get_embedding_dimension(model, settings.llm_provider),
+            text=text,
+            compute=lambda: self._request_embedding(text, model),
+        )
+
+    async def _request_embedding(
+        self,
+        text: str,
+        model: str,
+    ) -> list[float] | None:
+        """Выполняет HTTP-запрос эмбеддинга к провайдеру (без кэша)."""
         # Определяем размерность для нулевого вектора при ошибке
         embedding_dim = self._get_embedding_dimension(model, settings.llm_provider)
         
@@ -905,23 +911,24 @@ class TopicMappingService:
         )
         async def _make_embedding_request() -> list[float] | None:
             """Выполняет HTTP-запрос для генерации эмбеддинга с автоматическими повторами."""
-            async with httpx.AsyncClient(timeout=30) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                data = response.json()
-                
-                # Извлекаем эмбеддинг из ответа (OpenAI-совместимый формат для всех провайдеров)
-                # https://yandex.cloud/ru/docs/ai-studio/concepts/openai-compatibility
-                if "data" in data and len(data["data"]) > 0:
-                    embedding = data["data"][0]["embedding"]
-                    if isinstance(embedding, list) and len(embedding) > 0:
-                        return embedding
-                    else:
-                        logger.warning(f"Неожиданный формат эмбеддинга: {type(embedding)}")
-                        return None
+            response = await get_llm_transport().post(
+                settings.llm_provider, url, headers=headers, json=payload, timeout=30, kind="embedding"
+            )
+            response.raise_for_status()
+            data = response.json()
+
+            # Извлекаем эмбеддинг из ответа (OpenAI-совместимый формат для всех провайдеров)
+            # https://yandex.cloud/ru/docs/ai-studio/concepts/openai-compatibility
+            if "data" in data and len(data["data"]) > 0:
+                embedding = data["data"][0]["embedding"]
+                if isinstance(embedding, list) and len(embedding) > 0:
+                    return embedding
                 else:
-                    logger.warning(f"Пустой ответ от API: {data}")
+                    logger.warning(f"Неожиданный формат эмбеддинга: {type(embedding)}")
                     return None
+            else:
+                logger.warning(f"Пустой ответ от API: {data}")
+                return None
         
         try:
             # Выполняем запрос с автоматическими повторами
@@ -971,49 +978,22 @@ class TopicMappingService:
         )
         return [0.0] * embedding_dim
     
-    def _cosine_similarity(self, vec_a: list[float], vec_b: list[float]) -> float:
-        """
-        Вычисляет cosine similarity между двумя векторами.
-        
-        Args:
-            vec_a: Первый вектор
-            vec_b: Второй вектор
-        
-        Returns:
-            Cosine similarity от 0.0 до 1.0
-        
-        Note:
-            Если размерности не совпадают (например, 1536 vs 256 для разных моделей эмбеддингов),
-            возвращается 0.0. Это может происходить при переходе с OpenAI (1536) на YandexGPT (256).
-            Рекомендуется пересоздать эмбеддинги топиков с новой моделью для корректной работы.
-        """
-        if len(vec_a) != len(vec_b):
-            # Логируем только один раз для каждого уникального сочетания размерностей
-            # чтобы не засорять логи повторяющимися сообщениями
-            if not hasattr(self, '_dimension_warnings'):
-                self._dimension_warnings: set[tuple[int, int]] = set()
-            
-            dim_pair = tuple(sorted([len(vec_a), len(vec_b)]))
-            if dim_pair not in self._dimension_warnings:
-                self._dimension_warnings.add(dim_pair)
-                logger.warning(
-                    f"Размерности векторов не совпадают: {len(vec_a)} != {len(vec_b)}. "
-                    f"Это может быть из-за использования разных моделей эмбеддингов "
-                    f"(OpenAI: 1536, YandexGPT: 256). Semantic similarity будет 0.0. "
-                    f"Рекомендуется пересоздать эмбеддинги топиков с текущей моделью."
-                )
-            return 0.0
-        
-        dot_product = sum(a * b for a, b in zip(vec_a, vec_b))
-        norm_a = math.sqrt(sum(a * a for a in vec_a))
-        norm_b = math.sqrt(sum(b * b for b in vec_b))
-        
-        if norm_a == 0.0 or norm_b == 0.0:
-            return 0.0
-        
-        similarity = dot_product / (norm_a * norm_b)
-        # Ограничиваем значение в диапазоне [0, 1]
-        return max(0.0, min(1.0, similarity))
+    def _warn_dimension_mismatch(self, dim_a: int, dim_b: int) -> None:
+        """Логирует несовпадение размерностей один раз на каждое сочетание."""
+        # Логируем только один раз для каждого уникального сочетания размерностей
+        # чтобы не засорять логи повторяющимися сообщениями
+        if not hasattr(self, '_dimension_warnings'):
+            self._dimension_warnings: set[tuple[int, int]] = set()
+
+        dim_pair = (min(dim_a, dim_b), max(dim_a, dim_b))
+        if dim_pair not in self._dimension_warnings:
+            self._dimension_warnings.add(dim_pair)
+            logger.warning(
+                f"Размерности векторов не совпадают: {dim_a} != {dim_b}. "
+                f"Это может быть из-за использования разных моделей эмбеддингов "
+                f"(OpenAI: 1536, YandexGPT: 256). Semantic similarity будет 0.0. "
+                f"Рекомендуется пересоздать эмбеддинги топиков с текущей моделью."
+            )
 
     def _convert_to_json_serializable(self, obj: Any) -> Any:
         """
@@ -1054,8 +1034,9 @@ class TopicMappingService:
         topic_key: str,
         confidence: float,
         debug_json: dict[str, Any] | None = None,
+        commit: bool = True,
     ) -> HeadingBlockTopicAssignment:
-        """Создает или обновляет HeadingBlockTopicAssignment."""
+        """Создает или обновляет HeadingBlockTopicAssignment (commit=False — без commit)."""
         from sqlalchemy.dialects.postgresql import insert as pg_insert
 
         # Конвертируем confidence и debug_json в JSON-сериализуемые типы
@@ -1082,7 +1063,8 @@ class TopicMappingService:
         # сериализуемые значения из .values(), поэтому дополнительная конвертация не нужна
 
         result = await self.db.execute(stmt)
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
         assignment = result.scalar_one()
         await self.db.refresh(assignment)
         return assignment
@@ -1143,8 +1125,9 @@ class TopicMappingService:
         doc_version_id: UUID,
         mode: str,
         metrics: MappingMetrics,
+        commit: bool = True,
     ) -> TopicMappingRun:
-        """Сохраняет запись о запуске маппинга."""
+        """Сохраняет запись о запуске маппинга (commit=False — только flush)."""
         from app.services.ingestion.metrics import get_git_sha, hash_configs
 
         mapping_run = TopicMappingRun(
@@ -1170,7 +1153,10 @@ class TopicMappingService:
             },
         )
         self.db.add(mapping_run)
-        await self.db.commit()
+        if commit:
+            await self.db.commit()
+        else:
+            await self.db.flush()
         await self.db.refresh(mapping_run)
         return mapping_run
 
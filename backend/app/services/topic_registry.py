@@ -0,0 +1,182 @@
+"""
+Реестр скомпилированных профилей топиков и zone priors (in-process, между документами).
+
+TopicMappingService раньше на каждый документ загружал все топики и priors, сливал
+profiles_by_doc_type и на каждую пару (блок, топик) заново нормализовал aliases,
+keywords и exclude-паттерны. Реестр делает это один раз на (workspace, doc_type)
+и хранит результат, пока не изменится счётчик topic_catalog_versions
+(его увеличивают триггеры на topics / topic_zone_priors). На документ остаётся
+один лёгкий запрос счётчика — пакетные кампании платят за компиляцию один раз.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.logging import logger
+from app.db.enums import DocumentType
+from app.db.models.topics import Topic, TopicCatalogVersion
+from app.services.text_normalization import normalize_for_match
+from app.services.topic_repository import TopicRepository
+
+# Списковые поля профиля, которые объединяются с doc_type-специфичным профилем
+MERGED_PROFILE_LIST_KEYS = ("aliases_ru", "aliases_en", "keywords_ru", "keywords_en", "headings_ru", "headings_en")
+
+
+def build_effective_profile(topic_profile: dict[str, Any], doc_type: DocumentType) -> dict[str, Any]:
+    """Объединяет базовый профиль топика с doc_type-специфичным (profiles_by_doc_type)."""
+    topic_profile = topic_profile or {}
+    profiles_by_doc_type = topic_profile.get("profiles_by_doc_type", {})
+    doc_type_profile = profiles_by_doc_type.get(doc_type.value, {})
+
+    effective_profile = {**topic_profile}
+    if doc_type_profile:
+        for key in MERGED_PROFILE_LIST_KEYS:
+            base_list = effective_profile.get(key, []) or []
+            doc_type_list = doc_type_profile.get(key, []) or []
+            effective_profile[key] = list(dict.fromkeys(base_list + doc_type_list))
+        for key in doc_type_profile:
+            if key not in MERGED_PROFILE_LIST_KEYS:
+                effective_profile[key] = doc_type_profile[key]
+    return effective_profile
+
+
+def _normalized(values: list[str] | None) -> tuple[tuple[str, str], ...]:
+    return tuple((value, normalize_for_match(value)) for value in values or [])
+
+
+@dataclass(frozen=True)
+class CompiledTopicProfile:
+    """Топик с эффективным профилем для doc_type: всё, что нужно скорингу блока, уже нормализовано."""
+
+    topic_key: str
+    title_ru: str | None
+    topic_embedding: list[float] | None
+    profile: dict[str, Any]
+    # (исходная строка, normalize_for_match(строка))
+    aliases_ru: tuple[tuple[str, str], ...]
+    aliases_en: tuple[tuple[str, str], ...]
+    keywords_ru: tuple[tuple[str, str], ...]
+    keywords_en: tuple[tuple[str, str], ...]
+    # Слова title_ru длиннее 3 символов (fallback, если keywords не заданы)
+    title_words_ru: tuple[tuple[str, str], ...]
+    title_ru_norm: str | None
+    exclude_ru: tuple[str, ...]
+    exclude_en: tuple[str, ...]
+    source_zones: frozenset[str]
+    dissimilar_zones: frozenset[str]
+    zone_priors: dict[str, float] = field(default_factory=dict)
+
+    @classmethod
+    def compile(
+        cls, topic: Topic, doc_type: DocumentType, zone_priors: dict[str, float] | None = None
+    ) -> CompiledTopicProfile:
+        profile = build_effective_profile(topic.topic_profile_json, doc_type)
+        title_words = (
+            [w for w in normalize_for_match(topic.title_ru).split() if len(w) > 3] if topic.title_ru else []
+        )
+        return cls(
+            topic_key=topic.topic_key,
+            title_ru=topic.title_ru,
+            topic_embedding=topic.topic_embedding,
+            profile=profile,
+            aliases_ru=_normalized(profile.get("aliases_ru", []) or profile.get("headings_ru", [])),
+            aliases_en=_normalized(profile.get("aliases_en", []) or profile.get("headings_en", [])),
+            keywords_ru=_normalized(profile.get("keywords_ru", [])),
+            keywords_en=_normalized(profile.get("keywords_en", [])),
+            title_words_ru=_normalized(title_words),
+            title_ru_norm=normalize_for_match(topic.title_ru) if topic.title_ru else None,
+            exclude_ru=tuple(normalize_for_match(p.lower()) for p in profile.get("exclude_patterns_ru", []) or []),
+            exclude_en=tuple(normalize_for_match(p.lower()) for p in profile.get("exclude_patterns_en", []) or []),
+            source_zones=frozenset(profile.get("source_zones", []) or []),
+            dissimilar_zones=frozenset(profile.get("dissimilar_zones", []) or []),
+            zone_priors=dict(zone_priors or {}),
+        )
+
+
+@dataclass
+class _RegistryEntry:
+    catalog_version: tuple[tuple[str, int], ...]
+    topics: list[CompiledTopicProfile]
+    active_topics_total: int
+
+
+class TopicRegistry:
+    """Кэш CompiledTopicProfile по (workspace_id, doc_type), инвалидируемый счётчиком topic_catalog_versions."""
+
+    def __init__(self) -> None:
+        self._entries: dict[tuple[UUID, DocumentType], _RegistryEntry] = {}
+        self.compilations = 0
+
+    async def get_topics(
+        self, db: AsyncSession, workspace_id: UUID, doc_type: DocumentType
+    ) -> tuple[list[CompiledTopicProfile], int]:
+        """
+        Возвращает применимые к doc_type активные топики workspace и число всех активных топиков.
+
+        Если справочники не менялись с прошлой компиляции — без загрузки топиков из БД.
+        """
+        catalog_version = await self._catalog_version(db)
+        key = (workspace_id, doc_type)
+        entry = self._entries.get(key)
+        if entry is not None and entry.catalog_version == catalog_version:
+            return entry.topics, entry.active_topics_total
+
+        topic_repo = TopicRepository(db)
+        all_topics = await topic_repo.list_topics(workspace_id=workspace_id, is_active=True)
+        topics = [
+            topic
+            for topic in all_topics
+            if not (topic.applicable_to_json or []) or doc_type.value in topic.applicable_to_json
+        ]
+        priors_by_topic = await topic_repo.get_zone_priors_for_topics(
+            [topic.topic_key for topic in topics], doc_type
+        )
+        compiled = [
+            CompiledTopicProfile.compile(
+                topic,
+                doc_type,
+                {prior.zone_key: prior.weight for prior in priors_by_topic.get(topic.topic_key, [])},
+            )
+            for topic in topics
+        ]
+        self._entries[key] = _RegistryEntry(catalog_version, compiled, len(all_topics))
+        self.compilations += 1
+        logger.debug(
+            f"TopicRegistry: скомпилировано {len(compiled)} топиков "
+            f"(workspace_id={workspace_id}, doc_type={doc_type.value}, catalog_version={catalog_version})"
+        )
+        return compiled, len(all_topics)
+
+    @staticmethod
+    async def _catalog_version(db: AsyncSession) -> tuple[tuple[str, int], ...]:
+        result = await db.execute(
+            select(TopicCatalogVersion.scope, TopicCatalogVersion.version).order_by(TopicCatalogVersion.scope)
+        )
+        return tuple((scope, version) for scope, version in result.all())
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_topic_registry_instance: TopicRegistry | None = None
+
+
+def get_topic_registry() -> TopicRegistry:
+    """Получить глобальный экземпляр TopicRegistry."""
+    global _topic_registry_instance
+    if _topic_registry_instance is None:
+        _topic_registry_instance = TopicRegistry()
+    return _topic_registry_instance
+
+
+__all__ = [
+    "CompiledTopicProfile",
+    "TopicRegistry",
+    "build_effective_profile",
+    "get_topic_registry",
+]
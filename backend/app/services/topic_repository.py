@@ -196,6 +196,28 @@ class TopicRepository:
         result = await self.db.execute(stmt)
         return list(result.scalars().all())
 
+    async def get_zone_priors_for_topics(
+        self,
+        topic_keys: list[str],
+        doc_type: DocumentType | None = None,
+    ) -> dict[str, list[TopicZonePrior]]:
+        """
+        Получает приоритеты зон сразу для набора топиков (одним запросом).
+
+        Returns:
+            Словарь topic_key -> список приоритетов (для топиков без приоритетов — пустой список)
+        """
+        priors_by_topic: dict[str, list[TopicZonePrior]] = {key: [] for key in topic_keys}
+        if not topic_keys:
+            return priors_by_topic
+        stmt = select(TopicZonePrior).where(TopicZonePrior.topic_key.in_(topic_keys))
+        if doc_type:
+            stmt = stmt.where(TopicZonePrior.doc_type == doc_type)
+        result = await self.db.execute(stmt)
+        for prior in result.scalars().all():
+            priors_by_topic[prior.topic_key].append(prior)
+        return priors_by_topic
+
     async def upsert_zone_prior(
         self,
         topic_key: str,
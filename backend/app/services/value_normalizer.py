@@ -9,6 +9,7 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
 import re
 import uuid
@@ -21,6 +22,7 @@ from app.core.logging import logger
 from app.db.enums import FactStatus
 from app.services.fact_extraction_rules import ExtractedFactCandidate, parse_date_to_iso
 from app.services.llm_client import LLMClient
+from app.services.llm_transport import get_llm_transport
 
 
 class ValueNormalizationResult:
@@ -101,20 +103,23 @@ class ValueNormalizer:
         
         return False
 
-    async def normalize_value(
-        self,
-        candidate: ExtractedFactCandidate,
-        text_fragment: str,
-    ) -> ValueNormalizationResult:
+    def _passthrough(self, candidate: ExtractedFactCandidate) -> ValueNormalizationResult:
+        """Исходное regex-значение без валидации (LLM не вызывалась или не ответила)."""
+        return ValueNormalizationResult(
+            normalized_value=candidate.value_json,
+            status=FactStatus.EXTRACTED,
+            match=False,
+            llm_confidence=0.0,
+        )
+
+    def _precheck(
+        self, candidate: ExtractedFactCandidate, text_fragment: str
+    ) -> ValueNormalizationResult | None:
         """
-        Нормализует значение факта через LLM и сравнивает с regex-результатом.
-        
-        Args:
-            candidate: Кандидат факта, извлеченный через regex
-            text_fragment: Фрагмент текста, из которого было извлечено значение
-            
+        Проверки перед вызовом LLM.
+
         Returns:
-            ValueNormalizationResult с нормализованным значением и статусом
+            Готовый результат, если LLM-нормализация не нужна; иначе None
         """
         # Если LLM недоступен, возвращаем исходное значение без валидации
         if not self.llm_client:
@@ -122,12 +127,7 @@ class ValueNormalizer:
                 f"LLM недоступен для нормализации факта {candidate.fact_type}.{candidate.fact_key}, "
                 f"возвращаем исходное значение"
             )
-            return ValueNormalizationResult(
-                normalized_value=candidate.value_json,
-                status=FactStatus.EXTRACTED,
-                match=False,
-                llm_confidence=0.0,
-            )
+            return self._passthrough(candidate)
 
         # Проверяем, является ли значение сложным
         if not self._is_complex_value(candidate, text_fragment):
@@ -135,38 +135,119 @@ class ValueNormalizer:
                 f"Значение факта {candidate.fact_type}.{candidate.fact_key} не является сложным, "
                 f"пропускаем LLM-нормализацию"
             )
-            return ValueNormalizationResult(
-                normalized_value=candidate.value_json,
-                status=FactStatus.EXTRACTED,
-                match=False,
-                llm_confidence=0.0,
+            return self._passthrough(candidate)
+
+        # Проверяем, что text_fragment не пустой
+        if not text_fragment or not text_fragment.strip():
+            logger.warning(
+                f"Пустой text_fragment для факта {candidate.fact_type}.{candidate.fact_key}, "
+                f"пропускаем LLM-нормализацию"
             )
+            return self._passthrough(candidate)
 
-        try:
-            # Проверяем, что text_fragment не пустой
-            if not text_fragment or not text_fragment.strip():
-                logger.warning(
-                    f"Пустой text_fragment для факта {candidate.fact_type}.{candidate.fact_key}, "
-                    f"пропускаем LLM-нормализацию"
-                )
-                return ValueNormalizationResult(
-                    normalized_value=candidate.value_json,
-                    status=FactStatus.EXTRACTED,
-                    match=False,
-                    llm_confidence=0.0,
-                )
+        return None
+
+    @staticmethod
+    def _is_ratio_list(candidate: ExtractedFactCandidate) -> bool:
+        """Список соотношений рандомизации: LLM выбирает главное соотношение."""
+        value_json = candidate.value_json or {}
+        return (
+            isinstance(value_json, dict)
+            and "value" in value_json
+            and isinstance(value_json.get("value"), list)
+            and f"{candidate.fact_type}.{candidate.fact_key}" == "study.design.randomization_ratio"
+        )
+
+    async def normalize_value(
+        self,
+        candidate: ExtractedFactCandidate,
+        text_fragment: str,
+    ) -> ValueNormalizationResult:
+        """
+        Нормализует значение факта через LLM и сравнивает с regex-результатом.
+        
+        Args:
+            candidate: Кандидат факта, извлеченный через regex
+            text_fragment: Фрагмент текста, из которого было извлечено значение
             
+        Returns:
+            ValueNormalizationResult с нормализованным значением и статусом
+        """
+        precheck_result = self._precheck(candidate, text_fragment)
+        if precheck_result is not None:
+            return precheck_result
+        return await self._normalize_with_llm(candidate, text_fragment)
+
+    async def normalize_values(
+        self,
+        items: list[tuple[ExtractedFactCandidate, str]],
+    ) -> list[ValueNormalizationResult]:
+        """
+        Нормализует значения нескольких кандидатов (candidate, text_fragment).
+
+        LLM-запросы выполняются конкурентно (не более settings.value_normalization_concurrency
+        одновременно). При settings.value_normalization_batch_size > 1 несколько кандидатов
+        упаковываются в один промпт с ответом-списком; кандидаты, для которых ответ батча
+        не получен, нормализуются отдельным запросом. Статус и значение каждого кандидата
+        определяются так же, как в normalize_value.
+
+        Returns:
+            Результаты в порядке items
+        """
+        results: list[ValueNormalizationResult | None] = [None] * len(items)
+        llm_indices: list[int] = []
+        for i, (candidate, text_fragment) in enumerate(items):
+            results[i] = self._precheck(candidate, text_fragment)
+            if results[i] is None:
+                llm_indices.append(i)
+
+        if llm_indices:
+            semaphore = asyncio.Semaphore(max(1, settings.value_normalization_concurrency))
+            batch_size = max(1, settings.value_normalization_batch_size)
+
+            async def _single(i: int) -> None:
+                candidate, text_fragment = items[i]
+                async with semaphore:
+                    results[i] = await self._normalize_with_llm(candidate, text_fragment)
+
+            async def _batch(indices: list[int]) -> None:
+                async with semaphore:
+                    batch_results = await self._normalize_batch_with_llm([items[i] for i in indices])
+                missing = [i for i, result in zip(indices, batch_results) if result is None]
+                for i, result in zip(indices, batch_results):
+                    results[i] = result
+                if missing:
+                    logger.info(
+                        f"Батч нормализации: нет ответа для {len(missing)} из {len(indices)} фактов, "
+                        f"повторяем по одному"
+                    )
+                    await asyncio.gather(*(_single(i) for i in missing))
+
+            # Списки соотношений рандомизации используют отдельный промпт и в батч не входят
+            single_indices = [i for i in llm_indices if batch_size == 1 or self._is_ratio_list(items[i][0])]
+            single_set = set(single_indices)
+            batchable = [i for i in llm_indices if i not in single_set]
+            tasks = [_single(i) for i in single_indices]
+            for start in range(0, len(batchable), batch_size):
+                chunk = batchable[start : start + batch_size]
+                tasks.append(_batch(chunk) if len(chunk) > 1 else _single(chunk[0]))
+            await asyncio.gather(*tasks)
+
+        return [result or self._passthrough(candidate) for result, (candidate, _) in zip(results, items)]
+
+    async def _normalize_with_llm(
+        self,
+        candidate: ExtractedFactCandidate,
+        text_fragment: str,
+    ) -> ValueNormalizationResult:
+        """Один LLM-запрос на кандидата (после _precheck)."""
+        try:
             # Формируем промпт для LLM
             fact_key = f"{candidate.fact_type}.{candidate.fact_key}"
             
             # Специальная обработка для randomization_ratio с несколькими соотношениями
             value_json = candidate.value_json or {}
-            is_ratio_list = (
-                isinstance(value_json, dict) 
-                and "value" in value_json 
-                and isinstance(value_json.get("value"), list)
-                and fact_key == "study.design.randomization_ratio"
-            )
+            is_ratio_list = self._is_ratio_list(candidate)
             
             if is_ratio_list:
                 # Специальный промпт для выбора главного соотношения из списка
@@ -209,282 +290,353 @@ class ValueNormalizer:
                 {"role": "user", "content": user_prompt},
             ]
 
-            # Вызываем LLM напрямую через httpx (упрощенный вариант)
-            request_id = str(uuid.uuid4())
-            
-            # Используем внутренний метод LLM клиента для вызова
-            if self.llm_client.provider.value == "azure_openai":
-                url = f"{self.llm_client.base_url}/openai/deployments/{self.llm_client.model}/chat/completions"
-                headers = {
-                    "api-key": self.llm_client.api_key,
-                    "Content-Type": "application/json",
-                }
-            elif self.llm_client.provider.value == "openai_compatible":
-                url = f"{self.llm_client.base_url}/v1/chat/completions"
-                headers = {
-                    "Authorization": f"Bearer {self.llm_client.api_key}",
-                    "Content-Type": "application/json",
-                }
-            elif self.llm_client.provider.value == "yandexgpt":
-                # YandexGPT использует OpenAI-совместимый endpoint
-                # Согласно документации: https://yandex.cloud/ru/docs/ai-studio/concepts/openai-compatibility
-                if not self.llm_client.base_url or self.llm_client.base_url == "https://llm.api.cloud.yandex.net":
-                    url = "https://llm.api.cloud.yandex.net/v1/chat/completions"
-                else:
-                    # Если указан кастомный base_url, используем его с /v1/chat/completions
-                    url = f"{self.llm_client.base_url.rstrip('/')}/v1/chat/completions"
-                headers = {
-                    "Authorization": f"Bearer {self.llm_client.api_key}",
-                    "Content-Type": "application/json",
-                }
-            else:  # local
-                url = f"{self.llm_client.base_url}/api/chat"
-                headers = {"Content-Type": "application/json"}
-            
-            # Формируем payload в зависимости от провайдера
-            if self.llm_client.provider.value == "yandexgpt":
-                # YandexGPT использует OpenAI-совместимый формат
-                # Формируем modelUri для YandexGPT
-                # Пользователь может указать модель в формате:
-                # - "folder-id/yandexgpt/latest" -> преобразуется в "gpt://folder-id/yandexgpt/latest"
-                # - "gpt://folder-id/yandexgpt/latest" -> используется как есть
-                if not self.llm_client.model:
-                    logger.error(f"Модель не указана для YandexGPT, пропускаем нормализацию факта {fact_key}")
-                    return ValueNormalizationResult(
-                        normalized_value=candidate.value_json,
-                        status=FactStatus.EXTRACTED,
-                        match=False,
-                        llm_confidence=0.0,
-                    )
-                
-                if self.llm_client.model.startswith("gpt://"):
-                    model_uri = self.llm_client.model
-                else:
-                    model_uri = f"gpt://{self.llm_client.model}"
-                
-                # OpenAI-совместимый формат запроса
-                payload = {
-                    "model": model_uri,  # Используем modelUri в поле model для OpenAI-совместимости
-                    "messages": messages,  # Стандартный формат OpenAI (role + content)
-                    "temperature": self.llm_client.temperature,
-                    "max_tokens": 500,
-                }
-                
-                # Логируем payload для отладки (без секретных данных)
-                logger.debug(
-                    f"YandexGPT payload для факта {fact_key}: "
-                    f"model={model_uri}, messages_count={len(messages)}, "
-                    f"temperature={payload['temperature']}"
-                )
-            elif self.llm_client.provider.value == "local":
-                payload = {
-                    "model": self.llm_client.model,
-                    "messages": messages,
-                    "options": {"temperature": 0.0},
-                    "stream": False,
-                }
-            else:
-                payload = {
-                    "model": self.llm_client.model,
-                    "messages": messages,
-                    "temperature": 0.0,  # Детерминированность для GxP
-                    "max_tokens": 500,
-                }
-
-            async with httpx.AsyncClient(timeout=self.llm_client.timeout_sec) as client:
-                try:
-                    response = await client.post(url, headers=headers, json=payload)
-                    response.raise_for_status()
-                    response_data = response.json()
-                except httpx.HTTPStatusError as e:
-                    error_body = ""
-                    try:
-                        if e.response is not None:
-                            error_body = e.response.text[:1000]
-                    except Exception:
-                        pass
-                    logger.error(
-                        f"Ошибка HTTP при запросе к LLM для факта {fact_key}: "
-                        f"status={e.response.status_code if e.response else None}, "
-                        f"url={url}, error_body={error_body[:500]}, "
-                        f"payload_keys={list(payload.keys()) if payload else None}"
-                    )
-                    raise
-            
-            # Извлекаем content из ответа
-            if self.llm_client.provider.value == "local" and "message" in response_data:
-                content = response_data["message"].get("content", "")
-            elif self.llm_client.provider.value == "yandexgpt":
-                # YandexGPT OpenAI-совместимый API возвращает ответ в стандартном формате OpenAI
-                content = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
-            else:
-                content = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
-            
+            content = await self._chat(messages, fact_key, max_tokens=500)
+            if content is None:
+                return self._passthrough(candidate)
             if not content:
                 logger.warning(f"Пустой ответ от LLM для факта {fact_key}")
-                return ValueNormalizationResult(
-                    normalized_value=candidate.value_json,
-                    status=FactStatus.EXTRACTED,
-                    match=False,
-                    llm_confidence=0.0,
-                )
+                return self._passthrough(candidate)
+
+            llm_value_json = self._parse_json_content(content, fact_key)
+            if llm_value_json is None:
+                return self._passthrough(candidate)
+
+            return self._evaluate(candidate, llm_value_json)
 
-            # Парсим JSON из ответа
-            content_str = str(content).strip()
+        except Exception as e:
+            logger.error(
+                f"Ошибка при нормализации значения факта {candidate.fact_type}.{candidate.fact_key}: {e}",
+                exc_info=True,
+            )
+            # В случае ошибки возвращаем исходное значение без валидации
+            return self._passthrough(candidate)
+
+    async def _normalize_batch_with_llm(
+        self,
+        items: list[tuple[ExtractedFactCandidate, str]],
+    ) -> list[ValueNormalizationResult | None]:
+        """
+        Один LLM-запрос на несколько кандидатов (после _precheck).
+
+        Returns:
+            Результаты в порядке items; None — для кандидатов без ответа в батче
+        """
+        fact_keys = [f"{candidate.fact_type}.{candidate.fact_key}" for candidate, _ in items]
+        batch_label = ", ".join(fact_keys)
+        try:
+            system_prompt = (
+                "Ты - эксперт по извлечению структурированных данных из клинических протоколов. "
+                "Твоя задача - для каждого поля из списка извлечь строгое значение из его текста. "
+                "Верни только JSON объект вида {\"results\": [{\"id\": 1, \"value\": ...}, ...]} - "
+                "по одному элементу на каждое поле с тем же id, с полем 'value' и дополнительными "
+                "полями при необходимости. Не добавляй пояснений или комментариев."
+            )
+            user_prompt = "\n\n".join(
+                f"[{n}] Поле '{fact_key}'. Текст: {text_fragment[:500]}"
+                for n, (fact_key, (_, text_fragment)) in enumerate(zip(fact_keys, items), start=1)
+            )
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ]
+            logger.info(f"Запрос LLM для нормализации значений {len(items)} фактов: {batch_label}")
+
+            content = await self._chat(messages, batch_label, max_tokens=500 * len(items))
+            if content is None:
+                return [self._passthrough(candidate) for candidate, _ in items]
+            if not content:
+                logger.warning(f"Пустой ответ от LLM для фактов {batch_label}")
+                return [None] * len(items)
+
+            response_json = self._parse_json_content(content, batch_label)
+            entries = response_json.get("results") if isinstance(response_json, dict) else None
+            values_by_id: dict[int, dict[str, Any]] = {}
+            for entry in entries if isinstance(entries, list) else []:
+                if isinstance(entry, dict) and isinstance(entry.get("id"), int):
+                    values_by_id[entry["id"]] = {k: v for k, v in entry.items() if k != "id"}
+
+            return [
+                self._evaluate(candidate, values_by_id[n]) if n in values_by_id else None
+                for n, (candidate, _) in enumerate(items, start=1)
+            ]
+
+        except Exception as e:
+            logger.error(
+                f"Ошибка при нормализации значений фактов {batch_label}: {e}",
+                exc_info=True,
+            )
+            # В случае ошибки возвращаем исходные значения без валидации
+            return [self._passthrough(candidate) for candidate, _ in items]
+
+    async def _chat(self, messages: list[dict[str, str]], fact_key: str, max_tokens: int) -> str | None:
+        """
+        Chat-запрос к провайдеру через общий транспорт.
+
+        Returns:
+            content ответа ("" — пустой ответ) или None, если запрос не был отправлен
+        """
+        assert self.llm_client is not None
+
+        # Вызываем LLM напрямую через httpx (упрощенный вариант)
+        request_id = str(uuid.uuid4())
+        
+        # Используем внутренний метод LLM клиента для вызова
+        if self.llm_client.provider.value == "azure_openai":
+            url = f"{self.llm_client.base_url}/openai/deployments/{self.llm_client.model}/chat/completions"
+            headers = {
+                "api-key": self.llm_client.api_key,
+                "Content-Type": "application/json",
+            }
+        elif self.llm_client.provider.value == "openai_compatible":
+            url = f"{self.llm_client.base_url}/v1/chat/completions"
+            headers = {
+                "Authorization": f"Bearer {self.llm_client.api_key}",
+                "Content-Type": "application/json",
+            }
+        elif self.llm_client.provider.value == "yandexgpt":
+            # YandexGPT использует OpenAI-совместимый endpoint
+            # Согласно документации: https://yandex.cloud/ru/docs/ai-studio/concepts/openai-compatibility
+            if not self.llm_client.base_url or self.llm_client.base_url == "https://llm.api.cloud.yandex.net":
+                url = "https://llm.api.cloud.yandex.net/v1/chat/completions"
+            else:
+                # Если указан кастомный base_url, используем его с /v1/chat/completions
+                url = f"{self.llm_client.base_url.rstrip('/')}/v1/chat/completions"
+            headers = {
+                "Authorization": f"Bearer {self.llm_client.api_key}",
+                "Content-Type": "application/json",
+            }
+        else:  # local
+            url = f"{self.llm_client.base_url}/api/chat"
+            headers = {"Content-Type": "application/json"}
+        
+        # Формируем payload в зависимости от провайдера
+        if self.llm_client.provider.value == "yandexgpt":
+            # YandexGPT использует OpenAI-совместимый формат
+            # Формируем modelUri для YandexGPT
+            # Пользователь может указать модель в формате:
+            # - "folder-id/yandexgpt/latest" -> преобразуется в "gpt://folder-id/yandexgpt/latest"
+            # - "gpt://folder-id/yandexgpt/latest" -> используется как есть
+            if not self.llm_client.model:
+                logger.error(f"Модель не указана для YandexGPT, пропускаем нормализацию факта {fact_key}")
+                return None
             
-            # Убираем markdown code blocks если есть
-            if content_str.startswith("```"):
-                parts = content_str.split("```")
-                if len(parts) >= 3:
-                    inner = parts[1].strip()
-                    if "\n" in inner:
-                        first_line, rest = inner.split("\n", 1)
-                        if first_line.strip().lower() == "json":
-                            inner = rest.strip()
-                    content_str = inner.strip()
+            if self.llm_client.model.startswith("gpt://"):
+                model_uri = self.llm_client.model
+            else:
+                model_uri = f"gpt://{self.llm_client.model}"
             
-            # Извлекаем JSON объект
-            if "{" in content_str and "}" in content_str:
-                l = content_str.find("{")
-                r = content_str.rfind("}")
-                if l != -1 and r != -1 and r > l:
-                    content_str = content_str[l : r + 1]
+            # OpenAI-совместимый формат запроса
+            payload = {
+                "model": model_uri,  # Используем modelUri в поле model для OpenAI-совместимости
+                "messages": messages,  # Стандартный формат OpenAI (role + content)
+                "temperature": self.llm_client.temperature,
+                "max_tokens": max_tokens,
+            }
             
+            # Логируем payload для отладки (без секретных данных)
+            logger.debug(
+                f"YandexGPT payload для факта {fact_key}: "
+                f"model={model_uri}, messages_count={len(messages)}, "
+                f"temperature={payload['temperature']}"
+            )
+        elif self.llm_client.provider.value == "local":
+            payload = {
+                "model": self.llm_client.model,
+                "messages": messages,
+                "options": {"temperature": 0.0},
+                "stream": False,
+            }
+        else:
+            payload = {
+                "model": self.llm_client.model,
+                "messages": messages,
+                "temperature": 0.0,  # Детерминированность для GxP
+                "max_tokens": max_tokens,
+            }
+
+        transport = get_llm_transport()
+        try:
+            response = await transport.post(
+                self.llm_client.provider,
+                url,
+                headers=headers,
+                json=payload,
+                timeout=self.llm_client.timeout_sec,
+            )
+            response.raise_for_status()
+            response_data = response.json()
+        except httpx.HTTPStatusError as e:
+            error_body = ""
             try:
-                llm_value_json = json.loads(content_str)
-            except json.JSONDecodeError as e:
-                logger.error(
-                    f"Ошибка парсинга JSON от LLM для факта {fact_key}: {e}. "
-                    f"Content: {content_str[:200]}"
-                )
-                return ValueNormalizationResult(
-                    normalized_value=candidate.value_json,
-                    status=FactStatus.EXTRACTED,
-                    match=False,
-                    llm_confidence=0.0,
-                )
+                if e.response is not None:
+                    error_body = e.response.text[:1000]
+            except Exception:
+                pass
+            logger.error(
+                f"Ошибка HTTP при запросе к LLM для факта {fact_key}: "
+                f"status={e.response.status_code if e.response else None}, "
+                f"url={url}, error_body={error_body[:500]}, "
+                f"payload_keys={list(payload.keys()) if payload else None}"
+            )
+            raise
 
-            # Проверяем, является ли значение LLM пустым или невалидным
-            def _is_llm_value_empty(llm_value: dict[str, Any] | None) -> bool:
-                """Проверяет, является ли значение LLM пустым."""
-                if llm_value is None:
+        # Извлекаем content из ответа
+        if self.llm_client.provider.value == "local" and "message" in response_data:
+            content = response_data["message"].get("content", "")
+        elif self.llm_client.provider.value == "yandexgpt":
+            # YandexGPT OpenAI-совместимый API возвращает ответ в стандартном формате OpenAI
+            content = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
+        else:
+            content = response_data.get("choices", [{}])[0].get("message", {}).get("content", "")
+        return str(content) if content else ""
+
+    @staticmethod
+    def _parse_json_content(content: str, fact_key: str) -> Any:
+        """JSON из ответа LLM (снимает markdown code block и текст вокруг объекта); None при ошибке."""
+        content_str = str(content).strip()
+        
+        # Убираем markdown code blocks если есть
+        if content_str.startswith("```"):
+            parts = content_str.split("```")
+            if len(parts) >= 3:
+                inner = parts[1].strip()
+                if "\n" in inner:
+                    first_line, rest = inner.split("\n", 1)
+                    if first_line.strip().lower() == "json":
+                        inner = rest.strip()
+                content_str = inner.strip()
+        
+        # Извлекаем JSON объект
+        if "{" in content_str and "}" in content_str:
+            l = content_str.find("{")
+            r = content_str.rfind("}")
+            if l != -1 and r != -1 and r > l:
+                content_str = content_str[l : r + 1]
+        
+        try:
+            return json.loads(content_str)
+        except json.JSONDecodeError as e:
+            logger.error(
+                f"Ошибка парсинга JSON от LLM для факта {fact_key}: {e}. "
+                f"Content: {content_str[:200]}"
+            )
+            return None
+
+    def _evaluate(
+        self, candidate: ExtractedFactCandidate, llm_value_json: Any
+    ) -> ValueNormalizationResult:
+        """Сравнивает значение LLM с regex-результатом и определяет статус (Double Check)."""
+        fact_key = f"{candidate.fact_type}.{candidate.fact_key}"
+        is_ratio_list = self._is_ratio_list(candidate)
+
+        # Проверяем, является ли значение LLM пустым или невалидным
+        def _is_llm_value_empty(llm_value: dict[str, Any] | None) -> bool:
+            """Проверяет, является ли значение LLM пустым."""
+            if llm_value is None:
+                return True
+            # Проверяем, есть ли ключ "value" и он не пустой
+            if "value" in llm_value:
+                val = llm_value["value"]
+                if val is None:
                     return True
-                # Проверяем, есть ли ключ "value" и он не пустой
-                if "value" in llm_value:
-                    val = llm_value["value"]
-                    if val is None:
-                        return True
-                    if isinstance(val, str) and not val.strip():
-                        return True
-                    if isinstance(val, list) and len(val) == 0:
-                        return True
-                    if isinstance(val, dict) and len(val) == 0:
-                        return True
-                # Если структура не содержит "value", проверяем сам словарь
-                if isinstance(llm_value, dict) and len(llm_value) == 0:
+                if isinstance(val, str) and not val.strip():
                     return True
-                return False
-            
-            llm_is_empty = _is_llm_value_empty(llm_value_json)
-            
-            # Сравниваем результат LLM с regex-результатом
-            regex_value = candidate.value_json
-            
-            # Специальная обработка для списков соотношений
-            # Если regex извлек список, а LLM вернула одно соотношение, проверяем, содержится ли оно в списке
-            if is_ratio_list and isinstance(regex_value, dict) and "value" in regex_value:
-                regex_ratios = regex_value.get("value", [])
-                if isinstance(regex_ratios, list) and len(regex_ratios) > 0:
-                    llm_ratio = llm_value_json.get("value") if isinstance(llm_value_json, dict) else None
-                    # Если LLM вернула одно соотношение, проверяем, есть ли оно в списке regex
-                    if llm_ratio and isinstance(llm_ratio, str):
-                        # Нормализуем формат соотношения для сравнения
-                        llm_ratio_norm = llm_ratio.replace("/", ":").strip()
-                        match = any(
-                            ratio.replace("/", ":").strip() == llm_ratio_norm 
-                            for ratio in regex_ratios
-                        )
-                    else:
-                        match = False
+                if isinstance(val, list) and len(val) == 0:
+                    return True
+                if isinstance(val, dict) and len(val) == 0:
+                    return True
+            # Если структура не содержит "value", проверяем сам словарь
+            if isinstance(llm_value, dict) and len(llm_value) == 0:
+                return True
+            return False
+        
+        llm_is_empty = _is_llm_value_empty(llm_value_json)
+        
+        # Сравниваем результат LLM с regex-результатом
+        regex_value = candidate.value_json
+        
+        # Специальная обработка для списков соотношений
+        # Если regex извлек список, а LLM вернула одно соотношение, проверяем, содержится ли оно в списке
+        if is_ratio_list and isinstance(regex_value, dict) and "value" in regex_value:
+            regex_ratios = regex_value.get("value", [])
+            if isinstance(regex_ratios, list) and len(regex_ratios) > 0:
+                llm_ratio = llm_value_json.get("value") if isinstance(llm_value_json, dict) else None
+                # Если LLM вернула одно соотношение, проверяем, есть ли оно в списке regex
+                if llm_ratio and isinstance(llm_ratio, str):
+                    # Нормализуем формат соотношения для сравнения
+                    llm_ratio_norm = llm_ratio.replace("/", ":").strip()
+                    match = any(
+                        ratio.replace("/", ":").strip() == llm_ratio_norm 
+                        for ratio in regex_ratios
+                    )
                 else:
-                    match = self._compare_values(regex_value, llm_value_json)
+                    match = False
             else:
                 match = self._compare_values(regex_value, llm_value_json)
-            
-            # Устанавливаем confidence для LLM (0.85 для успешного извлечения)
-            llm_confidence = 0.85 if llm_value_json and not llm_is_empty else 0.0
-            
-            # Определяем финальное значение для возврата
-            final_value = regex_value
-            original_regex_value = candidate.value_json  # Сохраняем оригинальное значение для логирования
-            
-            # Вспомогательная функция для нормализации значений в логах (для дат)
-            def _format_value_for_log(value: dict[str, Any] | None) -> str:
-                """Форматирует значение для логирования, нормализуя даты в ISO."""
-                if value is None:
-                    return "None"
-                if isinstance(value, dict) and "value" in value:
-                    val = value["value"]
-                    if isinstance(val, str):
-                        # Проверяем, является ли это датой
-                        iso_date = parse_date_to_iso(val)
-                        if iso_date is not None:
-                            return f"{{'value': '{iso_date}'}}"  # Показываем нормализованную дату
-                return str(value)
-            
-            if is_ratio_list and match and not llm_is_empty:
-                # Если LLM выбрала главное соотношение из списка и оно совпадает - используем его
-                final_value = llm_value_json
-                logger.info(
-                    f"LLM выбрала главное соотношение для факта {fact_key}: "
-                    f"из списка {original_regex_value.get('value', []) if isinstance(original_regex_value, dict) else []} "
-                    f"выбрано {llm_value_json.get('value')}"
-                )
-            
-            if match:
-                logger.info(
-                    f"Значения совпадают для факта {fact_key}: "
-                    f"Regex={_format_value_for_log(original_regex_value)}, "
-                    f"LLM={_format_value_for_log(llm_value_json)}"
-                )
-                status = FactStatus.VALIDATED
-            elif llm_is_empty:
-                # Если LLM вернула пустое значение, а regex нашел значение - это не конфликт,
-                # а просто LLM не смогла извлечь. Используем regex-результат со статусом EXTRACTED
-                logger.info(
-                    f"LLM вернула пустое значение для факта {fact_key}, "
-                    f"используем regex-результат: {_format_value_for_log(regex_value)}"
-                )
-                status = FactStatus.EXTRACTED
-            else:
-                # Значения не совпадают и LLM вернула не пустое значение - это конфликт
-                logger.warning(
-                    f"Значения НЕ совпадают для факта {fact_key}: "
-                    f"Regex={_format_value_for_log(regex_value)}, "
-                    f"LLM={_format_value_for_log(llm_value_json)}"
-                )
-                status = FactStatus.CONFLICTING
-
-            return ValueNormalizationResult(
-                normalized_value=final_value,  # Используем выбранное значение (LLM для списков соотношений)
-                status=status,
-                llm_value=llm_value_json,
-                match=match,
-                llm_confidence=llm_confidence,
+        else:
+            match = self._compare_values(regex_value, llm_value_json)
+        
+        # Устанавливаем confidence для LLM (0.85 для успешного извлечения)
+        llm_confidence = 0.85 if llm_value_json and not llm_is_empty else 0.0
+        
+        # Определяем финальное значение для возврата
+        final_value = regex_value
+        original_regex_value = candidate.value_json  # Сохраняем оригинальное значение для логирования
+        
+        # Вспомогательная функция для нормализации значений в логах (для дат)
+        def _format_value_for_log(value: dict[str, Any] | None) -> str:
+            """Форматирует значение для логирования, нормализуя даты в ISO."""
+            if value is None:
+                return "None"
+            if isinstance(value, dict) and "value" in value:
+                val = value["value"]
+                if isinstance(val, str):
+                    # Проверяем, является ли это датой
+                    iso_date = parse_date_to_iso(val)
+                    if iso_date is not None:
+                        return f"{{'value': '{iso_date}'}}"  # Показываем нормализованную дату
+            return str(value)
+        
+        if is_ratio_list and match and not llm_is_empty:
+            # Если LLM выбрала главное соотношение из списка и оно совпадает - используем его
+            final_value = llm_value_json
+            logger.info(
+                f"LLM выбрала главное соотношение для факта {fact_key}: "
+                f"из списка {original_regex_value.get('value', []) if isinstance(original_regex_value, dict) else []} "
+                f"выбрано {llm_value_json.get('value')}"
             )
-
-        except Exception as e:
-            logger.error(
-                f"Ошибка при нормализации значения факта {candidate.fact_type}.{candidate.fact_key}: {e}",
-                exc_info=True,
+        
+        if match:
+            logger.info(
+                f"Значения совпадают для факта {fact_key}: "
+                f"Regex={_format_value_for_log(original_regex_value)}, "
+                f"LLM={_format_value_for_log(llm_value_json)}"
             )
-            # В случае ошибки возвращаем исходное значение без валидации
-            return ValueNormalizationResult(
-                normalized_value=candidate.value_json,
-                status=FactStatus.EXTRACTED,
-                match=False,
-                llm_confidence=0.0,
+            status = FactStatus.VALIDATED
+        elif llm_is_empty:
+            # Если LLM вернула пустое значение, а regex нашел значение - это не конфликт,
+            # а просто LLM не смогла извлечь. Используем regex-результат со статусом EXTRACTED
+            logger.info(
+                f"LLM вернула пустое значение для факта {fact_key}, "
+                f"используем regex-результат: {_format_value_for_log(regex_value)}"
             )
+            status = FactStatus.EXTRACTED
+        else:
+            # Значения не совпадают и LLM вернула не пустое значение - это конфликт
+            logger.warning(
+                f"Значения НЕ совпадают для факта {fact_key}: "
+                f"Regex={_format_value_for_log(regex_value)}, "
+                f"LLM={_format_value_for_log(llm_value_json)}"
+            )
+            status = FactStatus.CONFLICTING
+
+        return ValueNormalizationResult(
+            normalized_value=final_value,  # Используем выбранное значение (LLM для списков соотношений)
+            status=status,
+            llm_value=llm_value_json,
+            match=match,
+            llm_confidence=llm_confidence,
+        )
 
     def _compare_values(
         self, regex_value: dict[str, Any] | None, llm_value: dict[str, Any] | None
@@ -1,18 +1,91 @@
 """
-Заготовка для отдельного воркера.
+Фоновый воркер ингестии.
 
-Реальный воркер может использовать тот же код сервисов и моделей, но подниматься
-как отдельный процесс/контейнер и слушать очередь задач (Redis, Postgres, Kafka и т.п.).
-Пока оставляем только структуру модуля.
+Поднимается отдельным процессом/контейнером (`python -m app.worker`), использует
+тот же код сервисов и моделей и забирает задачи из очереди ingestion_jobs в Postgres.
+Несколько процессов воркера могут работать параллельно: задачи распределяются
+через SELECT ... FOR UPDATE SKIP LOCKED.
 """
 
 from __future__ import annotations
 
+import asyncio
+import os
+import socket
 
-async def run_worker() -> None:  # pragma: no cover - заглушка
-    """Точка входа воркера."""
-    # TODO: реализовать цикл обработки задач (ingestion, extraction, generation и т.д.)
-    return None
+from app.core.config import settings
+from app.core.logging import logger
 
 
+async def _worker_loop(worker_id: str, stop_event: asyncio.Event) -> None:
+    """Цикл одного слота воркера: забирает задачи, пока не будет запрошена остановка."""
+    from app.worker.job_runner import process_next_job
 
+    while not stop_event.is_set():
+        try:
+            processed = await process_next_job(worker_id)
+        except Exception as e:  # не даём упасть слоту из-за ошибок БД/инфраструктуры
+            logger.error(f"[{worker_id}] Ошибка цикла воркера: {e}", exc_info=True)
+            processed = False
+
+        if not processed:
+            try:
+                await asyncio.wait_for(
+                    stop_event.wait(), timeout=settings.ingestion_job_poll_interval_sec
+                )
+            except asyncio.TimeoutError:
+                pass
+
+
+async def _stale_jobs_loop(stop_event: asyncio.Event) -> None:
+    """Периодически возвращает в очередь задачи, брошенные упавшими воркерами."""
+    from app.db.session import async_session_factory
+    from app.worker.job_runner import requeue_stale_jobs
+
+    interval = max(settings.ingestion_job_lock_timeout_sec // 4, 30)
+    while not stop_event.is_set():
+        try:
+            async with async_session_factory() as db:
+                await requeue_stale_jobs(db)
+        except Exception as e:
+            logger.error(f"Ошибка при возврате зависших задач: {e}", exc_info=True)
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_worker(
+    concurrency: int | None = None,
+    stop_event: asyncio.Event | None = None,
+) -> None:
+    """
+    Точка входа воркера.
+
+    Args:
+        concurrency: Количество параллельных задач в процессе
+            (по умолчанию settings.ingestion_worker_concurrency)
+        stop_event: Событие для корректной остановки (по умолчанию — до отмены)
+    """
+    concurrency = concurrency or settings.ingestion_worker_concurrency
+    stop_event = stop_event or asyncio.Event()
+    base_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    logger.info(f"Воркер ингестии запущен: id={base_id}, concurrency={concurrency}")
+    tasks = [
+        asyncio.create_task(_worker_loop(f"{base_id}:{slot}", stop_event))
+        for slot in range(concurrency)
+    ]
+    tasks.append(asyncio.create_task(_stale_jobs_loop(stop_event)))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        stop_event.set()
+        for task in tasks:
+            task.cancel()
+        from app.services.ingestion.cpu_pool import shutdown_cpu_executor
+        from app.services.llm_transport import close_llm_transport
+
+        await close_llm_transport()
+        shutdown_cpu_executor()
+        logger.info(f"Воркер ингестии остановлен: id={base_id}")
@@ -0,0 +1,40 @@
+"""Запуск воркера ингестии: python -m app.worker [--concurrency N]."""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import signal
+import sys
+
+from app.worker import run_worker
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Воркер фоновой ингестии документов")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Количество параллельных задач (по умолчанию INGESTION_WORKER_CONCURRENCY)",
+    )
+    args = parser.parse_args()
+
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    async def _run() -> None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError:  # Windows
+                pass
+        await run_worker(concurrency=args.concurrency, stop_event=stop_event)
+
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    main()
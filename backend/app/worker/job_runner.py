@@ -1,22 +1,44 @@
 from __future__ import annotations
 
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any
 from uuid import UUID
 
+from sqlalchemy import func, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.audit import log_audit
+from app.core.config import settings
+from app.core.errors import NotFoundError
+from app.core.logging import logger
+from app.db.enums import IngestionStatus
+from app.db.models.anchors import Anchor
+from app.db.models.ingestion_jobs import IngestionJob
+from app.db.models.studies import Document, DocumentVersion
+from app.db.session import async_session_factory
 from app.services.ingestion import IngestionService, IngestionResult
+from app.services.ingestion.summary import build_ingestion_summary
 
 """
-JobRunner - слой для выполнения фоновых задач.
+JobRunner - слой для выполнения задач ингестии.
 
-Подготовка к переходу на Celery/Redis: выделяем интерфейс
-для синхронного и асинхронного выполнения задач.
+Два режима:
+- run_ingestion_now / execute_ingestion: выполнение в текущем процессе (HTTP-запрос, тесты);
+- enqueue_ingestion + process_next_job: очередь в Postgres (таблица ingestion_jobs),
+  задачи забираются воркерами через SELECT ... FOR UPDATE SKIP LOCKED. Пока задача
+  выполняется, воркер продлевает locked_at (heartbeat), поэтому requeue_stale_jobs
+  забирает только задачи действительно упавших воркеров.
 """
 
 
 async def run_ingestion_now(
     db: AsyncSession,
     version_id: UUID,
+    force: bool = False,
 ) -> IngestionResult:
     """
     Синхронно выполняет ингестию документа.
@@ -24,24 +46,430 @@ async def run_ingestion_now(
     Args:
         db: Сессия базы данных
         version_id: ID версии документа
+        force: Принудительная переингестия
 
     Returns:
         IngestionResult с результатами ингестии
     """
     ingestion_service = IngestionService(db)
-    return await ingestion_service.ingest(version_id)
+    return await ingestion_service.ingest(version_id, force=force)
 
 
-async def enqueue_ingestion(version_id: UUID) -> None:
+async def execute_ingestion(
+    db: AsyncSession,
+    version_id: UUID,
+    *,
+    force: bool = False,
+    final_attempt: bool = True,
+) -> dict[str, Any]:
+    """
+    Выполняет ингестию и переводит версию в финальный статус (ready/needs_review/failed).
+
+    Ожидается, что версия уже переведена в processing вызывающим кодом.
+    При ошибке на последней попытке версия переводится в failed, иначе остаётся
+    в processing (задача будет повторена воркером). Исключение пробрасывается дальше.
+
+    Args:
+        db: Сессия базы данных
+        version_id: ID версии документа
+        force: Принудительная переингестия
+        final_attempt: Последняя ли это попытка (влияет на перевод в failed)
+
+    Returns:
+        Краткий результат ингестии (status, counts, warnings)
+    """
+    version = await db.get(DocumentVersion, version_id)
+    if not version:
+        raise NotFoundError("DocumentVersion", str(version_id))
+    document = await db.get(Document, version.document_id)
+    if not document:
+        raise NotFoundError("Document", str(version.document_id))
+    workspace_id = document.workspace_id
+
+    try:
+        ingestion_result = await run_ingestion_now(db, version_id, force=force)
+
+        # Определяем финальный статус на основе результата
+        if ingestion_result.needs_review or ingestion_result.warnings:
+            final_status = IngestionStatus.NEEDS_REVIEW
+        else:
+            final_status = IngestionStatus.READY
+
+        # Формируем стабильный summary
+        all_warnings: list[str] = []
+        if getattr(ingestion_result, "warnings", None):
+            all_warnings.extend(list(getattr(ingestion_result, "warnings") or []))
+        if getattr(ingestion_result, "docx_summary", None) and isinstance(ingestion_result.docx_summary, dict):
+            docx_warnings = ingestion_result.docx_summary.get("warnings") or []
+            all_warnings.extend(list(docx_warnings))
+
+        summary = await build_ingestion_summary(
+            db=db,
+            version=version,
+            ingestion_result=ingestion_result,
+            final_status=final_status,
+            warnings=all_warnings,
+            errors=[],
+        )
+
+        # Собираем counts_by_type и num_sections из созданных anchors (доп. поля; не часть стабильной схемы)
+        if ingestion_result.anchors_created > 0:
+            counts_result = await db.execute(
+                select(
+                    Anchor.content_type,
+                    func.count(Anchor.id).label("count"),
+                )
+                .where(Anchor.doc_version_id == version_id)
+                .group_by(Anchor.content_type)
+            )
+            summary["counts_by_type"] = {
+                row.content_type.value: row.count
+                for row in counts_result.all()
+            }
+            sections_result = await db.execute(
+                select(Anchor.section_path)
+                .where(Anchor.doc_version_id == version_id)
+                .distinct()
+            )
+            unique_sections = sorted([row.section_path for row in sections_result.all()])
+            summary["num_sections"] = len(unique_sections)
+            summary["sections"] = unique_sections
+
+        version.ingestion_summary_json = summary
+
+        # Обновляем статус
+        version.ingestion_status = final_status
+        await db.commit()
+
+        # Audit: логируем завершение ингестии
+        await log_audit(
+            db=db,
+            workspace_id=workspace_id,
+            action="ingest_complete",
+            entity_type="document_version",
+            entity_id=str(version_id),
+            before_json={"ingestion_status": IngestionStatus.PROCESSING.value},
+            after_json={
+                "ingestion_status": final_status.value,
+                "ingestion_summary": version.ingestion_summary_json,
+            },
+        )
+        await db.commit()
+
+        return {
+            "status": final_status.value,
+            "version_id": str(version_id),
+            "anchors_created": ingestion_result.anchors_created,
+            "chunks_created": ingestion_result.chunks_created,
+            "soa_detected": ingestion_result.soa_detected,
+            "warnings": ingestion_result.warnings,
+            "needs_review": ingestion_result.needs_review,
+        }
+
+    except Exception as e:
+        # Обработка ошибок: processing -> failed
+        # IngestionService.ingest не делает commit: rollback откатывает ингестию целиком
+        # (прежние данные версии сохраняются), запись failed IngestionRun уже зафиксирована
+        try:
+            await db.rollback()
+        except Exception:
+            pass  # Игнорируем ошибки rollback, если транзакция уже закрыта
+
+        if not final_attempt:
+            # Версия остаётся в processing: задачу повторит воркер
+            raise
+
+        error_message = str(e)
+        version.ingestion_status = IngestionStatus.FAILED
+        version.ingestion_summary_json = await build_ingestion_summary(
+            db=db,
+            version=version,
+            ingestion_result=None,
+            final_status=IngestionStatus.FAILED,
+            warnings=[],
+            errors=[error_message],
+        )
+        await db.commit()
+
+        # Audit: логируем ошибку
+        await log_audit(
+            db=db,
+            workspace_id=workspace_id,
+            action="ingest_failed",
+            entity_type="document_version",
+            entity_id=str(version_id),
+            before_json={"ingestion_status": IngestionStatus.PROCESSING.value},
+            after_json={
+                "ingestion_status": IngestionStatus.FAILED.value,
+                "error": error_message,
+            },
+        )
+        await db.commit()
+
+        # Пробрасываем ошибку дальше
+        raise
+
+
+async def enqueue_ingestion(
+    db: AsyncSession,
+    version_id: UUID,
+    *,
+    force: bool = False,
+    max_attempts: int | None = None,
+) -> IngestionJob:
     """
-    Ставит задачу ингестии в очередь (TODO: реализовать через Celery/Redis).
+    Ставит задачу ингестии в очередь (таблица ingestion_jobs).
+
+    Идемпотентна: если для версии уже есть активная задача (queued/running),
+    возвращается она. Вставка идёт через INSERT ... ON CONFLICT DO NOTHING по частичному
+    уникальному индексу uq_ingestion_jobs_active_doc_version, поэтому параллельные вызовы
+    для одной версии не падают с IntegrityError, а получают одну и ту же задачу.
+    Не делает commit.
 
     Args:
+        db: Сессия базы данных
         version_id: ID версии документа
+        force: Принудительная переингестия
+        max_attempts: Максимум попыток (по умолчанию из settings)
+
+    Returns:
+        IngestionJob
     """
-    # TODO: Реализовать через Celery/Redis
-    # Пример:
-    # from celery import current_app
-    # current_app.send_task('ingest_document', args=[str(version_id)])
-    raise NotImplementedError("Асинхронная очередь пока не реализована")
+    stmt = (
+        pg_insert(IngestionJob)
+        .values(
+            doc_version_id=version_id,
+            status="queued",
+            force=force,
+            attempts=0,
+            max_attempts=max_attempts or settings.ingestion_job_max_attempts,
+        )
+        .on_conflict_do_nothing(
+            index_elements=[IngestionJob.doc_version_id],
+            index_where=text("status IN ('queued', 'running')"),
+        )
+        .returning(IngestionJob)
+    )
+    while True:
+        job = (await db.execute(stmt)).scalars().first()
+        if job is not None:
+            logger.info(f"Задача ингестии {job.id} поставлена в очередь (doc_version_id={version_id})")
+            return job
+        # Конфликт: активная задача уже есть (или была создана параллельным вызовом)
+        existing = await db.execute(
+            select(IngestionJob).where(
+                IngestionJob.doc_version_id == version_id,
+                IngestionJob.status.in_(("queued", "running")),
+            )
+        )
+        active_job = existing.scalars().first()
+        if active_job is not None:
+            return active_job
+        # Активная задача успела завершиться между INSERT и SELECT — повторяем вставку
+
+
+async def get_ingestion_job(db: AsyncSession, job_id: UUID) -> IngestionJob | None:
+    """Возвращает задачу ингестии по ID."""
+    return await db.get(IngestionJob, job_id)
+
+
+async def claim_next_job(db: AsyncSession, worker_id: str) -> IngestionJob | None:
+    """
+    Забирает следующую готовую к выполнению задачу и помечает её running.
+
+    Использует FOR UPDATE SKIP LOCKED: параллельные воркеры никогда не получат
+    одну и ту же задачу и не блокируют друг друга. Делает commit.
+
+    Args:
+        db: Сессия базы данных
+        worker_id: Идентификатор воркера (для locked_by)
+
+    Returns:
+        IngestionJob или None, если очередь пуста
+    """
+    stmt = (
+        select(IngestionJob)
+        .where(
+            IngestionJob.status == "queued",
+            IngestionJob.run_after <= func.now(),
+        )
+        .order_by(IngestionJob.run_after, IngestionJob.created_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    result = await db.execute(stmt)
+    job = result.scalars().first()
+    if job is None:
+        await db.rollback()
+        return None
+
+    now = datetime.now(timezone.utc)
+    job.status = "running"
+    job.attempts += 1
+    job.locked_by = worker_id
+    job.locked_at = now
+    if job.started_at is None:
+        job.started_at = now
+    await db.commit()
+    return job
+
+
+async def requeue_stale_jobs(db: AsyncSession) -> int:
+    """
+    Обрабатывает задачи, зависшие в running дольше lock timeout без heartbeat
+    (например, процесс воркера был убит). Делает commit.
+
+    Задача с оставшимися попытками возвращается в очередь; задача, исчерпавшая
+    попытки (attempts >= max_attempts), помечается failed, а её версия документа
+    переводится из processing в failed.
+
+    Returns:
+        Количество обработанных задач (возвращённых в очередь и помеченных failed)
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.ingestion_job_lock_timeout_sec)
+    stale = (IngestionJob.status == "running", IngestionJob.locked_at < cutoff)
+    error_message = f"Блокировка задачи не продлевалась дольше {settings.ingestion_job_lock_timeout_sec} с"
+
+    failed_result = await db.execute(
+        update(IngestionJob)
+        .where(*stale, IngestionJob.attempts >= IngestionJob.max_attempts)
+        .values(
+            status="failed",
+            locked_by=None,
+            locked_at=None,
+            last_error=error_message,
+            finished_at=func.now(),
+        )
+        .returning(IngestionJob.doc_version_id)
+    )
+    failed_version_ids = list(failed_result.scalars().all())
+    if failed_version_ids:
+        await db.execute(
+            update(DocumentVersion)
+            .where(
+                DocumentVersion.id.in_(failed_version_ids),
+                DocumentVersion.ingestion_status == IngestionStatus.PROCESSING,
+            )
+            .values(ingestion_status=IngestionStatus.FAILED)
+        )
+
+    requeued_result = await db.execute(
+        update(IngestionJob)
+        .where(*stale, IngestionJob.attempts < IngestionJob.max_attempts)
+        .values(status="queued", locked_by=None, locked_at=None, run_after=func.now())
+    )
+    await db.commit()
+    requeued = requeued_result.rowcount or 0
+    if requeued:
+        logger.warning(f"Возвращено в очередь {requeued} зависших задач ингестии")
+    if failed_version_ids:
+        logger.error(
+            f"Помечено failed {len(failed_version_ids)} зависших задач ингестии без оставшихся попыток"
+        )
+    return requeued + len(failed_version_ids)
+
+
+async def _renew_job_lock(job_id: UUID, worker_id: str) -> None:
+    """Периодически продлевает locked_at задачи, пока она выполняется (в отдельной сессии)."""
+    interval = settings.ingestion_job_heartbeat_interval_sec
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with async_session_factory() as db:
+                await db.execute(
+                    update(IngestionJob)
+                    .where(
+                        IngestionJob.id == job_id,
+                        IngestionJob.status == "running",
+                        IngestionJob.locked_by == worker_id,
+                    )
+                    .values(locked_at=datetime.now(timezone.utc))
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"[{worker_id}] Не удалось продлить блокировку задачи {job_id}: {e}")
+
+
+@asynccontextmanager
+async def job_heartbeat(job_id: UUID, worker_id: str) -> AsyncIterator[None]:
+    """Продлевает блокировку задачи на время выполнения блока."""
+    task = asyncio.create_task(_renew_job_lock(job_id, worker_id))
+    try:
+        yield
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+def retry_delay_sec(attempts: int) -> int:
+    """Экспоненциальная задержка перед повтором: base * 2^(attempts-1)."""
+    return settings.ingestion_job_retry_backoff_sec * (2 ** max(attempts - 1, 0))
+
+
+async def process_next_job(worker_id: str) -> bool:
+    """
+    Забирает и выполняет одну задачу из очереди в отдельной сессии БД.
+
+    Args:
+        worker_id: Идентификатор воркера
+
+    Returns:
+        True, если задача была обработана (успешно или нет), False если очередь пуста
+    """
+    async with async_session_factory() as db:
+        job = await claim_next_job(db, worker_id)
+        if job is None:
+            return False
+
+        job_id = job.id
+        final_attempt = job.attempts >= job.max_attempts
+        logger.info(
+            f"[{worker_id}] Задача {job_id}: попытка {job.attempts}/{job.max_attempts} "
+            f"(doc_version_id={job.doc_version_id})"
+        )
+
+        try:
+            async with job_heartbeat(job_id, worker_id):
+                result = await execute_ingestion(
+                    db,
+                    job.doc_version_id,
+                    force=job.force,
+                    final_attempt=final_attempt,
+                )
+        except Exception as e:
+            try:
+                await db.rollback()
+            except Exception:
+                pass
+            job = await db.get(IngestionJob, job_id)
+            if job is None:
+                return True
+            job.last_error = str(e)
+            job.locked_by = None
+            job.locked_at = None
+            if final_attempt:
+                job.status = "failed"
+                job.finished_at = datetime.now(timezone.utc)
+                logger.error(f"[{worker_id}] Задача {job_id} завершилась ошибкой: {e}")
+            else:
+                delay = retry_delay_sec(job.attempts)
+                job.status = "queued"
+                job.run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+                logger.warning(f"[{worker_id}] Задача {job_id} будет повторена через {delay} с: {e}")
+            await db.commit()
+            return True
 
+        job = await db.get(IngestionJob, job_id)
+        if job is not None:
+            job.status = "succeeded"
+            job.finished_at = datetime.now(timezone.utc)
+            job.locked_by = None
+            job.locked_at = None
+            job.last_error = None
+            job.result_json = result
+            await db.commit()
+        logger.info(f"[{worker_id}] Задача {job_id} выполнена: status={result.get('status')}")
+        return True
@@ -0,0 +1,158 @@
+"""
+Тесты для AnchorAligner: генерация кандидатов должна совпадать с полным перебором пар.
+"""
+from __future__ import annotations
+
+import random
+import uuid
+from typing import Any
+
+import pytest
+
+from app.db.enums import AnchorContentType, DocumentLanguage, SourceZone
+from app.db.models.anchors import Anchor
+from app.services.anchor_aligner import AnchorAligner
+from app.services.chunking import _hash_embedding_v1
+
+_WORDS = (
+    "patients study dose visit screening baseline week treatment adverse events "
+    "пациенты исследование доза визит скрининг неделя лечение нежелательные явления "
+    "mg kg ecg blood sample informed consent randomization placebo arm"
+).split()
+_ZONES = [SourceZone.OVERVIEW, SourceZone.DESIGN, SourceZone.SAFETY, SourceZone.UNKNOWN]
+
+
+def _brute_force_match(
+    aligner: AnchorAligner,
+    anchors_a: list[Anchor],
+    anchors_b: list[Anchor],
+    embeddings_a: dict[str, list[float]],
+    embeddings_b: dict[str, list[float]],
+    min_score: float,
+) -> list[tuple[str, str, float, str, dict[str, Any]]]:
+    """Исходный алгоритм: exact_hash + все пары + жадный 1-to-1."""
+    hash_map_b: dict[str, list[Anchor]] = {}
+    for b in anchors_b:
+        hash_map_b.setdefault(aligner._extract_hash_part(b.anchor_id), []).append(b)
+    matches = []
+    used_a: set[str] = set()
+    used_b: set[str] = set()
+    for a in anchors_a:
+        bucket = hash_map_b.get(aligner._extract_hash_part(a.anchor_id))
+        if bucket:
+            b = bucket.pop(0)
+            matches.append((a.anchor_id, b.anchor_id, 1.0, "exact_hash", {"text_sim": 1.0, "path_sim": 1.0}))
+            used_a.add(a.anchor_id)
+            used_b.add(b.anchor_id)
+
+    candidates = []
+    for a in [x for x in anchors_a if x.anchor_id not in used_a]:
+        for b in [x for x in anchors_b if x.anchor_id not in used_b]:
+            zone_bonus = 0.05 if a.source_zone == b.source_zone else 0.0
+            lang_bonus = (
+                0.05 if a.language == b.language and a.language != DocumentLanguage.UNKNOWN else 0.0
+            )
+            score, _, _ = aligner._compute_score(
+                a, b, embeddings_a.get(a.anchor_id), embeddings_b.get(b.anchor_id)
+            )
+            final_score = float(min(1.0, score + zone_bonus + lang_bonus))
+            if final_score >= min_score:
+                candidates.append((a, b, final_score))
+    candidates.sort(key=lambda x: x[2], reverse=True)
+    for a, b, score in candidates:
+        if a.anchor_id in used_a or b.anchor_id in used_b:
+            continue
+        _, method, meta = aligner._compute_score(
+            a, b, embeddings_a.get(a.anchor_id), embeddings_b.get(b.anchor_id)
+        )
+        matches.append((a.anchor_id, b.anchor_id, score, method, meta))
+        used_a.add(a.anchor_id)
+        used_b.add(b.anchor_id)
+    return matches
+
+
+def _make_version(
+    rng: random.Random, paragraphs: list[tuple[str, str, SourceZone]]
+) -> tuple[list[Anchor], dict[str, list[float]]]:
+    """Создает anchors версии и embeddings chunk-ов (по 4 параграфа в секции)."""
+    doc_version_id = uuid.uuid4()
+    anchors = []
+    for i, (section_path, text, zone) in enumerate(paragraphs):
+        anchors.append(
+            Anchor(
+                doc_version_id=doc_version_id,
+                anchor_id=f"{doc_version_id}:p:{i}:{rng.getrandbits(40):010x}",
+                section_path=section_path,
+                content_type=AnchorContentType.P,
+                ordinal=i,
+                text_raw=text,
+                text_norm=text,
+                text_hash="",
+                location_json={"para_index": i},
+                source_zone=zone,
+                language=DocumentLanguage.EN if i % 7 else DocumentLanguage.UNKNOWN,
+            )
+        )
+    embeddings: dict[str, list[float]] = {}
+    by_section: dict[str, list[Anchor]] = {}
+    for a in anchors:
+        by_section.setdefault(a.section_path, []).append(a)
+    for section_anchors in by_section.values():
+        for start in range(0, len(section_anchors), 4):
+            group = section_anchors[start : start + 4]
+            if start == 0 and len(section_anchors) > 8:
+                continue  # часть якорей без chunk-а
+            emb = _hash_embedding_v1(" ".join(a.text_norm for a in group))
+            for a in group:
+                embeddings[a.anchor_id] = emb
+    return anchors, embeddings
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+@pytest.mark.parametrize("min_score", [0.3, 0.6])
+def test_match_anchors_equals_brute_force(seed: int, min_score: float):
+    """Индексированная генерация кандидатов даёт тот же результат, что и полный перебор."""
+    rng = random.Random(seed)
+    paragraphs_a = []
+    for s in range(6):
+        section = f"{s + 1} Section/{s + 1}.{rng.randint(1, 3)} Sub"
+        zone = rng.choice(_ZONES)
+        for _ in range(rng.randint(4, 12)):
+            text = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(0, 15)))
+            paragraphs_a.append((section, text.capitalize(), zone))
+
+    paragraphs_b = []
+    for section, text, zone in paragraphs_a:
+        roll = rng.random()
+        if roll < 0.1:
+            continue  # удалён
+        if roll < 0.5:
+            words = text.split()
+            if words:
+                words[rng.randrange(len(words))] = rng.choice(_WORDS)
+            text = " ".join(words) + rng.choice(["", ".", " (new)"])
+        if roll > 0.95:
+            section = "9 Moved/" + section
+        paragraphs_b.append((section, text, zone))
+        if rng.random() < 0.05:
+            paragraphs_b.append((section, " ".join(rng.choice(_WORDS) for _ in range(8)), zone))
+
+    anchors_a, embeddings_a = _make_version(rng, paragraphs_a)
+    anchors_b, embeddings_b = _make_version(rng, paragraphs_b)
+    aligner = AnchorAligner(db=None)  # type: ignore[arg-type]
+
+    expected = _brute_force_match(aligner, anchors_a, anchors_b, embeddings_a, embeddings_b, min_score)
+    actual = [
+        (a.anchor_id, b.anchor_id, score, method, meta)
+        for a, b, score, method, meta in aligner._match_anchors(
+            anchors_a, anchors_b, embeddings_a, embeddings_b, min_score=min_score
+        )
+    ]
+
+    assert len(expected) > 0
+    # cosine в _match_anchors берётся из матрицы float32 (один matmul), в переборе — по паре:
+    # пары и методы совпадают точно, score и meta — с точностью float32
+    assert [m[:2] + (m[3],) for m in actual] == [m[:2] + (m[3],) for m in expected]
+    for (*_, score, _method, meta), (*_, expected_score, _expected_method, expected_meta) in zip(actual, expected):
+        assert score == pytest.approx(expected_score, abs=1e-6)
+        assert meta == pytest.approx(expected_meta, abs=1e-6)
@@ -0,0 +1,123 @@
+"""
+Тесты сравнения anchors для инкрементальной переингестии (anchor_diff).
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from uuid import uuid4
+
+from docx import Document as DocxDocument
+
+from app.db.enums import AnchorContentType, DocumentLanguage, DocumentType
+from app.services.ingestion.anchor_diff import (
+    StoredAnchor,
+    diff_anchors,
+    split_stored_anchors,
+    stored_anchor,
+)
+from app.services.ingestion.docx_ingestor import DocxIngestor
+
+
+def _make_docx(path: Path, objectives: list[str], introduction: tuple[str, ...] = ()) -> Path:
+    doc = DocxDocument()
+    doc.add_paragraph("Introduction", style="Heading 1")
+    doc.add_paragraph("Protocol Version: 2.0")
+    for text in introduction:
+        doc.add_paragraph(text)
+    doc.add_paragraph("Objectives", style="Heading 1")
+    for text in objectives:
+        doc.add_paragraph(text, style="List Bullet")
+    doc.save(str(path))
+    return path
+
+
+def _stored(anchors) -> dict[str, StoredAnchor]:
+    return {a.anchor_id: stored_anchor(a) for a in anchors}
+
+
+def _ingest(path: Path, doc_version_id):
+    return DocxIngestor().ingest(path, doc_version_id, DocumentLanguage.EN, DocumentType.PROTOCOL).anchors
+
+
+def test_unchanged_document_has_empty_diff(tmp_path):
+    doc_version_id = uuid4()
+    path = _make_docx(tmp_path / "v1.docx", ["First objective", "Second objective"])
+    anchors = _ingest(path, doc_version_id)
+
+    diff = diff_anchors(_stored(anchors), _ingest(path, doc_version_id))
+
+    assert diff.is_empty
+    assert diff.unchanged == len(anchors)
+    assert diff.affected_sections == set()
+
+
+def test_changed_paragraph_affects_only_its_section(tmp_path):
+    doc_version_id = uuid4()
+    old = _ingest(_make_docx(tmp_path / "v1.docx", ["First objective", "Second objective"]), doc_version_id)
+    new = _ingest(_make_docx(tmp_path / "v2.docx", ["First objective", "Revised objective"]), doc_version_id)
+
+    diff = diff_anchors(_stored(old), new)
+
+    assert (diff.added, diff.removed, diff.updated) == (1, 1, 0)
+    assert [a.text_norm for a in diff.to_insert] == ["Revised objective"]
+    objectives_path = next(a.section_path for a in new if a.text_norm == "Revised objective")
+    assert diff.affected_sections == {objectives_path}
+
+
+def test_same_anchor_id_with_new_fields_is_rewritten(tmp_path):
+    doc_version_id = uuid4()
+    anchors = _ingest(_make_docx(tmp_path / "v1.docx", ["First objective"]), doc_version_id)
+    stored = _stored(anchors)
+    moved = next(a for a in anchors if a.text_norm == "Protocol Version: 2.0")
+    old_path = moved.section_path
+    moved.section_path = "Moved"
+
+    diff = diff_anchors(stored, anchors)
+
+    assert diff.updated == 1
+    assert diff.to_delete == [moved.anchor_id]
+    assert diff.to_insert == [moved]
+    assert diff.affected_sections == {old_path, "Moved"}
+
+
+def test_inserted_paragraph_moves_later_anchors_without_affecting_their_sections(tmp_path):
+    doc_version_id = uuid4()
+    objectives = ["First objective", "Second objective"]
+    old = _ingest(_make_docx(tmp_path / "v1.docx", objectives), doc_version_id)
+    new = _ingest(_make_docx(tmp_path / "v2.docx", objectives, introduction=("Sponsor: Acme",)), doc_version_id)
+
+    diff = diff_anchors(_stored(old), new)
+
+    introduction_path = next(a.section_path for a in new if a.text_norm == "Sponsor: Acme")
+    assert (diff.added, diff.removed, diff.updated) == (1, 0, 0)
+    assert diff.affected_sections == {introduction_path}
+    moved = {anchor.text_norm for _, anchor in diff.to_move}
+    assert {"Objectives", "First objective", "Second objective"} <= moved
+    assert not diff.is_empty
+
+
+def test_reordered_anchors_affect_their_section(tmp_path):
+    doc_version_id = uuid4()
+    old = _ingest(_make_docx(tmp_path / "v1.docx", ["First objective", "Second objective"]), doc_version_id)
+    new = _ingest(_make_docx(tmp_path / "v2.docx", ["Second objective", "First objective"]), doc_version_id)
+
+    diff = diff_anchors(_stored(old), new)
+
+    objectives_path = next(a.section_path for a in new if a.text_norm == "First objective")
+    assert (diff.added, diff.removed, diff.updated) == (0, 0, 0)
+    assert diff.moved == 2
+    assert diff.affected_sections == {objectives_path}
+    assert not diff.is_empty
+
+
+def test_split_stored_anchors_separates_cells():
+    fingerprint = ("section",)
+    stored = {
+        "p": StoredAnchor("p", "S", AnchorContentType.P, fingerprint),
+        "c": StoredAnchor("c", "S", AnchorContentType.CELL, fingerprint),
+    }
+
+    paragraphs, cells = split_stored_anchors(stored)
+
+    assert list(paragraphs) == ["p"]
+    assert list(cells) == ["c"]
@@ -0,0 +1,83 @@
+"""
+Тесты снимка anchors ингестии (AnchorSnapshot) и его использования стадиями без БД.
+"""
+from __future__ import annotations
+
+from uuid import uuid4
+
+import pytest
+
+from app.db.enums import AnchorContentType, DocumentLanguage, DocumentType, SourceZone
+from app.services.heading_block_builder import HeadingBlockBuilder
+from app.services.ingestion.anchor_snapshot import AnchorSnapshot
+from app.services.ingestion.docx_ingestor import AnchorCreate
+
+
+def _anchor(
+    doc_version_id,
+    anchor_id: str,
+    content_type: AnchorContentType,
+    section_path: str,
+    ordinal: int,
+    para_index: int,
+    text: str,
+    source_zone: str = "unknown",
+) -> AnchorCreate:
+    return AnchorCreate(
+        doc_version_id=doc_version_id,
+        anchor_id=anchor_id,
+        section_path=section_path,
+        content_type=content_type,
+        ordinal=ordinal,
+        text_raw=text,
+        text_norm=text,
+        text_hash=anchor_id,
+        location_json={"para_index": para_index},
+        source_zone=source_zone,
+        language=DocumentLanguage.EN,
+    )
+
+
+def _document(doc_version_id) -> list[AnchorCreate]:
+    return [
+        _anchor(doc_version_id, "h1", AnchorContentType.HDR, "1", 1, 0, "Study Design", "design"),
+        _anchor(doc_version_id, "p1", AnchorContentType.P, "1", 1, 1, "Randomized trial."),
+        _anchor(doc_version_id, "p2", AnchorContentType.P, "1", 2, 2, "Double-blind."),
+        _anchor(doc_version_id, "h2", AnchorContentType.HDR, "2", 2, 3, "Safety", "not_a_zone"),
+        _anchor(doc_version_id, "li1", AnchorContentType.LI, "2", 3, 4, "Adverse events."),
+    ]
+
+
+def test_snapshot_indexes_and_filters():
+    doc_version_id = uuid4()
+    snapshot = AnchorSnapshot(doc_version_id, _document(doc_version_id))
+
+    assert len(snapshot) == 5 and "p2" in snapshot
+    assert snapshot.get("h1").source_zone is SourceZone.DESIGN
+    # Неизвестная зона из парсера приводится к UNKNOWN, как при чтении из БД
+    assert snapshot.get("h2").source_zone is SourceZone.UNKNOWN
+    assert snapshot.get("p1").id is None and snapshot.get("p1").confidence is None
+    assert [a.anchor_id for a in snapshot.in_section("1")] == ["h1", "p1", "p2"]
+    assert [a.anchor_id for a in snapshot.at_para_index(4)] == ["li1"]
+    assert [a.anchor_id for a in snapshot.by_ids(["li1", "missing", "h1"])] == ["li1", "h1"]
+    assert [a.anchor_id for a in snapshot.select([AnchorContentType.P, AnchorContentType.LI], ["2"])] == ["li1"]
+    assert [a.anchor_id for a in snapshot.ordered_by_ordinal()] == ["h1", "p1", "p2", "h2", "li1"]
+    assert snapshot.section_paths == ["1", "2"]
+
+    cell = _anchor(doc_version_id, "c1", AnchorContentType.CELL, "2", 1, 5, "Visit 1")
+    extended = snapshot.extend([cell])
+    assert len(extended) == 6 and "c1" not in snapshot
+    assert [a.anchor_id for a in extended.select([AnchorContentType.CELL])] == ["c1"]
+
+
+@pytest.mark.asyncio
+async def test_heading_blocks_from_snapshot_without_db():
+    doc_version_id = uuid4()
+    snapshot = AnchorSnapshot(doc_version_id, _document(doc_version_id))
+    builder = HeadingBlockBuilder(None)  # type: ignore[arg-type]
+
+    blocks = await builder.build_blocks_for_doc_version(doc_version_id, DocumentType.PROTOCOL, snapshot)
+
+    assert [block.heading_anchor_id for block in blocks] == ["h1", "h2"]
+    assert blocks[0].content_anchor_ids == ["p1", "p2"]
+    assert blocks[1].content_anchor_ids == ["li1"]
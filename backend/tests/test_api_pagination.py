@@ -0,0 +1,107 @@
+"""
+Тесты keyset-пагинации и проекции полей списочных endpoints (app/api/pagination.py).
+"""
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from app.api.pagination import (
+    DEFAULT_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    decode_cursor,
+    encode_cursor,
+    ndjson_response,
+    page_limit,
+    page_response,
+    parse_fields,
+    uuid_key,
+)
+from app.api.v1.studies import _fact_items
+from app.core.errors import ValidationError
+from app.db.enums import EvidenceRole
+
+
+def test_cursor_roundtrip_and_validation():
+    anchor_uuid = uuid4()
+    cursor = encode_cursor(42, anchor_uuid)
+    assert decode_cursor(cursor, int, uuid_key) == (42, anchor_uuid)
+
+    with pytest.raises(ValidationError):
+        decode_cursor("not-a-cursor", int, uuid_key)
+    # Курсор другого endpoint (другая длина ключа)
+    with pytest.raises(ValidationError):
+        decode_cursor(encode_cursor(anchor_uuid), int, uuid_key)
+
+    # JSON-ответ всегда постраничный; весь список — только потоком NDJSON
+    assert page_limit(None, None) == DEFAULT_PAGE_SIZE
+    assert page_limit(None, None, "ndjson") is None
+    assert page_limit(None, cursor) == DEFAULT_PAGE_SIZE
+    assert page_limit(None, cursor, "ndjson") == DEFAULT_PAGE_SIZE
+    assert page_limit(10, cursor) == 10
+
+
+def test_parse_fields_projection():
+    allowed = ["id", "anchor_id", "text_raw"]
+    assert parse_fields(None, allowed) == allowed
+    assert parse_fields(" text_raw,id,text_raw ", allowed) == ["text_raw", "id"]
+    with pytest.raises(ValidationError):
+        parse_fields("id,embedding", allowed)
+
+
+@pytest.mark.asyncio
+async def test_page_and_ndjson_responses():
+    response = page_response([{"id": uuid4()}], encode_cursor(1))
+    assert response.headers[NEXT_CURSOR_HEADER] == encode_cursor(1)
+    assert NEXT_CURSOR_HEADER not in page_response([], None).headers
+
+    async def items():
+        yield {"anchor_id": "a", "text_raw": "Рандомизация"}
+        yield {"anchor_id": "b", "text_raw": "x"}
+
+    body = b"".join([chunk async for chunk in ndjson_response(items()).body_iterator])
+    lines = body.decode("utf-8").splitlines()
+    assert [json.loads(line)["anchor_id"] for line in lines] == ["a", "b"]
+    assert "Рандомизация" in lines[0]
+
+
+class _EvidenceSession:
+    """Сессия, отвечающая на запрос evidence фиксированными строками и считающая запросы."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    async def execute(self, stmt):
+        self.queries += 1
+        return SimpleNamespace(all=lambda: self.rows)
+
+
+def _fact_row(fact_id, fact_key):
+    return SimpleNamespace(id=fact_id, _mapping={"id": fact_id, "fact_key": fact_key})
+
+
+@pytest.mark.asyncio
+async def test_fact_evidence_loaded_in_one_query():
+    first, second = uuid4(), uuid4()
+    session = _EvidenceSession(
+        [(first, "a1", EvidenceRole.PRIMARY), (first, "a2", None), (second, "b1", EvidenceRole.SUPPORTING)]
+    )
+    rows = [_fact_row(first, "k1"), _fact_row(second, "k2"), _fact_row(uuid4(), "k3")]
+
+    items = await _fact_items(session, rows, ["fact_key", "evidence"])
+
+    assert session.queries == 1
+    assert [item["fact_key"] for item in items] == ["k1", "k2", "k3"]
+    assert items[0]["evidence"] == [
+        {"anchor_id": "a1", "evidence_role": EvidenceRole.PRIMARY},
+        {"anchor_id": "a2", "evidence_role": EvidenceRole.PRIMARY},
+    ]
+    assert items[2]["evidence"] == []
+
+    # Без поля evidence запрос не выполняется
+    assert await _fact_items(session, rows, ["id"]) == [{"id": row.id} for row in rows]
+    assert session.queries == 1
@@ -0,0 +1,176 @@
+"""
+Тесты массовой записи через COPY (app.db.bulk_copy).
+"""
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.bulk_copy import bulk_insert_anchors, bulk_insert_chunks, bulk_insert_fact_evidence
+from app.db.enums import (
+    AnchorContentType,
+    DocumentLanguage,
+    DocumentLifecycleStatus,
+    DocumentType,
+    EvidenceRole,
+    FactStatus,
+    IngestionStatus,
+    SourceZone,
+    StudyStatus,
+)
+from app.db.models.anchors import Anchor, Chunk
+from app.db.models.auth import Workspace
+from app.db.models.facts import Fact, FactEvidence
+from app.db.models.studies import Document, DocumentVersion, Study
+from app.services.chunking import hash_embeddings_v1_batch
+from app.services.ingestion.docx_ingestor import AnchorCreate
+
+
+@pytest.fixture
+async def doc_version(db: AsyncSession) -> DocumentVersion:
+    """Создает версию документа для записи anchors/chunks."""
+    workspace = Workspace(name="Test Workspace")
+    db.add(workspace)
+    await db.flush()
+    study = Study(
+        workspace_id=workspace.id,
+        study_code="TEST-COPY",
+        title="Test Study",
+        status=StudyStatus.ACTIVE,
+    )
+    db.add(study)
+    await db.flush()
+    document = Document(
+        workspace_id=workspace.id,
+        study_id=study.id,
+        doc_type=DocumentType.PROTOCOL,
+        title="Test Document",
+        lifecycle_status=DocumentLifecycleStatus.DRAFT,
+    )
+    db.add(document)
+    await db.flush()
+    version = DocumentVersion(
+        document_id=document.id,
+        version_label="v1.0",
+        source_file_uri="file:///tmp/test.docx",
+        source_sha256="abc123",
+        effective_date=date.today(),
+        ingestion_status=IngestionStatus.PROCESSING,
+    )
+    db.add(version)
+    await db.flush()
+    return version
+
+
+def _make_anchors(doc_version_id, n: int) -> list[AnchorCreate]:
+    return [
+        AnchorCreate(
+            doc_version_id=doc_version_id,
+            anchor_id=f"{doc_version_id}:p:{i}:hash{i}",
+            section_path="1 Introduction",
+            content_type=AnchorContentType.P,
+            ordinal=i,
+            text_raw=f"Paragraph {i}",
+            text_norm=f"Paragraph {i}",
+            text_hash=f"hash{i}",
+            location_json={"para_index": i, "style": "Normal"},
+            source_zone=SourceZone.OVERVIEW.value,
+            language=DocumentLanguage.EN,
+        )
+        for i in range(1, n + 1)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("copy_enabled", [True, False])
+async def test_bulk_insert_anchors_and_evidence(
+    db: AsyncSession, doc_version: DocumentVersion, monkeypatch, copy_enabled: bool
+):
+    """Anchors и evidence записываются одинаково через COPY и через executemany."""
+    monkeypatch.setattr(settings, "bulk_copy_enabled", copy_enabled)
+
+    written = await bulk_insert_anchors(db, _make_anchors(doc_version.id, 50))
+    assert written == 50
+
+    anchors = (
+        await db.execute(
+            select(Anchor).where(Anchor.doc_version_id == doc_version.id).order_by(Anchor.ordinal)
+        )
+    ).scalars().all()
+    assert len(anchors) == 50
+    assert anchors[0].content_type == AnchorContentType.P
+    assert anchors[0].source_zone == SourceZone.OVERVIEW
+    assert anchors[0].language == DocumentLanguage.EN
+    assert anchors[0].location_json == {"para_index": 1, "style": "Normal"}
+
+    document = await db.get(Document, doc_version.document_id)
+    fact = Fact(
+        study_id=document.study_id,
+        fact_type="test",
+        fact_key="key",
+        value_json={"value": 1},
+        status=FactStatus.EXTRACTED,
+        created_from_doc_version_id=doc_version.id,
+    )
+    db.add(fact)
+    await db.flush()
+
+    anchor_ids = [a.anchor_id for a in anchors[:3]]
+    assert await bulk_insert_fact_evidence(db, fact.id, anchor_ids) == 3
+    evidence = (
+        await db.execute(select(FactEvidence).where(FactEvidence.fact_id == fact.id))
+    ).scalars().all()
+    assert sorted(e.anchor_id for e in evidence) == sorted(anchor_ids)
+    assert all(e.evidence_role == EvidenceRole.PRIMARY for e in evidence)
+
+
+@pytest.mark.asyncio
+async def test_bulk_insert_chunks_roundtrips_embedding(
+    db: AsyncSession, doc_version: DocumentVersion
+):
+    """COPY chunks сохраняет vector(1536) и массив anchor_ids."""
+    embedding = hash_embeddings_v1_batch(["schedule of activities"])[0]
+    chunk = Chunk(
+        doc_version_id=doc_version.id,
+        chunk_id=f"{doc_version.id}:chunk:1",
+        section_path="1 Introduction",
+        text="Schedule of activities",
+        anchor_ids=["a1", "a2"],
+        embedding=embedding,
+        metadata_json={"embedding_type": "hash_v1"},
+        source_zone=SourceZone.UNKNOWN,
+        language=DocumentLanguage.EN,
+    )
+
+    assert await bulk_insert_chunks(db, [chunk]) == 1
+
+    stored = (
+        await db.execute(select(Chunk).where(Chunk.doc_version_id == doc_version.id))
+    ).scalar_one()
+    assert stored.anchor_ids == ["a1", "a2"]
+    assert stored.metadata_json == {"embedding_type": "hash_v1"}
+    assert len(stored.embedding) == 1536
+    assert stored.embedding == embedding.tolist()
+
+
+@pytest.mark.asyncio
+async def test_bulk_insert_chunks_rejects_wrong_dimension(
+    db: AsyncSession, doc_version: DocumentVersion
+):
+    """Embedding неверной размерности отклоняется до записи."""
+    chunk = Chunk(
+        doc_version_id=doc_version.id,
+        chunk_id="bad",
+        section_path="ROOT",
+        text="x",
+        anchor_ids=[],
+        embedding=[0.0] * 10,
+        source_zone=SourceZone.UNKNOWN,
+        language=DocumentLanguage.UNKNOWN,
+    )
+    with pytest.raises(ValueError):
+        await bulk_insert_chunks(db, [chunk])
@@ -7,6 +7,7 @@ from __future__ import annotations
 import tempfile
 from pathlib import Path
 
+import numpy as np
 import pytest
 from docx import Document as DocxDocument
 from sqlalchemy import select
@@ -16,6 +17,7 @@ from app.db.enums import DocumentLifecycleStatus, DocumentType, IngestionStatus,
 from app.db.models.anchors import Chunk
 from app.db.models.auth import Workspace
 from app.db.models.studies import Document, DocumentVersion, Study
+from app.services.chunking import _hash_embedding_v1, hash_embeddings_v1_batch
 from app.services.ingestion import IngestionService
 
 
@@ -121,3 +123,22 @@ class TestChunkCreation:
         assert {c.chunk_id for c in chunks2} == chunk_ids_1
 
 
+
+
+def test_hash_embeddings_batch_is_bit_compatible_with_v1():
+    """Пакетные float32-эмбеддинги побитно совпадают с v1, приведённым к float32 (vector(1536))."""
+    texts = [
+        "Schedule of Activities: Screening, Baseline, Week 4",
+        "Пациенты в возрасте ≥ 18 лет (включительно), ECG, ECG, ECG",
+        "",
+        ". , ; ( )",
+        "a " * 500,
+    ]
+
+    batch = hash_embeddings_v1_batch(texts, dims=1536)
+    expected = np.array([_hash_embedding_v1(t, dims=1536) for t in texts], dtype=np.float32)
+
+    assert batch.dtype == np.float32
+    assert batch.shape == (len(texts), 1536)
+    assert np.array_equal(batch.view(np.uint32), expected.view(np.uint32))
+    assert not batch[2].any()
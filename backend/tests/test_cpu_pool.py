@@ -0,0 +1,103 @@
+"""
+Тесты пула процессов для CPU-bound этапов ингестии (cpu_pool, docx_pipeline).
+"""
+from __future__ import annotations
+
+import asyncio
+import pickle
+import time
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+from docx import Document as DocxDocument
+
+from app.core.config import settings
+from app.db.enums import AnchorContentType, DocumentLanguage, DocumentType
+from app.services.ingestion.cpu_pool import run_cpu_bound, shutdown_cpu_executor
+from app.services.ingestion.docx_ingestor import DocxIngestor
+from app.services.ingestion.docx_pipeline import DocxParseResult, parse_docx_document
+
+
+def _make_soa_docx(path: Path) -> Path:
+    doc = DocxDocument()
+    doc.add_paragraph("Introduction", style="Heading 1")
+    doc.add_paragraph("Protocol Version: 2.0")
+    doc.add_paragraph("Schedule of Activities", style="Heading 1")
+    table = doc.add_table(rows=4, cols=4)
+    rows = [
+        ("Procedure", "Screening", "Baseline", "Week 4"),
+        ("Informed consent", "X", "X", ""),
+        ("Vitals", "X", "X", "X"),
+        ("ECG", "", "X", ""),
+    ]
+    for row, values in zip(table.rows, rows):
+        for cell, value in zip(row.cells, values):
+            cell.text = value
+    doc.save(str(path))
+    return path
+
+
+@pytest.fixture
+def cpu_workers(monkeypatch):
+    monkeypatch.setattr(settings, "ingestion_cpu_workers", 2)
+    shutdown_cpu_executor()
+    yield
+    shutdown_cpu_executor()
+
+
+def test_parse_result_is_picklable(tmp_path: Path):
+    """DTO результата (AnchorCreate, CellAnchorCreate, SoAResult) передаются между процессами."""
+    doc_version_id = uuid4()
+    result = parse_docx_document(
+        _make_soa_docx(tmp_path / "soa.docx"), doc_version_id, DocumentLanguage.EN, DocumentType.PROTOCOL
+    )
+
+    restored = pickle.loads(pickle.dumps(result))
+
+    assert isinstance(restored, DocxParseResult)
+    assert restored.ingest.anchors == result.ingest.anchors
+    assert restored.cell_anchors == result.cell_anchors
+    assert restored.cell_anchors and restored.cell_anchors[0].content_type == AnchorContentType.CELL
+    assert restored.soa_result is not None
+    assert restored.soa_result.model_dump() == result.soa_result.model_dump()
+
+
+@pytest.mark.asyncio
+async def test_pool_matches_inline_parse(tmp_path: Path, cpu_workers):
+    """Разбор в пуле процессов даёт те же anchors, что и DocxIngestor в текущем процессе."""
+    paths = [_make_soa_docx(tmp_path / f"doc{i}.docx") for i in range(3)]
+    doc_version_id = uuid4()
+
+    results = await asyncio.gather(
+        *(
+            run_cpu_bound(parse_docx_document, path, doc_version_id, DocumentLanguage.EN, DocumentType.PROTOCOL)
+            for path in paths
+        )
+    )
+
+    inline = DocxIngestor().ingest(paths[0], doc_version_id, DocumentLanguage.EN, DocumentType.PROTOCOL)
+    for result in results:
+        assert result.ingest.anchors == inline.anchors
+        assert result.soa_result is not None
+        assert "docx_parse_cpu" in result.timings_ms
+
+
+@pytest.mark.asyncio
+async def test_event_loop_stays_responsive(cpu_workers):
+    """Пока процесс пула занят, event loop продолжает обслуживать другие корутины."""
+    ticks = 0
+
+    async def ticker() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    # Прогрев: запуск процесса пула (spawn) не должен влиять на замер
+    await run_cpu_bound(time.sleep, 0)
+    task = asyncio.create_task(ticker())
+    await run_cpu_bound(time.sleep, 0.5)
+    task.cancel()
+
+    assert ticks >= 20
@@ -0,0 +1,95 @@
+"""
+Тесты для content-addressed кэша эмбеддингов (embedding_cache).
+"""
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import LLMProvider, settings
+from app.db.models.embedding_cache import EmbeddingCacheEntry
+from app.services.embedding_cache import EmbeddingCache
+from app.services.topic_mapping import TopicMappingService
+
+
+def _counting_compute(vector: list[float]):
+    calls = {"n": 0}
+
+    async def compute() -> list[float]:
+        calls["n"] += 1
+        return vector
+
+    return compute, calls
+
+
+@pytest.mark.asyncio
+async def test_get_or_compute_uses_memory_then_db(db: AsyncSession):
+    """Повторный запрос берётся из LRU, а после сброса LRU — из Postgres."""
+    cache = EmbeddingCache(max_size=8)
+    compute, calls = _counting_compute([0.1, 0.2, 0.3])
+    kwargs = dict(provider=LLMProvider.OPENAI_COMPATIBLE, model="m", dims=3, text="Study Design")
+
+    assert await cache.get_or_compute(db, compute=compute, **kwargs) == [0.1, 0.2, 0.3]
+    assert await cache.get_or_compute(db, compute=compute, **kwargs) == [0.1, 0.2, 0.3]
+    assert calls["n"] == 1
+    assert cache.memory_hits == 1
+
+    cache.clear()
+    assert await cache.get_or_compute(db, compute=compute, **kwargs) == pytest.approx([0.1, 0.2, 0.3])
+    assert calls["n"] == 1
+    assert cache.db_hits == 1
+
+    # Другая модель/размерность — другой ключ
+    await cache.get_or_compute(db, compute=compute, **{**kwargs, "model": "other"})
+    assert calls["n"] == 2
+
+
+@pytest.mark.asyncio
+async def test_zero_vector_fallback_is_not_cached(db: AsyncSession):
+    """Нулевой вектор (fallback после ошибки провайдера) не сохраняется."""
+    cache = EmbeddingCache(max_size=8)
+    compute, calls = _counting_compute([0.0, 0.0, 0.0])
+    kwargs = dict(provider="local", model="m", dims=3, text="Objectives")
+
+    await cache.get_or_compute(db, compute=compute, **kwargs)
+    await cache.get_or_compute(db, compute=compute, **kwargs)
+
+    assert calls["n"] == 2
+    count = (await db.execute(select(func.count()).select_from(EmbeddingCacheEntry))).scalar_one()
+    assert count == 0
+
+
+def test_lru_evicts_oldest_entries():
+    """LRU ограничен max_size."""
+    cache = EmbeddingCache(max_size=2)
+    for i in range(3):
+        cache._remember(("p", "m", 1, str(i)), [float(i + 1)])
+    assert list(cache._lru) == [("p", "m", 1, "1"), ("p", "m", 1, "2")]
+
+
+@pytest.mark.asyncio
+async def test_topic_mapping_repeat_makes_no_http_calls(db: AsyncSession, monkeypatch):
+    """Повторная генерация эмбеддинга того же заголовка не вызывает провайдера."""
+    monkeypatch.setattr(settings, "llm_provider", LLMProvider.OPENAI_COMPATIBLE)
+    monkeypatch.setattr(settings, "llm_base_url", "http://llm.local")
+    monkeypatch.setattr(settings, "llm_api_key", "key")
+    monkeypatch.setattr(
+        "app.services.topic_mapping.get_embedding_cache", lambda: shared_cache
+    )
+    shared_cache = EmbeddingCache(max_size=8)
+
+    calls = {"n": 0}
+
+    async def fake_request(self, text: str, model: str) -> list[float]:
+        calls["n"] += 1
+        return [1.0] + [0.0] * 1535
+
+    monkeypatch.setattr(TopicMappingService, "_request_embedding", fake_request)
+
+    service = TopicMappingService(db)
+    first = await service._generate_embedding("Study Design. Patients are randomized.")
+    second = await service._generate_embedding("Study Design. Patients are randomized.")
+
+    assert first == second
+    assert calls["n"] == 1
@@ -0,0 +1,130 @@
+"""
+Тесты для скомпилированного матчера правил извлечения фактов (fact_extraction_matcher).
+
+Префильтр по литералам должен давать тот же результат, что и наивный обход
+"правило × anchor × паттерн".
+"""
+from __future__ import annotations
+
+import random
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.fact_extraction import FactExtractionService
+from app.services.fact_extraction_matcher import (
+    CompiledRuleSet,
+    compile_rules,
+    required_literals,
+)
+from app.services.fact_extraction_rules import get_extraction_rules
+
+SAMPLE_TEXTS = [
+    "Версия протокола: 2.1 от 10.06.2024",
+    "ПРОТОКОЛ КЛИНИЧЕСКОГО ИССЛЕДОВАНИЯ № ABC-123, редакция протокола 3.0",
+    "Protocol Version: 4.0; Protocol date: 12 April 2010",
+    "Спонсор: ООО «Фармсинтез»",
+    "Sponsor: Acme Pharma Inc.",
+    "Рандомизированное двойное слепое плацебо-контролируемое исследование II фазы",
+    "A Phase III, randomized, double-blind, placebo-controlled study",
+    "Всего 120 пациентов будет включено в исследование; N = 120",
+    "Планируется включить 48 здоровых добровольцев в возрасте от 18 до 45 лет",
+    "Соотношение рандомизации 2:1 (исследуемый препарат : плацебо)",
+    "Период отмывания составит 7 дней. Объем крови 250 мл.",
+    "Sample size: 200 subjects will be enrolled. Randomization ratio 1:1",
+    "Препарат вводится перорально 1 раз в сутки натощак.",
+    "",
+    "Таблица 1. Критерии включения",
+    # Символы, которые re.IGNORECASE считает равными s/i/в
+    "ſponsor: Acme Pharma Inc.",
+    "A RANDOMİZED study",
+    "ᲀерсия протокола: 1.0",
+]
+
+
+def _random_texts(count: int, seed: int = 0) -> list[str]:
+    """Случайные тексты из литералов правил, чисел и разделителей (с разным регистром)."""
+    rules = get_extraction_rules()
+    vocabulary: list[str] = []
+    for rule in rules:
+        for pattern in rule.patterns_ru + rule.patterns_en:
+            vocabulary.extend(re.findall(r"[A-Za-zА-Яа-яЁё]{2,}", pattern.pattern))
+    vocabulary.extend(["12", "2024", "10.06.2024", "2:1", "N", "=", ":", "-", "мг", "I", "II", "1/2"])
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        words = [rng.choice(vocabulary) for _ in range(rng.randint(1, 12))]
+        words = [w.upper() if rng.random() < 0.2 else w for w in words]
+        texts.append(rng.choice([" ", ": ", " "]).join(words))
+    return texts
+
+
+def test_required_literals_examples():
+    """Обязательные литералы выводятся из AST паттерна."""
+    assert required_literals(re.compile(r"\bпротокол\s+№", re.IGNORECASE)) == {"протокол"}
+    assert required_literals(re.compile(r"(?:randomized|randomization)\b", re.I)) == {
+        "randomized",
+        "randomization",
+    }
+    # Чистые классы символов не дают литералов — паттерн выполняется без префильтра
+    assert required_literals(re.compile(r"\b(\d+\s*:\s*\d+)\b")) is None
+    # Необязательная часть не считается обязательной
+    assert required_literals(re.compile(r"(?:foo)?bar", re.I)) == {"bar"}
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_prefilter_never_drops_a_match(seed: int):
+    """Если паттерн находит совпадение, его литерал обязательно найден префильтром."""
+    compiled = compile_rules(get_extraction_rules())
+    texts = SAMPLE_TEXTS + _random_texts(400, seed=seed)
+    for text in texts:
+        if not text:
+            continue
+        candidates = compiled.candidate_patterns(text)
+        for pid, pattern in enumerate(compiled.patterns):
+            if pattern.search(text):
+                assert pid in candidates or pid in compiled.unfiltered, (pattern.pattern, text)
+
+
+def test_prefilter_skips_unrelated_text():
+    """На тексте без ключевых слов полные regex почти не запускаются."""
+    compiled = compile_rules(get_extraction_rules())
+    assert len(compiled.candidate_patterns("Таблица 1. Критерии включения")) < 5
+
+
+def _anchors(texts: list[str]) -> list[SimpleNamespace]:
+    return [
+        SimpleNamespace(
+            anchor_id=f"dv:p:{i}",
+            text_raw=text,
+            text_norm=text,
+            source_zone="unknown" if i % 3 else "overview",
+        )
+        for i, text in enumerate(texts)
+    ]
+
+
+def test_extract_facts_matches_unfiltered_loop(monkeypatch):
+    """Кандидаты фактов совпадают с наивным обходом всех паттернов."""
+    texts = SAMPLE_TEXTS + _random_texts(300, seed=7)
+    anchors = _anchors(texts)
+    anchor_topic_mapping = {
+        a.anchor_id: {"admin_ethics"} if i % 4 == 0 else {"design"} for i, a in enumerate(anchors)
+    }
+
+    service = FactExtractionService(db=None)  # type: ignore[arg-type]
+    fast = service._extract_facts_from_anchors(
+        anchors, {a.anchor_id for a in anchors}, {}, anchor_topic_mapping
+    )
+
+    # Наивный режим: все паттерны без префильтра
+    naive = CompiledRuleSet(service.rules)
+    naive.unfiltered = set(range(len(naive.patterns)))
+    monkeypatch.setattr(FactExtractionService, "compiled_rules", property(lambda self: naive))
+    slow = service._extract_facts_from_anchors(
+        anchors, {a.anchor_id for a in anchors}, {}, anchor_topic_mapping
+    )
+
+    assert fast == slow
+    assert len(fast) > 10
@@ -0,0 +1,67 @@
+"""
+Тесты обратного индекса ссылок сгенерированных секций (app/services/impact.py).
+"""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.sql.dml import Delete, Insert
+
+from app.db.models.generation import GeneratedSectionAnchorRef, GeneratedSectionFactRef
+from app.services.impact import (
+    extract_anchor_ids_from_artifacts,
+    extract_fact_keys_from_artifacts,
+    index_generated_section_refs,
+)
+
+ARTIFACTS = {
+    "citations": ["a1", "a2"],
+    "claim_items": [
+        {"text": "x", "anchor_ids": ["a2", "a3"], "fact_refs": ["dose", "n_subjects"]},
+        {"text": "y", "anchor_ids": "not-a-list", "fact_refs": ["dose"]},
+        "not-a-claim",
+    ],
+    "citation_items": [{"anchor_id": "a4"}, {"other": 1}],
+}
+
+
+class _RecordingSession:
+    def __init__(self):
+        self.calls = []
+
+    async def execute(self, stmt, params=None):
+        self.calls.append((stmt, params))
+
+
+def test_extract_refs_from_artifacts():
+    assert extract_anchor_ids_from_artifacts(ARTIFACTS) == {"a1", "a2", "a3", "a4"}
+    assert extract_fact_keys_from_artifacts(ARTIFACTS) == {"dose", "n_subjects"}
+    assert extract_anchor_ids_from_artifacts({}) == set()
+
+
+@pytest.mark.asyncio
+async def test_index_generated_section_refs_replaces_rows():
+    section = SimpleNamespace(id=uuid4(), artifacts_json=ARTIFACTS)
+    session = _RecordingSession()
+
+    await index_generated_section_refs(session, section)
+
+    deletes = [stmt for stmt, _ in session.calls if isinstance(stmt, Delete)]
+    inserts = {stmt.table.name: params for stmt, params in session.calls if isinstance(stmt, Insert)}
+    assert {stmt.table.name for stmt in deletes} == {
+        GeneratedSectionAnchorRef.__tablename__,
+        GeneratedSectionFactRef.__tablename__,
+    }
+    assert inserts[GeneratedSectionAnchorRef.__tablename__] == [
+        {"anchor_id": anchor_id, "generated_section_id": section.id} for anchor_id in ["a1", "a2", "a3", "a4"]
+    ]
+    assert inserts[GeneratedSectionFactRef.__tablename__] == [
+        {"fact_key": fact_key, "generated_section_id": section.id} for fact_key in ["dose", "n_subjects"]
+    ]
+
+    # Секция без ссылок: старые строки удаляются, новые не вставляются
+    empty = _RecordingSession()
+    await index_generated_section_refs(empty, SimpleNamespace(id=uuid4(), artifacts_json=None))
+    assert [type(stmt) for stmt, _ in empty.calls] == [Delete, Delete]
@@ -0,0 +1,73 @@
+"""
+Тесты кампании ингестии: очереди по исследованиям и прогресс (campaign_benchmark.csv, --resume).
+"""
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from app.scripts.run_ingestion_campaign import (
+    BENCHMARK_FILENAME,
+    BenchmarkSummaryWriter,
+    group_by_study,
+    run_study_queues,
+)
+
+
+def test_benchmark_summary_resume_appends_and_skips_completed(tmp_path: Path):
+    path = tmp_path / BENCHMARK_FILENAME
+    writer = BenchmarkSummaryWriter(path)
+    writer.write({"doc_version_id": "a", "status": "ok", "processing_time_sec": 1.5, "error": "ignored"})
+    writer.write({"doc_version_id": "b", "status": "failed", "processing_time_sec": 0.2})
+    writer.close()
+
+    assert BenchmarkSummaryWriter.completed_ids(path) == {"a"}
+
+    # Продолжение кампании дописывает строки к отчёту без повторного заголовка
+    resumed = BenchmarkSummaryWriter(path, resume=True)
+    resumed.write({"doc_version_id": "b", "status": "ok", "processing_time_sec": 0.9})
+    resumed.close()
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert lines[0].startswith("doc_version_id,")
+    assert len(lines) == 4
+    assert BenchmarkSummaryWriter.completed_ids(path) == {"a", "b"}
+
+    # Новый запуск без --resume начинает отчёт заново
+    BenchmarkSummaryWriter(path).close()
+    assert BenchmarkSummaryWriter.completed_ids(path) == set()
+
+
+def test_group_by_study_keeps_version_order():
+    versions = [("v1", "s1"), ("v2", "s2"), ("v3", "s1"), ("v4", "s1"), ("v5", "s2")]
+    assert group_by_study(versions) == [
+        [("v1", "s1"), ("v3", "s1"), ("v4", "s1")],
+        [("v2", "s2"), ("v5", "s2")],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_study_queues_run_in_order_and_in_parallel_across_studies():
+    versions = [(f"{study}-v{n}", study) for study in ("s1", "s2", "s3") for n in (1, 2, 3)]
+    events: list[tuple[str, str, str, int]] = []
+
+    async def handle(worker_idx: int, item: tuple[str, str]) -> None:
+        version, study = item
+        events.append(("start", version, study, worker_idx))
+        await asyncio.sleep(0.01)
+        events.append(("end", version, study, worker_idx))
+
+    await run_study_queues(group_by_study(versions), 2, handle)
+
+    assert len(events) == 2 * len(versions)
+    for study in ("s1", "s2", "s3"):
+        study_events = [e for e in events if e[2] == study]
+        # Версии исследования — по порядку, одним воркером, без перекрытия
+        assert [(kind, version) for kind, version, _, _ in study_events] == [
+            (kind, f"{study}-v{n}") for n in (1, 2, 3) for kind in ("start", "end")
+        ]
+        assert len({worker for *_, worker in study_events}) == 1
+    # Разные исследования обрабатываются параллельно
+    assert [e[:2] for e in events[:2]] == [("start", "s1-v1"), ("start", "s2-v1")]
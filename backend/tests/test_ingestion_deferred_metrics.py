@@ -0,0 +1,111 @@
+"""
+Тесты отложенного сбора метрик ингестии (settings.ingestion_metrics_deferred).
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from pathlib import Path
+from uuid import uuid4
+
+from app.db.enums import DocumentLanguage, DocumentType, IngestionStatus
+from app.db.models.ingestion_runs import IngestionRun
+from app.db.models.studies import DocumentVersion
+from app.services.ingestion import IngestionService, _IngestionContext
+from app.services.ingestion.metrics_collector import MetricsCollector
+
+
+class _Result:
+    def tuples(self) -> _Result:
+        return self
+
+    def all(self) -> list:
+        return []
+
+
+class _Session:
+    """Сессия фоновой задачи: объекты по первичному ключу, пустые выборки, счётчик commit."""
+
+    def __init__(self, objects: dict) -> None:
+        self.objects = objects
+        self.commits = 0
+
+    async def __aenter__(self) -> _Session:
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        return None
+
+    async def get(self, model, pk):
+        return self.objects.get((model, pk))
+
+    async def execute(self, stmt) -> _Result:
+        return _Result()
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+
+def _context(doc_version_id) -> _IngestionContext:
+    return _IngestionContext(
+        doc_version_id=doc_version_id,
+        study_id=uuid4(),
+        document_id=uuid4(),
+        doc_type=DocumentType.PROTOCOL,
+        document_language=DocumentLanguage.EN,
+        effective_date=None,
+        created_at=datetime.now(),
+        file_path=Path("protocol.docx"),
+        metrics_collector=MetricsCollector(None, str(doc_version_id)),  # type: ignore[arg-type]
+        defer_metrics=True,
+        deferred_metrics={"chunks"},
+    )
+
+
+def _version_and_run(status: IngestionStatus) -> tuple[DocumentVersion, IngestionRun]:
+    run = IngestionRun(id=uuid4(), summary_json={"metrics_pending": True}, warnings_json=[])
+    version = DocumentVersion(
+        id=uuid4(),
+        ingestion_status=status,
+        last_ingestion_run_id=run.id,
+        ingestion_summary_json={
+            "metrics_pending": True,
+            "needs_review": False,
+            "warnings": [],
+            "mapping_status": {"status": "ready"},
+        },
+    )
+    return version, run
+
+
+async def test_deferred_quality_gate_marks_version_needs_review():
+    version, run = _version_and_run(IngestionStatus.READY)
+    session = _Session({(DocumentVersion, version.id): version, (IngestionRun, run.id): run})
+
+    await IngestionService(None)._collect_deferred_metrics(  # type: ignore[arg-type]
+        _context(version.id), run.id, lambda: session
+    )
+
+    assert session.commits == 1
+    assert run.quality_json["needs_review"] is True
+    assert "metrics_pending" not in run.summary_json
+    assert version.ingestion_status == IngestionStatus.NEEDS_REVIEW
+    summary = version.ingestion_summary_json
+    assert "metrics_pending" not in summary
+    assert summary["needs_review"] is True
+    assert summary["mapping_status"]["status"] == "needs_review"
+    assert summary["warnings"] == run.warnings_json
+
+
+async def test_deferred_quality_gate_skips_superseded_version():
+    version, run = _version_and_run(IngestionStatus.READY)
+    version.last_ingestion_run_id = uuid4()
+    summary_before = dict(version.ingestion_summary_json)
+    session = _Session({(DocumentVersion, version.id): version, (IngestionRun, run.id): run})
+
+    await IngestionService(None)._collect_deferred_metrics(  # type: ignore[arg-type]
+        _context(version.id), run.id, lambda: session
+    )
+
+    assert run.quality_json["needs_review"] is True
+    assert version.ingestion_status == IngestionStatus.READY
+    assert version.ingestion_summary_json == summary_before
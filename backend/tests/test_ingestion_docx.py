@@ -13,7 +13,7 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.enums import AnchorContentType, DocumentLifecycleStatus, DocumentType, IngestionStatus, StudyStatus
-from app.db.models.anchors import Anchor
+from app.db.models.anchors import Anchor, Chunk
 from app.db.models.auth import Workspace
 from app.db.models.facts import Fact, FactEvidence
 from app.db.models.studies import Document, DocumentVersion, Study
@@ -346,7 +346,70 @@ class TestDocxIngestion:
         anchors_result = await db.execute(stmt)
         anchors = anchors_result.scalars().all()
         assert len(anchors) == anchors_count_1
-    
+
+    @pytest.mark.asyncio
+    async def test_docx_incremental_re_ingest_rewrites_changed_sections(
+        self, db: AsyncSession, test_version_with_docx: DocumentVersion, sample_docx_file: Path
+    ):
+        """Инкрементальный re-ingest пересобирает chunks только затронутых секций."""
+        service = IngestionService(db)
+        await service.ingest(test_version_with_docx.id, incremental=True)
+        await db.commit()
+
+        chunks_before = {
+            c.section_path: c.id
+            for c in (await db.execute(
+                select(Chunk).where(Chunk.doc_version_id == test_version_with_docx.id)
+            )).scalars().all()
+        }
+
+        # Без изменений файла: ничего не переписывается
+        await service.ingest(test_version_with_docx.id, incremental=True)
+        await db.commit()
+        await db.refresh(test_version_with_docx)
+        summary = test_version_with_docx.ingestion_summary_json
+        assert summary["incremental"]["added"] == 0
+        assert summary["incremental"]["removed"] == 0
+        assert summary["incremental"]["updated"] == 0
+
+        # Меняем последний пункт в секции Objectives
+        doc = DocxDocument(str(sample_docx_file))
+        doc.paragraphs[-1].text = "Revised objective"
+        doc.save(str(sample_docx_file))
+
+        result = await service.ingest(test_version_with_docx.id, incremental=True)
+        await db.commit()
+        await db.refresh(test_version_with_docx)
+        summary = test_version_with_docx.ingestion_summary_json
+        assert summary["incremental"]["added"] == 1
+        assert summary["incremental"]["removed"] == 1
+        assert summary["incremental"]["affected_sections"] == 1
+
+        anchors = (await db.execute(
+            select(Anchor).where(Anchor.doc_version_id == test_version_with_docx.id)
+        )).scalars().all()
+        assert len(anchors) == result.anchors_created
+        assert "Revised objective" in {a.text_norm for a in anchors}
+        assert "Second objective" not in {a.text_norm for a in anchors}
+
+        chunks_after = {
+            c.section_path: c.id
+            for c in (await db.execute(
+                select(Chunk).where(Chunk.doc_version_id == test_version_with_docx.id)
+            )).scalars().all()
+        }
+        changed_path = next(a.section_path for a in anchors if a.text_norm == "Revised objective")
+        assert chunks_after[changed_path] != chunks_before[changed_path]
+        for section_path, chunk_id in chunks_before.items():
+            if section_path != changed_path:
+                assert chunks_after[section_path] == chunk_id
+
+        # force — полная пересборка даже при включённом инкрементальном режиме
+        await service.ingest(test_version_with_docx.id, force=True, incremental=True)
+        await db.commit()
+        await db.refresh(test_version_with_docx)
+        assert "incremental" not in test_version_with_docx.ingestion_summary_json
+
     @pytest.mark.asyncio
     async def test_docx_ingestion_location_json(
         self, db: AsyncSession, test_version_with_docx: DocumentVersion
@@ -0,0 +1,218 @@
+"""
+Тесты для очереди фоновой ингестии (ingestion_jobs).
+"""
+from __future__ import annotations
+
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1 import documents as documents_api
+from app.api.v1.documents import start_ingestion
+from app.core.config import settings
+from app.core.errors import ConflictError
+from app.db.enums import DocumentLifecycleStatus, DocumentType, IngestionStatus, StudyStatus
+from app.db.models.auth import Workspace
+from app.db.models.ingestion_jobs import IngestionJob
+from app.db.models.studies import Document, DocumentVersion, Study
+from app.worker import job_runner
+from app.worker.job_runner import (
+    claim_next_job,
+    enqueue_ingestion,
+    job_heartbeat,
+    requeue_stale_jobs,
+    retry_delay_sec,
+)
+
+
+class TestIngestionJobs:
+    """Тесты очереди ingestion_jobs."""
+
+    @pytest.fixture
+    async def test_version(self, db: AsyncSession, tmp_path: Path) -> DocumentVersion:
+        """Создает версию документа со статусом UPLOADED и файлом."""
+        workspace = Workspace(name="Test Workspace")
+        db.add(workspace)
+        await db.flush()
+        study = Study(
+            workspace_id=workspace.id,
+            study_code="TEST-JOBS",
+            title="Test Study",
+            status=StudyStatus.ACTIVE,
+        )
+        db.add(study)
+        await db.flush()
+        document = Document(
+            workspace_id=workspace.id,
+            study_id=study.id,
+            doc_type=DocumentType.PROTOCOL,
+            title="Test Document",
+            lifecycle_status=DocumentLifecycleStatus.DRAFT,
+        )
+        db.add(document)
+        await db.flush()
+
+        p = tmp_path / "test.pdf"
+        p.write_bytes(b"%PDF-1.4\n%test\n")
+        version = DocumentVersion(
+            document_id=document.id,
+            version_label="v1.0",
+            source_file_uri=f"file://{p.resolve().as_posix()}",
+            source_sha256="abc123",
+            effective_date=date.today(),
+            ingestion_status=IngestionStatus.UPLOADED,
+        )
+        db.add(version)
+        await db.commit()
+        await db.refresh(version)
+        return version
+
+    @pytest.mark.asyncio
+    async def test_enqueue_is_idempotent_for_active_job(
+        self, db: AsyncSession, test_version: DocumentVersion
+    ):
+        """Повторная постановка в очередь возвращает уже активную задачу."""
+        job1 = await enqueue_ingestion(db, test_version.id)
+        await db.commit()
+        job2 = await enqueue_ingestion(db, test_version.id)
+
+        assert job1.id == job2.id
+        assert job1.status == "queued"
+        assert job1.max_attempts == settings.ingestion_job_max_attempts
+
+    @pytest.mark.asyncio
+    async def test_claim_marks_job_running(
+        self, db: AsyncSession, test_version: DocumentVersion
+    ):
+        """claim_next_job переводит задачу в running и увеличивает attempts."""
+        job = await enqueue_ingestion(db, test_version.id, force=True)
+        await db.commit()
+
+        claimed = await claim_next_job(db, "test-worker")
+        assert claimed is not None
+        assert claimed.id == job.id
+        assert claimed.status == "running"
+        assert claimed.attempts == 1
+        assert claimed.locked_by == "test-worker"
+        assert claimed.force is True
+
+        # Очередь пуста: больше нечего забирать
+        assert await claim_next_job(db, "test-worker") is None
+
+    @pytest.mark.asyncio
+    async def test_stale_job_fails_after_last_attempt(
+        self, db: AsyncSession, test_version: DocumentVersion
+    ):
+        """Зависшая задача возвращается в очередь, пока есть попытки, затем помечается failed."""
+        job = await enqueue_ingestion(db, test_version.id, max_attempts=2)
+        test_version.ingestion_status = IngestionStatus.PROCESSING
+        await db.commit()
+        expired = datetime.now(timezone.utc) - timedelta(seconds=settings.ingestion_job_lock_timeout_sec + 60)
+
+        claimed = await claim_next_job(db, "test-worker")
+        claimed.locked_at = expired
+        await db.commit()
+        assert await requeue_stale_jobs(db) == 1
+        await db.refresh(job)
+        assert job.status == "queued"
+
+        claimed = await claim_next_job(db, "test-worker")
+        assert claimed.attempts == 2
+        claimed.locked_at = expired
+        await db.commit()
+        assert await requeue_stale_jobs(db) == 1
+        await db.refresh(job)
+        await db.refresh(test_version)
+        assert job.status == "failed"
+        assert job.finished_at is not None
+        assert test_version.ingestion_status == IngestionStatus.FAILED
+
+    @pytest.mark.asyncio
+    async def test_start_ingestion_enqueues_in_queue_mode(
+        self, db: AsyncSession, test_version: DocumentVersion, monkeypatch
+    ):
+        """В режиме очереди эндпоинт сразу возвращает job_id, версия остаётся processing."""
+        monkeypatch.setattr(settings, "ingestion_queue_enabled", True)
+
+        result = await start_ingestion(test_version.id, force=False, db=db)
+
+        assert result["status"] == IngestionStatus.PROCESSING.value
+        assert "job_id" in result
+        job = await db.get(IngestionJob, result["job_id"])
+        assert job is not None
+        assert job.status == "queued"
+
+        await db.refresh(test_version)
+        assert test_version.ingestion_status == IngestionStatus.PROCESSING
+
+        # Повторный запуск отклоняется guard-ом по статусу processing
+        with pytest.raises(ConflictError):
+            await start_ingestion(test_version.id, force=False, db=db)
+
+    @pytest.mark.asyncio
+    async def test_start_ingestion_does_not_commit_processing_without_job(
+        self, db: AsyncSession, test_version: DocumentVersion, monkeypatch
+    ):
+        """Статус processing фиксируется одним commit с задачей: ошибка постановки в очередь ничего не коммитит."""
+        monkeypatch.setattr(settings, "ingestion_queue_enabled", True)
+        commits: list[IngestionStatus] = []
+        original_commit = db.commit
+
+        async def _commit() -> None:
+            commits.append(test_version.ingestion_status)
+            await original_commit()
+
+        async def _failing_enqueue(*args, **kwargs):
+            raise RuntimeError("queue unavailable")
+
+        monkeypatch.setattr(db, "commit", _commit)
+        monkeypatch.setattr(documents_api, "enqueue_ingestion", _failing_enqueue)
+
+        with pytest.raises(RuntimeError):
+            await start_ingestion(test_version.id, force=False, db=db)
+
+        assert commits == []
+
+
+def test_retry_delay_grows_exponentially(monkeypatch):
+    """Задержка перед повтором удваивается с каждой попыткой."""
+    monkeypatch.setattr(settings, "ingestion_job_retry_backoff_sec", 10)
+    assert retry_delay_sec(1) == 10
+    assert retry_delay_sec(2) == 20
+    assert retry_delay_sec(3) == 40
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_renews_lock_while_job_runs(monkeypatch):
+    """Пока выполняется блок, locked_at задачи продлевается; после выхода — нет."""
+    statements = []
+
+    class _Session:
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+        async def execute(self, stmt):
+            statements.append(stmt)
+
+        async def commit(self):
+            pass
+
+    monkeypatch.setattr(settings, "ingestion_job_heartbeat_interval_sec", 0)
+    monkeypatch.setattr(job_runner, "async_session_factory", _Session)
+
+    async with job_heartbeat(uuid4(), "test-worker"):
+        for _ in range(5):
+            await asyncio.sleep(0)
+    renewals = len(statements)
+    assert renewals > 0
+    assert all(stmt.table.name == IngestionJob.__tablename__ for stmt in statements)
+
+    await asyncio.sleep(0)
+    assert len(statements) == renewals
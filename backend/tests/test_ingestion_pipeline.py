@@ -0,0 +1,242 @@
+"""
+Тесты графа стадий ингестии (StagePipeline).
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from app.services.ingestion.metrics_collector import MetricsCollector
+from app.services.ingestion.pipeline import Stage, StagePipeline
+
+
+class _Session:
+    """Минимальная сессия ингестии: фиксирует commit и сессии, переданные стадиям."""
+
+    def __init__(self) -> None:
+        self.commits = 0
+        self.seen_by_stages: list[_Session] = []
+        # Сколько стадий работает с сессией одновременно (должно быть не больше одной)
+        self.active = 0
+        self.max_active = 0
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+
+@pytest.fixture
+def session() -> _Session:
+    return _Session()
+
+
+@pytest.fixture
+def metrics_collector() -> MetricsCollector:
+    return MetricsCollector(None, "doc-version")  # type: ignore[arg-type]
+
+
+def _sleeping_stage(name: str, delay: float, log: list[str], **kwargs) -> Stage:
+    async def run(db) -> None:
+        db.seen_by_stages.append(db)
+        db.active += 1
+        db.max_active = max(db.max_active, db.active)
+        log.append(f"start:{name}")
+        await asyncio.sleep(delay)
+        log.append(f"end:{name}")
+        db.active -= 1
+
+    return Stage(name, run, **kwargs)
+
+
+def _computing_stage(name: str, compute_delay: float, log: list[str], **kwargs) -> Stage:
+    """Стадия с фазой compute (без сессии) и быстрой записью в сессию."""
+
+    async def compute() -> None:
+        log.append(f"compute:{name}")
+        await asyncio.sleep(compute_delay)
+        log.append(f"computed:{name}")
+
+    return _sleeping_stage(name, 0, log, compute=compute, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_stages_run_one_by_one_in_one_session_without_commit(session, metrics_collector):
+    """Стадии идут по одной в порядке зависимостей, в общей сессии и без commit."""
+    log: list[str] = []
+    pipeline = StagePipeline(
+        [
+            _sleeping_stage("topics", 0, log, requires=("chunks", "facts")),
+            _sleeping_stage("chunking", 0.01, log, requires=("anchors",), provides=("chunks",)),
+            _sleeping_stage("facts", 0, log, requires=("anchors",), provides=("facts",)),
+            _sleeping_stage("parse", 0, log, provides=("anchors",)),
+        ]
+    )
+
+    report = await pipeline.run(session, metrics_collector)
+
+    # Среди готовых стадий — порядок объявления; следующая стартует после завершения предыдущей
+    assert log == [
+        "start:parse", "end:parse",
+        "start:chunking", "end:chunking",
+        "start:facts", "end:facts",
+        "start:topics", "end:topics",
+    ]
+    assert session.seen_by_stages == [session] * 4
+    assert session.commits == 0
+    assert set(report.durations_ms) == {"parse", "chunking", "facts", "topics"}
+
+
+@pytest.mark.asyncio
+async def test_critical_path_recorded_in_metrics(session, metrics_collector):
+    """Критический путь — самая долгая цепочка зависимостей; время стадий идёт в timings_ms."""
+    log: list[str] = []
+    pipeline = StagePipeline(
+        [
+            _sleeping_stage("parse", 0.01, log, provides=("anchors",)),
+            _sleeping_stage("chunking", 0.02, log, requires=("anchors",), provides=("chunks",)),
+            _sleeping_stage("section_mapping", 0.15, log, requires=("anchors",)),
+            _sleeping_stage("alignment", 0.02, log, requires=("chunks",)),
+        ]
+    )
+
+    report = await pipeline.run(session, metrics_collector)
+
+    assert report.critical_path == ["parse", "section_mapping"]
+    timings = metrics_collector.metrics.timings_ms
+    assert {"parse", "chunking", "section_mapping", "alignment", "critical_path", "session"} <= set(timings)
+    assert timings["critical_path"] == report.critical_path_ms
+    assert timings["critical_path"] >= timings["section_mapping"]
+    assert metrics_collector.metrics.to_summary_json()["critical_path"] == ["parse", "section_mapping"]
+
+
+@pytest.mark.asyncio
+async def test_compute_overlaps_other_stages_session_work(session, metrics_collector):
+    """compute независимых стадий идут параллельно друг с другом и с записью другой ветви."""
+    log: list[str] = []
+    pipeline = StagePipeline(
+        [
+            _sleeping_stage("parse", 0, log, provides=("anchors",)),
+            _computing_stage("chunking", 0.05, log, requires=("anchors",), provides=("chunks",)),
+            _computing_stage("alignment", 0.1, log, requires=("chunks",), provides=("matches",)),
+            _sleeping_stage("fact_extraction", 0.1, log, requires=("anchors",), provides=("facts",)),
+            _sleeping_stage("section_mapping", 0.1, log, requires=("facts",)),
+            _sleeping_stage("consistency", 0, log, requires=("facts", "matches")),
+        ]
+    )
+
+    started = time.perf_counter()
+    report = await pipeline.run(session, metrics_collector)
+    elapsed = time.perf_counter() - started
+
+    # Последовательно было бы 0.35 с: compute chunking идёт вместе с fact_extraction,
+    # compute alignment — вместе с section_mapping
+    assert elapsed < 0.3
+    assert log.index("compute:chunking") < log.index("end:fact_extraction")
+    assert log.index("compute:alignment") < log.index("end:section_mapping")
+    # Запись стадии — после её compute; сессия используется одной стадией за раз, без commit
+    assert log.index("computed:chunking") < log.index("start:chunking")
+    assert log.index("computed:alignment") < log.index("start:alignment")
+    assert log[-1] == "end:consistency"
+    assert session.max_active == 1
+    assert session.commits == 0
+    # Время стадии — compute + запись; сессия занята только записями
+    assert report.durations_ms["chunking"] >= 50
+    assert report.session_ms < 250
+
+
+@pytest.mark.asyncio
+async def test_stage_error_cancels_running_compute(session, metrics_collector):
+    """Ошибка записи отменяет выполняющиеся compute других стадий."""
+    log: list[str] = []
+    compute_started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def slow_compute() -> None:
+        compute_started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def failing(db) -> None:
+        await compute_started.wait()
+        raise RuntimeError("boom")
+
+    pipeline = StagePipeline(
+        [
+            _sleeping_stage("parse", 0, log, provides=("anchors",)),
+            _sleeping_stage("chunking", 0, log, requires=("anchors",), compute=slow_compute),
+            Stage("fact_extraction", failing, requires=("anchors",)),
+        ]
+    )
+
+    with pytest.raises(RuntimeError, match="boom"):
+        await asyncio.wait_for(pipeline.run(session, metrics_collector), timeout=5)
+
+    assert cancelled.is_set()
+    assert "start:chunking" not in log
+
+
+@pytest.mark.asyncio
+async def test_skipped_stage_unblocks_dependents(session, metrics_collector):
+    """Стадия с ложным condition не выполняется, но зависимые от неё стадии запускаются."""
+    log: list[str] = []
+    pipeline = StagePipeline(
+        [
+            _sleeping_stage("section_mapping", 0, log, provides=("section_maps",)),
+            _sleeping_stage(
+                "llm_assist_mapping", 0, log, requires=("section_maps",), provides=("assisted",),
+                condition=lambda: False,
+            ),
+            _sleeping_stage("report", 0, log, requires=("assisted",)),
+        ]
+    )
+
+    report = await pipeline.run(session, metrics_collector)
+
+    assert report.skipped == ["llm_assist_mapping"]
+    assert "start:llm_assist_mapping" not in log
+    assert "end:report" in log
+    assert "llm_assist_mapping" not in metrics_collector.metrics.timings_ms
+
+
+@pytest.mark.asyncio
+async def test_stage_error_stops_pipeline(session, metrics_collector):
+    """Ошибка стадии пробрасывается без commit; следующие стадии не запускаются."""
+    log: list[str] = []
+
+    async def failing(db) -> None:
+        raise RuntimeError("boom")
+
+    pipeline = StagePipeline(
+        [
+            _sleeping_stage("chunking", 0, log, provides=("chunks",)),
+            Stage("fact_extraction", failing, provides=("facts",)),
+            _sleeping_stage("topic_mapping", 0, log, requires=("facts", "chunks")),
+        ]
+    )
+
+    with pytest.raises(RuntimeError, match="boom"):
+        await pipeline.run(session, metrics_collector)
+
+    assert log == ["start:chunking", "end:chunking"]
+    assert session.commits == 0
+
+
+@pytest.mark.parametrize(
+    "stages, message",
+    [
+        ([Stage("a", None, requires=("x",))], "без поставщика"),
+        ([Stage("a", None, provides=("x",)), Stage("b", None, provides=("x",))], "две стадии"),
+        ([Stage("a", None), Stage("a", None)], "дважды"),
+        (
+            [Stage("a", None, requires=("y",), provides=("x",)), Stage("b", None, requires=("x",), provides=("y",))],
+            "Цикл",
+        ),
+    ],
+)
+def test_invalid_graph_rejected(stages, message):
+    with pytest.raises(ValueError, match=message):
+        StagePipeline(stages)
@@ -0,0 +1,105 @@
+"""
+Тесты профилирования ингестии по стадиям (app/services/ingestion/profiling.py).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.services.ingestion.profiling import (
+    IngestionProfiler,
+    profile_stage,
+    profiling,
+    record_db_time,
+    record_external_call,
+)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_stages_get_their_own_calls_and_queries():
+    profiler = IngestionProfiler()
+    engine = create_engine("sqlite://")
+
+    async def stage(name: str, llm_calls: int, queries: int) -> None:
+        with profile_stage(name):
+            for _ in range(llm_calls):
+                record_external_call("llm", 5.0)
+                await asyncio.sleep(0)
+            with engine.connect() as conn:
+                for _ in range(queries):
+                    conn.execute(text("SELECT 1"))
+            record_external_call("embedding", 2.0)
+
+    with profiling(profiler):
+        await asyncio.gather(
+            asyncio.create_task(stage("fact_extraction", 3, 1)),
+            asyncio.create_task(stage("chunking", 0, 2)),
+        )
+        record_external_call("llm", 1.0)
+
+    # Вне активного профайлера вызовы и запросы не учитываются
+    with profile_stage("ignored"):
+        record_external_call("llm", 100.0)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+
+    result = profiler.finish()
+    facts = result["stages"]["fact_extraction"]
+    chunking = result["stages"]["chunking"]
+    assert (facts["llm_calls"], facts["llm_ms"], facts["db_queries"]) == (3, 15.0, 1)
+    assert (chunking["llm_calls"], chunking["db_queries"], chunking["embedding_calls"]) == (0, 2, 1)
+    assert result["outside_stages"]["llm_calls"] == 1
+    assert result["total"]["llm_calls"] == 4
+    assert result["total"]["db_queries"] == 3
+    assert result["total"]["embedding_ms"] == 4.0
+    assert "ignored" not in result["stages"]
+    assert facts["wall_ms"] >= 0 and facts["cpu_ms"] >= 0
+
+
+def test_collapsed_and_speedscope_export(tmp_path: Path):
+    profiler = IngestionProfiler()
+    with profiling(profiler):
+        with profiler.stage("parse_anchors") as stage:
+            record_external_call("llm", 30.0)
+    stage.wall_ms = 100.0
+    stage.db_ms = 20.0
+    profiler.finish()
+
+    stacks = dict((";".join(frames), weight) for frames, weight in profiler.collapsed_stacks())
+    assert stacks["ingest;parse_anchors;db"] == 20.0
+    assert stacks["ingest;parse_anchors;llm"] == 30.0
+    assert stacks["ingest;parse_anchors;self"] == 50.0
+
+    paths = profiler.export(tmp_path / "profiles", "run-1")
+    collapsed = Path(paths["collapsed"]).read_text(encoding="utf-8").splitlines()
+    assert "ingest;parse_anchors;self 50" in collapsed
+
+    speedscope = json.loads(Path(paths["speedscope"]).read_text(encoding="utf-8"))
+    frames = [frame["name"] for frame in speedscope["shared"]["frames"]]
+    profile = speedscope["profiles"][0]
+    assert profile["type"] == "sampled" and profile["unit"] == "milliseconds"
+    assert len(profile["samples"]) == len(profile["weights"]) == len(stacks)
+    assert [frames[i] for i in profile["samples"][0]] == ["ingest", "parse_anchors", "db"]
+
+
+def test_failed_queries_and_copy_are_recorded():
+    profiler = IngestionProfiler()
+    engine = create_engine("sqlite://")
+
+    with profiling(profiler):
+        with profile_stage("chunking"):
+            with engine.connect() as conn:
+                with pytest.raises(Exception):
+                    conn.execute(text("SELECT * FROM missing_table"))
+                # Начало упавшего запроса снято со стека и не смещает замер следующего
+                assert conn.info["ingestion_profile_query_start"] == []
+                conn.execute(text("SELECT 1"))
+            record_db_time(12.0)
+
+    chunking = profiler.finish()["stages"]["chunking"]
+    assert chunking["db_queries"] == 3
+    assert chunking["db_ms"] >= 12.0
@@ -0,0 +1,136 @@
+"""
+Тесты для общего HTTP-транспорта LLM (llm_transport).
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core.config import LLMProvider
+from app.services import llm_client as llm_client_module
+from app.services.llm_client import LLMClient
+from app.services.llm_transport import LLMTransport, TokenBucket, get_llm_transport
+
+
+def _make_transport(handler, **kwargs) -> LLMTransport:
+    kwargs.setdefault("rate_limits_rps", {})
+    kwargs.setdefault("backoff_sec", 0.0)
+    return LLMTransport(http_transport=httpx.MockTransport(handler), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_retries_on_429_with_retry_after():
+    """429 повторяется с задержкой из Retry-After, затем возвращается успешный ответ."""
+    calls = {"n": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls["n"] += 1
+        if calls["n"] == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"ok": True})
+
+    transport = _make_transport(handler)
+    response = await transport.post(LLMProvider.OPENAI_COMPATIBLE, "http://llm.local/v1/x", json={})
+
+    assert response.status_code == 200
+    assert calls["n"] == 2
+    await transport.aclose()
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries():
+    """После max_retries повторов возвращается последний ответ 429."""
+    calls = {"n": 0}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls["n"] += 1
+        return httpx.Response(429)
+
+    transport = _make_transport(handler, max_retries=2)
+    response = await transport.post("local", "http://llm.local/api/chat", json={})
+
+    assert response.status_code == 429
+    assert calls["n"] == 3
+    await transport.aclose()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_limited_by_semaphore():
+    """Одновременно выполняется не больше max_concurrency запросов."""
+    state = {"active": 0, "peak": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return httpx.Response(200, json={})
+
+    transport = _make_transport(handler, max_concurrency=2)
+    await asyncio.gather(
+        *(transport.post("local", "http://llm.local/api/chat", json={}) for _ in range(8))
+    )
+
+    assert state["peak"] == 2
+    await transport.aclose()
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    """После исчерпания burst токены выдаются с частотой rate."""
+    bucket = TokenBucket(rate=50.0, capacity=1)
+    start = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    # первый токен из burst, остальные три — по 1/50 с
+    assert time.monotonic() - start >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_is_split_between_processes():
+    """Общий лимит провайдера делится между процессами: bucket процесса получает свою долю."""
+    transport = _make_transport(
+        lambda request: httpx.Response(200), rate_limits_rps={"local": 40.0}, burst=8, processes=4
+    )
+
+    bucket = transport.bucket("local")
+
+    assert bucket.rate == 10.0
+    assert bucket.capacity == 2.0
+    assert transport.bucket(LLMProvider.OPENAI_COMPATIBLE).rate == 0.0
+    await transport.aclose()
+
+
+@pytest.mark.asyncio
+async def test_shared_transport_per_event_loop():
+    """get_llm_transport возвращает один экземпляр в пределах event loop."""
+    assert get_llm_transport() is get_llm_transport()
+
+
+@pytest.mark.asyncio
+async def test_llm_client_uses_shared_transport(monkeypatch):
+    """LLMClient отправляет запросы через общий транспорт."""
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(str(request.url))
+        content = '{"candidates": {"synopsis": []}}'
+        return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+    transport = _make_transport(handler)
+    monkeypatch.setattr(llm_client_module, "get_llm_transport", lambda: transport)
+
+    client = LLMClient(
+        provider=LLMProvider.OPENAI_COMPATIBLE,
+        base_url="http://llm.local/v1",
+        api_key="key",
+        model="m",
+    )
+    result = await client.generate_candidates("system", {"q": 1})
+
+    assert result.candidates == {"synopsis": []}
+    assert seen == ["http://llm.local/v1/chat/completions"]
+    await transport.aclose()
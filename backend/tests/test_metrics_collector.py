@@ -0,0 +1,95 @@
+"""
+Тесты MetricsCollector: метрики из данных пайплайна в памяти и сгруппированные запросы.
+"""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.enums import AnchorContentType, DocumentLanguage, DocumentType, FactStatus
+from app.db.models.facts import Fact
+from app.services.ingestion.metrics_collector import MetricsCollector
+
+
+def _anchor(content_type: AnchorContentType, text: str, source_zone: str = "unknown"):
+    return SimpleNamespace(
+        content_type=content_type,
+        source_zone=source_zone,
+        language=DocumentLanguage.EN,
+        text_norm=text,
+    )
+
+
+@pytest.mark.asyncio
+async def test_anchor_metrics_from_parsed_anchors_without_db():
+    collector = MetricsCollector(None, str(uuid4()))  # type: ignore[arg-type]
+    anchors = [
+        _anchor(AnchorContentType.HDR, "Appendix"),
+        _anchor(AnchorContentType.HDR, "Appendix"),
+        _anchor(AnchorContentType.HDR, "1 Study Design", "design"),
+        _anchor(AnchorContentType.P, "Randomized double-blind trial", "design"),
+        _anchor(AnchorContentType.P, "Short"),
+    ]
+
+    await collector.collect_anchor_metrics(anchors)
+    await collector.collect_source_zones_metrics(DocumentType.PROTOCOL)
+
+    metrics = collector.metrics.anchors
+    assert metrics.total == 5
+    assert metrics.by_content_type == {"hdr": 3, "p": 2}
+    assert metrics.by_source_zone == {"unknown": 3, "design": 2}
+    assert metrics.by_language == {"en": 5}
+    assert metrics.empty_or_short == 3
+    assert metrics.unknown_rate == pytest.approx(0.6)
+    assert metrics.low_confidence_rate == 0.0
+    assert metrics.text_len == {"p50": 8, "p95": 29, "avg": 12.8}
+    assert metrics.top_unknown_headings == [{"heading": "Appendix", "count": 2}]
+    # Статистика зон берётся из уже собранных метрик anchors (db=None — запроса не было)
+    assert collector.metrics.source_zones.by_zone_counts == {"unknown": 3, "design": 2}
+
+
+@pytest.mark.asyncio
+async def test_facts_metrics_single_grouped_query(db: AsyncSession):
+    study_id = uuid4()
+    for status, confidence in [
+        (FactStatus.EXTRACTED, 0.9),
+        (FactStatus.EXTRACTED, 0.5),
+        (FactStatus.VALIDATED, None),
+        (FactStatus.CONFLICTING, 0.95),
+    ]:
+        db.add(
+            Fact(
+                study_id=study_id,
+                fact_type="population",
+                fact_key="sample_size",
+                value_json={"value": 100},
+                status=status,
+                confidence=confidence,
+                created_from_doc_version_id=uuid4(),
+            )
+        )
+    db.add(
+        Fact(
+            study_id=study_id,
+            fact_type="study",
+            fact_key="phase",
+            value_json={"value": "III"},
+            status=FactStatus.VALIDATED,
+            confidence=0.7,
+            created_from_doc_version_id=uuid4(),
+        )
+    )
+    await db.flush()
+
+    collector = MetricsCollector(db, str(uuid4()))
+    await collector.collect_facts_metrics(str(study_id))
+
+    facts = collector.metrics.facts
+    assert facts.total == 5
+    assert facts.by_fact_key == {"population/sample_size": 4, "study/phase": 1}
+    assert facts.by_status == {"extracted": 2, "validated": 2, "conflicting": 1}
+    assert facts.conflicting_count == 1
+    assert facts.validated_count == 2
@@ -0,0 +1,66 @@
+"""
+Тесты кэша данных passport tuning (app/services/passport_tuning_cache.py).
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+from app.schemas.passport_tuning import MappingMode
+from app.services.passport_tuning_cache import CachedJsonFile, build_cluster_index, build_mapping_items
+
+
+def _write(path: Path, data, mtime_ns: int) -> None:
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_cached_file_reloads_only_when_file_changes(tmp_path: Path):
+    loads = []
+
+    def loader(data):
+        loads.append(data)
+        return build_mapping_items(data)
+
+    cache = CachedJsonFile(loader)
+    path = tmp_path / "cluster_to_section_key.json"
+    assert cache.get(path) is None
+
+    _write(path, {"1": {"section_key": "protocol.design"}, "2": "invalid"}, 1_000_000_000)
+    first = cache.get(path)
+    assert cache.get(path) is first
+    assert len(loads) == 1
+    # Обратная совместимость и пропуск невалидных элементов
+    assert list(first) == ["1"] and first["1"].mapping_mode == MappingMode.SINGLE
+
+    # Изменение файла другим процессом подхватывается по mtime/size
+    _write(path, {"1": {"section_key": "protocol.endpoints", "mapping_mode": "skip"}}, 2_000_000_000)
+    assert cache.get(path)["1"].mapping_mode == MappingMode.SKIP
+    assert len(loads) == 2
+
+    # После записи save_mapping кэш получает данные без повторного чтения
+    saved = {"3": {"section_key": "protocol.objectives"}}
+    _write(path, saved, 3_000_000_000)
+    cache.put(path, saved)
+    assert list(cache.get(path)) == ["3"]
+    assert len(loads) == 3
+
+
+def test_cluster_search_matches_substring_semantics():
+    index = build_cluster_index(
+        [
+            {"cluster_id": 1, "top_titles_ru": ["Рандомизация пациентов"], "top_titles_en": ["Randomization"]},
+            {"cluster_id": 2, "top_titles_ru": ["Нежелательные явления"], "top_titles_en": ["Adverse Events"]},
+            {"cluster_id": 3, "top_titles_ru": ["Серьёзные нежелательные явления"], "top_titles_en": []},
+        ]
+    )
+
+    assert [c.cluster_id for c in index.search(None)] == ["1", "2", "3"]
+    assert [c.cluster_id for c in index.search("  ")] == ["1", "2", "3"]
+    assert [c.cluster_id for c in index.search("ДОМИЗ")] == ["1"]
+    assert [c.cluster_id for c in index.search("желательные яв")] == ["2", "3"]
+    assert [c.cluster_id for c in index.search("verse ev")] == ["2"]
+    # Слова запроса есть, но не подряд — совпадения нет (как в поиске по подстроке)
+    assert index.search("явления нежелательные") == []
+    assert index.search("отсутствует") == []
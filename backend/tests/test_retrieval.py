@@ -0,0 +1,182 @@
+"""
+Тесты для RetrievalService: векторный поиск chunks с фильтрами и crosswalk re-ranking.
+"""
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.enums import (
+    DocumentLanguage,
+    DocumentLifecycleStatus,
+    DocumentType,
+    IngestionStatus,
+    SourceZone,
+    StudyStatus,
+)
+from app.db.bulk_copy import ensure_vector_adapter
+from app.db.models.anchors import Chunk
+from app.db.models.auth import Workspace
+from app.db.models.studies import Document, DocumentVersion, Study
+from app.services.chunking import _normalize_text, hash_embeddings_v1_batch
+from app.services.retrieval import RetrievalService
+
+
+async def _create_version(
+    db: AsyncSession, study: Study, doc_type: DocumentType, chunks: list[tuple[str, SourceZone, DocumentLanguage]]
+) -> DocumentVersion:
+    document = Document(
+        workspace_id=study.workspace_id,
+        study_id=study.id,
+        doc_type=doc_type,
+        title=f"{doc_type.value} document",
+        lifecycle_status=DocumentLifecycleStatus.DRAFT,
+    )
+    db.add(document)
+    await db.flush()
+    version = DocumentVersion(
+        document_id=document.id,
+        version_label="v1.0",
+        source_file_uri="file:///test/file.docx",
+        source_sha256="abc123",
+        effective_date=date.today(),
+        ingestion_status=IngestionStatus.READY,
+        document_language=DocumentLanguage.EN,
+    )
+    db.add(version)
+    await db.flush()
+
+    await ensure_vector_adapter(db)
+    embeddings = hash_embeddings_v1_batch([_normalize_text(text) for text, _, _ in chunks])
+    for i, ((text, zone, language), embedding) in enumerate(zip(chunks, embeddings)):
+        db.add(
+            Chunk(
+                doc_version_id=version.id,
+                chunk_id=f"{version.id}:{i}",
+                section_path=f"{i + 1} Section",
+                text=text,
+                anchor_ids=[f"{version.id}:p:{i}"],
+                embedding=embedding,
+                source_zone=zone,
+                language=language,
+            )
+        )
+    await db.commit()
+    return version
+
+
+async def _create_study(db: AsyncSession, workspace: Workspace, code: str) -> Study:
+    study = Study(workspace_id=workspace.id, study_code=code, title=code, status=StudyStatus.ACTIVE)
+    db.add(study)
+    await db.commit()
+    return study
+
+
+@pytest.fixture
+async def workspace(db: AsyncSession) -> Workspace:
+    workspace = Workspace(name="Retrieval Workspace")
+    db.add(workspace)
+    await db.commit()
+    return workspace
+
+
+EN = DocumentLanguage.EN
+RU = DocumentLanguage.RU
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("exact_max_chunks", [20000, 0])
+async def test_retrieve_ranks_by_similarity_with_filters(
+    db: AsyncSession, workspace: Workspace, monkeypatch, exact_max_chunks: int
+):
+    """Топ-k по косинусному сходству в рамках study/doc_type (точный и HNSW-путь)."""
+    monkeypatch.setattr(settings, "retrieval_exact_search_max_chunks", exact_max_chunks)
+    study = await _create_study(db, workspace, "RET-1")
+    other_study = await _create_study(db, workspace, "RET-2")
+    await _create_version(
+        db,
+        study,
+        DocumentType.PROTOCOL,
+        [
+            ("Adverse events are recorded at every visit", SourceZone.SAFETY, EN),
+            ("Patients are randomized to placebo or study drug", SourceZone.DESIGN, EN),
+            ("Blood samples are collected at screening", SourceZone.PROCEDURES, EN),
+            ("", SourceZone.UNKNOWN, EN),
+        ],
+    )
+    await _create_version(
+        db, other_study, DocumentType.PROTOCOL, [("Adverse events are recorded at every visit", SourceZone.SAFETY, EN)]
+    )
+
+    service = RetrievalService(db)
+    results = await service.retrieve(
+        "adverse events recorded", filters={"study_id": study.id, "doc_type": "protocol"}, k=2
+    )
+
+    assert len(results) == 2
+    assert results[0].text == "Adverse events are recorded at every visit"
+    assert results[0].score > results[1].score
+    assert results[0].source_zone == "safety"
+
+    zone_results = await service.retrieve(
+        "adverse events recorded", filters={"study_id": study.id, "source_zones": ["design"]}, k=5
+    )
+    assert [r.source_zone for r in zone_results] == ["design"]
+
+    assert await service.retrieve("adverse events", filters={"doc_type": DocumentType.CSR}) == []
+    assert await service.retrieve("   ", filters={"study_id": study.id}) == []
+
+
+@pytest.mark.asyncio
+async def test_prefer_language_reranks_without_excluding(db: AsyncSession, workspace: Workspace, monkeypatch):
+    """prefer_language поднимает chunks на нужном языке, не исключая остальные."""
+    monkeypatch.setattr(settings, "retrieval_prefer_language_penalty", 0.2)
+    study = await _create_study(db, workspace, "RET-3")
+    await _create_version(
+        db,
+        study,
+        DocumentType.PROTOCOL,
+        [
+            ("Primary endpoint is overall survival", SourceZone.ENDPOINTS, EN),
+            ("Primary endpoint: overall survival.", SourceZone.ENDPOINTS, RU),
+        ],
+    )
+
+    results = await RetrievalService(db).retrieve(
+        "primary endpoint overall survival", filters={"study_id": study.id, "prefer_language": "ru"}, k=2
+    )
+
+    assert [r.language for r in results] == ["ru", "en"]
+
+
+@pytest.mark.asyncio
+async def test_crosswalk_weights_rerank_target_zones(db: AsyncSession, workspace: Workspace):
+    """Веса zone_crosswalk работают как prior: при равном сходстве выигрывает зона с большим весом."""
+    study = await _create_study(db, workspace, "RET-4")
+    text = "Study design and treatment duration"
+    await _create_version(
+        db,
+        study,
+        DocumentType.CSR,
+        [
+            (text, SourceZone.OVERVIEW, EN),
+            (text, SourceZone.DESIGN, EN),
+            (text, SourceZone.SAFETY, EN),
+        ],
+    )
+
+    results = await RetrievalService(db).retrieve_with_zone_crosswalk(
+        "study design",
+        source_doc_type=DocumentType.PROTOCOL,
+        target_doc_type=DocumentType.CSR,
+        source_zones=["design"],
+        filters={"study_id": study.id},
+        k=5,
+    )
+
+    # protocol/design -> csr: design 0.95, overview 0.6; safety вне crosswalk
+    assert [r.source_zone for r in results] == ["design", "overview"]
+    assert results[0].score > results[1].score
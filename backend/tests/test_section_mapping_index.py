@@ -0,0 +1,144 @@
+"""
+Тесты индекса заголовков (OutlineIndex) и кэша скомпилированных сигналов SectionMappingService.
+"""
+from __future__ import annotations
+
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+from app.db.enums import AnchorContentType, DocumentLanguage, SourceZone
+from app.services import section_mapping
+from app.services.section_mapping import SectionMappingService
+from app.services.section_mapping_index import CompiledSignals, OutlineIndex
+
+
+def _anchor(anchor_id: str, text: str, para_index: int | None, *, heading_level: int | None = None):
+    location = {"para_index": para_index} if para_index is not None else {"para_index_hint": None}
+    if heading_level is not None:
+        location["style"] = f"Heading {heading_level}"
+    return SimpleNamespace(
+        anchor_id=anchor_id,
+        text_norm=text,
+        location_json=location,
+        content_type=AnchorContentType.HDR if heading_level is not None else AnchorContentType.P,
+        section_path="ROOT",
+        source_zone=SourceZone.UNKNOWN,
+    )
+
+
+def _document():
+    return [
+        _anchor("h1", "1 Introduction", 0, heading_level=1),
+        _anchor("p1", "Background text", 1),
+        _anchor("h2", "2 Study Objectives", 2, heading_level=1),
+        _anchor("h2.1", "2.1 Primary objective", 3, heading_level=2),
+        _anchor("p2", "Primary objective text", 4),
+        _anchor("h3", "3 Study Design", 5, heading_level=1),
+        _anchor("p3", "Design text", 6),
+        _anchor("cell", "Visit 1", None),
+    ]
+
+
+def _contract(must: list[str], regex: list[str] | None = None):
+    return SimpleNamespace(
+        id=uuid4(),
+        version=1,
+        title="Objectives",
+        target_section="protocol.endpoints",
+        required_facts_json={},
+        allowed_sources_json={},
+        qc_ruleset_json={},
+        retrieval_recipe_json={
+            "version": 1,
+            "heading_match": {"must": must, "should": [], "not": []},
+            "regex": {"heading": regex or []},
+        },
+    )
+
+
+def test_keyword_hits_match_substring_semantics():
+    service = SectionMappingService(db=None)  # type: ignore[arg-type]
+    outline = service._build_document_outline(_document())
+    index = outline.index
+
+    positions = {outline.headings[i][0].anchor_id for i in index.headings_with_keyword("objective")}
+    assert positions == {"h2", "h2.1"}
+    multi_word = {outline.headings[i][0].anchor_id for i in index.headings_with_keyword("study design")}
+    assert multi_word == {"h3"}
+
+
+def test_score_headings_applies_weights_and_first_regex_only():
+    outline_anchors = _document()
+    headings = [(a, 1) for a in outline_anchors if a.content_type == AnchorContentType.HDR]
+    index = OutlineIndex(outline_anchors, headings)
+    signals = CompiledSignals.compile(["objective"], ["study"], ["primary"], [r"objectives?", r"study", "("])
+
+    scores = index.score_headings(signals)
+
+    by_id = {headings[i][0].anchor_id: entry for i, entry in scores.items()}
+    assert by_id["h2"].score == 2.0 + 1.0 + 3.0
+    assert by_id["h2"].matched_regex == "objectives?"
+    assert by_id["h2.1"].score == 2.0 - 3.0 + 3.0
+    assert "h1" not in by_id
+    # Некорректный regex отбрасывается при компиляции
+    assert [pattern for pattern, _ in signals.regex] == ["objectives?", "study"]
+
+
+def test_capture_block_uses_next_heading_of_same_or_higher_level():
+    anchors = _document()
+    service = SectionMappingService(db=None)  # type: ignore[arg-type]
+    index = service._build_document_outline(anchors).index
+    heading = anchors[2]
+
+    end = index.block_end_para_index(heading, 1)
+
+    assert end == 5
+    assert [a.anchor_id for a in index.capture_block(2, end)] == ["h2", "h2.1", "p2"]
+    # Последний блок открыт до конца документа; anchors без para_index в него не попадают
+    assert [a.anchor_id for a in index.capture_block(5, None)] == ["h3", "p3"]
+
+
+@pytest.mark.asyncio
+async def test_find_heading_candidate_reuses_compiled_signals(monkeypatch):
+    service = SectionMappingService(db=None)  # type: ignore[arg-type]
+    anchors = _document()
+    outline = service._build_document_outline(anchors)
+    contract = _contract(["objectives"], [r"study\s+objectives"])
+
+    calls = 0
+    original = service._get_effective_signals
+
+    def _counting(**kwargs):
+        nonlocal calls
+        calls += 1
+        return original(**kwargs)
+
+    monkeypatch.setattr(service, "_get_effective_signals", _counting)
+
+    first = await service._find_heading_candidate(contract, outline, anchors, DocumentLanguage.EN)
+    second = await service._find_heading_candidate(contract, outline, anchors, DocumentLanguage.EN)
+
+    assert first is not None and first.anchor_id == "h2"
+    assert second.anchor_id == "h2"
+    assert first.score == 5.0
+    assert calls == 1
+
+    # Изменение recipe in-place (как делают сиды) инвалидирует кэш
+    contract.retrieval_recipe_json["heading_match"]["must"] = ["design"]
+    contract.retrieval_recipe_json["regex"]["heading"] = [r"study\s+design"]
+    third = await service._find_heading_candidate(contract, outline, anchors, DocumentLanguage.EN)
+    assert third.anchor_id == "h3"
+    assert calls == 2
+
+
+def test_contract_signals_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(section_mapping, "CONTRACT_SIGNALS_CACHE_SIZE", 2)
+    monkeypatch.setattr(section_mapping, "_contract_signals_cache", section_mapping.OrderedDict())
+    service = SectionMappingService(db=None)  # type: ignore[arg-type]
+
+    for _ in range(3):
+        service._get_contract_signals(_contract(["objectives"]), DocumentLanguage.EN)
+
+    assert len(section_mapping._contract_signals_cache) == 2
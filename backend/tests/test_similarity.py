@@ -0,0 +1,109 @@
+"""
+Тесты векторизованного косинусного сходства (app.services.similarity) и матрицы блоки × топики.
+"""
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pytest
+
+from app.db.enums import DocumentLanguage, SourceZone
+from app.services.heading_block_builder import HeadingBlock
+from app.services.similarity import cosine_similarity, cosine_similarity_matrix, mismatched_dimensions
+from app.services.topic_mapping import TopicMappingService
+from app.services.topic_registry import CompiledTopicProfile
+
+
+def _reference_cosine(vec_a: list[float], vec_b: list[float]) -> float:
+    if len(vec_a) != len(vec_b):
+        return 0.0
+    norm_a = math.sqrt(sum(a * a for a in vec_a))
+    norm_b = math.sqrt(sum(b * b for b in vec_b))
+    if norm_a == 0.0 or norm_b == 0.0:
+        return 0.0
+    return sum(a * b for a, b in zip(vec_a, vec_b)) / (norm_a * norm_b)
+
+
+def test_matrix_matches_pairwise_cosine_with_mixed_dimensions():
+    rng = np.random.default_rng(7)
+    vectors_a = [rng.normal(size=8).tolist() for _ in range(4)] + [rng.normal(size=3).tolist(), [0.0] * 8]
+    vectors_b = [rng.normal(size=8).tolist() for _ in range(3)] + [rng.normal(size=5).tolist()]
+
+    matrix = cosine_similarity_matrix(vectors_a, vectors_b)
+
+    assert matrix.shape == (6, 4) and matrix.dtype == np.float32
+    for i, vec_a in enumerate(vectors_a):
+        for j, vec_b in enumerate(vectors_b):
+            assert matrix[i, j] == pytest.approx(_reference_cosine(vec_a, vec_b), abs=1e-6)
+    assert mismatched_dimensions(vectors_a, vectors_b) == {(5, 8), (3, 8), (3, 5)}
+
+
+def test_clip_and_empty_inputs():
+    assert cosine_similarity([1.0, 0.0], [-1.0, 0.0]) == pytest.approx(-1.0)
+    assert cosine_similarity([1.0, 0.0], [-1.0, 0.0], clip=True) == 0.0
+    assert cosine_similarity([1.0, 2.0], [1.0, 2.0, 3.0]) == 0.0
+    assert cosine_similarity_matrix([], [[1.0]]).shape == (0, 1)
+
+
+def _block(block_id: str, heading: str) -> HeadingBlock:
+    return HeadingBlock(
+        heading_block_id=block_id,
+        heading_anchor_id=f"{block_id}-h",
+        content_anchor_ids=[],
+        section_path=heading,
+        source_zone=SourceZone.UNKNOWN,
+        text_preview="",
+        heading_text=heading,
+        language=DocumentLanguage.EN,
+    )
+
+
+def _topic(topic_key: str, embedding: list[float] | None) -> CompiledTopicProfile:
+    return CompiledTopicProfile(
+        topic_key=topic_key,
+        title_ru=None,
+        topic_embedding=embedding,
+        profile={},
+        aliases_ru=(),
+        aliases_en=(),
+        keywords_ru=(),
+        keywords_en=(),
+        title_words_ru=(),
+        title_ru_norm=None,
+        exclude_ru=(),
+        exclude_en=(),
+        source_zones=frozenset(),
+        dissimilar_zones=frozenset(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_topic_mapping_embeds_each_block_once():
+    service = TopicMappingService.__new__(TopicMappingService)
+    embeddings = {"Design.": [1.0, 0.0], "Safety.": [0.6, 0.8], "Broken.": None}
+    calls: list[str] = []
+
+    async def _generate_embedding(text: str) -> list[float] | None:
+        calls.append(text)
+        return embeddings[text]
+
+    service._generate_embedding = _generate_embedding  # type: ignore[method-assign]
+    blocks = [_block("b1", "Design"), _block("b2", "Safety"), _block("b3", "Broken")]
+    topics = [
+        _topic("design", [1.0, 0.0]),
+        _topic("no_embedding", None),
+        _topic("legacy", [1.0, 0.0, 0.0]),
+        _topic("opposite", [-1.0, 0.0]),
+    ]
+
+    scores = await service._embedding_similarity_matrix(blocks, topics, {})
+
+    assert calls == ["Design.", "Safety.", "Broken."]
+    assert scores.shape == (3, 4)
+    np.testing.assert_allclose(
+        scores,
+        [[1.0, 0.0, 0.0, 0.0], [0.6, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 0.0]],
+        atol=1e-6,
+    )
+    assert service._dimension_warnings == {(2, 3)}
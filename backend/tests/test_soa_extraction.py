@@ -26,6 +26,8 @@ from app.db.models.auth import Workspace
 from app.db.models.facts import Fact, FactEvidence
 from app.db.models.studies import Document, DocumentVersion, Study
 from app.services.ingestion import IngestionService
+from app.services.ingestion.parsed_docx import ParsedDocx
+from app.services.soa_extraction import SoAExtractionService
 
 
 class TestSoAExtraction:
@@ -482,3 +484,37 @@ class TestSoAExtraction:
         # Количество фактов должно быть таким же (пересозданы)
         assert facts_count_2 == facts_count_1
 
+
+
+def test_parsed_docx_table_contexts_match_full_scan(tmp_path: Path):
+    """Контексты таблиц из ParsedDocx совпадают с полным сканированием документа."""
+    doc = DocxDocument()
+    doc.add_paragraph("Introduction", style="Heading 1")
+    doc.add_paragraph("Some intro text")
+    doc.add_table(rows=2, cols=2)
+    doc.add_paragraph("Study Design", style="Heading 1")
+    doc.add_paragraph("Schedule of Activities", style="Heading 2")
+    for i in range(8):
+        doc.add_paragraph(f"Paragraph {i}")
+    doc.add_table(rows=2, cols=2)
+    doc.add_paragraph("Appendix", style="Heading 1")
+    doc.add_table(rows=2, cols=2)
+    path = tmp_path / "contexts.docx"
+    doc.save(str(path))
+
+    parsed = ParsedDocx.load(path)
+    service = SoAExtractionService(db=None)  # type: ignore[arg-type]
+
+    # Без ParsedDocx сервис сканирует документ с начала для каждой таблицы
+    expected = [
+        service._get_context_for_table(parsed.doc, i) for i in range(len(parsed.tables))
+    ]
+    service._parsed = parsed
+    actual = [
+        service._get_context_for_table(parsed.doc, i) for i in range(len(parsed.tables))
+    ]
+
+    assert len(expected) == 3
+    assert actual == expected
+    assert expected[1][0] == "Study Design / Schedule of Activities"
+    assert parsed.heading_stack == [(1, "Appendix")]
@@ -5,6 +5,7 @@ from pathlib import Path
 
 import pytest
 
+from app.db.enums import DocumentType
 from app.services.source_zone_classifier import SourceZoneClassifier, SourceZoneResult
 
 
@@ -292,3 +293,37 @@ class TestSourceZoneClassifier:
         ]
         assert all(r.zone == "ip_handling" for r in results_ip)
 
+
+
+class TestSourceZoneClassifierMemo:
+    """Тесты мемоизации и пакетной классификации."""
+
+    def test_memo_matches_uncached_classification(self, classifier: SourceZoneClassifier) -> None:
+        """Повторная классификация берётся из кэша и совпадает с первой."""
+        first = classifier.classify(DocumentType.PROTOCOL, "Study Design/Randomization", "Randomization", "en")
+        again = classifier.classify(DocumentType.PROTOCOL, ["Study Design", "Randomization"], "Randomization", "en")
+        assert again is first
+        assert first.zone != "unknown"
+        assert classifier._classify_cached.cache_info().hits == 1
+
+        # Кэш результата не подменяет разные heading_text
+        other = classifier.classify(DocumentType.PROTOCOL, "Study Design/Randomization", "Adverse Events", "en")
+        assert other is not first
+
+    def test_classify_many_reuses_parent_prefixes(self, classifier: SourceZoneClassifier) -> None:
+        """Дочерние пути дополняют совпадения родительского префикса."""
+        items = [
+            ("Study Design", None),
+            ("Study Design/Randomization", None),
+            ("Study Design/Randomization", None),
+            ("Study Design/Randomization/Stratification", None),
+            ("ROOT", None),
+        ]
+        results = classifier.classify_many(DocumentType.PROTOCOL, items)
+
+        assert len(results) == len(items)
+        assert results[1] is results[2]
+        assert results[4].zone == "unknown"
+        assert results == [classifier.classify(DocumentType.PROTOCOL, path, heading) for path, heading in items]
+        # Каждый сегмент сопоставлен с паттернами один раз
+        assert classifier._segment_matches.cache_info().misses == 3
@@ -0,0 +1,181 @@
+"""
+Тесты для предзагрузки данных в TopicMappingService: число SQL-запросов
+не должно зависеть от количества блоков и топиков.
+"""
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.enums import (
+    AnchorContentType,
+    DocumentLanguage,
+    DocumentLifecycleStatus,
+    DocumentType,
+    IngestionStatus,
+    SourceZone,
+    StudyStatus,
+)
+from app.db.models.anchors import Anchor
+from app.db.models.auth import Workspace
+from app.db.models.studies import Document, DocumentVersion, Study
+from app.db.models.topics import Topic, TopicZonePrior
+from app.services.heading_block_builder import HeadingBlock
+from app.services.topic_mapping import TopicMappingService
+from app.services.topic_registry import get_topic_registry
+
+_SECTIONS = [
+    ("Study Design", "This is a randomized study. Patients receive placebo! Follow-up lasts 12 weeks."),
+    ("Objectives", "The primary objective is safety. Secondary objectives include efficacy."),
+    ("Inclusion Criteria", "Adults aged 18 to 65. Signed informed consent."),
+    ("Adverse Events", "All adverse events are recorded. Serious events are reported within 24 hours."),
+]
+
+
+async def _create_version(db: AsyncSession, workspace: Workspace, sections: int) -> DocumentVersion:
+    """Создает версию протокола: на каждую секцию заголовок и три параграфа."""
+    study = Study(
+        workspace_id=workspace.id,
+        study_code=f"TM-{sections}",
+        title="Topic Mapping Study",
+        status=StudyStatus.ACTIVE,
+    )
+    db.add(study)
+    await db.flush()
+    document = Document(
+        workspace_id=workspace.id,
+        study_id=study.id,
+        doc_type=DocumentType.PROTOCOL,
+        title="Protocol",
+        lifecycle_status=DocumentLifecycleStatus.DRAFT,
+    )
+    db.add(document)
+    await db.flush()
+    version = DocumentVersion(
+        document_id=document.id,
+        version_label="v1.0",
+        source_file_uri="file:///test/protocol.docx",
+        source_sha256="abc123",
+        effective_date=date.today(),
+        ingestion_status=IngestionStatus.READY,
+        document_language=DocumentLanguage.EN,
+    )
+    db.add(version)
+    await db.flush()
+
+    ordinal = 0
+    for s in range(sections):
+        heading, body = _SECTIONS[s % len(_SECTIONS)]
+        section_path = f"{s + 1} {heading}"
+        items = [(AnchorContentType.HDR, heading)] + [
+            (AnchorContentType.P, sentence.strip() + ".") for sentence in body.split(".") if sentence.strip()
+        ][:3]
+        for content_type, text in items:
+            ordinal += 1
+            db.add(
+                Anchor(
+                    doc_version_id=version.id,
+                    anchor_id=f"{version.id}:{content_type.value}:{ordinal}",
+                    section_path=section_path,
+                    content_type=content_type,
+                    ordinal=ordinal,
+                    text_raw=text,
+                    text_norm=text,
+                    text_hash=f"h{ordinal}",
+                    location_json={"para_index": ordinal},
+                    language=DocumentLanguage.EN,
+                )
+            )
+    await db.commit()
+    return version
+
+
+async def _create_topics(db: AsyncSession, workspace: Workspace, count: int) -> None:
+    keys = [f"topic_{i}" for i in range(count)]
+    for i, key in enumerate(keys):
+        heading, _ = _SECTIONS[i % len(_SECTIONS)]
+        db.add(
+            Topic(
+                workspace_id=workspace.id,
+                topic_key=key,
+                title_en=heading,
+                topic_profile_json={
+                    "aliases_en": [heading],
+                    "profiles_by_doc_type": {"protocol": {"headings_en": [heading.lower()]}},
+                },
+                applicable_to_json=["protocol"],
+                is_active=True,
+            )
+        )
+        db.add(TopicZonePrior(topic_key=key, doc_type=DocumentType.PROTOCOL, zone_key="design", weight=0.5))
+    await db.commit()
+
+
+async def _count_mapping_queries(db: AsyncSession, version: DocumentVersion) -> tuple[int, int]:
+    # Холодный реестр топиков: считаем запросы полной загрузки профилей
+    get_topic_registry().clear()
+    statements: list[str] = []
+
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", _on_execute)
+    try:
+        _, metrics = await TopicMappingService(db).map_topics_for_doc_version(
+            version.id, apply=False
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", _on_execute)
+    return len(statements), metrics.blocks_total
+
+
+@pytest.mark.asyncio
+async def test_mapping_query_count_does_not_grow_with_blocks(db: AsyncSession, monkeypatch):
+    """Zone priors, anchors и профили загружаются set-based запросами, а не на каждый блок/топик."""
+    monkeypatch.setattr(settings, "topic_mapping_use_clustering", False)
+    monkeypatch.setattr(settings, "llm_provider", None)
+
+    workspace = Workspace(name="Topic Mapping Workspace")
+    db.add(workspace)
+    await db.commit()
+    await _create_topics(db, workspace, 6)
+
+    small = await _create_version(db, workspace, sections=2)
+    large = await _create_version(db, workspace, sections=12)
+
+    small_queries, small_blocks = await _count_mapping_queries(db, small)
+    large_queries, large_blocks = await _count_mapping_queries(db, large)
+
+    assert (small_blocks, large_blocks) == (2, 12)
+    assert large_queries == small_queries
+    assert large_queries <= 8
+
+
+def test_first_two_sentences_follow_content_order():
+    """Первые два предложения берутся из предзагруженных anchors в порядке блока."""
+    service = TopicMappingService.__new__(TopicMappingService)
+    anchors = {
+        f"a{i}": Anchor(anchor_id=f"a{i}", text_raw=text)
+        for i, text in enumerate(["First sentence. Second", "part! Third sentence.", "Unused"])
+    }
+    block = HeadingBlock(
+        heading_block_id="b1",
+        heading_anchor_id="h1",
+        content_anchor_ids=["a1", "a0", "missing", "a2"],
+        section_path="1 Intro",
+        source_zone=SourceZone.UNKNOWN,
+        text_preview="",
+        heading_text="Intro",
+        language=DocumentLanguage.EN,
+    )
+
+    assert service._first_two_sentences(block, anchors) == "part Third sentence."
+    block.content_anchor_ids = ["a0", "a1"]
+    assert service._first_two_sentences(block, anchors) == "First sentence Second part."
+    block.content_anchor_ids = []
+    assert service._first_two_sentences(block, anchors) == ""
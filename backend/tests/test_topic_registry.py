@@ -0,0 +1,106 @@
+"""
+Тесты реестра скомпилированных профилей топиков (TopicRegistry).
+"""
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.enums import DocumentLanguage, DocumentType
+from app.db.models.auth import Workspace
+from app.db.models.topics import Topic, TopicZonePrior
+from app.services.topic_mapping import TopicMappingService
+from app.services.topic_registry import CompiledTopicProfile, TopicRegistry, build_effective_profile
+
+
+def _topic(**profile) -> SimpleNamespace:
+    return SimpleNamespace(
+        topic_key="study_design",
+        title_ru="Дизайн исследования",
+        topic_embedding=None,
+        topic_profile_json=profile,
+    )
+
+
+def test_effective_profile_merges_doc_type_lists_without_duplicates():
+    profile = build_effective_profile(
+        {
+            "aliases_en": ["Study Design", "Design"],
+            "source_zones": ["design"],
+            "profiles_by_doc_type": {"protocol": {"aliases_en": ["Design", "Trial Design"], "source_zones": ["overview"]}},
+        },
+        DocumentType.PROTOCOL,
+    )
+
+    assert profile["aliases_en"] == ["Study Design", "Design", "Trial Design"]
+    assert profile["source_zones"] == ["overview"]
+
+
+def test_compiled_profile_scores_like_raw_profile():
+    service = TopicMappingService.__new__(TopicMappingService)
+    compiled = CompiledTopicProfile.compile(
+        _topic(
+            aliases_ru=["Дизайн исследования"],
+            keywords_en=["randomized", "placebo"],
+            exclude_patterns_en=["Appendix"],
+            dissimilar_zones=["admin"],
+        ),
+        DocumentType.PROTOCOL,
+        {"design": 0.9},
+    )
+
+    ratio, signals = service._calculate_heading_match_score("дизайн исследования", compiled, DocumentLanguage.RU)
+    assert ratio == 1.0 and signals["matched_alias"] == "Дизайн исследования"
+
+    score, kw_signals = service._calculate_text_keywords_score(
+        "study design a randomized trial", compiled, DocumentLanguage.EN
+    )
+    assert kw_signals["matched_keywords"] == ["randomized"]
+    assert score == pytest.approx(0.4)
+
+    # Без keywords для RU используется fallback по словам title_ru
+    _, ru_signals = service._calculate_text_keywords_score("дизайн", compiled, DocumentLanguage.RU)
+    assert ru_signals["matched_keywords"] == ["дизайн"]
+
+    assert service._check_exclude_patterns("appendix 1 design", compiled, DocumentLanguage.EN)
+    assert not service._check_exclude_patterns("appendix 1 design", compiled, DocumentLanguage.RU)
+    assert compiled.zone_priors == {"design": 0.9}
+    assert compiled.dissimilar_zones == frozenset({"admin"})
+
+
+@pytest.mark.asyncio
+async def test_registry_recompiles_only_after_catalog_changes(db: AsyncSession):
+    workspace = Workspace(name="Topic Registry Workspace")
+    db.add(workspace)
+    await db.commit()
+    db.add(
+        Topic(
+            workspace_id=workspace.id,
+            topic_key="study_design",
+            topic_profile_json={"aliases_en": ["Study Design"]},
+            applicable_to_json=["protocol"],
+            is_active=True,
+        )
+    )
+    db.add(TopicZonePrior(topic_key="study_design", doc_type=DocumentType.PROTOCOL, zone_key="design", weight=0.8))
+    await db.commit()
+
+    registry = TopicRegistry()
+    topics, _ = await registry.get_topics(db, workspace.id, DocumentType.PROTOCOL)
+    again, _ = await registry.get_topics(db, workspace.id, DocumentType.PROTOCOL)
+
+    assert again is topics
+    assert registry.compilations == 1
+    assert topics[0].zone_priors == {"design": 0.8}
+
+    prior = (await db.execute(TopicZonePrior.__table__.select())).first()
+    await db.execute(
+        TopicZonePrior.__table__.update().where(TopicZonePrior.id == prior.id).values(weight=0.1)
+    )
+    await db.commit()
+
+    updated, _ = await registry.get_topics(db, workspace.id, DocumentType.PROTOCOL)
+    assert registry.compilations == 2
+    assert updated[0].zone_priors == {"design": 0.1}
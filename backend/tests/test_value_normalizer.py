@@ -0,0 +1,140 @@
+"""
+Тесты для ValueNormalizer: конкурентная и пакетная LLM-нормализация значений фактов.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.core.config import LLMProvider, settings
+from app.db.enums import FactStatus
+from app.services import value_normalizer as value_normalizer_module
+from app.services.fact_extraction_rules import ExtractedFactCandidate
+from app.services.llm_client import LLMClient
+from app.services.llm_transport import LLMTransport
+from app.services.value_normalizer import ValueNormalizer
+
+# Сложные значения (длиннее 50 символов) — всегда идут в LLM
+SPONSOR = "Pharma Research Laboratories International Holding Company Ltd."
+TITLE = "A Randomized, Double-Blind, Placebo-Controlled Study of Drug X in Adults"
+
+
+def _candidate(fact_key: str, value: str) -> ExtractedFactCandidate:
+    return ExtractedFactCandidate(
+        fact_type="protocol_meta",
+        fact_key=fact_key,
+        value_json={"value": value},
+        raw_value=value,
+        confidence=0.9,
+        evidence_anchor_ids=[],
+        extractor_version=1,
+    )
+
+
+def _chat_response(payload: dict) -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(payload)}}]})
+
+
+@pytest.fixture
+def normalizer_with_llm(monkeypatch):
+    """ValueNormalizer с LLM-клиентом, запросы которого обрабатывает handler теста."""
+
+    def factory(handler) -> ValueNormalizer:
+        transport = LLMTransport(
+            http_transport=httpx.MockTransport(handler), rate_limits_rps={}, backoff_sec=0.0
+        )
+        monkeypatch.setattr(value_normalizer_module, "get_llm_transport", lambda: transport)
+        normalizer = ValueNormalizer()
+        normalizer.llm_client = LLMClient(
+            provider=LLMProvider.OPENAI_COMPATIBLE,
+            base_url="http://llm.local",
+            api_key="key",
+            model="m",
+        )
+        return normalizer
+
+    return factory
+
+
+@pytest.mark.asyncio
+async def test_normalize_values_runs_candidates_concurrently(normalizer_with_llm, monkeypatch):
+    """Кандидаты нормализуются параллельно, но не больше value_normalization_concurrency запросов."""
+    monkeypatch.setattr(settings, "value_normalization_concurrency", 3)
+    monkeypatch.setattr(settings, "value_normalization_batch_size", 1)
+    state = {"active": 0, "peak": 0, "calls": 0}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        state["active"] += 1
+        state["calls"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(0.01)
+        state["active"] -= 1
+        return _chat_response({"value": SPONSOR})
+
+    normalizer = normalizer_with_llm(handler)
+    items = [(_candidate("sponsor_name", SPONSOR), SPONSOR) for _ in range(8)]
+    items.append((_candidate("protocol_version", "3"), "Protocol version 3"))
+
+    results = await normalizer.normalize_values(items)
+
+    assert state["calls"] == 8  # простое значение в LLM не отправляется
+    assert state["peak"] == 3
+    assert [r.status for r in results[:8]] == [FactStatus.VALIDATED] * 8
+    assert results[8].status == FactStatus.EXTRACTED
+    assert results[8].llm_value is None
+
+
+@pytest.mark.asyncio
+async def test_batched_prompt_keeps_per_candidate_statuses(normalizer_with_llm, monkeypatch):
+    """Несколько кандидатов в одном промпте; статусы такие же, как при отдельных запросах."""
+    monkeypatch.setattr(settings, "value_normalization_batch_size", 5)
+    requests: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append(body)
+        if "results" in body["messages"][0]["content"]:
+            # Ответ на батч: для id=3 значения нет — он повторяется отдельным запросом
+            return _chat_response(
+                {"results": [{"id": 1, "value": SPONSOR}, {"id": 2, "value": "Another Title Entirely"}]}
+            )
+        return _chat_response({"value": ""})
+
+    normalizer = normalizer_with_llm(handler)
+    items = [
+        (_candidate("sponsor_name", SPONSOR), SPONSOR),
+        (_candidate("study_title", TITLE), TITLE),
+        (_candidate("sponsor_name", SPONSOR), SPONSOR),
+    ]
+
+    results = await normalizer.normalize_values(items)
+
+    assert len(requests) == 2
+    assert [r.status for r in results] == [
+        FactStatus.VALIDATED,
+        FactStatus.CONFLICTING,
+        FactStatus.EXTRACTED,
+    ]
+    assert results[1].llm_value == {"value": "Another Title Entirely"}
+    assert results[1].llm_confidence == 0.85
+    assert results[2].normalized_value == {"value": SPONSOR}
+
+
+@pytest.mark.asyncio
+async def test_batch_error_falls_back_to_regex_values(normalizer_with_llm, monkeypatch):
+    """Ошибка батч-запроса не меняет значения: кандидаты остаются со статусом extracted."""
+    monkeypatch.setattr(settings, "value_normalization_batch_size", 5)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(500, json={"error": "boom"})
+
+    normalizer = normalizer_with_llm(handler)
+    items = [(_candidate("sponsor_name", SPONSOR), SPONSOR), (_candidate("study_title", TITLE), TITLE)]
+
+    results = await normalizer.normalize_values(items)
+
+    assert [r.status for r in results] == [FactStatus.EXTRACTED, FactStatus.EXTRACTED]
+    assert [r.normalized_value for r in results] == [{"value": SPONSOR}, {"value": TITLE}]
@@ -22,7 +22,13 @@
 Опция --resume:
   Позволяет пропускать уже обработанные файлы (проверка по SHA256 в базе данных)
   и начинать обработку с первого необработанного файла. Полезно при прерывании
-  массовой обработки - можно продолжить с места остановки.
+  массовой обработки - можно продолжить с места остановки. Строки benchmark_summary.csv
+  дописываются к отчёту прерванного запуска.
+
+Опция --workers:
+  Количество исследований, обрабатываемых параллельно (по умолчанию 1). Версии одного
+  исследования всегда обрабатываются последовательно (порядок важен для выравнивания
+  якорей). Строка benchmark_summary.csv пишется сразу после обработки версии.
 """
 
 import argparse
@@ -31,7 +37,9 @@ import hashlib
 import json
 import os
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Set, Tuple
@@ -49,12 +57,50 @@ except ImportError:
 
 ALLOWED_EXTENSIONS = {".docx", ".pdf", ".xlsx"}
 
+BENCHMARK_FIELDNAMES = [
+    "study_code",
+    "file_name",
+    "version",
+    "status",
+    "anchors_count",
+    "soa_confidence",
+    "matched_anchors",
+    "changed_anchors",
+    "topics_rate",
+    "facts_total",
+    "facts_validated",
+    "facts_conflicts",
+    "processing_time_sec",
+]
+
 
 class HTTPError(Exception):
     """Исключение для HTTP ошибок."""
     pass
 
 
+class BenchmarkSummaryWriter:
+    """Построчная потокобезопасная запись benchmark_summary.csv (прогресс не теряется при прерывании)."""
+
+    def __init__(self, path: Path, append: bool = False) -> None:
+        ensure_dir(path.parent)
+        append = append and path.exists()
+        self._lock = threading.Lock()
+        self._file = open(path, "a" if append else "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=BENCHMARK_FIELDNAMES)
+        if not append:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            self._writer.writerow({k: row.get(k, "") for k in BENCHMARK_FIELDNAMES})
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
 def die(msg: str, code: int = 1) -> None:
     """Завершает выполнение с ошибкой."""
     print(f"ОШИБКА: {msg}", file=sys.stderr)
@@ -72,22 +118,44 @@ def http_json(method: str, url: str, *, json_body: Any = None, params: Dict[str,
     if json_body is not None:
         headers["Content-Type"] = "application/json"
     r = requests.request(method, url, headers=headers, json=json_body, params=params, timeout=timeout)
-    if r.status_code >= 400:
-        try:
-            body = r.json()
-            error_msg = json.dumps(body, indent=2, ensure_ascii=False)
-        except Exception:
-            error_msg = r.text
-        error_text = f"{method} {url} -> {r.status_code}\n{error_msg}"
-        if raise_on_error:
-            die(error_text)
-        else:
-            raise HTTPError(error_text)
+    _check_response(method, url, r, raise_on_error)
     if r.text.strip() == "":
         return None
     return r.json()
 
 
+def _check_response(method: str, url: str, r: requests.Response, raise_on_error: bool) -> None:
+    """Завершает скрипт (или бросает HTTPError) при ответе с ошибкой."""
+    if r.status_code < 400:
+        return
+    try:
+        body = r.json()
+        error_msg = json.dumps(body, indent=2, ensure_ascii=False)
+    except Exception:
+        error_msg = r.text
+    error_text = f"{method} {url} -> {r.status_code}\n{error_msg}"
+    if raise_on_error:
+        die(error_text)
+    else:
+        raise HTTPError(error_text)
+
+
+def http_json_pages(url: str, *, params: Dict[str, Any] | None = None, page_size: int = 5000, timeout: int = 30, raise_on_error: bool = True) -> List[Any]:
+    """GET списочного endpoint с keyset-пагинацией: собирает все страницы по заголовку X-Next-Cursor."""
+    items: List[Any] = []
+    cursor: str | None = None
+    while True:
+        page_params = {**(params or {}), "limit": page_size}
+        if cursor:
+            page_params["cursor"] = cursor
+        r = requests.get(url, headers={"Accept": "application/json"}, params=page_params, timeout=timeout)
+        _check_response("GET", url, r, raise_on_error)
+        items.extend(r.json() or [])
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return items
+
+
 def upload_file(api_base: str, version_id: str, file_path: Path) -> Dict[str, Any]:
     """Загружает файл для версии документа."""
     url = f"{api_base}/api/document-versions/{version_id}/upload"
@@ -305,7 +373,7 @@ def save_benchmark_artifacts(
     topics_path = target_dir / f"v{version_number}_topics.json"
     
     # Скачиваем факты и обогащаем их found_in_preferred_topic
-    facts_data = http_json("GET", f"{api_base}/api/studies/{study_id}/facts", timeout=120, raise_on_error=False)
+    facts_data = http_json_pages(f"{api_base}/api/studies/{study_id}/facts", timeout=120, raise_on_error=False)
     if facts_data:
         # Добавляем found_in_preferred_topic из meta_json
         for fact in facts_data:
@@ -810,6 +878,7 @@ def process_study(
     workspace_id: str,
     ingestion_timeout: int,
     project_root: Path,
+    benchmark_writer: Optional[BenchmarkSummaryWriter] = None,
 ) -> List[Dict[str, Any]]:
     """Обрабатывает файлы одного исследования последовательно (версии в порядке mtime)."""
     print(f"\n{'='*80}")
@@ -890,6 +959,8 @@ def process_study(
                 "stats": stats,
             }
         )
+        if benchmark_writer is not None:
+            benchmark_writer.write(study_results[-1])
     
     return study_results
 
@@ -972,6 +1043,12 @@ def main() -> None:
         action="store_true",
         help="Пропускать уже обработанные файлы (проверка по SHA256 в базе данных) и начинать с первого необработанного"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Количество исследований, обрабатываемых параллельно (по умолчанию: 1)"
+    )
     parser.add_argument(
         "--max-studies",
         type=int,
@@ -985,6 +1062,8 @@ def main() -> None:
     )
     
     args = parser.parse_args()
+    if args.workers < 1:
+        die(f"--workers должен быть >= 1: {args.workers}")
     
     api_base = args.api.rstrip("/")
     
@@ -1046,43 +1125,36 @@ def main() -> None:
     
     all_rows: List[Dict[str, Any]] = []
     
-    for study_code, files in study_items:
-        try:
-            rows = process_study(
-                study_code,
-                files,
-                api_base,
-                workspace_id,
-                args.timeout,
-                project_root,
-            )
-            all_rows.extend(rows)
-        except Exception as e:
-            print(f"✗ Ошибка при обработке исследования {study_code}: {e}")
-    
-    # Запись расширенного отчёта
+    # Расширенный отчёт пишется построчно по мере обработки версий
     summary_path = project_root / "benchmark_summary.csv"
-    ensure_dir(summary_path.parent)
-    fieldnames = [
-        "study_code",
-        "file_name",
-        "version",
-        "status",
-        "anchors_count",
-        "soa_confidence",
-        "matched_anchors",
-        "changed_anchors",
-        "topics_rate",
-        "facts_total",
-        "facts_validated",
-        "facts_conflicts",
-        "processing_time_sec",
-    ]
-    with open(summary_path, "w", encoding="utf-8", newline="") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in all_rows:
-            writer.writerow({k: row.get(k, "") for k in fieldnames})
+    benchmark_writer = BenchmarkSummaryWriter(summary_path, append=args.resume)
+    campaign_start = time.time()
+    
+    try:
+        # Исследования обрабатываются параллельно (версии внутри исследования — последовательно);
+        # HTTP-вызовы и ожидание статуса блокирующие, поэтому пул потоков
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            futures = {
+                executor.submit(
+                    process_study,
+                    study_code,
+                    files,
+                    api_base,
+                    workspace_id,
+                    args.timeout,
+                    project_root,
+                    benchmark_writer,
+                ): study_code
+                for study_code, files in study_items
+            }
+            for future in as_completed(futures):
+                try:
+                    all_rows.extend(future.result())
+                except Exception as e:
+                    print(f"✗ Ошибка при обработке исследования {futures[future]}: {e}")
+    finally:
+        benchmark_writer.close()
+    wall_time_sec = round(time.time() - campaign_start, 2)
     
     total_versions = len(all_rows)
     successful = sum(1 for r in all_rows if r.get("success"))
@@ -1095,6 +1167,7 @@ def main() -> None:
     print(f"Всего версий: {total_versions}")
     print(f"Успешно (ready/needs_review): {successful}")
     print(f"С ошибками: {failed}")
+    print(f"Общее время: {wall_time_sec} сек (workers: {args.workers})")
     print(f"CSV отчёт: {summary_path}")
     
     if all_rows:
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Микробенчмарк матчера правил извлечения фактов.
+
+Сравнивает наивный обход "правило × anchor × паттерн" (как в FactExtractionService
+до появления fact_extraction_matcher) со скомпилированным набором правил:
+однократное сканирование anchor префильтром литералов + полный regex только
+для правил-кандидатов. Проверяет, что найденные совпадения идентичны.
+
+Тексты берутся из параграфов DOCX (--docx) или генерируются синтетически.
+
+Примеры использования:
+  python scripts/bench_fact_extraction_matcher.py
+  python scripts/bench_fact_extraction_matcher.py --docx protocol.docx --repeat 5
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+# Добавляем backend в путь для импортов
+backend_dir = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(backend_dir))
+
+from app.services.fact_extraction_matcher import CompiledRuleSet  # noqa: E402
+from app.services.fact_extraction_rules import get_extraction_rules  # noqa: E402
+
+FACT_SENTENCES = [
+    "Версия протокола: 2.1 от 10.06.2024",
+    "Protocol Version: 4.0; Protocol date: 12 April 2010",
+    "Спонсор: ООО «Фармсинтез»",
+    "Рандомизированное двойное слепое плацебо-контролируемое исследование II фазы",
+    "Всего 120 пациентов будет включено в исследование",
+    "Соотношение рандомизации 2:1",
+    "Период отмывания составит 7 дней.",
+]
+
+FILLER_SENTENCES = [
+    "Исследователь должен обеспечить сохранность первичной документации.",
+    "Нежелательные явления регистрируются на протяжении всего периода наблюдения.",
+    "Образцы крови отбираются в соответствии с графиком процедур.",
+    "The investigator will review the laboratory results at each visit.",
+    "Adverse events will be coded using the current MedDRA version.",
+    "Данные вносятся в электронную индивидуальную регистрационную карту.",
+]
+
+
+def load_texts(docx_path: str | None, count: int, seed: int) -> list[str]:
+    """Тексты anchors: параграфы DOCX или синтетический корпус (~5% "фактовых" предложений)."""
+    if docx_path:
+        from app.services.ingestion.parsed_docx import ParsedDocx
+
+        parsed = ParsedDocx.load(docx_path)
+        return [p.text_raw for p in parsed.paragraphs if p.text_norm]
+
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        pool = FACT_SENTENCES if rng.random() < 0.05 else FILLER_SENTENCES
+        texts.append(" ".join(rng.choice(pool) for _ in range(rng.randint(1, 4))))
+    return texts
+
+
+def naive_matches(compiled: CompiledRuleSet, texts: list[str]) -> list[tuple[int, int, int]]:
+    """Наивный обход: каждый паттерн каждого правила на каждом тексте."""
+    found = []
+    for rule_index, entries in enumerate(compiled.rule_patterns):
+        for anchor_index, text in enumerate(texts):
+            for pid, pattern in entries:
+                match = pattern.search(text)
+                if match:
+                    found.append((rule_index, anchor_index, pid))
+    return found
+
+
+def compiled_matches(compiled: CompiledRuleSet, texts: list[str]) -> list[tuple[int, int, int]]:
+    """Скомпилированный обход: одно сканирование anchor + regex только кандидатов."""
+    found = []
+    scan = compiled.scan(texts)
+    for rule_index, entries in enumerate(compiled.rule_patterns):
+        for anchor_index in compiled.anchors_for_rule(rule_index, scan):
+            text = scan.texts[anchor_index]
+            candidates = scan.candidates[anchor_index]
+            for pid, pattern in entries:
+                if pid in candidates or pid in compiled.unfiltered:
+                    match = pattern.search(text)
+                    if match:
+                        found.append((rule_index, anchor_index, pid))
+    return found
+
+
+def best_of(func, repeat: int) -> tuple[float, list]:
+    best = float("inf")
+    result: list = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк матчера правил извлечения фактов")
+    parser.add_argument("--docx", default=None, help="DOCX, параграфы которого используются как anchors")
+    parser.add_argument("--anchors", type=int, default=5000, help="Число синтетических anchors")
+    parser.add_argument("--repeat", type=int, default=3, help="Число прогонов (берётся лучший)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rules = get_extraction_rules()
+    start = time.perf_counter()
+    compiled = CompiledRuleSet(rules)
+    compile_time = time.perf_counter() - start
+
+    texts = load_texts(args.docx, args.anchors, args.seed)
+    print(
+        f"Правил: {len(rules)}, паттернов: {len(compiled.patterns)} "
+        f"(без префильтра: {len(compiled.unfiltered)}), литералов: {compiled.literal_count}, "
+        f"компиляция: {compile_time * 1000:.1f} мс"
+    )
+    print(f"Anchors: {len(texts)}")
+
+    naive_time, naive = best_of(lambda: naive_matches(compiled, texts), args.repeat)
+    fast_time, fast = best_of(lambda: compiled_matches(compiled, texts), args.repeat)
+
+    if sorted(naive) != sorted(fast):
+        print("ОШИБКА: результаты наивного и скомпилированного обхода различаются")
+        sys.exit(1)
+
+    print(f"Совпадений: {len(naive)} (идентичны)")
+    print(f"Наивный обход:        {naive_time * 1000:8.1f} мс")
+    print(f"Скомпилированный:     {fast_time * 1000:8.1f} мс")
+    print(f"Ускорение:            {naive_time / fast_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк векторного поиска chunks (RetrievalService, pgvector HNSW).
+
+1. (опционально) Засевает БД синтетическими chunks: отдельный workspace с
+   --studies исследованиями и --versions версиями документов, embeddings —
+   тот же feature hashing v1, что и при ингестии. Запись — COPY (bulk_insert_chunks).
+2. Проверяет/создаёт индексы миграций (HNSW idx_chunks_embedding_hnsw, btree по
+   doc_version_id/study_id, STORAGE PLAIN для embedding) и выполняет ANALYZE.
+3. Выполняет --queries запросов в сценариях:
+   - global: без фильтров (HNSW);
+   - study:  фильтр по study_id (точный поиск по версиям исследования);
+   - zone:   фильтр по source_zone без ограничения по документам (HNSW + пост-фильтр).
+4. Печатает p50/p95/p99 латентности и recall@k относительно точного поиска
+   (на --recall-queries запросах; точный поиск по всей таблице медленный).
+
+Целевое значение: p95 < 50 мс. На 10M chunks (≈60 ГБ векторов + ≈30 ГБ HNSW)
+индекс должен помещаться в shared_buffers/page cache, иначе латентность
+определяется диском.
+
+Примеры использования:
+  python scripts/bench_retrieval.py --seed-chunks 100000
+  python scripts/bench_retrieval.py --seed-chunks 10000000 --versions 20000 --studies 500
+  python scripts/bench_retrieval.py --queries 500 --ef-search 80   # на уже засеянных данных
+  python scripts/bench_retrieval.py --cleanup
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import date
+from pathlib import Path
+from types import SimpleNamespace
+
+# Добавляем backend в путь для импортов
+backend_dir = Path(__file__).parent.parent / "backend"
+sys.path.insert(0, str(backend_dir))
+
+from sqlalchemy import delete, select, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.bulk_copy import bulk_insert_chunks  # noqa: E402
+from app.db.enums import (  # noqa: E402
+    DocumentLanguage,
+    DocumentLifecycleStatus,
+    DocumentType,
+    IngestionStatus,
+    SourceZone,
+    StudyStatus,
+)
+from app.db.models.anchors import Chunk  # noqa: E402
+from app.db.models.auth import Workspace  # noqa: E402
+from app.db.models.studies import Document, DocumentVersion, Study  # noqa: E402
+from app.services.chunking import _normalize_text, hash_embeddings_v1_batch  # noqa: E402
+from app.services.retrieval import RetrievalService, embed_query  # noqa: E402
+
+BENCH_WORKSPACE = "retrieval-benchmark"
+
+_CLINICAL_WORDS = (
+    "patients study dose visit screening baseline week treatment adverse events serious "
+    "randomization placebo arm endpoint survival efficacy safety laboratory ecg blood sample "
+    "informed consent inclusion exclusion criteria pharmacokinetics concentration analysis "
+    "population statistical hypothesis interim monitoring withdrawal discontinuation"
+).split()
+_VOCAB = _CLINICAL_WORDS + [f"term{i}" for i in range(5000)]
+_ZONES = [z for z in SourceZone if z != SourceZone.UNKNOWN]
+
+
+def _synthetic_text(rng: random.Random) -> str:
+    return " ".join(rng.choice(_VOCAB) for _ in range(rng.randint(20, 60)))
+
+
+async def _get_workspace(db: AsyncSession) -> Workspace | None:
+    result = await db.execute(select(Workspace).where(Workspace.name == BENCH_WORKSPACE))
+    return result.scalars().first()
+
+
+async def seed(db: AsyncSession, chunks: int, versions: int, studies: int, batch_size: int, seed_value: int) -> None:
+    """Засевает синтетические chunks (COPY, пачками по batch_size)."""
+    rng = random.Random(seed_value)
+    workspace = await _get_workspace(db) or Workspace(name=BENCH_WORKSPACE)
+    db.add(workspace)
+    await db.flush()
+
+    study_rows = [
+        Study(workspace_id=workspace.id, study_code=f"BENCH-{uuid.uuid4().hex[:8]}", title="bench", status=StudyStatus.ACTIVE)
+        for _ in range(studies)
+    ]
+    db.add_all(study_rows)
+    await db.flush()
+    version_ids = []
+    for i in range(versions):
+        study = study_rows[i % len(study_rows)]
+        document = Document(
+            workspace_id=workspace.id,
+            study_id=study.id,
+            doc_type=rng.choice([DocumentType.PROTOCOL, DocumentType.CSR, DocumentType.SAP]),
+            title=f"bench {i}",
+            lifecycle_status=DocumentLifecycleStatus.DRAFT,
+        )
+        db.add(document)
+        await db.flush()
+        version = DocumentVersion(
+            document_id=document.id,
+            version_label="v1",
+            source_file_uri="file:///bench",
+            source_sha256="bench",
+            effective_date=date.today(),
+            ingestion_status=IngestionStatus.READY,
+            document_language=DocumentLanguage.EN,
+        )
+        db.add(version)
+        await db.flush()
+        version_ids.append(version.id)
+    await db.commit()
+
+    started = time.perf_counter()
+    written = 0
+    while written < chunks:
+        size = min(batch_size, chunks - written)
+        texts = [_synthetic_text(rng) for _ in range(size)]
+        embeddings = hash_embeddings_v1_batch([_normalize_text(t) for t in texts])
+        rows = []
+        for i, (chunk_text, embedding) in enumerate(zip(texts, embeddings)):
+            doc_version_id = version_ids[(written + i) % len(version_ids)]
+            rows.append(
+                SimpleNamespace(
+                    doc_version_id=doc_version_id,
+                    chunk_id=f"{doc_version_id}:bench:{written + i}",
+                    section_path="bench",
+                    text=chunk_text,
+                    anchor_ids=[],
+                    embedding=embedding,
+                    source_zone=rng.choice(_ZONES),
+                    language=DocumentLanguage.EN,
+                    metadata_json=None,
+                )
+            )
+        await bulk_insert_chunks(db, rows)
+        await db.commit()
+        written += size
+        rate = written / (time.perf_counter() - started)
+        print(f"  засеяно {written}/{chunks} chunks ({rate:.0f}/с)", flush=True)
+
+
+async def prepare_schema(db: AsyncSession) -> None:
+    """Идемпотентно повторяет DDL миграций 0007/0026 (для БД, созданной через create_all)."""
+    await db.execute(text("ALTER TABLE chunks ALTER COLUMN embedding SET STORAGE PLAIN"))
+    await db.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_chunks_doc_version_source_zone ON chunks (doc_version_id, source_zone)"
+    ))
+    await db.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_documents_study_doc_type ON documents (study_id, doc_type)"
+    ))
+    await db.commit()
+
+
+async def ensure_index(db: AsyncSession) -> None:
+    print("Проверка HNSW-индекса (построение на больших таблицах занимает время)...", flush=True)
+    await db.execute(text("SET maintenance_work_mem = '1GB'"))
+    await db.execute(text("""
+        CREATE INDEX IF NOT EXISTS idx_chunks_embedding_hnsw
+        ON chunks USING hnsw (embedding vector_cosine_ops)
+        WITH (m = 16, ef_construction = 64)
+    """))
+    await db.commit()
+    await db.execute(text("ANALYZE chunks"))
+    await db.commit()
+
+
+async def _exact_ids(db: AsyncSession, query: str, k: int, filters: dict) -> list[uuid.UUID]:
+    """Эталон: точный поиск (индексы отключены)."""
+    await db.execute(text("SET LOCAL enable_indexscan = off"))
+    await db.execute(text("SET LOCAL max_parallel_workers_per_gather = 4"))
+    service = RetrievalService(db)
+    conditions = service._chunk_conditions(filters, await service._resolve_doc_version_ids(filters))
+    rows = await service._exact_search(embed_query(query), conditions, k)
+    await db.rollback()
+    return [row.id for row in rows]
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def run_scenario(
+    session_factory: async_sessionmaker,
+    name: str,
+    queries: list[tuple[str, dict]],
+    k: int,
+    recall_queries: int,
+) -> None:
+    latencies: list[float] = []
+    recalls: list[float] = []
+    async with session_factory() as db:
+        service = RetrievalService(db)
+        for i, (query, filters) in enumerate(queries):
+            start = time.perf_counter()
+            results = await service._search(query, filters, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            # Каждый запрос — в своей транзакции (как в HTTP-запросе)
+            await db.rollback()
+            if i < recall_queries:
+                expected = await _exact_ids(db, query, k, filters)
+                if expected:
+                    found = {r.id for r in results}
+                    recalls.append(len(found.intersection(expected)) / len(expected))
+
+    p95 = _percentile(latencies, 0.95)
+    recall = f"{statistics.mean(recalls):.3f}" if recalls else "n/a"
+    print(
+        f"{name:<7} n={len(latencies):<5} p50={_percentile(latencies, 0.5):7.1f} мс  "
+        f"p95={p95:7.1f} мс  p99={_percentile(latencies, 0.99):7.1f} мс  "
+        f"recall@{k}={recall}  {'OK' if p95 < 50 else '> 50 мс'}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк векторного поиска chunks")
+    parser.add_argument("--database-url", default=settings.async_database_url)
+    parser.add_argument("--seed-chunks", type=int, default=0, help="Засеять столько синтетических chunks")
+    parser.add_argument("--versions", type=int, default=1000, help="Версий документов для засева")
+    parser.add_argument("--studies", type=int, default=100, help="Исследований для засева")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Размер пачки COPY")
+    parser.add_argument("--queries", type=int, default=200, help="Запросов на сценарий")
+    parser.add_argument("--recall-queries", type=int, default=20, help="Запросов для оценки recall")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, default=None, help="Переопределить hnsw.ef_search")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cleanup", action="store_true", help="Удалить засеянные данные и выйти")
+    args = parser.parse_args()
+
+    if args.ef_search is not None:
+        settings.retrieval_hnsw_ef_search = args.ef_search
+
+    engine = create_async_engine(args.database_url, echo=False)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    try:
+        async with session_factory() as db:
+            if args.cleanup:
+                await db.execute(delete(Workspace).where(Workspace.name == BENCH_WORKSPACE))
+                await db.commit()
+                print("Данные бенчмарка удалены")
+                return
+            await prepare_schema(db)
+            if args.seed_chunks:
+                await seed(db, args.seed_chunks, args.versions, args.studies, args.batch_size, args.seed)
+            await ensure_index(db)
+
+            total = (await db.execute(text("SELECT count(*) FROM chunks"))).scalar_one()
+            workspace = await _get_workspace(db)
+            study_ids = []
+            if workspace is not None:
+                study_ids = list(
+                    (await db.execute(select(Study.id).where(Study.workspace_id == workspace.id))).scalars()
+                )
+            sample = list(
+                (await db.execute(select(Chunk.text).order_by(text("random()")).limit(args.queries))).scalars()
+            )
+            await db.commit()
+
+        if not sample:
+            print("В таблице chunks нет данных: используйте --seed-chunks")
+            return
+
+        rng = random.Random(args.seed)
+
+        def make_query(source: str) -> str:
+            words = source.split()
+            return " ".join(rng.sample(words, min(len(words), 6)))
+
+        print(f"Chunks: {total}, ef_search={settings.retrieval_hnsw_ef_search}, k={args.k}")
+        scenarios = {
+            "global": [(make_query(t), {}) for t in sample],
+            "zone": [(make_query(t), {"source_zones": [rng.choice(_ZONES).value]}) for t in sample],
+        }
+        if study_ids:
+            scenarios["study"] = [(make_query(t), {"study_id": rng.choice(study_ids)}) for t in sample]
+        for name, queries in scenarios.items():
+            await run_scenario(session_factory, name, queries, args.k, args.recall_queries)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    # Настройка event loop для Windows (psycopg требует SelectorEventLoop)
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    asyncio.run(main())
@@ -26,6 +26,7 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sess
 from app.core.config import LLMProvider, settings
 from app.core.logging import logger
 from app.db.models.topics import Topic
+from app.services.embedding_cache import embedding_dimension, get_embedding_cache
 
 
 async def get_embedding_from_openai(
@@ -220,6 +221,7 @@ async def generate_embeddings_for_topics(
         return {"processed": len(topics), "updated": 0, "errors": 0}
     
     stats = {"processed": 0, "updated": 0, "errors": 0}
+    embedding_cache = get_embedding_cache()
     
     # Обрабатываем топики батчами
     for i in range(0, len(topics), batch_size):
@@ -232,13 +234,20 @@ async def generate_embeddings_for_topics(
                 text = format_topic_text(topic)
                 logger.debug(f"Генерация эмбеддинга для {topic.topic_key}: {text[:100]}...")
                 
-                # Получаем эмбеддинг
-                embedding = await get_embedding_from_openai(
-                    text=text,
+                # Получаем эмбеддинг (через content-addressed кэш)
+                embedding = await embedding_cache.get_or_compute(
+                    db,
                     provider=provider,
-                    base_url=base_url,
-                    api_key=api_key,
                     model=model,
+                    dims=embedding_dimension(model, provider),
+                    text=text,
+                    compute=lambda: get_embedding_from_openai(
+                        text=text,
+                        provider=provider,
+                        base_url=base_url,
+                        api_key=api_key,
+                        model=model,
+                    ),
                 )
                 
                 # Проверяем размерность (должно быть 1536 для text-embedding-3-small)
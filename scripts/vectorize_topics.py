@@ -42,6 +42,7 @@ from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sess
 from app.core.config import LLMProvider, settings
 from app.core.logging import logger
 from app.db.models.topics import Topic
+from app.services.embedding_cache import embedding_dimension, get_embedding_cache
 
 
 def format_topic_text(topic: Topic) -> str:
@@ -259,6 +260,7 @@ async def vectorize_topics(
         return {"processed": 0, "updated": 0, "errors": 0}
     
     stats = {"processed": 0, "updated": 0, "errors": 0}
+    embedding_cache = get_embedding_cache()
     
     # Обрабатываем топики батчами
     for i in range(0, len(topics), batch_size):
@@ -271,20 +273,25 @@ async def vectorize_topics(
                 text = format_topic_text(topic)
                 logger.debug(f"Генерация эмбеддинга для {topic.topic_key}: {text[:100]}...")
                 
-                # Получаем эмбеддинг
-                embedding = await get_embedding(
-                    text=text,
+                # Проверяем размерность в зависимости от провайдера
+                expected_dim = embedding_dimension(model, provider)
+                
+                # Получаем эмбеддинг (повторный запуск для неизменённых топиков берёт его из кэша)
+                embedding = await embedding_cache.get_or_compute(
+                    db,
                     provider=provider,
-                    base_url=base_url,
-                    api_key=api_key,
                     model=model,
+                    dims=expected_dim,
+                    text=text,
+                    compute=lambda: get_embedding(
+                        text=text,
+                        provider=provider,
+                        base_url=base_url,
+                        api_key=api_key,
+                        model=model,
+                    ),
                 )
                 
-                # Проверяем размерность в зависимости от провайдера
-                expected_dim = 1536  # OpenAI по умолчанию
-                if provider == LLMProvider.YANDEXGPT:
-                    expected_dim = 256  # YandexGPT возвращает 256 измерений
-                
                 if len(embedding) != expected_dim:
                     logger.warning(
                         f"Неожиданная размерность эмбеддинга для {topic.topic_key}: "